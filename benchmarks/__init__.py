@@ -0,0 +1,12 @@
+"""Performance benchmarks for mypy.
+
+Each benchmark type checks a synthetic program that stresses one part of
+mypy (see benchmarks.generators). Usage:
+
+  python -m benchmarks.runner [-o FILE] [BENCHMARK...]   (run benchmarks)
+  python -m benchmarks.compare OLD NEW                   (compare two results)
+  python -m benchmarks.lexer [DIR...]                    (compare lexer engines)
+
+The results are written as JSON (see benchmarks.runner), so that the results
+of different commits can be compared.
+"""
@@ -0,0 +1,77 @@
+"""Compare two benchmark results written by benchmarks.runner.
+
+Usage:
+
+  python -m benchmarks.compare [--threshold FRACTION] OLD NEW
+
+For each benchmark in both results, print the wall time and peak memory
+use of both results and their ratio. Exit with status 1 if the wall time or
+the peak memory use of a benchmark grew by more than the threshold (default
+10%), or if a benchmark reported errors.
+"""
+
+import argparse
+import json
+import sys
+
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.runner import RESULTS_FORMAT_VERSION
+
+
+# Measurements compared between results
+MEASUREMENTS = ['wall', 'peak_rss_kb']
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('format') != RESULTS_FORMAT_VERSION:
+        sys.exit('{}: unsupported format of results'.format(path))
+    return data['benchmarks']
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any],
+            threshold: float) -> Tuple[List[str], List[str]]:
+    """Compare two results.
+
+    Return the lines of a comparison table and the descriptions of regressions.
+    """
+    table = ['{:20} {:>12} {:>12} {:>7}'.format('benchmark', 'old', 'new', 'ratio')]
+    regressions = []  # type: List[str]
+    for name in sorted(set(old) & set(new)):
+        if old[name]['size'] != new[name]['size']:
+            table.append('{:20} (sizes differ: {} and {})'.format(name, old[name]['size'],
+                                                                  new[name]['size']))
+            continue
+        if new[name]['errors']:
+            regressions.append('{}: {} errors'.format(name, new[name]['errors']))
+        for measurement in MEASUREMENTS:
+            old_value, new_value = old[name][measurement], new[name][measurement]
+            ratio = new_value / old_value if old_value else 1.0
+            table.append('{:20} {:>12.3f} {:>12.3f} {:>7.2f}'.format(
+                '{} {}'.format(name, measurement), old_value, new_value, ratio))
+            if ratio > 1.0 + threshold:
+                regressions.append('{}: {} grew by {:.0%}'.format(name, measurement,
+                                                                  ratio - 1.0))
+    return table, regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='benchmarks.compare',
+                                     description='Compare two benchmark results.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='largest allowed relative growth (default: 0.1)')
+    parser.add_argument('old', help='results of the baseline')
+    parser.add_argument('new', help='results to compare with the baseline')
+    args = parser.parse_args()
+    table, regressions = compare(load(args.old), load(args.new), args.threshold)
+    for line in table:
+        print(line)
+    for regression in regressions:
+        print('Regression: {}'.format(regression))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Generators of synthetic programs for benchmarks.
+
+Each generator takes a size and returns a Program whose main module type
+checks without errors. The time needed to check a program grows with its
+size; the default sizes take a few seconds each.
+"""
+
+import os
+
+from typing import Callable, Dict, List
+
+
+class Program:
+    """A generated program.
+
+    Attributes:
+      modules: Map from module id to source text; the module '__main__' is
+               the program itself, other modules are imported by it (a module
+               whose id ends with '.pyi' is a stub)
+    """
+
+    def __init__(self, modules: Dict[str, str]) -> None:
+        self.modules = modules
+
+    def write(self, dir: str) -> str:
+        """Write the modules to a directory; return the path of the main module."""
+        for id, text in self.modules.items():
+            if id == '__main__':
+                name = 'main.py'
+            elif id.endswith('.pyi'):
+                name = id
+            else:
+                name = id + '.py'
+            with open(os.path.join(dir, name), 'w') as f:
+                f.write(text)
+        return os.path.join(dir, 'main.py')
+
+
+class Benchmark:
+    """A program generator with a default size.
+
+    If full_stubs is True, the program needs the builtins of typeshed (for
+    example, list) and can't be checked with the test builtins.
+    """
+
+    def __init__(self, name: str, generate: Callable[[int], Program], size: int,
+                 full_stubs: bool = False) -> None:
+        self.name = name
+        self.generate = generate
+        self.size = size
+        self.full_stubs = full_stubs
+
+
+def import_chain(n: int) -> Program:
+    """n modules where each module imports the previous one."""
+    modules = {}  # type: Dict[str, str]
+    for i in range(n):
+        lines = []  # type: List[str]
+        if i > 0:
+            lines.append('import m{}'.format(i - 1))
+        lines += ['class C{}:'.format(i),
+                  '    def __init__(self) -> None:',
+                  '        self.value = {}'.format(i),
+                  '    def get(self) -> int:',
+                  '        return self.value',
+                  'def f{}(x: int) -> int:'.format(i)]
+        if i > 0:
+            lines.append('    return m{}.f{}(C{}().get())'.format(i - 1, i - 1, i))
+        else:
+            lines.append('    return x')
+        modules['m{}'.format(i)] = '\n'.join(lines) + '\n'
+    modules['__main__'] = 'import m{0}\nx = m{0}.f{0}(1)\n'.format(n - 1)
+    return Program(modules)
+
+
+def import_cycle(n: int) -> Program:
+    """n modules that form a single import cycle."""
+    modules = {}  # type: Dict[str, str]
+    for i in range(n):
+        j = (i + 1) % n
+        modules['m{}'.format(i)] = ('import m{j}\n'
+                                    'class C{i}:\n'
+                                    '    def other(self) -> \'m{j}.C{j}\':\n'
+                                    '        return m{j}.C{j}()\n'
+                                    'def f{i}(x: int) -> int:\n'
+                                    '    return x\n'
+                                    'def g{i}() -> int:\n'
+                                    '    return m{j}.f{j}(1)\n').format(i=i, j=j)
+    modules['__main__'] = 'import m0\nx = m0.C0().other().other()\n'
+    return Program(modules)
+
+
+def class_hierarchy(depth: int) -> Program:
+    """A chain of depth classes, each derived from the previous one."""
+    lines = ['class C0:',
+             '    def method(self, x: int) -> int:',
+             '        return x',
+             '    def attr0(self) -> str:',
+             "        return ''"]
+    for i in range(1, depth):
+        lines += ['class C{}(C{}):'.format(i, i - 1),
+                  '    def method(self, x: int) -> int:',
+                  '        return x',
+                  '    def attr{}(self) -> str:'.format(i),
+                  "        return ''"]
+    lines += ['def take(c: C0) -> None:',
+              '    pass',
+              'c = C{}()'.format(depth - 1),
+              'take(c)',
+              'y = c.method(1)']
+    lines += ['a{0} = c.attr{0}()'.format(i) for i in range(depth)]
+    return Program({'__main__': '\n'.join(lines) + '\n'})
+
+
+# Number of variants of each overloaded function
+OVERLOAD_VARIANTS = 10
+
+
+def overloaded_stubs(n: int) -> Program:
+    """A stub with n overloaded functions, each called with its last variant."""
+    lines = ['from typing import overload']
+    lines += ['class A{}: pass'.format(i) for i in range(OVERLOAD_VARIANTS + 1)]
+    for j in range(n):
+        for i in range(OVERLOAD_VARIANTS):
+            lines += ['@overload',
+                      'def f{}(x: A{}) -> A{}: pass'.format(j, i, i + 1)]
+    main = ['import ovl']
+    main += ['x{0} = ovl.f{0}(ovl.A{1}())'.format(j, OVERLOAD_VARIANTS - 1) for j in range(n)]
+    return Program({'ovl.pyi': '\n'.join(lines) + '\n',
+                    '__main__': '\n'.join(main) + '\n'})
+
+
+def big_union(n: int) -> Program:
+    """A union of n classes, used as an argument and a return type."""
+    lines = ['from typing import Union',
+             'class B:',
+             '    def name(self) -> str:',
+             "        return ''"]
+    lines += ['class U{}(B): pass'.format(i) for i in range(n)]
+    lines.append('Alias = Union[{}]'.format(', '.join('U{}'.format(i) for i in range(n))))
+    lines += ['def take(x: Alias) -> str:',
+              '    return x.name()',
+              'def make() -> Alias:',
+              '    return U0()',
+              'y = make()  # type: Alias',
+              'z = take(y)']
+    lines += ['take(U{}())'.format(i) for i in range(n)]
+    return Program({'__main__': '\n'.join(lines) + '\n'})
+
+
+def literal_containers(n: int) -> Program:
+    """List, dict and nested list literals with n items each."""
+    lines = ['numbers = [{}]'.format(', '.join(str(i) for i in range(n))),
+             'table = {{{}}}'.format(', '.join("'k{0}': {0}".format(i) for i in range(n))),
+             'pairs = [{}]'.format(', '.join("({}, 'x')".format(i) for i in range(n))),
+             'nested = [{}]'.format(', '.join('[{}]'.format(i) for i in range(n)))]
+    return Program({'__main__': '\n'.join(lines) + '\n'})
+
+
+# Depth of nested calls of a generic function in a single expression (the
+# time needed for checking the calls grows exponentially with the depth)
+GENERIC_NESTING = 6
+
+
+def generic_calls(n: int) -> Program:
+    """n chained calls of generic methods and nested calls of a generic function."""
+    lines = ['from typing import TypeVar, Generic, Callable',
+             "T = TypeVar('T')",
+             "S = TypeVar('S')",
+             'class Box(Generic[T]):',
+             '    def __init__(self, item: T) -> None:',
+             '        self.item = item',
+             '    def get(self) -> T:',
+             '        return self.item',
+             "    def map(self, f: Callable[[T], S]) -> 'Box[S]':",
+             '        return Box(f(self.item))',
+             'def ident(x: T) -> T:',
+             '    return x',
+             'def to_str(x: int) -> str:',
+             "    return ''",
+             'def to_int(x: str) -> int:',
+             '    return 0',
+             'b0 = Box(1)']
+    for i in range(1, n + 1):
+        lines.append('b{} = b{}.map(to_str).map(to_int)'.format(i, i - 1))
+        lines.append('x{} = {}b{}.get(){}'.format(i, 'ident(' * GENERIC_NESTING, i,
+                                                  ')' * GENERIC_NESTING))
+    return Program({'__main__': '\n'.join(lines) + '\n'})
+
+
+BENCHMARKS = [
+    Benchmark('import_chain', import_chain, 500),
+    Benchmark('import_cycle', import_cycle, 300),
+    Benchmark('class_hierarchy', class_hierarchy, 400),
+    Benchmark('overloaded_stubs', overloaded_stubs, 200),
+    Benchmark('big_union', big_union, 200),
+    Benchmark('literal_containers', literal_containers, 5000, full_stubs=True),
+    Benchmark('generic_calls', generic_calls, 200),
+]
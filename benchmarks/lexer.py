@@ -0,0 +1,129 @@
+"""Compare the speed of the lexer engines (see mypy.lex).
+
+Usage:
+
+  python -m benchmarks.lexer [--runs N] [DIR...]
+
+Lex the .py and .pyi files in the directories (default: lib-python and
+typeshed of the repository, if present) with both engines, check that the
+engines produce the same tokens and print the number of tokens lexed per
+second by each engine (of the fastest of N runs). Files in a directory named
+2 or 2.x (or 2and3) are lexed as Python 2.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from typing import Any, Dict, List, Tuple
+
+from mypy import defaults
+from mypy.lex import lex
+
+
+# Directories of the repository lexed by default
+DEFAULT_DIRS = ['lib-python', 'typeshed']
+
+
+class Source:
+    """A source file to lex."""
+
+    def __init__(self, path: str, text: bytes, pyversion: Tuple[int, int]) -> None:
+        self.path = path
+        self.text = text
+        self.pyversion = pyversion
+        self.is_stub_file = path.endswith('.pyi')
+
+
+def find_sources(dirs: List[str]) -> List[Source]:
+    sources = []  # type: List[Source]
+    for dir in dirs:
+        for root, subdirs, files in os.walk(dir):
+            subdirs.sort()
+            parts = os.path.relpath(root, dir).split(os.sep)
+            if any(part == '2' or part.startswith('2.') or part == '2and3' for part in parts):
+                pyversion = defaults.PYTHON2_VERSION
+            else:
+                pyversion = defaults.PYTHON3_VERSION
+            for name in sorted(files):
+                if name.endswith('.py') or name.endswith('.pyi'):
+                    path = os.path.join(root, name)
+                    with open(path, 'rb') as f:
+                        sources.append(Source(path, f.read(), pyversion))
+    return sources
+
+
+def lex_sources(sources: List[Source], scanner: bool) -> int:
+    """Lex the sources and return the number of tokens."""
+    count = 0
+    for source in sources:
+        tokens, _ = lex(source.text, pyversion=source.pyversion,
+                        is_stub_file=source.is_stub_file, scanner=scanner)
+        count += len(tokens)
+    return count
+
+
+def different_files(sources: List[Source]) -> List[str]:
+    """Return the paths of the sources that the engines lex differently."""
+    def dump(source: Source, scanner: bool) -> Tuple[List[Tuple[str, str, str, int]],
+                                                      List[int]]:
+        tokens, ignored_lines = lex(source.text, pyversion=source.pyversion,
+                                    is_stub_file=source.is_stub_file, scanner=scanner)
+        return ([(type(t).__name__, t.string, t.pre, t.line) for t in tokens],
+                sorted(ignored_lines))
+
+    return [source.path for source in sources if dump(source, True) != dump(source, False)]
+
+
+def measure(sources: List[Source], runs: int = 3) -> Dict[str, Any]:
+    """Return the tokens, seconds and tokens per second of each engine."""
+    results = {}  # type: Dict[str, Any]
+    for engine, scanner in [('dispatch', False), ('scanner', True)]:
+        best = None  # type: float
+        for _ in range(runs):
+            start = time.perf_counter()
+            tokens = lex_sources(sources, scanner)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        results[engine] = {'tokens': tokens,
+                           'seconds': best,
+                           'tokens_per_second': tokens / best if best else 0.0}
+    return results
+
+
+def main() -> None:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(prog='benchmarks.lexer',
+                                     description='Compare the speed of the lexer engines.')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='lex the files RUNS times and use the fastest run')
+    parser.add_argument('dirs', nargs='*', metavar='DIR',
+                        help='directories to lex (default: {})'.format(
+                            ', '.join(DEFAULT_DIRS)))
+    args = parser.parse_args()
+    dirs = args.dirs or [os.path.join(root, dir) for dir in DEFAULT_DIRS
+                         if os.path.isdir(os.path.join(root, dir))]
+    sources = find_sources(dirs)
+    if not sources:
+        sys.exit('No source files found')
+    different = different_files(sources)
+    for path in different:
+        print('Different tokens: {}'.format(path), file=sys.stderr)
+    results = measure(sources, args.runs)
+    print('{} files in {}'.format(len(sources), ', '.join(dirs)))
+    print('{:10} {:>10} {:>9} {:>12}'.format('engine', 'tokens', 'seconds', 'tokens/s'))
+    for engine in 'dispatch', 'scanner':
+        result = results[engine]
+        print('{:10} {:10d} {:9.3f} {:12.0f}'.format(engine, result['tokens'],
+                                                     result['seconds'],
+                                                     result['tokens_per_second']))
+    print('speedup: {:.2f}x'.format(results['dispatch']['seconds'] /
+                                    results['scanner']['seconds']))
+    if different:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
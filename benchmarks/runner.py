@@ -0,0 +1,189 @@
+"""Run benchmarks and write the results as JSON.
+
+Each run of a benchmark type checks the generated program with build.build
+in a new process (if os.fork is available), so that the peak memory use of
+the process can be measured. The time spent in each phase is taken from the
+timing report of the build (see mypy.timing); of several runs, the fastest
+one is used. The results are written as:
+
+  {"format": 1,
+   "python": "<version>",
+   "mypy": "<version>",
+   "benchmarks": {
+     "<name>": {"size": ..., "runs": ..., "modules": ..., "errors": ...,
+                "wall": ..., "cpu": ..., "peak_rss_kb": ...,
+                "phases": {"<phase>": {"wall": ..., "cpu": ...}, ...}},
+     ...}}
+
+Times are in seconds. The number of errors should be 0; otherwise the
+generated program doesn't type check as intended.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+
+from typing import Any, Dict, List
+
+from mypy import build
+from mypy.build import BuildSource
+from mypy.errors import CompileError
+from mypy.version import __version__
+
+from benchmarks.generators import BENCHMARKS, Benchmark, Program
+
+
+# Version of the format of the results.
+RESULTS_FORMAT_VERSION = 1
+
+
+def check_program(program: Program, flags: List[str]) -> Dict[str, Any]:
+    """Type check a program in this process and return the measurements."""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        main = program.write(temp_dir)
+        timing_report = os.path.join(temp_dir, 'timing.json')
+        errors = 0
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            build.build(sources=[BuildSource(main, '__main__', None)],
+                        target=build.TYPE_CHECK,
+                        flags=flags,
+                        alt_lib_path=temp_dir,
+                        timing_report=timing_report)
+        except CompileError as e:
+            errors = len(e.messages)
+        wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+        with open(timing_report) as f:
+            report = json.load(f)
+    finally:
+        shutil.rmtree(temp_dir)
+    return {'wall': wall,
+            'cpu': cpu,
+            'errors': errors,
+            'modules': len(report['modules']),
+            'phases': dict((phase, {'wall': values['wall'], 'cpu': values['cpu']})
+                           for phase, values in report['totals'].items()),
+            'peak_rss_kb': peak_rss_kb(resource.getrusage(resource.RUSAGE_SELF))}
+
+
+def peak_rss_kb(usage: Any) -> int:
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    if sys.platform == 'darwin':
+        return usage.ru_maxrss // 1024
+    return usage.ru_maxrss
+
+
+def run_once(program: Program, flags: List[str]) -> Dict[str, Any]:
+    """Type check a program in a child process and return the measurements."""
+    if not hasattr(os, 'fork'):
+        return check_program(program, flags)
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            with os.fdopen(write_fd, 'w') as f:
+                json.dump(check_program(program, flags), f)
+        except BaseException:
+            traceback.print_exc()
+            sys.stderr.flush()
+            os._exit(1)
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        data = f.read()
+    _, status, usage = os.wait4(pid, 0)
+    if status != 0 or not data:
+        if os.WIFEXITED(status):
+            reason = 'exit status {}'.format(os.WEXITSTATUS(status))
+        else:
+            reason = 'signal {}'.format(os.WTERMSIG(status))
+        raise RuntimeError('Benchmark process failed with {}'.format(reason))
+    result = json.loads(data)
+    # The peak of the child, including anything allocated after reporting.
+    result['peak_rss_kb'] = peak_rss_kb(usage)
+    return result
+
+
+def run_benchmark(benchmark: Benchmark, size: int, runs: int,
+                  flags: List[str]) -> Dict[str, Any]:
+    """Run a benchmark several times and return the results of the fastest run."""
+    program = benchmark.generate(size)
+    results = [run_once(program, flags) for _ in range(runs)]
+    result = min(results, key=lambda r: r['wall'])
+    result['peak_rss_kb'] = max(r['peak_rss_kb'] for r in results)
+    result['size'] = size
+    result['runs'] = runs
+    return result
+
+
+def run(benchmarks: List[Benchmark], scale: float = 1.0, runs: int = 1,
+        flags: List[str] = None, verbose: bool = False) -> Dict[str, Any]:
+    """Run benchmarks and return the results (as JSON data)."""
+    flags = flags or []
+    results = {}  # type: Dict[str, Any]
+    for benchmark in benchmarks:
+        size = max(1, int(benchmark.size * scale))
+        result = run_benchmark(benchmark, size, runs, flags)
+        if verbose:
+            print('{:20} {:8.3f} s {:10} kB{}'.format(
+                benchmark.name, result['wall'], result['peak_rss_kb'],
+                '  ({} errors)'.format(result['errors']) if result['errors'] else ''),
+                file=sys.stderr)
+        results[benchmark.name] = result
+    return {'format': RESULTS_FORMAT_VERSION,
+            'python': platform.python_version(),
+            'mypy': __version__,
+            'benchmarks': results}
+
+
+def main() -> None:
+    names = [benchmark.name for benchmark in BENCHMARKS]
+    parser = argparse.ArgumentParser(prog='benchmarks.runner',
+                                     description='Run mypy performance benchmarks.')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='write the results to FILE (default: stdout)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply the default program sizes by SCALE')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='run each benchmark RUNS times and use the fastest run')
+    parser.add_argument('--test-builtins', action='store_true',
+                        help='use the test builtins instead of typeshed (skips the '
+                             'benchmarks that need typeshed)')
+    parser.add_argument('--fast-parser', action='store_true',
+                        help='use the experimental fast parser')
+    parser.add_argument('benchmarks', nargs='*', metavar='BENCHMARK',
+                        help='benchmarks to run (default: all; one of {})'.format(
+                            ', '.join(names)))
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in names:
+            parser.error('Unknown benchmark: {}'.format(name))
+    benchmarks = [benchmark for benchmark in BENCHMARKS
+                  if not args.benchmarks or benchmark.name in args.benchmarks]
+    flags = []  # type: List[str]
+    if args.test_builtins:
+        flags.append(build.TEST_BUILTINS)
+        benchmarks = [benchmark for benchmark in benchmarks if not benchmark.full_stubs]
+    if args.fast_parser:
+        flags.append(build.FAST_PARSER)
+
+    results = run(benchmarks, args.scale, args.runs, flags, verbose=True)
+    text = json.dumps(results, indent=2, sort_keys=True) + '\n'
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+
+if __name__ == '__main__':
+    main()
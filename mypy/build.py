@@ -9,27 +9,41 @@ file.  The individual passes are implemented in separate modules.
 The function build() is the main interface to this module.
 """
 
+import concurrent.futures
+import functools
+import heapq
 import os
 import os.path
+import pickle
 import shlex
 import subprocess
 import sys
 import re
+import traceback
 from os.path import dirname, basename
 
 from typing import Dict, List, Tuple, Iterable, cast, Set, Union, Optional
 
 from mypy.types import Type
 from mypy.nodes import MypyFile, Node, Import, ImportFrom, ImportAll
-from mypy.nodes import SymbolTableNode, MODULE_REF
+from mypy.nodes import SymbolTableNode, FuncDef, Block, MODULE_REF
 from mypy.semanal import SemanticAnalyzer, FirstPass, ThirdPass
 from mypy.checker import TypeChecker
-from mypy.errors import Errors, CompileError
+from mypy.traverser import TraverserVisitor
+from mypy.errors import Errors, ErrorInfo, CompileError
+from mypy import cache
 from mypy import parse
 from mypy import stats
 from mypy.report import Reports
 from mypy import defaults
 from mypy import moduleinfo
+from mypy.moduleindex import ModuleIndex
+from mypy.timing import TimingReport, PhaseTimer, NullTimer, NULL_TIMER
+from mypy.profiling import PhaseProfiler, ProfiledPhase
+from mypy.deftiming import DefTimings
+from mypy.importscan import scan_imports
+from mypy import recheck
+from mypy import shard
 from mypy import util
 
 
@@ -58,6 +72,44 @@ DISALLOW_UNTYPED_CALLS = 'disallow-untyped-calls'
 DISALLOW_UNTYPED_DEFS = 'disallow-untyped-defs'
 # Type check unannotated functions
 CHECK_UNTYPED_DEFS = 'check-untyped-defs'
+# Cache module interfaces on disk and reuse them in later builds
+INCREMENTAL = 'incremental'
+# Keep the state of the build so that a later build in the same process can reuse
+# it (see mypy.daemon). Non-blocking errors are returned in the build result
+# instead of raising CompileError.
+RESIDENT = 'resident'
+# Type check independent groups of modules in worker processes (the number of
+# processes is given by the jobs argument of build). The types inferred in the
+# workers are not included in the build result.
+PARALLEL_CHECK = 'parallel-check'
+# Write the messages of each module to stdout as soon as the module has been
+# type checked. The messages are not included in CompileError.
+STREAM_ERRORS = 'stream-errors'
+# Release the function bodies of each module, and the types of its nodes, once
+# the module has been type checked, unless they are needed for reports or
+# statistics. The types are not included in the build result.
+LOW_MEMORY = 'low-memory'
+# Don't parse the bodies of the functions of modules that aren't build sources,
+# except for methods that may define attributes (see mypy.parse.LazyBody). The
+# skipped bodies are not type checked.
+LAZY_BODIES = 'lazy-bodies'
+
+# Build flags that affect the results of analyzing a module. A cached module
+# is only used if these are the same as when the cache was written.
+CACHE_SENSITIVE_FLAGS = [SILENT_IMPORTS, FAST_PARSER, DISALLOW_UNTYPED_CALLS,
+                         DISALLOW_UNTYPED_DEFS, CHECK_UNTYPED_DEFS, TEST_BUILTINS]
+
+# Counters of BuildManager.scheduler_stats. The number of dependency checks
+# grows linearly with the number of import dependencies in the build.
+SCHEDULER_COUNTERS = [
+    'processed',          # State transitions performed
+    'dependency_checks',  # Import dependencies examined when ordering the components
+    'components',         # Strongly connected components of the import graph processed
+    'ready_pushes',       # Components added to the ready heap
+    'graph_updates',      # Recomputations of the components after the import graph changed
+    'prescanned',         # Modules found by the import scanner before they were imported
+    'prescan_hits',       # Modules found by the import scanner that were imported
+]
 
 # State ids. These describe the states a source file / module can be in a
 # build.
@@ -88,14 +140,17 @@ class BuildResult:
     """The result of a successful build.
 
     Attributes:
-      files:  Dictionary from module name to related AST node.
-      types:  Dictionary from parse tree node to its inferred type.
+      files:   Dictionary from module name to related AST node.
+      types:   Dictionary from parse tree node to its inferred type.
+      manager: The build manager that performed the build.
     """
 
     def __init__(self, files: Dict[str, MypyFile],
-                 types: Dict[Node, Type]) -> None:
+                 types: Dict[Node, Type],
+                 manager: 'BuildManager' = None) -> None:
         self.files = files
         self.types = types
+        self.manager = manager
 
 
 class BuildSource:
@@ -105,14 +160,15 @@ class BuildSource:
         self.module = module or '__main__'
         self.text = text
 
-    def load(self, lib_path, pyversion: Tuple[int, int]) -> str:
+    def load(self, lib_path, pyversion: Tuple[int, int],
+             overlays: Dict[str, str] = None) -> str:
         """Load the module if needed. This also has the side effect
         of calculating the effective path for modules."""
         if self.text is not None:
             return self.text
 
         self.path = self.path or lookup_program(self.module, lib_path)
-        return read_program(self.path, pyversion)
+        return read_program(self.path, pyversion, overlays)
 
     @property
     def effective_path(self) -> str:
@@ -155,7 +211,19 @@ def build(sources: List[BuildSource],
           custom_typing_module: str = None,
           report_dirs: Dict[str, str] = None,
           flags: List[str] = None,
-          python_path: bool = False) -> BuildResult:
+          python_path: bool = False,
+          cache_dir: str = defaults.CACHE_DIR,
+          previous: 'BuildManager' = None,
+          changed_paths: Iterable[str] = (),
+          jobs: int = 1,
+          snapshot_path: str = None,
+          timing_report: str = None,
+          profile_dir: str = None,
+          profile_slowest: int = None,
+          slowest_defs: int = None,
+          shard_spec: Tuple[int, int] = None,
+          shard_output: str = None,
+          overlays: Dict[str, str] = None) -> BuildResult:
     """Analyze a program.
 
     A single call to build performs parsing, semantic analysis and optionally
@@ -173,13 +241,42 @@ def build(sources: List[BuildSource],
       pyversion: Python version (major, minor)
       custom_typing_module: if not None, use this module id as an alias for typing
       flags: list of build options (e.g. COMPILE_ONLY)
+      cache_dir: directory for storing module interfaces in incremental mode
+      previous: manager of an earlier build with the RESIDENT flag; modules that
+        haven't changed since then (and don't depend on changed modules) are reused
+      changed_paths: files known to have changed since the previous build
+      jobs: number of processes used for parsing; if greater than one, files
+        are parsed in worker processes as soon as they are found
+      snapshot_path: snapshot of analyzed library stubs (see mypy.snapshot); if
+        None, use the default snapshot in the data directory if there is one; if
+        empty, don't use a snapshot
+      timing_report: if given, write the time spent in each phase of each module
+        to this file as JSON (see mypy.timing)
+      profile_dir: if given, profile each phase of the build with cProfile and
+        write the profiles to this directory (see mypy.profiling)
+      profile_slowest: if given, only write the profiles of this many modules
+        that took the longest
+      slowest_defs: if given, write this many functions and classes that took
+        the longest to type check to stdout (see mypy.deftiming)
+      shard_spec: if given, tuple (K, N); only type check the modules of shard K
+        out of N (see mypy.shard)
+      shard_output: file for the errors and report data of the shard; the
+        reports are finished when the outputs of all shards are merged
+      overlays: map from file path to source text that is used instead of the
+        contents of the file (for example, an unsaved editor buffer)
     """
     report_dirs = report_dirs or {}
     flags = flags or []
+    overlays = dict((os.path.abspath(path), text) for path, text in (overlays or {}).items())
 
     data_dir = default_data_dir(bin_dir)
 
     find_module_clear_caches()
+    index_path = None  # type: str
+    if INCREMENTAL in flags:
+        # Reuse the directory listings of the previous run that are still valid.
+        index_path = os.path.join(cache_dir, defaults.MODULE_INDEX_FILE)
+        module_index.load(index_path)
 
     # Determine the default module search path.
     lib_path = default_lib_path(data_dir, pyversion, python_path)
@@ -211,6 +308,12 @@ def build(sources: List[BuildSource],
 
     reports = Reports(data_dir, report_dirs)
 
+    if snapshot_path is None:
+        snapshot_path = default_snapshot_path(data_dir, pyversion)
+    snapshot = None  # type: cache.Snapshot
+    if snapshot_path:
+        snapshot = cache.read_snapshot(snapshot_path, pyversion)
+
     source_set = BuildSourceSet(sources)
 
     # Construct a build manager object that performs all the stages of the
@@ -222,22 +325,57 @@ def build(sources: List[BuildSource],
                            ignore_prefix=os.getcwd(),
                            custom_typing_module=custom_typing_module,
                            source_set=source_set,
-                           reports=reports)
+                           reports=reports,
+                           cache_dir=cache_dir,
+                           previous=previous,
+                           changed_paths=changed_paths,
+                           jobs=jobs,
+                           snapshot=snapshot,
+                           timing=timing_report is not None,
+                           profile=profile_dir is not None,
+                           profile_slowest=profile_slowest,
+                           def_timing=slowest_defs is not None,
+                           shard_spec=shard_spec,
+                           overlays=overlays)
 
     # Construct information that describes the initial files. __main__ is the
     # implicit module id and the import context is empty initially ([]).
     initial_states = []  # type: List[UnprocessedFile]
     for source in sources:
-        content = source.load(lib_path, pyversion)
+        with manager.timed(source.module, 'read'):
+            content = source.load(lib_path, pyversion, overlays)
         info = StateInfo(source.effective_path, source.module, [], manager)
-        initial_state = UnprocessedFile(info, content)
+        if source.text is not None:
+            initial_state = UnprocessedFile(info, content)
+        else:
+            initial_state = manager.new_file_state(info, content)
         initial_states += [initial_state]
 
     # Perform the build by sending the files as new file (UnprocessedFile is the
     # initial state of all files) to the manager. The manager will process the
     # file and all dependant modules recursively.
-    result = manager.process(initial_states)
-    reports.finish()
+    try:
+        try:
+            result = manager.process(initial_states)
+        except CompileError:
+            if shard_output:
+                manager.write_shard_output(shard_output, report_dirs)
+            raise
+    finally:
+        if index_path:
+            module_index.save(index_path)
+        # The files may change before the next lookup.
+        find_module_clear_caches()
+        if manager.timings is not None:
+            manager.timings.write(timing_report)
+        if manager.profiler is not None:
+            manager.profiler.write(profile_dir)
+        if manager.def_timings is not None:
+            manager.def_timings.write(slowest_defs, sys.stdout)
+    if shard_output:
+        manager.write_shard_output(shard_output, report_dirs)
+    else:
+        reports.finish()
     return result
 
 
@@ -335,6 +473,11 @@ def default_lib_path(data_dir: str, pyversion: Tuple[int, int],
     return path
 
 
+def default_snapshot_path(data_dir: str, pyversion: Tuple[int, int]) -> str:
+    """Return the path of the default snapshot of library stubs (see mypy.snapshot)."""
+    return os.path.join(data_dir, 'snapshot', '%d.%d.pickle' % pyversion)
+
+
 def lookup_program(module: str, lib_path: List[str]) -> str:
     # Modules are .py or .pyi
     path = find_module(module, lib_path)
@@ -345,9 +488,10 @@ def lookup_program(module: str, lib_path: List[str]) -> str:
             "mypy: can't find module '{}'".format(module)])
 
 
-def read_program(path: str, pyversion: Tuple[int, int]) -> str:
+def read_program(path: str, pyversion: Tuple[int, int],
+                 overlays: Dict[str, str] = None) -> str:
     try:
-        text = read_with_python_encoding(path, pyversion)
+        text = read_source(path, pyversion, overlays)
     except IOError as ioerr:
         raise CompileError([
             "mypy: can't read file '{}': {}".format(path, ioerr.strerror)])
@@ -379,14 +523,76 @@ class BuildManager:
       states:          States of all individual files that are being
                        processed. Each file in a build is always represented
                        by a single state object (after it has been encountered
-                       for the first time). This is the only place where
-                       states are stored.
+                       for the first time). The states are also indexed by
+                       module id and path in state_positions and path_states.
+      state_positions: Map from module id to the index of its state in states
+      path_states:     Map from source file path to the state of the file
+      submodules:      Map from package id to the ids of its submodules that have states
+      unparsed:        Heap of modules that must be parsed to discover their
+                       imports (items are (-index in states, module id))
+      scheduler_stats: Counters for the scheduling overhead of the build
       module_files:    Map from module name to source file path. There is a
                        1:1 mapping between modules and source files.
-      module_deps:     Cache for module dependencies (direct or indirect).
-                       Item (m, n) indicates whether m depends on n (directly
-                       or indirectly).
       missing_modules: Set of modules that could not be imported encountered so far
+      cache_dir:       Directory for cached module interfaces (incremental mode)
+      interface_hashes:
+                       Map from module id to the hash of the module interface
+                       (incremental mode; only for type checked modules)
+      symbol_hashes:   Map from module id to the hashes of its top-level symbols
+                       (incremental mode; only for type checked modules)
+      symbol_deps:     Map from module id to the full names of the symbols that
+                       the module read during semantic analysis and type checking
+                       (incremental mode)
+      import_cycles:   Map from module id to the ids of the modules in the same
+                       strongly connected component of the import graph
+      fresh_modules:   Modules that were loaded from the cache
+      stale_modules:   Modules that were processed (not loaded from the cache)
+      source_hashes:   Map from module id to the hash of its source (incremental or
+                       resident mode)
+      previous:        Manager of an earlier resident build whose modules can be reused
+      changed_paths:   Normalized paths of files that have changed since the previous build
+      reused_modules:  Modules reused from the previous build
+      module_type_maps:
+                       Map from module id to the types of the nodes in the module
+                       (resident mode)
+      module_defs:     Map from module id to the top-level statements of the module
+                       (resident mode; see mypy.recheck)
+      module_check_errors:
+                       Map from module id to the errors reported when type checking
+                       the module (resident mode)
+      reused_functions:
+                       Full names of functions and methods of changed modules that
+                       weren't type checked again (see mypy.recheck)
+      jobs:            Number of processes used for parsing (and type checking
+                       with the PARALLEL_CHECK flag)
+      parse_futures:   Map from module id to the pending result of parsing the
+                       module in a worker process (if jobs > 1)
+      snapshot:        Snapshot of analyzed library stubs (or None)
+      check_groups:    Map from module id to the group of independent modules
+                       that the module is type checked with in a worker process
+                       (PARALLEL_CHECK only; modules checked by the driver are omitted)
+      deferred_checks: Modules whose type checking was left to worker processes,
+                       with the number of errors reported before the module would
+                       have been type checked in a serial build
+      timings:         Time spent in the phases of each module (or None if no
+                       timing report is generated)
+      profiler:        Profiles of the phases of each module (or None if the build
+                       is not profiled)
+      def_timings:     Time spent type checking each function and class (or None
+                       if not measured)
+      shard_spec:      Tuple (K, N) if only the modules of shard K out of N are
+                       type checked (or None)
+      unchecked_modules:
+                       Modules of other shards that have not been type checked
+      shard_checks:    Tuples (module id, start, end) giving the range of the errors
+                       reported while type checking each module (if shard_spec is given)
+      overlays:        Map from absolute file path to source text used instead of
+                       the contents of the file
+      prescanned:      Map from module id to the initial state of a module that
+                       the import scanner found before any module imported it
+                       (if jobs > 1); the module is being parsed in a worker
+                       process if the state isn't a cache candidate
+      scanned_modules: Modules whose imports have been predicted
     """
 
     def __init__(self, data_dir: str,
@@ -397,7 +603,18 @@ class BuildManager:
                  ignore_prefix: str,
                  custom_typing_module: str,
                  source_set: BuildSourceSet,
-                 reports: Reports) -> None:
+                 reports: Reports,
+                 cache_dir: str = defaults.CACHE_DIR,
+                 previous: 'BuildManager' = None,
+                 changed_paths: Iterable[str] = (),
+                 jobs: int = 1,
+                 snapshot: cache.Snapshot = None,
+                 timing: bool = False,
+                 profile: bool = False,
+                 profile_slowest: int = None,
+                 def_timing: bool = False,
+                 shard_spec: Tuple[int, int] = None,
+                 overlays: Dict[str, str] = None) -> None:
         self.data_dir = data_dir
         self.errors = Errors()
         self.errors.set_ignore_prefix(ignore_prefix)
@@ -419,9 +636,50 @@ class BuildManager:
                                         DISALLOW_UNTYPED_DEFS in self.flags,
                                         CHECK_UNTYPED_DEFS in self.flags)
         self.states = []  # type: List[State]
+        self.state_positions = {}  # type: Dict[str, int]
+        self.path_states = {}  # type: Dict[str, State]
+        self.submodules = {}  # type: Dict[str, List[str]]
+        self.unparsed = []  # type: List[Tuple[int, str]]
+        self.scheduler_stats = dict((name, 0) for name in SCHEDULER_COUNTERS)
         self.module_files = {}  # type: Dict[str, str]
-        self.module_deps = {}  # type: Dict[Tuple[str, str], bool]
         self.missing_modules = set()  # type: Set[str]
+        self.cache_dir = cache_dir
+        self.interface_hashes = {}  # type: Dict[str, str]
+        self.symbol_hashes = {}  # type: Dict[str, Dict[str, str]]
+        self.symbol_deps = {}  # type: Dict[str, Set[str]]
+        self.import_cycles = {}  # type: Dict[str, Set[str]]
+        self.fresh_modules = set()  # type: Set[str]
+        self.stale_modules = set()  # type: Set[str]
+        self.source_hashes = {}  # type: Dict[str, str]
+        self.previous = previous
+        self.changed_paths = set(os.path.abspath(path) for path in changed_paths)
+        self.reused_modules = set()  # type: Set[str]
+        self.module_type_maps = {}  # type: Dict[str, Dict[Node, Type]]
+        self.module_defs = {}  # type: Dict[str, List[recheck.TopLevelDef]]
+        self.module_check_errors = {}  # type: Dict[str, List[ErrorInfo]]
+        self.reused_functions = set()  # type: Set[str]
+        self.jobs = jobs
+        self.parse_pool = None  # type: concurrent.futures.ProcessPoolExecutor
+        self.parse_futures = {}  # type: Dict[str, concurrent.futures.Future]
+        self.snapshot = snapshot
+        self.check_groups = {}  # type: Dict[str, int]
+        self.deferred_checks = []  # type: List[Tuple[int, str]]
+        self.timings = None  # type: TimingReport
+        if timing:
+            self.timings = TimingReport(self.errors, self.type_checker)
+        self.profiler = None  # type: PhaseProfiler
+        if profile:
+            self.profiler = PhaseProfiler(profile_slowest)
+        self.def_timings = None  # type: DefTimings
+        if def_timing:
+            self.def_timings = DefTimings()
+            self.type_checker.def_timings = self.def_timings
+        self.shard_spec = shard_spec
+        self.unchecked_modules = set()  # type: Set[str]
+        self.shard_checks = []  # type: List[Tuple[str, int, int]]
+        self.overlays = overlays or {}
+        self.prescanned = {}  # type: Dict[str, UnprocessedFile]
+        self.scanned_modules = set()  # type: Set[str]
 
     def process(self, initial_states: List['UnprocessedFile']) -> BuildResult:
         """Perform a build.
@@ -431,45 +689,42 @@ class BuildManager:
         manager object.  The return values are identical to the return
         values of the build function.
         """
-        self.states += initial_states
         for initial_state in initial_states:
+            self.add_state(initial_state)
             self.module_files[initial_state.id] = initial_state.path
         for initial_state in initial_states:
             initial_state.load_dependencies()
 
-        # Process states in a loop until all files (states) have been
-        # semantically analyzed or type checked (depending on target).
-        #
-        # We type check all files before the rest of the passes so that we can
-        # report errors and fail as quickly as possible.
-        while True:
-            # Find the next state that has all its dependencies met.
-            next = self.next_available_state()
-            if not next:
-                self.trace('done')
-                break
-
-            # Potentially output some debug information.
-            self.trace('next {} ({})'.format(next.path, next.state()))
-
-            # Set the import context for reporting error messages correctly.
-            self.errors.set_import_context(next.import_context)
-            # Process the state. The process method is responsible for adding a
-            # new state object representing the new state of the file.
-            next.process()
-
-            # Raise exception if the build failed. The build can fail for
-            # various reasons, such as parse error, semantic analysis error,
-            # etc.
-            if self.errors.is_blockers():
-                self.errors.raise_error()
+        # Process the modules one strongly connected component of the import
+        # graph (a single module or an import cycle) at a time, after all the
+        # components it depends on. Parsing a module that can't be loaded from
+        # the cache may find new imports; then the components are computed
+        # again for the modules that haven't been processed yet.
+        try:
+            while True:
+                self.parse_discovered_modules()
+                if self.process_components():
+                    break
+                self.scheduler_stats['graph_updates'] += 1
+        finally:
+            self.shutdown_parse_pool()
+            self.prescanned.clear()
+        if self.deferred_checks:
+            self.check_deferred_modules()
+        self.trace('done')
 
         # If there were no errors, all files should have been fully processed.
         for s in self.states:
             assert s.state() == final_state, (
                 '{} still unprocessed in state {}'.format(s.path, s.state()))
 
-        if self.errors.is_errors():
+        self.log('Scheduler: ' + ', '.join('{} {}'.format(self.scheduler_stats[name], name)
+                                           for name in SCHEDULER_COUNTERS))
+
+        if self.is_incremental():
+            self.write_cache_files()
+
+        if self.errors.is_errors() and RESIDENT not in self.flags:
             self.errors.raise_error()
 
         # Collect a list of all files.
@@ -481,19 +736,409 @@ class BuildManager:
         self.final_passes(trees, self.type_checker.type_map)
 
         return BuildResult(self.semantic_analyzer.modules,
-                           self.type_checker.type_map)
-
-    def next_available_state(self) -> 'State':
-        """Find a ready state (one that has all its dependencies met)."""
-        i = len(self.states) - 1
-        while i >= 0:
-            if self.states[i].is_ready():
-                num_incomplete = self.states[i].num_incomplete_deps()
-                if num_incomplete == 0:
-                    # This is perfect; no need to look for the best match.
-                    return self.states[i]
-            i -= 1
-        return None
+                           self.type_checker.type_map,
+                           self)
+
+    def add_state(self, state: 'State') -> None:
+        """Add the state of a newly encountered file."""
+        self.state_positions[state.id] = len(self.states)
+        self.states.append(state)
+        self.path_states[state.path] = state
+        if '.' in state.id:
+            self.submodules.setdefault(state.id.rsplit('.', 1)[0], []).append(state.id)
+        if isinstance(state, UnprocessedFile):
+            if self.jobs > 1 and state.id not in self.scanned_modules:
+                self.prescan(state)
+            if not state.is_cache_candidate():
+                self.parse_later(state.id)
+
+    def replace_state(self, state: 'State') -> None:
+        """Replace the state of a file with a new state object."""
+        if state.id not in self.state_positions:
+            raise RuntimeError('State for {} not found'.format(state.path))
+        self.states[self.state_positions[state.id]] = state
+        self.path_states[state.path] = state
+
+    def parse_later(self, id: str) -> None:
+        # Prefer modules added later, like a backwards scan of states would.
+        heapq.heappush(self.unparsed, (-self.state_positions[id], id))
+        if self.jobs > 1 and id not in self.parse_futures:
+            # Start parsing right away, while the driver processes other modules.
+            self.start_parsing(cast(UnprocessedFile, self.lookup_state(id)))
+
+    def start_parsing(self, state: 'UnprocessedFile') -> None:
+        """Parse a module in a worker process."""
+        if self.parse_pool is None:
+            self.parse_pool = concurrent.futures.ProcessPoolExecutor(self.jobs)
+        self.parse_futures[state.id] = self.parse_pool.submit(
+            parse_file, state.program_text, state.path, state.id, state.import_context,
+            self.pyversion, self.custom_typing_module, FAST_PARSER in self.flags,
+            self.has_lazy_bodies(state.info()), self.errors.ignore_prefix)
+
+    def prescan(self, state: 'UnprocessedFile') -> None:
+        """Find the modules that a new module seems to import, recursively.
+
+        The imports of a module are predicted with the import scanner (see
+        mypy.importscan), or taken from the cache metadata of a module that
+        may be loaded from the cache. The modules found are parsed in worker
+        processes right away, so the workers don't have to wait for the
+        driver to parse the modules that import them. They are added to the
+        build only when a parsed module imports them.
+        """
+        pending = [state]
+        while pending:
+            state = pending.pop()
+            self.scanned_modules.add(state.id)
+            if state.is_cache_candidate():
+                imported = cast(CachedFile, state).meta.dependencies
+            else:
+                is_package = os.path.basename(state.path).startswith('__init__.')
+                imported = scan_imports(state.program_text, state.id, is_package)
+                if state.id != 'builtins':
+                    imported.append('builtins')
+            for module in imported:
+                for id in super_packages(module) + [module]:
+                    if (self.has_module(id) or id in self.prescanned or
+                            id in self.scanned_modules or id in self.missing_modules):
+                        continue
+                    self.scanned_modules.add(id)
+                    path, text = self.read_module(id, state.silent)
+                    if text is None:
+                        continue
+                    new_state = self.new_file_state(StateInfo(path, id, [], self), text)
+                    self.scheduler_stats['prescanned'] += 1
+                    self.prescanned[id] = new_state
+                    if not new_state.is_cache_candidate():
+                        self.start_parsing(new_state)
+                    pending.append(new_state)
+
+    def read_module(self, id: str, silent: bool) -> Tuple[Optional[str], Optional[str]]:
+        """Find and read the source file of a module.
+
+        Return a pair (path, file contents), or (None, None) if the module
+        could not be found or read (see read_module_source_from_file).
+        """
+        if id == 'builtins' and self.pyversion[0] == 2:
+            # The __builtin__ module is called internally by mypy 'builtins' in Python 2 mode
+            # (similar to Python 3), but the stub file is __builtin__.pyi. The reason is that
+            # a lot of code hard codes 'builtins.x' and this it's easier to work it around like
+            # this. It also means that the implementation can mostly ignore the difference and
+            # just assume 'builtins' everywhere, which simplifies code.
+            file_id = '__builtin__'
+        else:
+            file_id = id
+        with self.timed(id, 'read'):
+            return read_module_source_from_file(file_id, self.lib_path, self.pyversion,
+                                                silent, self.overlays)
+
+    def parsed_tree(self, id: str) -> Optional[MypyFile]:
+        """Return the tree of a module parsed in a worker process.
+
+        Add the errors reported by the parser. Return None if the module
+        wasn't parsed in a worker process, or if the tree couldn't be
+        transferred from the worker.
+        """
+        future = self.parse_futures.pop(id, None)
+        if future is None:
+            return None
+        try:
+            tree, error_infos = future.result()
+        except Exception as err:
+            self.log('Could not parse {} in a worker process: {}'.format(id, err))
+            return None
+        for info in error_infos:
+            # The module may have been parsed before it was imported.
+            info.import_ctx = self.errors.import_context()
+        self.errors.copy_error_infos(error_infos)
+        return tree
+
+    def shutdown_parse_pool(self) -> None:
+        if self.parse_pool is not None:
+            # Parse results are not needed any more if the build failed.
+            for future in self.parse_futures.values():
+                future.cancel()
+            self.parse_futures.clear()
+            self.parse_pool.shutdown()
+            self.parse_pool = None
+
+    def parse_discovered_modules(self) -> None:
+        """Parse modules until all modules imported by parsed modules have been found.
+
+        Modules that may be loaded from the cache aren't parsed; their
+        dependencies are known from the cache.
+        """
+        while self.unparsed:
+            _, id = heapq.heappop(self.unparsed)
+            self.process_state(self.lookup_state(id))
+
+    def process_components(self) -> bool:
+        """Process the strongly connected components of the import graph.
+
+        A component is processed once all the components it depends on have
+        been processed. Return False if the import graph changed so that the
+        remaining components must be computed again.
+        """
+        edges = dict((state.id, state.dependencies) for state in self.states
+                     if state.state() != final_state)
+        components = strongly_connected_components(
+            [state.id for state in self.states if state.id in edges], edges)
+        component_index = {}  # type: Dict[str, int]
+        for i, component in enumerate(components):
+            for id in component:
+                component_index[id] = i
+        # Components that depend on each component, and the number of unprocessed
+        # components that each component depends on.
+        dependents = [set() for _ in components]  # type: List[Set[int]]
+        num_deps = [0] * len(components)
+        for i, component in enumerate(components):
+            for id in component:
+                for dep in edges[id]:
+                    self.scheduler_stats['dependency_checks'] += 1
+                    j = component_index.get(dep, i)
+                    if j != i and i not in dependents[j]:
+                        dependents[j].add(i)
+                        num_deps[i] += 1
+        if self.is_parallel_check():
+            self.assign_check_groups(components, dependents)
+        # Process the ready component containing the module added last first,
+        # like a backwards scan of states would.
+        ready = []  # type: List[Tuple[int, int]]
+
+        def push_ready(i: int) -> None:
+            self.scheduler_stats['ready_pushes'] += 1
+            heapq.heappush(ready, (-max(self.state_positions[id] for id in components[i]), i))
+
+        for i in range(len(components)):
+            if num_deps[i] == 0:
+                push_ready(i)
+        while ready:
+            _, i = heapq.heappop(ready)
+            if not self.process_component(components[i]):
+                return False
+            for j in dependents[i]:
+                num_deps[j] -= 1
+                if num_deps[j] == 0:
+                    push_ready(j)
+        return True
+
+    def process_component(self, ids: List[str]) -> bool:
+        """Process the modules of a strongly connected component to the final state.
+
+        Each phase is performed for all the modules before the next phase, so
+        modules in an import cycle can refer to each other. Return False if the
+        import graph changed.
+        """
+        self.scheduler_stats['components'] += 1
+        ids = sorted(ids, key=lambda id: -self.state_positions[id])
+        cycle = set(ids)
+        for id in ids:
+            self.import_cycles[id] = cycle
+        states = [self.lookup_state(id) for id in ids]
+        candidates = [cast(CachedFile, state) for state in states
+                      if state.state() == UNPROCESSED_STATE]
+        if candidates:
+            if (len(candidates) == len(states) and
+                    all(type(state) == type(candidates[0]) for state in candidates) and
+                    candidates[0].load_group(candidates)):
+                self.flush_errors(ids)
+                return True
+            # The modules must be processed again. Since they depend on each
+            # other, none of them can be loaded from the cache.
+            num_states = len(self.states)
+            for state in candidates:
+                dependencies = set(state.dependencies)
+                state.demote()
+                self.parse_discovered_modules()
+                if set(self.lookup_state(state.id).dependencies) != dependencies:
+                    return False
+            if len(self.states) != num_states:
+                return False
+        for phase in (PARSED_STATE, PARTIAL_SEMANTIC_ANALYSIS_STATE,
+                      SEMANTICALLY_ANALYSED_STATE):
+            for id in ids:
+                state = self.lookup_state(id)
+                if state.state() == phase:
+                    if phase == SEMANTICALLY_ANALYSED_STATE and id in self.check_groups:
+                        self.deferred_checks.append((self.errors.num_messages(), id))
+                    else:
+                        self.process_state(state)
+        self.flush_errors(ids)
+        return True
+
+    def is_parallel_check(self) -> bool:
+        """Should independent groups of modules be type checked in worker processes?
+
+        The types inferred in the workers aren't available to the driver, so
+        this isn't done if they are needed for reports, statistics or caching.
+        Neither are the timings and profiles of the workers.
+        """
+        return (PARALLEL_CHECK in self.flags and self.jobs > 1 and hasattr(os, 'fork') and
+                self.target >= TYPE_CHECK and not self.reports.reporters and
+                self.timings is None and self.profiler is None and
+                self.def_timings is None and self.shard_spec is None and
+                not self.is_incremental() and not self.is_resident() and
+                DUMP_TYPE_STATS not in self.flags and DUMP_INFER_STATS not in self.flags)
+
+    def assign_check_groups(self, components: List[List[str]],
+                            dependents: List[Set[int]]) -> None:
+        """Split the components into groups that can be type checked independently.
+
+        Each component that no other component depends on starts a group. A
+        component belongs to the same group as the components that depend on
+        it, if they all belong to the same group; otherwise it's shared by
+        several groups and type checked by the driver before the groups. A
+        group thus only depends on its own modules and shared modules.
+        """
+        shared = -1
+        owners = [shared] * len(components)
+        # Components come after their dependencies, so visit them in reverse.
+        for i in reversed(range(len(components))):
+            if not dependents[i]:
+                owners[i] = i
+            else:
+                groups = set(owners[j] for j in dependents[i])
+                if len(groups) == 1:
+                    owners[i] = groups.pop()
+        self.check_groups = {}
+        if len(set(owners) - {shared}) > 1:
+            for i, component in enumerate(components):
+                if owners[i] != shared:
+                    for id in component:
+                        self.check_groups[id] = owners[i]
+
+    def check_deferred_modules(self) -> None:
+        """Type check the modules that were left to worker processes.
+
+        Each worker is forked after all other modules have been processed, so
+        it inherits everything it needs from the driver. The errors reported
+        by the workers are inserted where a serial build would have reported
+        them. If a worker fails, the driver type checks its modules instead.
+        """
+        groups = {}  # type: Dict[int, List[str]]
+        for _, id in self.deferred_checks:
+            groups.setdefault(self.check_groups[id], []).append(id)
+        # Assign each group (largest first) to the worker with the fewest modules.
+        assignments = [[] for _ in range(min(self.jobs, len(groups)))]  # type: List[List[str]]
+        for group in sorted(groups.values(), key=len, reverse=True):
+            min(assignments, key=len).extend(group)
+        self.log('Type checking {} modules in {} worker processes'.format(
+            len(self.deferred_checks), len(assignments)))
+
+        workers = []  # type: List[Tuple[int, int, List[str]]]
+        for ids in assignments:
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                try:
+                    try:
+                        result = (True, self.check_modules(ids))  # type: Tuple[bool, object]
+                    except BaseException:
+                        result = (False, traceback.format_exc())
+                    with os.fdopen(write_fd, 'wb') as f:
+                        pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+                finally:
+                    os._exit(0)
+            os.close(write_fd)
+            workers.append((pid, read_fd, ids))
+
+        error_infos = {}  # type: Dict[str, List[ErrorInfo]]
+        failed = []  # type: List[str]
+        for pid, read_fd, ids in workers:
+            with os.fdopen(read_fd, 'rb') as f:
+                try:
+                    ok, result = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError) as err:
+                    ok, result = False, str(err)
+            os.waitpid(pid, 0)
+            if ok:
+                error_infos.update(cast(Dict[str, List[ErrorInfo]], result))
+            else:
+                self.log('Type checking in a worker process failed: {}'.format(result))
+                failed.extend(ids)
+        # The remaining modules of groups only depend on each other, so the
+        # order of checking them doesn't matter.
+        error_infos.update(self.check_modules(failed))
+
+        for index, id in reversed(self.deferred_checks):
+            self.errors.insert_error_infos(index, error_infos[id])
+            state = self.lookup_state(id)
+            if state.state() != final_state:
+                self.replace_state(TypeCheckedFile(state.info(), cast(ParsedFile, state).tree))
+        self.flush_errors([id for _, id in self.deferred_checks])
+        self.deferred_checks = []
+
+    def check_modules(self, ids: List[str]) -> Dict[str, List[ErrorInfo]]:
+        """Type check semantically analyzed modules.
+
+        Return the errors reported for each module instead of recording them.
+        """
+        error_infos = {}  # type: Dict[str, List[ErrorInfo]]
+        for id in ids:
+            num_errs = self.errors.num_messages()
+            self.process_state(self.lookup_state(id))
+            error_infos[id] = self.errors.error_info[num_errs:]
+            del self.errors.error_info[num_errs:]
+        return error_infos
+
+    def is_in_shard(self, id: str) -> bool:
+        """Should a module be type checked and reported by this build?"""
+        return (self.shard_spec is None or
+                shard.shard_of(id, self.shard_spec[1]) == self.shard_spec[0])
+
+    def check_shard_dependencies(self, state: 'State') -> None:
+        """Type check the modules of other shards that a module depends on.
+
+        The types inferred for their interfaces may be needed for type checking
+        the module. The errors reported for them are discarded, so the bodies
+        of functions that only affect themselves are not checked (see
+        recheck.self_contained_functions).
+        """
+        for id in state.dependencies:
+            if id in self.unchecked_modules:
+                self.unchecked_modules.remove(id)
+                dep = cast(SemanticallyAnalyzedFile, self.lookup_state(id))
+                self.check_shard_dependencies(dep)
+                num_errs = self.errors.num_messages()
+                only_once_messages = set(self.errors.only_once_messages)
+                self.errors.set_import_context(dep.import_context)
+                dep.type_check(interface_only=True)
+                del self.errors.error_info[num_errs:]
+                self.errors.only_once_messages = only_once_messages
+        self.errors.set_import_context(state.import_context)
+
+    def write_shard_output(self, path: str, report_dirs: Dict[str, str]) -> None:
+        shard.write_output(path, self.shard_spec, self.errors, self.shard_checks,
+                           self.reports, report_dirs)
+
+    def flush_errors(self, ids: List[str]) -> None:
+        """Write the messages of modules that have been type checked (STREAM_ERRORS only)."""
+        if STREAM_ERRORS not in self.flags:
+            return
+        for id in ids:
+            state = self.lookup_state(id)
+            if state.state() == final_state:
+                for message in self.errors.flush_file(state.path):
+                    print(message)
+        sys.stdout.flush()
+
+    def process_state(self, state: 'State') -> None:
+        """Advance a state to the next state."""
+        # Potentially output some debug information.
+        self.trace('next {} ({})'.format(state.path, state.state()))
+        self.scheduler_stats['processed'] += 1
+
+        # Set the import context for reporting error messages correctly.
+        self.errors.set_import_context(state.import_context)
+        # Process the state. The process method is responsible for adding a
+        # new state object representing the new state of the file.
+        state.process()
+
+        # Raise exception if the build failed. The build can fail for
+        # various reasons, such as parse error, semantic analysis error,
+        # etc.
+        if self.errors.is_blockers():
+            self.errors.raise_error()
 
     def has_module(self, name: str) -> bool:
         """Have we seen a module yet?"""
@@ -507,10 +1152,10 @@ class BuildManager:
 
         This function does not consider any dependencies.
         """
-        for s in self.states:
-            if s.path == path:
-                return s.state()
-        return UNSEEN_STATE
+        state = self.path_states.get(path)
+        if state is None:
+            return UNSEEN_STATE
+        return state.state()
 
     def module_state(self, name: str) -> int:
         """Return the state of a module.
@@ -528,38 +1173,28 @@ class BuildManager:
             state = fs
         return state
 
-    def is_dep(self, m1: str, m2: str, done: Set[str] = None) -> bool:
-        """Does m1 import m2 directly or indirectly?"""
-        # Have we computed this previously?
-        dep = self.module_deps.get((m1, m2))
-        if dep is not None:
-            return dep
-
-        if not done:
-            done = set([m1])
+    def lookup_state(self, module: str) -> 'State':
+        if module not in self.state_positions:
+            raise RuntimeError('%s not found' % module)
+        return self.states[self.state_positions[module]]
 
-        # m1 depends on m2 iff one of the deps of m1 depends on m2.
-        st = self.lookup_state(m1)
-        for m in st.dependencies:
-            if m in done:
-                continue
-            done.add(m)
-            # Cache this dependency.
-            self.module_deps[m1, m] = True
-            # Search recursively.
-            if m == m2 or self.is_dep(m, m2, done):
-                # Yes! Mark it in the cache.
-                self.module_deps[m1, m2] = True
-                return True
-        # No dependency. Mark it in the cache.
-        self.module_deps[m1, m2] = False
-        return False
+    def add_module_refs(self, id: str, tree: MypyFile) -> None:
+        """Include a module in the symbol table of the enclosing package.
 
-    def lookup_state(self, module: str) -> 'State':
-        for state in self.states:
-            if state.id == module:
-                return state
-        raise RuntimeError('%s not found' % module)
+        Also include the submodules of the module that are already in the
+        module symbol table (a submodule may be processed before a cached
+        package is loaded).
+        """
+        modules = self.semantic_analyzer.modules
+        if '.' in id:
+            c = id.split('.')
+            p = '.'.join(c[:-1])
+            if p in modules:
+                modules[p].names[c[-1]] = SymbolTableNode(MODULE_REF, tree, p)
+        for submodule in self.submodules.get(id, ()):
+            if submodule in modules:
+                tree.names[submodule.split('.')[-1]] = SymbolTableNode(
+                    MODULE_REF, modules[submodule], id)
 
     def all_imported_modules_in_file(self,
                                      file: MypyFile) -> List[Tuple[str, int]]:
@@ -612,9 +1247,253 @@ class BuildManager:
         else:
             raise RuntimeError('Unsupported target %d' % self.target)
 
+    def is_incremental(self) -> bool:
+        """Should module interfaces be cached across builds?"""
+        return (INCREMENTAL in self.flags and self.target >= TYPE_CHECK and
+                DUMP_TYPE_STATS not in self.flags and DUMP_INFER_STATS not in self.flags)
+
+    def is_resident(self) -> bool:
+        """Should the build keep the state needed for reusing it in a later build?"""
+        return RESIDENT in self.flags and self.target >= TYPE_CHECK
+
+    def is_releasable(self, info: 'StateInfo') -> bool:
+        """Can the function bodies and node types of a module be released after type checking?
+
+        Later modules only need the signatures and symbol tables of the module.
+        """
+        return (LOW_MEMORY in self.flags and self.target >= TYPE_CHECK and
+                not self.is_resident() and DUMP_INFER_STATS not in self.flags and
+                not (self.reports.reporters and self.is_source(info)))
+
+    def has_lazy_bodies(self, info: 'StateInfo') -> bool:
+        """Should the function bodies of a module be skipped by the parser?
+
+        The bodies of the build sources are always parsed, as are those of
+        all modules when they are needed for statistics or by a later build.
+        """
+        return (LAZY_BODIES in self.flags and info.path.endswith('.py') and
+                not self.is_source(info) and not self.is_resident() and
+                DUMP_TYPE_STATS not in self.flags and DUMP_INFER_STATS not in self.flags)
+
+    def cache_options(self, info: 'StateInfo') -> Dict[str, object]:
+        """Return the options that a cached module must have been analyzed with."""
+        options = {'flags': sorted(set(flag for flag in self.flags
+                                       if flag in CACHE_SENSITIVE_FLAGS)),
+                   'custom_typing_module': self.custom_typing_module}  # type: Dict[str, object]
+        if self.has_lazy_bodies(info):
+            # Errors in the skipped bodies weren't reported.
+            options['lazy_bodies'] = True
+        return options
+
+    def new_file_state(self, info: 'StateInfo', text: str) -> 'UnprocessedFile':
+        """Create the initial state for a module that was found in the file system.
+
+        If the module can be reused from the previous build, use a ResidentFile
+        state. If the snapshot of library stubs contains the module, use a
+        SnapshotFile state. In incremental mode, use a CachedFile state if there
+        is a cache entry for the module that matches the source text.
+        """
+        if self.reports.reporters and self.is_source(info):
+            # Reports are generated while type checking source files.
+            return UnprocessedFile(info, text)
+        if self.previous is not None and os.path.abspath(info.path) not in self.changed_paths:
+            meta = self.previous.resident_meta(info.id, info.path, text)
+            if meta and not any(self.is_module(id) for id in meta.suppressed):
+                return ResidentFile(info, text, meta, self.previous)
+        if self.snapshot is not None and self.target >= TYPE_CHECK:
+            meta = self.snapshot.metas.get(info.id)
+            if meta and meta.path == info.path and self.is_usable_meta(meta, info, text):
+                return SnapshotFile(info, text, meta, self.snapshot)
+        if self.is_incremental():
+            meta = cache.read_meta(self.cache_dir, self.pyversion, info.id, info.path)
+            if meta and self.is_usable_meta(meta, info, text):
+                return CachedFile(info, text, meta)
+        return UnprocessedFile(info, text)
+
+    def is_usable_meta(self, meta: cache.CacheMeta, info: 'StateInfo', text: str) -> bool:
+        """Was a cached module analyzed from the same source and with the same options?"""
+        return (meta.source_hash == cache.source_hash(text)
+                and meta.options == self.cache_options(info)
+                and not any(self.is_module(id) for id in meta.suppressed))
+
+    def is_source(self, info: 'StateInfo') -> bool:
+        return (info.path in self.source_set.source_paths or
+                info.id in self.source_set.source_modules)
+
+    def interface_hash(self, id: str) -> str:
+        """Return the interface hash of a type checked module."""
+        if id not in self.interface_hashes:
+            self.hash_modules(id)
+        return self.interface_hashes[id]
+
+    def symbol_hash(self, name: str) -> Tuple[str, str]:
+        """Find the top-level symbol or module that a full name refers to, and its hash.
+
+        Return a tuple (full name of symbol or module, hash). The hash of a
+        module is its interface hash. The hash is empty if the symbol doesn't
+        exist or its module hasn't been type checked.
+        """
+        module, rest = cache.split_module_prefix(name, self.semantic_analyzer.modules)
+        if module is None:
+            return name, ''
+        if (module not in self.state_positions or
+                self.lookup_state(module).state() != TYPE_CHECKED_STATE):
+            return name if not rest else module + '.' + rest[0], ''
+        if not rest:
+            return module, self.interface_hash(module)
+        name = module + '.' + rest[0]
+        return name, self.module_symbol_hashes(module).get(name, '')
+
+    def module_symbol_hashes(self, id: str) -> Dict[str, str]:
+        """Return the hashes of the top-level symbols of a type checked module."""
+        if id not in self.symbol_hashes:
+            self.hash_modules(id)
+        return self.symbol_hashes[id]
+
+    def hash_modules(self, id: str) -> None:
+        """Calculate the interface and symbol hashes of a type checked module.
+
+        The hashes include the hashes of the symbols of other modules that the
+        interface refers to, so the modules that the module depends on
+        (directly or indirectly) are hashed first, in dependency order. This
+        avoids deep recursion through long import chains.
+        """
+        def is_hashed(id: str) -> bool:
+            return id in self.interface_hashes and id in self.symbol_hashes
+
+        order = []  # type: List[str]
+        seen = set([id])
+        stack = [(id, iter(self.lookup_state(id).dependencies))]
+        while stack:
+            current, deps = stack[-1]
+            for dep in deps:
+                if (dep not in seen and dep in self.state_positions and not is_hashed(dep) and
+                        self.lookup_state(dep).state() == TYPE_CHECKED_STATE):
+                    seen.add(dep)
+                    stack.append((dep, iter(self.lookup_state(dep).dependencies)))
+                    break
+            else:
+                stack.pop()
+                order.append(current)
+        modules = self.semantic_analyzer.modules
+        for module in order:
+            state = cast(ParsedFile, self.lookup_state(module))
+            ref_hash = functools.partial(self.ref_hash, module)
+            if module not in self.interface_hashes:
+                self.interface_hashes[module] = cache.interface_hash(
+                    state.tree, state.dependencies, modules, ref_hash)
+            if module not in self.symbol_hashes:
+                self.symbol_hashes[module] = cache.symbol_hashes(
+                    state.tree, state.dependencies, modules, ref_hash)
+
+    def ref_hash(self, id: str, kind: str, name: str) -> str:
+        """Return the hash of a symbol or module that the interface of a module refers to.
+
+        The hash is empty for the modules in the same import cycle.
+        """
+        module, _ = cache.split_module_prefix(name, self.semantic_analyzer.modules)
+        if module is None or module in self.import_cycles.get(id, (id,)):
+            return ''
+        return self.symbol_hash(name)[1]
+
+    def symbol_deps_of(self, id: str) -> Optional[Set[str]]:
+        """Return the set for recording the symbols read by a module (None if not recorded)."""
+        if not self.is_incremental():
+            return None
+        return self.symbol_deps.setdefault(id, set())
+
+    def resident_meta(self, id: str, path: str, text: str) -> Optional[cache.CacheMeta]:
+        """Return metadata for reusing a module of this build, or None if not possible.
+
+        The module must have been fully processed in this build and its source
+        must not have changed.
+        """
+        if (not self.is_resident() or id not in self.source_hashes or
+                self.source_hashes[id] != cache.source_hash(text)):
+            return None
+        state = self.lookup_state(id)
+        if state.path != path or state.state() != TYPE_CHECKED_STATE:
+            return None
+        if cast(TypeCheckedFile, state).meta is not None:
+            # The tree of a loaded module doesn't include the imports.
+            return cast(TypeCheckedFile, state).meta
+        return self.cache_meta(state, interface_hashes=False)
+
+    def write_cache_files(self) -> None:
+        """Write the interfaces of processed modules to the cache.
+
+        Modules with errors are not cached, so that the errors will be
+        reported again by later builds.
+        """
+        modules = self.semantic_analyzer.modules
+        for state in self.states:
+            if (state.id not in self.stale_modules or state.path == '<string>' or
+                    not self.is_in_shard(state.id) or
+                    self.errors.is_errors_for_file(state.path)):
+                continue
+            meta = self.cache_meta(state)
+            try:
+                cache.write_cache(self.cache_dir, self.pyversion, meta,
+                                  cast(ParsedFile, state).tree, modules)
+            except cache.CacheError as err:
+                self.log('Could not cache {}: {}'.format(state.id, err))
+
+    def cache_meta(self, state: 'State', interface_hashes: bool = True) -> cache.CacheMeta:
+        """Construct the cache metadata of a type checked module.
+
+        If interface_hashes is False, don't calculate interface hashes.
+        """
+        tree = cast(ParsedFile, state).tree
+        imports = {}  # type: Dict[str, int]
+        for id, line in self.all_imported_modules_in_file(tree):
+            imports.setdefault(id, line)
+        dependencies = [p for p in super_packages(state.id) if self.has_module(p)]
+        dependencies += [dep for dep in state.dependencies if dep not in dependencies]
+        symbol_hashes = {}  # type: Dict[str, str]
+        dep_symbol_hashes = None  # type: Dict[str, str]
+        if interface_hashes:
+            interface_hash = self.interface_hash(state.id)
+            dep_interface_hashes = dict((dep, self.interface_hash(dep))
+                                        for dep in dependencies)
+            symbol_hashes = self.module_symbol_hashes(state.id)
+            if state.id in self.symbol_deps:
+                dep_symbol_hashes = {}
+                for name in self.symbol_deps[state.id]:
+                    name, hash = self.symbol_hash(name)
+                    if hash and name != state.id and not name.startswith(state.id + '.'):
+                        dep_symbol_hashes[name] = hash
+        else:
+            interface_hash = self.interface_hashes.get(state.id, '')
+            dep_interface_hashes = {}
+        return cache.CacheMeta(
+            id=state.id,
+            path=state.path,
+            source_hash=self.source_hashes[state.id],
+            dependencies=dependencies,
+            dep_lines=[imports.get(dep, 1) for dep in dependencies],
+            suppressed=sorted(id for id in imports if id in self.missing_modules),
+            interface_hash=interface_hash,
+            dep_interface_hashes=dep_interface_hashes,
+            options=self.cache_options(state.info()),
+            symbol_hashes=symbol_hashes,
+            dep_symbol_hashes=dep_symbol_hashes)
+
     def report_file(self, file: MypyFile) -> None:
         if self.source_set.is_source(file):
-            self.reports.file(file, type_map=self.type_checker.type_map)
+            with self.timed(file.fullname(), 'report'):
+                self.reports.file(file, type_map=self.type_checker.type_map)
+
+    def timed(self, id: str, phase: str) -> Union[PhaseTimer, NullTimer, ProfiledPhase]:
+        """Return a context manager that measures a phase of a module.
+
+        The phase is recorded in the timing report and profiled, if enabled.
+        """
+        timer = NULL_TIMER  # type: Union[PhaseTimer, NullTimer]
+        if self.timings is not None:
+            timer = self.timings.phase(id, phase)
+        if self.profiler is not None:
+            return self.profiler.phase(id, phase, timer)
+        return timer
 
     def log(self, message: str) -> None:
         if VERBOSE in self.flags:
@@ -701,21 +1580,6 @@ class State:
     def process(self) -> None:
         raise RuntimeError('Not implemented')
 
-    def is_ready(self) -> bool:
-        """Return True if all dependencies are at least in the same state
-        as this object (but not in the initial state).
-        """
-        for module in self.dependencies:
-            state = self.manager.module_state(module)
-            if earlier_state(state,
-                             self.state()) or state == UNPROCESSED_STATE:
-                return False
-        return True
-
-    def num_incomplete_deps(self) -> int:
-        """Return the number of dependencies that are ready but incomplete."""
-        return 0  # Does not matter in this state
-
     def state(self) -> int:
         raise RuntimeError('Not implemented')
 
@@ -724,11 +1588,7 @@ class State:
 
         Also notify the manager.
         """
-        for i in range(len(self.manager.states)):
-            if self.manager.states[i].path == state_object.path:
-                self.manager.states[i] = state_object
-                return
-        raise RuntimeError('State for {} not found'.format(state_object.path))
+        self.manager.replace_state(state_object)
 
     def errors(self) -> Errors:
         return self.manager.errors
@@ -793,19 +1653,16 @@ class UnprocessedFile(State):
             return
 
         tree = self.parse(self.program_text, self.path)
+        self.manager.stale_modules.add(self.id)
+        if self.manager.is_incremental() or self.manager.is_resident():
+            self.manager.source_hashes[self.id] = cache.source_hash(self.program_text)
+        if self.manager.is_resident():
+            self.manager.module_defs[self.id] = recheck.split_top_level_defs(tree,
+                                                                             self.program_text)
 
         # Store the parsed module in the shared module symbol table.
         self.manager.semantic_analyzer.modules[self.id] = tree
 
-        if '.' in self.id:
-            # Include module in the symbol table of the enclosing package.
-            c = self.id.split('.')
-            p = '.'.join(c[:-1])
-            sem_anal = self.manager.semantic_analyzer
-            if p in sem_anal.modules:
-                sem_anal.modules[p].names[c[-1]] = SymbolTableNode(
-                    MODULE_REF, tree, p)
-
         if self.id != 'builtins':
             # The builtins module is imported implicitly in every program (it
             # contains definitions of int, print etc.).
@@ -817,7 +1674,8 @@ class UnprocessedFile(State):
         # the file to the symbol table. We must do this before processing imports,
         # since this may mark some import statements as unreachable.
         first = FirstPass(self.semantic_analyzer())
-        first.analyze(tree, self.path, self.id)
+        with self.manager.timed(self.id, 'first_pass'):
+            first.analyze(tree, self.path, self.id)
 
         # Add all directly imported modules to be processed (however they are
         # not processed yet, just waiting to be processed).
@@ -843,6 +1701,7 @@ class UnprocessedFile(State):
         # Initialize module symbol table, which was populated by the semantic
         # analyzer.
         tree.names = self.semantic_analyzer().globals
+        self.manager.add_module_refs(self.id, tree)
 
         # Replace this state object with a parsed state in BuildManager.
         self.switch_state(ParsedFile(self.info(), tree))
@@ -857,22 +1716,22 @@ class UnprocessedFile(State):
             # Do nothing: already being compiled.
             return True
 
-        if id == 'builtins' and self.manager.pyversion[0] == 2:
-            # The __builtin__ module is called internally by mypy 'builtins' in Python 2 mode
-            # (similar to Python 3), but the stub file is __builtin__.pyi. The reason is that
-            # a lot of code hard codes 'builtins.x' and this it's easier to work it around like
-            # this. It also means that the implementation can mostly ignore the difference and
-            # just assume 'builtins' everywhere, which simplifies code.
-            file_id = '__builtin__'
-        else:
-            file_id = id
-        path, text = read_module_source_from_file(file_id, self.manager.lib_path,
-                                                  self.manager.pyversion, self.silent)
+        if id in self.manager.prescanned:
+            # The module was found by the import scanner (and is being parsed).
+            new_file = self.manager.prescanned.pop(id)
+            new_file.import_context = self.errors().import_context()
+            self.manager.scheduler_stats['prescan_hits'] += 1
+            self.manager.add_state(new_file)
+            self.manager.module_files[id] = new_file.path
+            new_file.load_dependencies()
+            return True
+
+        path, text = self.manager.read_module(id, self.silent)
         if text is not None:
             info = StateInfo(path, id, self.errors().import_context(),
                              self.manager)
-            new_file = UnprocessedFile(info, text)
-            self.manager.states.append(new_file)
+            new_file = self.manager.new_file_state(info, text)
+            self.manager.add_state(new_file)
             self.manager.module_files[id] = path
             new_file.load_dependencies()
             return True
@@ -885,19 +1744,222 @@ class UnprocessedFile(State):
         Raise CompileError if there is a parse error.
         """
         num_errs = self.errors().num_messages()
-        tree = parse.parse(source_text, fnam, self.errors(),
-                           pyversion=self.manager.pyversion,
-                           custom_typing_module=self.manager.custom_typing_module,
-                           fast_parser=FAST_PARSER in self.manager.flags)
-        tree._fullname = self.id
+        with self.manager.timed(self.id, 'parse'):
+            tree = self.manager.parsed_tree(self.id)
+            if tree is None:
+                tree = parse.parse(source_text, fnam, self.errors(),
+                                   pyversion=self.manager.pyversion,
+                                   custom_typing_module=self.manager.custom_typing_module,
+                                   fast_parser=FAST_PARSER in self.manager.flags,
+                                   lazy_bodies=self.manager.has_lazy_bodies(self.info()))
+                tree._fullname = self.id
         if self.errors().num_messages() != num_errs:
             self.errors().raise_error()
         return tree
 
+    def is_cache_candidate(self) -> bool:
+        """Can we still try to load this module from the cache?"""
+        return False
+
     def state(self) -> int:
         return UNPROCESSED_STATE
 
 
+class CachedFile(UnprocessedFile):
+    """A module that has an entry in the incremental cache matching its source.
+
+    The module is loaded from the cache together with the other modules in
+    its import cycle, once all the modules they depend on have been type
+    checked, if the interfaces of those modules haven't changed since the
+    cache entry was written. Otherwise the module is demoted and processed
+    like an ordinary unprocessed file.
+    """
+
+    meta = None  # type: cache.CacheMeta
+
+    def __init__(self, info: StateInfo, program_text: str, meta: cache.CacheMeta) -> None:
+        super().__init__(info, program_text)
+        self.meta = meta
+        # Dependencies of an unprocessed file (only the surrounding packages)
+        self.package_dependencies = []  # type: List[str]
+
+    def load_dependencies(self) -> None:
+        super().load_dependencies()
+        self.package_dependencies = self.dependencies[:]
+        if not self.is_cache_candidate():
+            return
+        for id, line in zip(self.meta.dependencies, self.meta.dep_lines):
+            if id in self.dependencies:
+                continue
+            self.errors().push_import_context(self.path, line)
+            try:
+                found = id not in self.manager.missing_modules and self.import_module(id)
+            finally:
+                self.errors().pop_import_context()
+            if not found:
+                # A dependency has disappeared; the module must be processed again.
+                self.demote()
+                return
+            self.dependencies.append(id)
+
+    def is_cache_candidate(self) -> bool:
+        return self.meta is not None
+
+    def demote(self) -> None:
+        """Don't use the cache; process the module as an ordinary unprocessed file."""
+        self.manager.trace('not using cache for {}'.format(self.id))
+        self.meta = None
+        self.dependencies = self.package_dependencies[:]
+        self.manager.parse_later(self.id)
+
+    def process(self) -> None:
+        if self.is_cache_candidate():
+            raise RuntimeError('Cached module {} must be loaded with its import cycle'.format(
+                self.id))
+        super().process()
+
+    def load_group(self, group: List['CachedFile']) -> bool:
+        """Load a group of modules that form an import cycle (or a single module).
+
+        All the modules the group depends on must have been type checked.
+        Return False if the cache can't be used for the group.
+        """
+        if not self.validate_group(group):
+            return False
+        try:
+            trees = self.load_trees(group)
+        except cache.CacheError as err:
+            self.manager.log('Could not load cached {}: {}'.format(self.id, err))
+            return False
+        for member in group:
+            member.finish_loading(trees[member.id])
+        return True
+
+    def load_trees(self, group: List['CachedFile']) -> Dict[str, MypyFile]:
+        """Load the trees of a group of modules; raise CacheError on failure."""
+        return cache.load_trees(self.manager.cache_dir, self.manager.pyversion,
+                                [member.meta for member in group],
+                                self.semantic_analyzer().modules)
+
+    def validate_group(self, group: List['CachedFile']) -> bool:
+        """Are the symbols read by the group the same as when caching the group?
+
+        If the symbols weren't recorded, compare the interfaces of the dependencies.
+        """
+        # Hashes of the modules of the group and their symbols when the group was cached
+        group_hashes = {}  # type: Dict[str, str]
+        for member in group:
+            group_hashes.update(member.meta.symbol_hashes)
+            group_hashes[member.id] = member.meta.interface_hash
+        members = set(member.id for member in group)
+        modules = self.semantic_analyzer().modules
+        for member in group:
+            if member.meta.dep_symbol_hashes is None:
+                if not self.validate_dependencies(member, group_hashes):
+                    return False
+                continue
+            for name, hash in sorted(member.meta.dep_symbol_hashes.items()):
+                module, _ = cache.split_module_prefix(name, modules)
+                if module in members:
+                    current = group_hashes.get(name, '')
+                else:
+                    _, current = self.manager.symbol_hash(name)
+                if current != hash:
+                    self.manager.log('{} has changed; not using cache for {}'.format(
+                        name, member.id))
+                    return False
+        return True
+
+    def validate_dependencies(self, member: 'CachedFile', group_hashes: Dict[str, str]) -> bool:
+        """Are the interfaces of the dependencies the same as when caching a module?"""
+        for dep in member.dependencies:
+            if dep in group_hashes:
+                current = group_hashes[dep]
+            else:
+                current = self.manager.interface_hash(dep)
+            if member.meta.dep_interface_hashes.get(dep) != current:
+                self.manager.log('Interface of {} has changed; not using cache for {}'.format(
+                    dep, member.id))
+                return False
+        return True
+
+    def finish_loading(self, tree: MypyFile) -> None:
+        self.manager.log('Loaded {} from cache'.format(self.id))
+        self.manager.fresh_modules.add(self.id)
+        if self.meta.interface_hash:
+            self.manager.interface_hashes[self.id] = self.meta.interface_hash
+        if self.meta.symbol_hashes:
+            self.manager.symbol_hashes[self.id] = self.meta.symbol_hashes
+        self.manager.source_hashes[self.id] = self.meta.source_hash
+        self.manager.add_module_refs(self.id, tree)
+        new_state = TypeCheckedFile(self.info(), tree)
+        # The imports of the module aren't part of the cached interface.
+        new_state.dependencies = self.dependencies[:]
+        new_state.meta = self.meta
+        self.switch_state(new_state)
+
+
+class ResidentFile(CachedFile):
+    """A module that can be reused from an earlier build in the same process.
+
+    The module is reused if its source hasn't changed and all its
+    dependencies are reused as well (the reused tree refers to the symbols of
+    the dependencies in the previous build). The errors reported for the
+    module and the types of its nodes are carried over.
+    """
+
+    def __init__(self, info: StateInfo, program_text: str, meta: cache.CacheMeta,
+                 previous: BuildManager) -> None:
+        super().__init__(info, program_text, meta)
+        self.previous = previous
+
+    def validate_group(self, group: List['CachedFile']) -> bool:
+        members = set(member.id for member in group)
+        for member in group:
+            for dep in member.dependencies:
+                if dep not in members and dep not in self.manager.reused_modules:
+                    self.manager.log('{} was processed again; not reusing {}'.format(
+                        dep, member.id))
+                    return False
+        return True
+
+    def load_trees(self, group: List['CachedFile']) -> Dict[str, MypyFile]:
+        trees = {}  # type: Dict[str, MypyFile]
+        for member in group:
+            tree = self.previous.semantic_analyzer.modules[member.id]
+            self.semantic_analyzer().modules[member.id] = tree
+            trees[member.id] = tree
+        return trees
+
+    def finish_loading(self, tree: MypyFile) -> None:
+        self.manager.reused_modules.add(self.id)
+        self.errors().copy_error_infos(self.previous.errors.error_infos_for_file(self.path))
+        type_map = self.previous.module_type_maps.get(self.id, {})
+        self.manager.module_type_maps[self.id] = type_map
+        if self.id in self.previous.module_defs:
+            self.manager.module_defs[self.id] = self.previous.module_defs[self.id]
+            self.manager.module_check_errors[self.id] = self.previous.module_check_errors[self.id]
+        self.type_checker().type_map.update(type_map)
+        super().finish_loading(tree)
+
+
+class SnapshotFile(CachedFile):
+    """A module that can be loaded from the snapshot of analyzed library stubs.
+
+    The module is validated like a module in the incremental cache.
+    """
+
+    def __init__(self, info: StateInfo, program_text: str, meta: cache.CacheMeta,
+                 snapshot: cache.Snapshot) -> None:
+        super().__init__(info, program_text, meta)
+        self.snapshot = snapshot
+
+    def load_trees(self, group: List['CachedFile']) -> Dict[str, MypyFile]:
+        return cache.load_trees_from_data([member.meta for member in group],
+                                          self.snapshot.data,
+                                          self.semantic_analyzer().modules)
+
+
 class ParsedFile(State):
     tree = None  # type: MypyFile
 
@@ -925,25 +1987,16 @@ class ParsedFile(State):
 
     def process(self) -> None:
         """Semantically analyze file and advance to the next state."""
-        self.semantic_analyzer().visit_file(self.tree, self.tree.path)
+        analyzer = self.semantic_analyzer()
+        analyzer.symbol_deps = self.manager.symbol_deps_of(self.id)
+        try:
+            with self.manager.timed(self.id, 'semanal'):
+                analyzer.visit_file(self.tree, self.tree.path)
+        finally:
+            analyzer.symbol_deps = None
         self.switch_state(PartiallySemanticallyAnalyzedFile(self.info(),
                                                             self.tree))
 
-    def num_incomplete_deps(self) -> int:
-        """Return the number of dependencies that are incomplete.
-
-        Here complete means that their state is *later* than this module.
-        Cyclic dependencies are omitted to break cycles forcibly (and somewhat
-        arbitrarily).
-        """
-        incomplete = 0
-        for module in self.dependencies:
-            state = self.manager.module_state(module)
-            if (not earlier_state(self.state(), state) and
-                    not self.manager.is_dep(module, self.id)):
-                incomplete += 1
-        return incomplete
-
     def state(self) -> int:
         return PARSED_STATE
 
@@ -951,7 +2004,8 @@ class ParsedFile(State):
 class PartiallySemanticallyAnalyzedFile(ParsedFile):
     def process(self) -> None:
         """Perform final pass of semantic analysis and advance state."""
-        self.semantic_analyzer_pass3().visit_file(self.tree, self.tree.path)
+        with self.manager.timed(self.id, 'semanal_pass3'):
+            self.semantic_analyzer_pass3().visit_file(self.tree, self.tree.path)
         if DUMP_TYPE_STATS in self.manager.flags:
             stats.dump_type_stats(self.tree, self.tree.path)
         self.switch_state(SemanticallyAnalyzedFile(self.info(), self.tree))
@@ -963,38 +2017,139 @@ class PartiallySemanticallyAnalyzedFile(ParsedFile):
 class SemanticallyAnalyzedFile(ParsedFile):
     def process(self) -> None:
         """Type check file and advance to the next state."""
-        if self.manager.target >= TYPE_CHECK:
-            self.type_checker().visit_file(self.tree, self.tree.path)
+        if self.manager.target >= TYPE_CHECK and not self.manager.is_in_shard(self.id):
+            # Checked later if a module of the shard depends on this module.
+            self.manager.unchecked_modules.add(self.id)
+            num_errs = self.errors().num_messages()
+            self.manager.shard_checks.append((self.id, num_errs, num_errs))
+        elif self.manager.target >= TYPE_CHECK:
+            if self.manager.shard_spec is not None:
+                self.manager.check_shard_dependencies(self)
+            num_errs = self.errors().num_messages()
+            with self.manager.timed(self.id, 'check'):
+                self.type_check()
             if DUMP_INFER_STATS in self.manager.flags:
                 stats.dump_type_stats(self.tree, self.tree.path, inferred=True,
                                       typemap=self.manager.type_checker.type_map)
             self.manager.report_file(self.tree)
+            if self.manager.is_releasable(self.info()):
+                self.tree.accept(BodyReleaser())
+            if self.manager.shard_spec is not None:
+                self.manager.shard_checks.append((self.id, num_errs,
+                                                  self.errors().num_messages()))
 
         # FIX remove from active state list to speed up processing
 
         self.switch_state(TypeCheckedFile(self.info(), self.tree))
 
+    def type_check(self, interface_only: bool = False) -> None:
+        """Type check the module.
+
+        If interface_only is True, only check what is needed for inferring
+        the types of the module interface (the errors are incomplete).
+        """
+        checker = self.type_checker()
+        checker.symbol_deps = self.manager.symbol_deps_of(self.id)
+        type_map = checker.type_map
+        reused = []  # type: List[Tuple[FuncDef, recheck.TopLevelDef, recheck.TopLevelDef]]
+        if self.manager.is_releasable(self.info()):
+            # The types of the nodes are discarded after type checking.
+            checker.type_map = {}
+        if self.manager.is_resident():
+            # Record the types of the nodes of each module separately, so
+            # that they can be reused by a later build.
+            checker.type_map = {}
+            recheck.set_signatures(self.manager.module_defs.get(self.id, []), self.tree)
+            reused = self.reusable_functions()
+            checker.unchanged_defs = set(defn for defn, _, _ in reused)
+        elif interface_only:
+            checker.unchanged_defs = set(recheck.self_contained_functions(self.tree.defs))
+        num_errs = self.errors().num_messages()
+        try:
+            checker.visit_file(self.tree, self.tree.path)
+        finally:
+            checker.symbol_deps = None
+            checker.unchanged_defs = set()
+            if self.manager.is_resident():
+                self.manager.module_type_maps[self.id] = checker.type_map
+                type_map.update(checker.type_map)
+            checker.type_map = type_map
+        if self.manager.is_resident():
+            previous_errors = self.manager.previous.module_check_errors[self.id] if reused else []
+            for defn, old, new in reused:
+                if defn.info:
+                    self.manager.reused_functions.add(defn.info.fullname() + '.' + defn.name())
+                else:
+                    self.manager.reused_functions.add(defn.fullname())
+                self.errors().copy_error_infos(recheck.moved_errors(
+                    previous_errors, old, new, self.import_context))
+            self.manager.module_check_errors[self.id] = self.errors().error_info[num_errs:]
+
+    def reusable_functions(self) -> List[Tuple[FuncDef, recheck.TopLevelDef,
+                                               recheck.TopLevelDef]]:
+        """Find the functions and methods whose type checking results can be reused.
+
+        This is possible if the module has changed since the previous build but
+        its dependencies were reused (see mypy.recheck).
+        """
+        previous = self.manager.previous
+        defs = self.manager.module_defs.get(self.id)
+        if (previous is None or not defs or self.id not in previous.module_check_errors or
+                previous.lookup_state(self.id).path != self.path or
+                not all(dep in self.manager.reused_modules for dep in self.dependencies)):
+            return []
+        return recheck.reusable_functions(previous.module_defs[self.id], defs, self.tree) or []
+
     def state(self) -> int:
         return SEMANTICALLY_ANALYSED_STATE
 
 
+class BodyReleaser(TraverserVisitor):
+    """Replace the bodies of the functions of a type checked module with empty blocks."""
+
+    def visit_func_def(self, defn: FuncDef) -> None:
+        defn.body = Block([])
+        defn.expanded = []
+
+
 class TypeCheckedFile(SemanticallyAnalyzedFile):
+    # Metadata of the module if it was loaded from a cache (or reused from an
+    # earlier build).
+    meta = None  # type: cache.CacheMeta
+
     def process(self) -> None:
         """Finished, so cannot process."""
         raise RuntimeError('Cannot process TypeCheckedFile')
 
-    def is_ready(self) -> bool:
-        """Finished, so cannot ever become ready."""
-        return False
-
     def state(self) -> int:
         return TYPE_CHECKED_STATE
 
 
+def parse_file(source_text: str, path: str, id: str, import_context: List[Tuple[str, int]],
+               pyversion: Tuple[int, int], custom_typing_module: str, fast_parser: bool,
+               lazy_bodies: bool, ignore_prefix: str) -> Tuple[MypyFile, List[ErrorInfo]]:
+    """Parse a file in a worker process.
+
+    Return the tree and the errors reported by the parser.
+    """
+    errors = Errors()
+    errors.set_ignore_prefix(ignore_prefix)
+    errors.set_import_context(import_context)
+    tree = parse.parse(source_text, path, errors,
+                       pyversion=pyversion,
+                       custom_typing_module=custom_typing_module,
+                       fast_parser=fast_parser,
+                       lazy_bodies=lazy_bodies)
+    tree._fullname = id
+    return tree, errors.error_info
+
+
 def read_module_source_from_file(id: str,
                                  lib_path: Iterable[str],
                                  pyversion: Tuple[int, int],
-                                 silent: bool) -> Tuple[Optional[str], Optional[str]]:
+                                 silent: bool,
+                                 overlays: Dict[str, str] = None
+                                 ) -> Tuple[Optional[str], Optional[str]]:
     """Find and read the source file of a module.
 
     Return a pair (path, file contents). Return (None, None) if the module
@@ -1004,13 +2159,14 @@ def read_module_source_from_file(id: str,
       id:       module name, a string of form 'foo' or 'foo.bar'
       lib_path: library search path
       silent:   if set, don't import .py files (only .pyi files)
+      overlays: map from absolute path to source text used instead of the file
     """
     path = find_module(id, lib_path)
     if path is not None:
         if silent and not path.endswith('.pyi'):
             return None, None
         try:
-            text = read_with_python_encoding(path, pyversion)
+            text = read_source(path, pyversion, overlays)
         except IOError:
             return None, None
         return path, text
@@ -1027,10 +2183,16 @@ find_module_cache = {}  # type: Dict[Tuple[str, Tuple[str, ...]], str]
 # in the last component.
 find_module_dir_cache = {}  # type: Dict[Tuple[str, Tuple[str, ...]], List[str]]
 
+# Listings of the directories looked at by find_module and related functions,
+# so that each directory is scanned once instead of checking each candidate
+# file separately.
+module_index = ModuleIndex()
+
 
 def find_module_clear_caches():
     find_module_cache.clear()
     find_module_dir_cache.clear()
+    module_index.clear()
 
 
 def find_module(id: str, lib_path: Iterable[str]) -> str:
@@ -1050,7 +2212,7 @@ def find_module(id: str, lib_path: Iterable[str]) -> str:
             for pathitem in lib_path:
                 # e.g., '/usr/lib/python3.4/foo/bar'
                 dir = os.path.normpath(os.path.join(pathitem, dir_chain))
-                if os.path.isdir(dir):
+                if module_index.isdir(dir):
                     dirs.append(dir)
             find_module_dir_cache[dir_chain, lib_path] = dirs
         candidate_base_dirs = find_module_dir_cache[dir_chain, lib_path]
@@ -1065,9 +2227,9 @@ def find_module(id: str, lib_path: Iterable[str]) -> str:
             base_path = base_dir + seplast  # so e.g. '/usr/lib/python3.4/foo/bar/baz'
             for extension in PYTHON_EXTENSIONS:
                 path = base_path + extension
-                if not os.path.isfile(path):
+                if not module_index.isfile(path):
                     path = base_path + sepinit + extension
-                if os.path.isfile(path) and verify_module(id, path):
+                if module_index.isfile(path) and verify_module(id, path):
                     return path
         return None
 
@@ -1092,15 +2254,16 @@ def find_modules_recursive(module: str, lib_path: List[str]) -> List[BuildSource
         # use hits to avoid adding it a second time when we see x.pyi.
         # This also avoids both x.py and x.pyi when x/ was seen first.
         hits = set()  # type: Set[str]
-        for item in sorted(os.listdir(os.path.dirname(module_path))):
-            abs_path = os.path.join(os.path.dirname(module_path), item)
-            if os.path.isdir(abs_path) and \
-                    (os.path.isfile(os.path.join(abs_path, '__init__.py')) or
-                    os.path.isfile(os.path.join(abs_path, '__init__.pyi'))):
+        package_dir = os.path.dirname(module_path)
+        listing = module_index.listing(package_dir)
+        for item in sorted(listing.files | listing.subdirs):
+            abs_path = os.path.join(package_dir, item)
+            if item in listing.subdirs and module_index.has_init_file(abs_path,
+                                                                      PYTHON_EXTENSIONS):
                 hits.add(item)
                 result += find_modules_recursive(module + '.' + item, lib_path)
             elif item != '__init__.py' and item != '__init__.pyi' and \
-                    item.endswith(('.py', '.pyi')):
+                    item in listing.files and item.endswith(('.py', '.pyi')):
                 mod = item.split('.')[0]
                 if mod not in hits:
                     hits.add(mod)
@@ -1115,8 +2278,7 @@ def verify_module(id: str, path: str) -> bool:
         path = dirname(path)
     for i in range(id.count('.')):
         path = dirname(path)
-        if not any(os.path.isfile(os.path.join(path, '__init__{}'.format(extension)))
-                   for extension in PYTHON_EXTENSIONS):
+        if not module_index.has_init_file(path, PYTHON_EXTENSIONS):
             return False
     return True
 
@@ -1130,6 +2292,62 @@ def super_packages(id: str) -> List[str]:
     return res
 
 
+def strongly_connected_components(vertices: List[str],
+                                  edges: Dict[str, List[str]]) -> List[List[str]]:
+    """Find the strongly connected components of a directed graph.
+
+    Edges to vertices that aren't in the graph are ignored. Each component
+    comes after the components that its vertices have edges to, i.e. in an
+    import graph the imported modules come first.
+
+    This is Tarjan's algorithm, written without recursion so that long import
+    chains can't exceed the recursion limit.
+    """
+    index = {}  # type: Dict[str, int]
+    lowlink = {}  # type: Dict[str, int]
+    stack = []  # type: List[str]
+    on_stack = set()  # type: Set[str]
+    components = []  # type: List[List[str]]
+    for root in vertices:
+        if root in index:
+            continue
+        # Items are (vertex, index of the next edge of the vertex to follow).
+        work = [(root, 0)]
+        while work:
+            v, pos = work.pop()
+            if pos == 0:
+                index[v] = lowlink[v] = len(index)
+                stack.append(v)
+                on_stack.add(v)
+            targets = edges[v]
+            while pos < len(targets):
+                w = targets[pos]
+                pos += 1
+                if w not in edges:
+                    continue
+                if w not in index:
+                    # Visit w and continue with the rest of the edges of v afterwards.
+                    work.append((v, pos))
+                    work.append((w, 0))
+                    break
+                if w in on_stack:
+                    lowlink[v] = min(lowlink[v], index[w])
+            else:
+                if lowlink[v] == index[v]:
+                    component = []  # type: List[str]
+                    while True:
+                        w = stack.pop()
+                        on_stack.remove(w)
+                        component.append(w)
+                        if w == v:
+                            break
+                    components.append(component)
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[v])
+    return components
+
+
 def make_parent_dirs(path: str) -> None:
     parent = os.path.dirname(path)
     try:
@@ -1138,6 +2356,15 @@ def make_parent_dirs(path: str) -> None:
         pass
 
 
+def read_source(path: str, pyversion: Tuple[int, int], overlays: Dict[str, str] = None) -> str:
+    """Read a source file, unless overlays contains the source text for the file."""
+    if overlays:
+        text = overlays.get(os.path.abspath(path))
+        if text is not None:
+            return text
+    return read_with_python_encoding(path, pyversion)
+
+
 def read_with_python_encoding(path: str, pyversion: Tuple[int, int]) -> str:
     """Read the Python file with while obeying PEP-263 encoding detection"""
     source_bytearray = bytearray()
@@ -0,0 +1,641 @@
+"""Persistent on-disk cache of per-module analysis results.
+
+This is used by incremental builds (the INCREMENTAL build flag). After a
+module has been type checked, its externally visible interface (the module
+symbol table, the TypeInfos of classes defined in the module and the
+declared and inferred types of module and class attributes) is written to
+a cache directory together with a JSON metadata file. On a later run the
+module can be loaded from the cache instead of being parsed, semantically
+analyzed and type checked again, provided that
+
+ * the source file has the same hash as when the cache was written, and
+ * each symbol of another module that the module read during semantic
+   analysis and type checking still has the same hash as it had when the
+   cache was written (or, if the symbols weren't recorded, each dependency
+   still has the same interface hash).
+
+Symbols are tracked at the level of the top-level names of modules: the
+hash of a class covers its members. Adding a definition to a module thus
+only invalidates the modules that read that name.
+
+The interface is stored using pickle. References to symbols defined in
+other modules are not stored by value; instead they are replaced with
+fully qualified names, which are resolved against the modules of the
+current build when the cache data is loaded (see fix_cross_refs). Function
+bodies, class bodies and other statement and expression nodes are not part
+of the interface and are dropped.
+
+The interface hash of a module is calculated from the same data, but line
+numbers are ignored so that edits that only move definitions around or
+change function bodies don't invalidate dependent modules. References to
+symbols of other modules are hashed together with the hash of the referred
+symbol, so that a change propagates to the modules that use it indirectly
+(for example, through a base class of a base class). References within an
+import cycle are hashed by name only; the modules of a cycle are validated
+together.
+
+The interfaces of library stubs can also be stored in a single snapshot
+file (see mypy.snapshot), using the same format for each module.
+"""
+
+import copyreg
+import hashlib
+import io
+import json
+import os
+import pickle
+
+from typing import Any, Callable, Dict, List, Tuple, Optional, Set, Iterable
+
+from mypy.nodes import (
+    MypyFile, SymbolNode, SymbolTable, TypeInfo, FuncItem, FuncDef, FuncExpr, ClassDef,
+    Decorator, Argument, Block, MODULE_REF
+)
+from mypy.util import replace_file
+from mypy.version import __version__
+
+
+# Version of the cache format. Bump this when the structure of the cached data changes.
+CACHE_FORMAT_VERSION = 3
+
+
+class CacheError(Exception):
+    """Raised if the interface of a module cannot be stored in or loaded from the cache."""
+
+
+class CacheMeta:
+    """Metadata describing a cached module.
+
+    Attributes:
+      id:             Module id
+      path:           Path of the source file
+      source_hash:    Hash of the source file contents
+      dependencies:   Modules the module directly depends on
+      dep_lines:      Line numbers of the imports of dependencies (parallel to dependencies)
+      suppressed:     Imported modules that could not be found
+      interface_hash: Hash of the interface of the module
+      dep_interface_hashes:
+                      Interface hashes of dependencies at the time the cache was written
+      symbol_hashes:  Hashes of the top-level symbols of the module, by full name
+      dep_symbol_hashes:
+                      Hashes of the symbols of other modules read by the module at
+                      the time the cache was written, or None if not recorded (a
+                      module name stands for the interface hash of the module)
+      options:        Build options that affect the analysis of the module
+      version:        Mypy version that wrote the cache
+    """
+
+    def __init__(self, id: str, path: str, source_hash: str,
+                 dependencies: List[str], dep_lines: List[int], suppressed: List[str],
+                 interface_hash: str, dep_interface_hashes: Dict[str, str],
+                 options: Dict[str, Any], version: str = __version__,
+                 symbol_hashes: Dict[str, str] = None,
+                 dep_symbol_hashes: Dict[str, str] = None) -> None:
+        self.id = id
+        self.path = path
+        self.source_hash = source_hash
+        self.dependencies = dependencies
+        self.dep_lines = dep_lines
+        self.suppressed = suppressed
+        self.interface_hash = interface_hash
+        self.dep_interface_hashes = dep_interface_hashes
+        self.options = options
+        self.version = version
+        self.symbol_hashes = symbol_hashes or {}
+        self.dep_symbol_hashes = dep_symbol_hashes
+
+    def serialize(self) -> Dict[str, Any]:
+        return {'format': CACHE_FORMAT_VERSION,
+                'id': self.id,
+                'path': self.path,
+                'source_hash': self.source_hash,
+                'dependencies': self.dependencies,
+                'dep_lines': self.dep_lines,
+                'suppressed': self.suppressed,
+                'interface_hash': self.interface_hash,
+                'dep_interface_hashes': self.dep_interface_hashes,
+                'options': self.options,
+                'version': self.version,
+                'symbol_hashes': self.symbol_hashes,
+                'dep_symbol_hashes': self.dep_symbol_hashes}
+
+    @classmethod
+    def deserialize(cls, data: Dict[str, Any]) -> Optional['CacheMeta']:
+        if data.get('format') != CACHE_FORMAT_VERSION:
+            return None
+        try:
+            return CacheMeta(data['id'], data['path'], data['source_hash'],
+                             data['dependencies'], data['dep_lines'], data['suppressed'],
+                             data['interface_hash'], data['dep_interface_hashes'],
+                             data['options'], data['version'],
+                             data['symbol_hashes'], data['dep_symbol_hashes'])
+        except KeyError:
+            return None
+
+
+def source_hash(text: str) -> str:
+    """Return a hash of the contents of a source file."""
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def cache_file_prefix(cache_dir: str, pyversion: Tuple[int, int], id: str, path: str) -> str:
+    """Return the path prefix of the cache files of a module (without an extension)."""
+    prefix = os.path.join(cache_dir, '%d.%d' % pyversion, *id.split('.'))
+    if os.path.basename(path).startswith('__init__.'):
+        prefix = os.path.join(prefix, '__init__')
+    return prefix
+
+
+def read_meta(cache_dir: str, pyversion: Tuple[int, int], id: str,
+              path: str) -> Optional[CacheMeta]:
+    """Read the cache metadata of a module.
+
+    Return None if there is no usable metadata (for example, it was written
+    by a different version of mypy or for a different file).
+    """
+    meta_file = cache_file_prefix(cache_dir, pyversion, id, path) + '.meta.json'
+    try:
+        with open(meta_file) as f:
+            meta = CacheMeta.deserialize(json.load(f))
+    except (IOError, ValueError):
+        return None
+    if meta is None or meta.id != id or meta.path != path or meta.version != __version__:
+        return None
+    return meta
+
+
+def write_cache(cache_dir: str, pyversion: Tuple[int, int], meta: CacheMeta,
+                tree: MypyFile, modules: Dict[str, MypyFile]) -> None:
+    """Write the interface of a type checked module and its metadata to the cache.
+
+    Raise CacheError if the interface cannot be stored. The metadata is
+    written last so that a partially written cache entry is never used.
+    """
+    prefix = cache_file_prefix(cache_dir, pyversion, meta.id, meta.path)
+    data_file = prefix + '.data.pickle'
+    meta_file = prefix + '.meta.json'
+    data = dump_tree(meta, tree, modules)
+    try:
+        os.makedirs(os.path.dirname(prefix), exist_ok=True)
+        # Remove the old metadata first, in case we fail in the middle.
+        if os.path.exists(meta_file):
+            os.remove(meta_file)
+        with open(data_file, 'wb') as f:
+            f.write(data)
+        with open(meta_file + '.tmp', 'w') as f:
+            json.dump(meta.serialize(), f, sort_keys=True)
+        replace_file(meta_file + '.tmp', meta_file)
+    except OSError as err:
+        raise CacheError(str(err))
+
+
+def dump_tree(meta: CacheMeta, tree: MypyFile, modules: Dict[str, MypyFile]) -> bytes:
+    """Serialize the interface of a type checked module.
+
+    Raise CacheError if the interface cannot be stored.
+    """
+    context = InterfaceContext(meta.id, meta.dependencies, modules)
+    f = io.BytesIO()
+    try:
+        InterfacePickler(f, context).dump(tree)
+    except (pickle.PicklingError, RuntimeError) as err:
+        # RuntimeError is raised if the recursion limit is exceeded.
+        raise CacheError(str(err))
+    return f.getvalue()
+
+
+def load_trees(cache_dir: str, pyversion: Tuple[int, int], metas: List[CacheMeta],
+               modules: Dict[str, MypyFile]) -> Dict[str, MypyFile]:
+    """Load the cached interfaces of a group of modules.
+
+    The modules may refer to each other (e.g. an import cycle). The loaded
+    trees are added to modules, and references to symbols in other modules
+    are resolved. Raise CacheError (and leave modules unchanged) on failure.
+    """
+    data = {}  # type: Dict[str, bytes]
+    try:
+        for meta in metas:
+            prefix = cache_file_prefix(cache_dir, pyversion, meta.id, meta.path)
+            with open(prefix + '.data.pickle', 'rb') as f:
+                data[meta.id] = f.read()
+    except OSError as err:
+        raise CacheError(str(err))
+    return load_trees_from_data(metas, data, modules)
+
+
+def load_trees_from_data(metas: List[CacheMeta], data: Dict[str, bytes],
+                         modules: Dict[str, MypyFile]) -> Dict[str, MypyFile]:
+    """Load the interfaces of a group of modules serialized by dump_tree.
+
+    This is like load_trees, but the data of each module is given in data.
+    """
+    loaded = {}  # type: Dict[str, MypyFile]
+    unpicklers = []  # type: List[InterfaceUnpickler]
+    try:
+        for meta in metas:
+            if meta.id not in data:
+                raise CacheError('No data for {}'.format(meta.id))
+            unpickler = InterfaceUnpickler(io.BytesIO(data[meta.id]), modules)
+            tree = unpickler.load()
+            if not isinstance(tree, MypyFile):
+                raise CacheError('Invalid cache data for {}'.format(meta.id))
+            loaded[meta.id] = tree
+            unpicklers.append(unpickler)
+        modules.update(loaded)
+        for unpickler in unpicklers:
+            if unpickler.has_cross_refs:
+                fix_cross_refs(unpickler.root, modules, unpickler.external)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError,
+            RuntimeError, CacheError) as err:
+        for id in loaded:
+            modules.pop(id, None)
+        raise CacheError(str(err))
+    return loaded
+
+
+class Snapshot:
+    """The interfaces of a set of modules, stored in a single file.
+
+    Attributes:
+      metas: Map from module id to the metadata of the module
+      data:  Map from module id to the interface of the module (see dump_tree)
+    """
+
+    def __init__(self, metas: Dict[str, CacheMeta], data: Dict[str, bytes]) -> None:
+        self.metas = metas
+        self.data = data
+
+
+def read_snapshot(path: str, pyversion: Tuple[int, int]) -> Optional[Snapshot]:
+    """Read a snapshot file.
+
+    Return None if there is no usable snapshot (for example, it was written
+    by a different version of mypy or for a different Python version).
+    """
+    try:
+        with open(path, 'rb') as f:
+            content = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if (not isinstance(content, dict) or content.get('format') != CACHE_FORMAT_VERSION or
+            content.get('version') != __version__ or
+            content.get('pyversion') != list(pyversion)):
+        return None
+    metas = {}  # type: Dict[str, CacheMeta]
+    data = {}  # type: Dict[str, bytes]
+    for meta_data, module_data in content['modules']:
+        meta = CacheMeta.deserialize(meta_data)
+        if meta is not None:
+            metas[meta.id] = meta
+            data[meta.id] = module_data
+    return Snapshot(metas, data)
+
+
+def write_snapshot(path: str, pyversion: Tuple[int, int],
+                   entries: List[Tuple[CacheMeta, MypyFile]],
+                   modules: Dict[str, MypyFile]) -> List[str]:
+    """Write the interfaces of type checked modules to a snapshot file.
+
+    Modules whose interface cannot be stored are left out. Return their ids.
+    Raise CacheError if the file cannot be written.
+    """
+    stored = []  # type: List[Tuple[Dict[str, Any], bytes]]
+    omitted = []  # type: List[str]
+    for meta, tree in entries:
+        try:
+            stored.append((meta.serialize(), dump_tree(meta, tree, modules)))
+        except CacheError:
+            omitted.append(meta.id)
+    content = {'format': CACHE_FORMAT_VERSION,
+               'version': __version__,
+               'pyversion': list(pyversion),
+               'modules': stored}
+    try:
+        dir = os.path.dirname(path)
+        if dir:
+            os.makedirs(dir, exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(content, f, pickle.HIGHEST_PROTOCOL)
+        replace_file(path + '.tmp', path)
+    except OSError as err:
+        raise CacheError(str(err))
+    return omitted
+
+
+def interface_hash(tree: MypyFile, dependencies: Iterable[str],
+                   modules: Dict[str, MypyFile],
+                   ref_hash: Callable[[str, str], str] = None) -> str:
+    """Calculate a hash of the externally visible interface of a module.
+
+    This is not affected by line numbers or by definitions within function
+    bodies. See InterfaceContext for ref_hash.
+    """
+    context = InterfaceContext(tree.fullname(), dependencies, modules, ref_hash)
+    fingerprint = InterfaceFingerprint(context)
+    fingerprint.add(tree)
+    return fingerprint.hexdigest()
+
+
+def symbol_hashes(tree: MypyFile, dependencies: Iterable[str],
+                  modules: Dict[str, MypyFile],
+                  ref_hash: Callable[[str, str], str] = None) -> Dict[str, str]:
+    """Calculate a hash of the interface of each top-level symbol of a module.
+
+    Return a map from the full name of each symbol to its hash.
+    """
+    context = InterfaceContext(tree.fullname(), dependencies, modules, ref_hash)
+    hashes = {}  # type: Dict[str, str]
+    for name, symbol in context.module_names(tree.names).items():
+        fingerprint = InterfaceFingerprint(context)
+        fingerprint.add(symbol)
+        hashes[tree.fullname() + '.' + name] = fingerprint.hexdigest()
+    return hashes
+
+
+def lookup_fully_qualified(name: str, modules: Dict[str, MypyFile]) -> Optional[SymbolNode]:
+    """Find the symbol with the given fully qualified name, or None if it doesn't exist.
+
+    Names of classes nested within other classes are supported as well.
+    """
+    module, rest = split_module_prefix(name, modules)
+    if module is None:
+        return None
+    node = modules[module]  # type: SymbolNode
+    names = modules[module].names  # type: SymbolTable
+    for part in rest:
+        symbol = names.get(part) if names is not None else None
+        if symbol is None:
+            return None
+        node = symbol.node
+        if isinstance(node, (MypyFile, TypeInfo)):
+            names = node.names
+        else:
+            names = None
+    return node
+
+
+def split_module_prefix(name: str, modules: Dict[str, MypyFile]) -> Tuple[Optional[str],
+                                                                            List[str]]:
+    """Split a fully qualified name into the longest module prefix and remaining components.
+
+    Return (None, []) if no prefix of the name is a module.
+    """
+    head = name
+    rest = []  # type: List[str]
+    while head not in modules:
+        if '.' not in head:
+            return None, []
+        head, tail = head.rsplit('.', 1)
+        rest.insert(0, tail)
+    return head, rest
+
+
+class InterfaceContext:
+    """Decide which parts of a module are stored as part of its interface.
+
+    Symbols defined in other modules are referred to by name, and statements
+    and expressions are left out. If ref_hash is given, it is called with the
+    kind and the fully qualified name of a reference (see external_ref) to
+    get the hash of the referred symbol when calculating a hash.
+    """
+
+    def __init__(self, module_id: str, dependencies: Iterable[str],
+                 modules: Dict[str, MypyFile],
+                 ref_hash: Callable[[str, str], str] = None) -> None:
+        self.module_id = module_id
+        self.dependencies = set(dependencies)
+        self.modules = modules
+        self.ref_hash = ref_hash
+
+    def external_ref(self, obj: Any) -> Optional[Tuple[str, str]]:
+        """If obj is defined in another module, return a reference to it.
+
+        The reference is a tuple (kind, fully qualified name), where kind is
+        'module' or 'node'. Return None for objects that are stored by value.
+        """
+        if isinstance(obj, MypyFile):
+            if obj.fullname() != self.module_id:
+                return 'module', obj.fullname()
+        elif isinstance(obj, SymbolNode):
+            fullname = obj.fullname()
+            if fullname:
+                module, _ = split_module_prefix(fullname, self.modules)
+                if (module is not None and module != self.module_id and
+                        lookup_fully_qualified(fullname, self.modules) is obj):
+                    return 'node', fullname
+        return None
+
+    def state(self, obj: Any) -> Dict[str, Any]:
+        """Return the attributes of obj that are part of the interface."""
+        state = obj.__dict__
+        if isinstance(obj, MypyFile):
+            state = state.copy()
+            state['defs'] = []
+            state['imports'] = []
+            state['names'] = self.module_names(obj.names)
+        elif isinstance(obj, FuncItem):
+            state = state.copy()
+            state['body'] = Block([])
+            state['expanded'] = []
+            state['lazy_body'] = None
+        elif isinstance(obj, Argument):
+            state = state.copy()
+            state['initializer'] = None
+            state['initialization_statement'] = None
+        elif isinstance(obj, ClassDef):
+            state = state.copy()
+            state['defs'] = Block([])
+            state['base_type_exprs'] = []
+            state['decorators'] = []
+        elif isinstance(obj, Decorator):
+            state = state.copy()
+            state['decorators'] = []
+        elif isinstance(obj, TypeInfo):
+            state = state.copy()
+            state['subtypes'] = set()
+        return state
+
+    def module_names(self, names: SymbolTable) -> SymbolTable:
+        """Filter the symbol table of the module.
+
+        References to submodules that were added when the submodules were
+        processed are left out, since the submodules may be loaded after
+        this module. They are added back when the submodules are loaded.
+        """
+        result = SymbolTable()
+        for name, symbol in names.items():
+            if (symbol.kind == MODULE_REF and isinstance(symbol.node, MypyFile)
+                    and symbol.node.fullname().startswith(self.module_id + '.')
+                    and symbol.node.fullname() not in self.dependencies):
+                continue
+            result[name] = symbol
+        return result
+
+
+class InterfacePickler(pickle.Pickler):
+    """Pickler that stores the interface of a single module."""
+
+    def __init__(self, file: Any, context: InterfaceContext) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.context = context
+        self.dispatch_table = copyreg.dispatch_table.copy()
+        for cls in (MypyFile, FuncDef, FuncExpr, Argument, ClassDef, Decorator, TypeInfo):
+            self.dispatch_table[cls] = self.reduce_interface_node
+
+    def persistent_id(self, obj: Any) -> Optional[Tuple[str, str]]:
+        return self.context.external_ref(obj)
+
+    def reduce_interface_node(self, obj: Any) -> Tuple[Any, ...]:
+        return copyreg.__newobj__, (type(obj),), self.context.state(obj)  # type: ignore
+
+
+class CrossRef:
+    """Placeholder for a reference to a symbol that could not be resolved yet."""
+
+    def __init__(self, kind: str, fullname: str) -> None:
+        self.kind = kind
+        self.fullname = fullname
+
+
+class InterfaceUnpickler(pickle.Unpickler):
+    """Unpickler that resolves references to symbols in other modules.
+
+    References to modules that haven't been loaded yet (this happens within
+    import cycles) are represented by CrossRef placeholders and must be
+    resolved using fix_cross_refs after all the related modules have been
+    loaded.
+    """
+
+    def __init__(self, file: Any, modules: Dict[str, MypyFile]) -> None:
+        super().__init__(file)
+        self.modules = modules
+        self.has_cross_refs = False
+        # Ids of objects that belong to other modules
+        self.external = set()  # type: Set[int]
+        self.root = None  # type: MypyFile
+
+    def load(self) -> Any:
+        self.root = super().load()
+        return self.root
+
+    def persistent_load(self, pid: Tuple[str, str]) -> Any:
+        kind, fullname = pid
+        obj = resolve_ref(kind, fullname, self.modules)
+        if obj is None:
+            self.has_cross_refs = True
+            return CrossRef(kind, fullname)
+        self.external.add(id(obj))
+        return obj
+
+
+def resolve_ref(kind: str, fullname: str, modules: Dict[str, MypyFile]) -> Optional[Any]:
+    if kind == 'module':
+        return modules.get(fullname)
+    else:
+        return lookup_fully_qualified(fullname, modules)
+
+
+def fix_cross_refs(root: Any, modules: Dict[str, MypyFile], external: Set[int]) -> None:
+    """Replace CrossRef placeholders reachable from root with the referred objects.
+
+    Objects with ids in external belong to other modules and are not traversed.
+    """
+    def fix(value: Any) -> Any:
+        if isinstance(value, CrossRef):
+            target = resolve_ref(value.kind, value.fullname, modules)
+            if target is None:
+                raise CacheError('Cannot resolve reference to {}'.format(value.fullname))
+            return target
+        elif isinstance(value, tuple):
+            stack.extend(value)
+            if any(isinstance(item, CrossRef) for item in value):
+                return tuple(fix(item) for item in value)
+        elif id(value) not in external:
+            stack.append(value)
+        return value
+
+    seen = set(external)
+    stack = [root]  # type: List[Any]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, dict):
+            for key, value in obj.items():
+                obj[key] = fix(value)
+        elif isinstance(obj, list):
+            for i, value in enumerate(obj):
+                obj[i] = fix(value)
+        elif isinstance(obj, set):
+            items = [fix(value) for value in obj]
+            obj.clear()
+            obj.update(items)
+        elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+            attrs = obj.__dict__
+            for key, value in attrs.items():
+                attrs[key] = fix(value)
+
+
+class InterfaceFingerprint:
+    """Calculate a deterministic hash of the interface of a module.
+
+    The traversal mirrors InterfacePickler, but line numbers are ignored,
+    dictionary keys and sets are sorted and objects that are reached more
+    than once are only included once (referred to by their index).
+    References to other modules include the hash of the referred symbol.
+    """
+
+    # Attributes that are not significant for dependent modules
+    ignored_attributes = set(['line', 'ignored_lines', 'path'])
+
+    def __init__(self, context: InterfaceContext) -> None:
+        self.context = context
+        self.hash = hashlib.md5()
+        # Map from id to (index, object). The object is kept alive, since
+        # InterfaceContext.state() creates temporary objects whose ids
+        # would otherwise be reused.
+        self.seen = {}  # type: Dict[int, Tuple[int, Any]]
+
+    def hexdigest(self) -> str:
+        return self.hash.hexdigest()
+
+    def emit(self, s: str) -> None:
+        self.hash.update(s.encode('utf-8'))
+        self.hash.update(b'\0')
+
+    def add(self, obj: Any) -> None:
+        if obj is None or isinstance(obj, (bool, int, float, str, bytes)):
+            self.emit(repr(obj))
+            return
+        ref = self.context.external_ref(obj)
+        if ref is not None:
+            self.emit('ref:%s:%s' % ref)
+            if self.context.ref_hash is not None:
+                self.emit(self.context.ref_hash(*ref))
+            return
+        if id(obj) in self.seen:
+            self.emit('seen:%d' % self.seen[id(obj)][0])
+            return
+        self.seen[id(obj)] = len(self.seen), obj
+        if isinstance(obj, (list, tuple)):
+            self.emit('[')
+            for item in obj:
+                self.add(item)
+            self.emit(']')
+        elif isinstance(obj, dict):
+            self.emit('{')
+            for key in sorted(obj):
+                self.add(key)
+                self.add(obj[key])
+            self.emit('}')
+        elif isinstance(obj, (set, frozenset)):
+            self.emit('set:%r' % sorted(repr(item) for item in obj))
+        else:
+            state = self.context.state(obj)
+            self.emit(type(obj).__name__)
+            for key in sorted(state):
+                if key not in self.ignored_attributes:
+                    self.emit(key)
+                    self.add(state[key])
+            self.emit(')')
@@ -29,11 +29,12 @@ from mypy import nodes
 from mypy.types import (
     Type, AnyType, CallableType, Void, FunctionLike, Overloaded, TupleType,
     Instance, NoneTyp, ErrorType, strip_type,
-    UnionType, TypeVarType, PartialType, DeletedType
+    UnionType, TypeVarType, PartialType, DeletedType, TypeQuery, ALL_TYPES_STRATEGY
 )
 from mypy.sametypes import is_same_type
 from mypy.messages import MessageBuilder
 import mypy.checkexpr
+import mypy.deftiming
 from mypy import defaults
 from mypy import messages
 from mypy.subtypes import (
@@ -370,6 +371,19 @@ class TypeChecker(NodeVisitor[Type]):
     disallow_untyped_defs = False
     # Should we check untyped function defs?
     check_untyped_defs = False
+    # Number of nodes type checked (for the timing report)
+    nodes_visited = 0
+    # Fully qualified names of the symbols read from other modules (or None if
+    # they aren't recorded). This includes the classes of the types of all
+    # checked nodes and their base classes, since member access and subtype
+    # checks depend on them.
+    symbol_deps = None  # type: Set[str]
+    # Functions and methods of the current file that aren't type checked, since
+    # the results of checking them earlier are reused (see mypy.recheck) or
+    # only the interface of the file is needed
+    unchanged_defs = None  # type: Set[Node]
+    # Time spent checking each function and class (or None if not measured)
+    def_timings = None  # type: mypy.deftiming.DefTimings
 
     def __init__(self, errors: Errors, modules: Dict[str, MypyFile],
                  pyversion: Tuple[int, int] = defaults.PYTHON3_VERSION,
@@ -400,6 +414,7 @@ class TypeChecker(NodeVisitor[Type]):
         self.disallow_untyped_calls = disallow_untyped_calls
         self.disallow_untyped_defs = disallow_untyped_defs
         self.check_untyped_defs = check_untyped_defs
+        self.unchanged_defs = set()
 
     def visit_file(self, file_node: MypyFile, path: str) -> None:
         """Type check a mypy file with the given path."""
@@ -410,10 +425,13 @@ class TypeChecker(NodeVisitor[Type]):
         self.globals = file_node.names
         self.locals = None
         self.weak_opts = file_node.weak_opts
+        if self.def_timings:
+            self.def_timings.enter_module(file_node.fullname())
         self.enter_partial_types()
 
         for d in file_node.defs:
-            self.accept(d)
+            if d not in self.unchanged_defs:
+                self.accept(d)
 
         self.leave_partial_types()
 
@@ -422,6 +440,8 @@ class TypeChecker(NodeVisitor[Type]):
 
         self.errors.set_ignored_lines(set())
         self.current_node_deferred = False
+        if self.def_timings:
+            self.def_timings.leave_module()
 
     def check_second_pass(self):
         """Run second pass of type checking which goes through deferred nodes."""
@@ -452,6 +472,7 @@ class TypeChecker(NodeVisitor[Type]):
 
     def accept(self, node: Node, type_context: Type = None) -> Type:
         """Type check a node in the given type context."""
+        self.nodes_visited += 1
         self.type_context.append(type_context)
         try:
             typ = node.accept(self)
@@ -567,6 +588,8 @@ class TypeChecker(NodeVisitor[Type]):
 
     def visit_func_def(self, defn: FuncDef) -> Type:
         """Type check a function definition."""
+        if defn in self.unchanged_defs:
+            return None
         self.check_func_item(defn, name=defn.name())
         if defn.info:
             if not defn.is_dynamic():
@@ -618,6 +641,8 @@ class TypeChecker(NodeVisitor[Type]):
 
         if fdef:
             self.errors.push_function(fdef.name())
+            if self.def_timings:
+                self.def_timings.enter(fdef.name(), self.errors.type_name[-1])
 
         self.enter_partial_types()
 
@@ -632,6 +657,8 @@ class TypeChecker(NodeVisitor[Type]):
         self.leave_partial_types()
 
         if fdef:
+            if self.def_timings:
+                self.def_timings.leave()
             self.errors.pop_function()
 
         self.dynamic_funcs.pop()
@@ -1031,6 +1058,8 @@ class TypeChecker(NodeVisitor[Type]):
         """Type check a class definition."""
         typ = defn.info
         self.errors.push_type(defn.name)
+        if self.def_timings:
+            self.def_timings.enter(defn.name)
         self.enter_partial_types()
         old_binder = self.binder
         self.binder = ConditionalTypeBinder()
@@ -1039,6 +1068,8 @@ class TypeChecker(NodeVisitor[Type]):
         self.binder = old_binder
         self.check_multiple_inheritance(typ)
         self.leave_partial_types()
+        if self.def_timings:
+            self.def_timings.leave()
         self.errors.pop_type()
 
     def check_multiple_inheritance(self, typ: TypeInfo) -> None:
@@ -2198,6 +2229,8 @@ class TypeChecker(NodeVisitor[Type]):
     def store_type(self, node: Node, typ: Type) -> None:
         """Store the type of a node in the type map."""
         self.type_map[node] = typ
+        if self.symbol_deps is not None and typ is not None:
+            typ.accept(ClassRefsQuery(self.symbol_deps))
 
     def typing_mode_none(self) -> bool:
         if self.is_dynamic_function() and not self.check_untyped_defs:
@@ -2246,6 +2279,8 @@ class TypeChecker(NodeVisitor[Type]):
         if '.' not in name:
             return self.lookup(name, GDEF)  # FIX kind
         else:
+            if self.symbol_deps is not None:
+                self.symbol_deps.add(name)
             parts = name.split('.')
             n = self.modules[parts[0]]
             for i in range(1, len(parts) - 1):
@@ -2438,6 +2473,19 @@ class TypeTransformVisitor(TransformVisitor):
         return expand_type(type, self.map)
 
 
+class ClassRefsQuery(TypeQuery):
+    """Add the full names of the classes that a type refers to (and their bases) to a set."""
+
+    def __init__(self, refs: Set[str]) -> None:
+        super().__init__(True, ALL_TYPES_STRATEGY)
+        self.refs = refs
+
+    def visit_instance(self, t: Instance) -> bool:
+        for info in t.type.mro or [t.type]:
+            self.refs.add(info.fullname())
+        return super().visit_instance(t)
+
+
 def is_unsafe_overlapping_signatures(signature: Type, other: Type) -> bool:
     """Check if two signatures may be unsafely overlapping.
 
@@ -41,6 +41,9 @@ from mypy.checkstrformat import StringFormatterChecker
 ArgChecker = Callable[[Type, Type, Type, int, int, CallableType, Context, MessageBuilder],
                       None]
 
+# Number of check_call calls (for --slowest-defs)
+call_checks = 0
+
 
 class Finished(Exception):
     """Raised if we can terminate overload argument check early (no match)."""
@@ -216,6 +219,8 @@ class ExpressionChecker:
             if specified
           arg_messages: TODO
         """
+        global call_checks
+        call_checks += 1
         arg_messages = arg_messages or self.msg
         if isinstance(callee, CallableType):
             if callee.is_concrete_type_obj() and callee.type_object().is_abstract:
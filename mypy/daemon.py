@@ -0,0 +1,237 @@
+"""Resident type checking daemon.
+
+Starting mypy, parsing the library stubs and analyzing builtins and typing
+is repeated on every run of the mypy command. The daemon avoids this by
+keeping the state of the most recent build in memory. A client connects to
+the daemon over a Unix domain socket and sends the files that have changed
+since the previous check; the daemon processes the changed modules and the
+modules that depend on them again, reuses the rest of the previous build and
+replies with the error messages.
+
+Usage:
+
+  python -m mypy.daemon start [mypy options] FILES...   (start a daemon)
+  python -m mypy.daemon check [CHANGED_FILES...]        (type check)
+  python -m mypy.daemon status
+  python -m mypy.daemon stop
+
+The protocol is a single JSON object per connection in each direction. The
+client writes a request such as {"command": "check", "changed": [...]} and
+closes its side of the connection; the daemon replies with an object such
+as {"status": 1, "messages": [...]}.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+
+from typing import Any, Dict, List, Tuple
+
+from mypy import build
+from mypy import defaults
+from mypy.build import BuildSource
+from mypy.errors import CompileError
+from mypy.main import Options, process_options, per_build_options, find_bin_directory
+
+
+class DaemonError(Exception):
+    """Raised if the daemon cannot be reached or the request failed."""
+
+
+class Server:
+    """Type check a program repeatedly, reusing the results of the previous check.
+
+    Attributes:
+      sources:     Sources to type check
+      options:     Options used for each build
+      socket_path: Path of the Unix domain socket the server listens on
+      manager:     Build manager of the most recent build (None before the first one)
+    """
+
+    def __init__(self, sources: List[BuildSource], options: Options,
+                 socket_path: str = defaults.DAEMON_SOCKET, bin_dir: str = None) -> None:
+        self.sources = sources
+        self.options = options
+        self.socket_path = socket_path
+        self.bin_dir = bin_dir
+        self.manager = None  # type: build.BuildManager
+
+    def check(self, changed: List[str] = None) -> Tuple[int, List[str]]:
+        """Type check the program; return tuple (exit status, messages).
+
+        The files in changed are processed again even if they seem unchanged.
+        """
+        try:
+            result = build.build(sources=self.sources,
+                                 target=build.TYPE_CHECK,
+                                 bin_dir=self.bin_dir,
+                                 pyversion=self.options.pyversion,
+                                 custom_typing_module=self.options.custom_typing_module,
+                                 flags=self.options.build_flags + [build.RESIDENT],
+                                 python_path=self.options.python_path,
+                                 cache_dir=self.options.cache_dir,
+                                 previous=self.manager,
+                                 changed_paths=changed or [],
+                                 jobs=self.options.jobs)
+        except CompileError as e:
+            # A blocking error; the previous build can still be reused next time.
+            return 1, e.messages
+        self.manager = result.manager
+        messages = self.manager.errors.messages()
+        return (1 if messages else 0), messages
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Process a single request and return the response."""
+        command = request.get('command')
+        if command == 'check':
+            status, messages = self.check(request.get('changed', []))
+            return {'status': status, 'messages': messages}
+        elif command == 'status':
+            modules = self.manager.semantic_analyzer.modules if self.manager else {}
+            return {'status': 0, 'pid': os.getpid(), 'modules': len(modules)}
+        elif command == 'stop':
+            return {'status': 0}
+        else:
+            return {'error': 'Unknown command: {}'.format(command)}
+
+    def serve(self) -> None:
+        """Serve requests until a stop request is received."""
+        # Perform the first build right away, so that the first check is fast as well.
+        self.check()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if os.path.exists(self.socket_path):
+            # Left over from a daemon that didn't exit cleanly.
+            os.remove(self.socket_path)
+        sock.bind(self.socket_path)
+        sock.listen(5)
+        try:
+            while True:
+                conn, _ = sock.accept()
+                try:
+                    try:
+                        request = json.loads(receive(conn))
+                        response = self.handle(request)
+                    except Exception as err:
+                        request = {}
+                        response = {'error': '{}: {}'.format(type(err).__name__, err)}
+                    conn.sendall(json.dumps(response).encode('utf-8'))
+                finally:
+                    conn.close()
+                if request.get('command') == 'stop':
+                    break
+        finally:
+            sock.close()
+            os.remove(self.socket_path)
+
+
+def receive(conn: socket.socket) -> str:
+    """Read data from a socket until the other end closes it for writing."""
+    chunks = []  # type: List[bytes]
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b''.join(chunks).decode('utf-8')
+
+
+def request(socket_path: str, command: str, **kwargs: Any) -> Dict[str, Any]:
+    """Send a request to a daemon and return the response.
+
+    Raise DaemonError if the daemon is not running or the request failed.
+    """
+    data = dict(kwargs)
+    data['command'] = command
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(data).encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+        response = json.loads(receive(sock))
+    except (OSError, ValueError) as err:
+        raise DaemonError('Cannot communicate with daemon at {}: {}'.format(socket_path, err))
+    finally:
+        sock.close()
+    if 'error' in response:
+        raise DaemonError(response['error'])
+    return response
+
+
+def start(server: Server, timeout: float = 60.0) -> None:
+    """Run a server in a background process and wait until it accepts requests."""
+    pid = os.fork()
+    if pid == 0:
+        # Detach the daemon from the terminal of the client.
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in range(3):
+            os.dup2(devnull, fd)
+        try:
+            server.serve()
+        finally:
+            os._exit(0)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if os.waitpid(pid, os.WNOHANG) != (0, 0):
+            raise DaemonError('Daemon exited during startup')
+        try:
+            request(server.socket_path, 'status')
+            return
+        except DaemonError:
+            time.sleep(0.1)
+    raise DaemonError('Daemon did not start in {} seconds'.format(timeout))
+
+
+def main(script_path: str = None) -> None:
+    parser = argparse.ArgumentParser(prog='mypy.daemon',
+                                     description='Resident mypy type checking daemon.')
+    parser.add_argument('--socket', default=defaults.DAEMON_SOCKET, metavar='PATH',
+                        help='path of the daemon socket (default: {})'.format(
+                            defaults.DAEMON_SOCKET))
+    subparsers = parser.add_subparsers(dest='command')
+    for name, help in [('start', 'start a daemon in the background'),
+                       ('serve', 'run a daemon in the foreground')]:
+        p = subparsers.add_parser(name, help=help)
+        p.add_argument('flags', nargs=argparse.REMAINDER,
+                       help='mypy options and files to type check')
+    p = subparsers.add_parser('check', help='type check, reusing the previous results')
+    p.add_argument('changed', nargs='*', help='files changed since the previous check')
+    subparsers.add_parser('status', help='show whether a daemon is running')
+    subparsers.add_parser('stop', help='stop the daemon')
+    args = parser.parse_args()
+
+    try:
+        if args.command in ('start', 'serve'):
+            sources, options = process_options(args.flags)
+            for option in per_build_options(options):
+                parser.error('May not use {} with the daemon'.format(option))
+            bin_dir = find_bin_directory(script_path) if script_path else None
+            server = Server(sources, options, args.socket, bin_dir)
+            if args.command == 'start':
+                start(server)
+            else:
+                server.serve()
+        elif args.command == 'check':
+            changed = [os.path.abspath(path) for path in args.changed]
+            response = request(args.socket, 'check', changed=changed)
+            for message in response['messages']:
+                print(message)
+            sys.exit(response['status'])
+        elif args.command == 'status':
+            response = request(args.socket, 'status')
+            print('Daemon running (pid {}, {} modules)'.format(response['pid'],
+                                                               response['modules']))
+        elif args.command == 'stop':
+            request(args.socket, 'stop')
+        else:
+            parser.error('Missing command')
+    except DaemonError as err:
+        sys.stderr.write('{}\n'.format(err))
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,8 @@
 PYTHON2_VERSION = (2, 7)
 PYTHON3_VERSION = (3, 5)
+CACHE_DIR = '.mypy_cache'
+# Directory listings of the module search path, stored in the cache directory
+MODULE_INDEX_FILE = 'module_index.json'
+DAEMON_SOCKET = '.mypy-daemon.sock'
+# Output of a shard of a build (formatted with the shard number and the number of shards)
+SHARD_OUTPUT = 'mypy-shard-{}-of-{}.json'
@@ -0,0 +1,104 @@
+"""Time spent type checking each definition (--slowest-defs).
+
+The type checker records, for each function and class, the wall time spent
+type checking it and the number of check_call and is_subtype calls made.
+The measurements of a definition exclude the nested definitions, which are
+recorded separately; the checks of a function that is deferred to the second
+pass of type checking are added to those of the first pass. Definitions are
+identified by their fully qualified names. Overloaded functions and functions
+defined more than once in the same scope are recorded under a single name.
+
+The report lists the slowest definitions with their share of the total time
+spent type checking modules:
+
+  Slowest definitions (of 1.234 s of type checking):
+       time   share   check_call  is_subtype  definition
+     0.6170   50.0%          120        3400  mod.C.method
+"""
+
+from typing import Dict, List, TextIO, Tuple
+
+from mypy import checkexpr
+from mypy import subtypes
+from mypy.util import wall_clock
+
+
+# The measurements recorded for each definition
+COUNTERS = ['time', 'check_call', 'is_subtype']
+
+
+class DefTimings:
+    """Measurements of the definitions type checked in a build.
+
+    Attributes:
+      defs:   Map from the fully qualified name of a definition to its
+              measurements (see COUNTERS)
+      total:  Total time spent type checking modules
+      module: Id of the module being type checked
+      stack:  Names and start samples of the definitions being type checked,
+              innermost last
+    """
+
+    def __init__(self) -> None:
+        self.defs = {}  # type: Dict[str, List[float]]
+        self.total = 0.0
+        self.module = None  # type: str
+        self.module_start = 0.0
+        self.stack = []  # type: List[Tuple[str, List[float]]]
+
+    def sample(self) -> List[float]:
+        """Return the current values of the counters (see COUNTERS)."""
+        return [wall_clock(), checkexpr.call_checks, subtypes.subtype_checks]
+
+    def enter_module(self, id: str) -> None:
+        self.module = id
+        self.module_start = wall_clock()
+
+    def leave_module(self) -> None:
+        self.total += wall_clock() - self.module_start
+        self.module = None
+
+    def enter(self, name: str, type_name: str = None) -> None:
+        """Start measuring a definition.
+
+        If there is no enclosing definition, the definition is assumed to be
+        a member of the class type_name (if not None).
+        """
+        now = self.sample()
+        if self.stack:
+            outer, start = self.stack[-1]
+            self.add(outer, start, now)
+            fullname = outer + '.' + name
+        elif type_name:
+            fullname = '{}.{}.{}'.format(self.module, type_name, name)
+        else:
+            fullname = '{}.{}'.format(self.module, name)
+        self.stack.append((fullname, now))
+
+    def leave(self) -> None:
+        """Stop measuring the innermost definition."""
+        now = self.sample()
+        fullname, start = self.stack.pop()
+        self.add(fullname, start, now)
+        if self.stack:
+            # Continue measuring the enclosing definition.
+            self.stack[-1] = (self.stack[-1][0], now)
+
+    def add(self, fullname: str, start: List[float], end: List[float]) -> None:
+        values = self.defs.setdefault(fullname, [0] * len(COUNTERS))
+        for i in range(len(COUNTERS)):
+            values[i] += end[i] - start[i]
+
+    def slowest(self, n: int) -> List[str]:
+        """Return the names of the n slowest definitions, slowest first."""
+        return sorted(self.defs, key=lambda name: (-self.defs[name][0], name))[:n]
+
+    def write(self, n: int, stdout: TextIO) -> None:
+        """Write the report of the n slowest definitions."""
+        stdout.write('Slowest definitions (of {:.3f} s of type checking):\n'.format(self.total))
+        stdout.write('     time   share   check_call  is_subtype  definition\n')
+        for name in self.slowest(n):
+            seconds, calls, subtype_checks = self.defs[name]
+            share = 100.0 * seconds / self.total if self.total else 0.0
+            stdout.write('{:9.4f} {:6.1f}% {:12d} {:11d}  {}\n'.format(
+                seconds, share, int(calls), int(subtype_checks), name))
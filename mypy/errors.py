@@ -85,6 +85,9 @@ class Errors:
     # Collection of reported only_once messages.
     only_once_messages = None  # type: Set[str]
 
+    # Errors whose messages have already been returned by flush_file.
+    flushed = None  # type: Set[ErrorInfo]
+
     def __init__(self) -> None:
         self.error_info = []
         self.import_ctx = []
@@ -92,6 +95,7 @@ class Errors:
         self.function_or_member = [None]
         self.ignored_lines = set()
         self.only_once_messages = set()
+        self.flushed = set()
 
     def copy(self) -> 'Errors':
         new = Errors()
@@ -187,6 +191,33 @@ class Errors:
         """Are there any generated errors?"""
         return bool(self.error_info)
 
+    def is_errors_for_file(self, file: str) -> bool:
+        """Are there any errors for the given file?"""
+        return bool(self.error_infos_for_file(file))
+
+    def error_infos_for_file(self, file: str) -> List[ErrorInfo]:
+        """Return the errors reported for the given file."""
+        file = remove_path_prefix(os.path.normpath(file), self.ignore_prefix)
+        return [err for err in self.error_info if err.file == file]
+
+    def copy_error_infos(self, infos: List[ErrorInfo]) -> None:
+        """Add errors reported earlier (possibly by another Errors instance).
+
+        The errors are not filtered by the ignored lines of the current file.
+        """
+        self.insert_error_infos(len(self.error_info), infos)
+
+    def insert_error_infos(self, index: int, infos: List[ErrorInfo]) -> None:
+        """Insert errors reported elsewhere before the error at the given index."""
+        new_infos = []  # type: List[ErrorInfo]
+        for info in infos:
+            if info.only_once:
+                if info.message in self.only_once_messages:
+                    continue
+                self.only_once_messages.add(info.message)
+            new_infos.append(info)
+        self.error_info[index:index] = new_infos
+
     def is_blockers(self) -> bool:
         """Are the any errors that are blockers?"""
         return any(err for err in self.error_info if err.blocker)
@@ -194,17 +225,35 @@ class Errors:
     def raise_error(self) -> None:
         """Raise a CompileError with the generated messages.
 
-        Render the messages suitable for displaying.
+        Render the messages suitable for displaying. Messages that have
+        already been flushed are left out.
         """
-        raise CompileError(self.messages(), use_stdout=True)
+        raise CompileError(self.format_messages([err for err in self.error_info
+                                                 if err not in self.flushed]),
+                           use_stdout=True,
+                           error_infos=self.error_info[:])
 
     def messages(self) -> List[str]:
         """Return a string list that represents the error messages.
 
         Use a form suitable for displaying to the user.
         """
+        return self.format_messages(self.error_info)
+
+    def flush_file(self, file: str) -> List[str]:
+        """Return the messages for the given file that haven't been flushed yet.
+
+        The messages won't be included when raising CompileError.
+        """
+        file = remove_path_prefix(os.path.normpath(file), self.ignore_prefix)
+        infos = [err for err in self.error_info if err.file == file and err not in self.flushed]
+        self.flushed.update(infos)
+        return self.format_messages(infos)
+
+    def format_messages(self, error_info: List[ErrorInfo]) -> List[str]:
+        """Render errors as sorted messages without duplicates."""
         a = []  # type: List[str]
-        errors = self.render_messages(self.sort_messages(self.error_info))
+        errors = self.render_messages(self.sort_messages(error_info))
         errors = self.remove_duplicates(errors)
         for file, line, severity, message in errors:
             s = ''
@@ -339,11 +388,15 @@ class CompileError(Exception):
 
     messages = None  # type: List[str]
     use_stdout = False
+    # The errors the messages were rendered from (if available).
+    error_infos = None  # type: List[ErrorInfo]
 
-    def __init__(self, messages: List[str], use_stdout: bool = False) -> None:
+    def __init__(self, messages: List[str], use_stdout: bool = False,
+                 error_infos: List[ErrorInfo] = None) -> None:
         super().__init__('\n'.join(messages))
         self.messages = messages
         self.use_stdout = use_stdout
+        self.error_infos = error_infos
 
 
 def remove_path_prefix(path: str, prefix: str) -> str:
@@ -1,78 +1,147 @@
+"""Parser front end based on the typed_ast module (--fast-parser).
+
+typed_ast contains the parsers of CPython 3 (typed_ast.ast3) and CPython 2.7
+(typed_ast.ast27), extended to keep type comments. They are C extensions, so
+they parse much faster than mypy.parse. The syntax tree produced by typed_ast
+is converted into the same mypy parse tree that mypy.parse produces for the
+source, with these exceptions:
+
+* The line of an expression that spans several lines may differ, since
+  typed_ast only records where an expression starts (mypy.parse uses the line
+  of the operator or the bracket that follows the left operand).
+* String literals are decoded like Python decodes them (mypy.parse leaves
+  some escape sequences, such as \\\\, and the contents of triple-quoted
+  literals untranslated). Python 2 str literals are decoded as UTF-8 if
+  possible and as Latin-1 otherwise.
+* A syntax error is reported with Python's message, and the rest of the file
+  is not parsed.
+
+Type comments are parsed with the type parser of mypy.parse (mypy.parsetype),
+so they are parsed and reported the same by both front ends. Python 2 stubs
+are parsed with the Python 3 parser, since they use '...' outside subscripts.
+"""
+
 from functools import wraps
+import re
 import sys
 
-from typing import Tuple, Union, TypeVar, Callable, Sequence
+from typing import Tuple, Union, TypeVar, Callable, Sequence, List, Set
 from mypy.nodes import (
-    MypyFile, Import, ImportAll, ImportFrom, FuncDef, OverloadedFuncDef,
+    MypyFile, Node, Import, ImportAll, ImportFrom, FuncDef, OverloadedFuncDef,
     ClassDef, Decorator, Block, Var, OperatorAssignmentStmt,
     ExpressionStmt, AssignmentStmt, ReturnStmt, RaiseStmt, AssertStmt,
     DelStmt, BreakStmt, ContinueStmt, PassStmt, GlobalDecl,
-    WhileStmt, ForStmt, IfStmt, TryStmt, WithStmt,
+    WhileStmt, ForStmt, IfStmt, TryStmt, WithStmt, PrintStmt, ExecStmt,
     TupleExpr, GeneratorExpr, ListComprehension, ListExpr, ConditionalExpr,
-    DictExpr, SetExpr, NameExpr, IntExpr, StrExpr, BytesExpr,
+    DictExpr, SetExpr, NameExpr, IntExpr, StrExpr, BytesExpr, UnicodeExpr,
     FloatExpr, CallExpr, SuperExpr, MemberExpr, IndexExpr, SliceExpr, OpExpr,
-    UnaryExpr, FuncExpr, ComparisonExpr,
+    UnaryExpr, FuncExpr, ComparisonExpr, BackquoteExpr,
     StarExpr, YieldFromExpr, NonlocalDecl, DictionaryComprehension,
     SetComprehension, ComplexExpr, EllipsisExpr, YieldExpr, Argument,
     ARG_POS, ARG_OPT, ARG_STAR, ARG_NAMED, ARG_STAR2
 )
-from mypy.types import Type, CallableType, AnyType, UnboundType, TupleType, TypeList, EllipsisType
+from mypy.types import (
+    Type, CallableType, AnyType, UnboundType, TupleType, TypeList, EllipsisType, StarType
+)
 from mypy import defaults
+from mypy import lex
 from mypy.errors import Errors
+from mypy.parse import token_repr
+from mypy.parsetype import parse_types, parse_signature, parse_str_as_type, TypeParseError
 
 try:
-    import typed_ast  # type: ignore
+    from typed_ast import ast3, ast27  # type: ignore
 except ImportError:
     print('You must install the typed_ast module before you can run mypy with `--fast-parser`.\n'
-          'The typed_ast module can be found at https://github.com/ddfisher/typed_ast',
+          'The typed_ast module can be found at https://github.com/python/typed_ast',
           file=sys.stderr)
     sys.exit(1)
 
 T = TypeVar('T')
 
+# A '# mypy: weak' comment at the start of a file (see Parser.weak_opts)
+weak_re = re.compile(br'^[\s]*# *mypy: *weak(=?)([^\s]*)', re.M)
+
+# The start of a def statement
+def_re = re.compile(br'\s*(async\s+)?def\b')
+
 
 def parse(source: Union[str, bytes], fnam: str = None, errors: Errors = None,
           pyversion: Tuple[int, int] = defaults.PYTHON3_VERSION,
           custom_typing_module: str = None) -> MypyFile:
     """Parse a source file, without doing any semantic analysis.
 
-    Return the parse tree. If errors is not provided, raise ParseError
+    Return the parse tree. If errors is not provided, raise CompileError
     on failure. Otherwise, use the errors object to report parse errors.
 
     The pyversion (major, minor) argument determines the Python syntax variant.
     """
+    raise_on_error = errors is None
+    if errors is None:
+        errors = Errors()
+    errors.set_file('<input>' if fnam is None else fnam)
     is_stub_file = bool(fnam) and fnam.endswith('.pyi')
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    is_bom = source.startswith(b'\xef\xbb\xbf')
     try:
-        ast = typed_ast.parse(source, fnam, 'exec')
-    except SyntaxError as e:
-        if errors:
-            errors.set_file('<input>' if fnam is None else fnam)
-            errors.report(e.lineno, e.msg)  # type: ignore
+        if pyversion[0] >= 3 or is_stub_file:
+            feature_version = pyversion[1] if pyversion[0] >= 3 else defaults.PYTHON3_VERSION[1]
+            ast = ast3.parse(source, fnam or '<input>', 'exec',
+                             feature_version=min(feature_version, ast3.LATEST_MINOR_VERSION))
+            converter = ASTConverter(source, errors, pyversion, custom_typing_module)
         else:
-            raise
-    else:
-        tree = ASTConverter().visit(ast)
-        tree.path = fnam
-        tree.is_stub = is_stub_file
-        return tree
+            ast = ast27.parse(source, fnam or '<input>', 'exec')
+            converter = ASTConverter27(source, errors, pyversion, custom_typing_module)
+        tree = converter.visit(ast)
+        tree.is_bom = is_bom
+    except SyntaxError as e:
+        errors.report(e.lineno, e.msg)
+        tree = MypyFile([], [], is_bom, set(), weak_opts=set())
+    if raise_on_error and errors.is_errors():
+        errors.raise_error()
+    tree.path = fnam
+    tree.is_stub = is_stub_file
+    return tree
+
 
-    return MypyFile([],
-                    [],
-                    False,
-                    set(),
-                    weak_opts=set())
+def parse_type_comment(type_comment: str, line: int, errors: Errors,
+                       signature: bool = False) -> Type:
+    """Parse the text of a '# type:' comment like mypy.parse does.
+
+    If signature is True, expect a signature of form (...) -> t. Report an
+    error and return None if the comment can't be parsed.
+    """
+    if re.match(r'ignore\b', type_comment):
+        return None
+    tokens = lex.lex(type_comment, line)[0]
+    if len(tokens) < 2:
+        errors.report(line, 'Empty type annotation')
+        return None
+    try:
+        if signature:
+            typ, index = parse_signature(tokens)
+        else:
+            typ, index = parse_types(tokens, 0)
+    except TypeParseError as e:
+        report_parse_error(errors, e.token, e.message)
+        return None
+    if index < len(tokens) - 2:
+        report_parse_error(errors, tokens[index])
+        return None
+    return typ
 
 
-def parse_type_comment(type_comment: str, line: int) -> Type:
-    typ = typed_ast.parse(type_comment, '<type_comment>', 'eval')
-    return TypeConverter(line=line).visit(typ.body)
+def report_parse_error(errors: Errors, tok: lex.Token, reason: str = None) -> None:
+    formatted_reason = ': {}'.format(reason) if reason else ''
+    errors.report(tok.line, 'Parse error before {}{}'.format(token_repr(tok), formatted_reason))
 
 
 def with_line(f):
     @wraps(f)
     def wrapper(self, ast):
         node = f(self, ast)
-        node.set_line(ast.lineno)
+        node.set_line(self.line(ast))
         return node
     return wrapper
 
@@ -84,13 +153,35 @@ def find(f: Callable[[T], bool], seq: Sequence[T]) -> T:
     return None
 
 
-class ASTConverter(typed_ast.NodeTransformer):
-    def __init__(self):
-        self.in_class = False
-        self.imports = []
+def unsupported(n, description: str) -> SyntaxError:
+    """Return the error raised for syntax that mypy doesn't support."""
+    return SyntaxError('{} is not supported'.format(description),
+                       ('', n.lineno, n.col_offset, None))
+
+
+class ASTConverter(ast3.NodeTransformer):
+    """Convert a typed_ast.ast3 syntax tree into a mypy parse tree.
+
+    Attributes:
+      lines:         Lines of the source (bytes), used for positions that
+                     typed_ast doesn't record (see line and block_line)
+      is_class_body: Are we converting the body of a class definition?
+      imports:       All import nodes encountered so far
+      future:        Names imported from __future__
+    """
+
+    def __init__(self, source: bytes, errors: Errors, pyversion: Tuple[int, int],
+                 custom_typing_module: str = None) -> None:
+        self.lines = source.splitlines()
+        self.errors = errors
+        self.pyversion = pyversion
+        self.custom_typing_module = custom_typing_module
+        self.is_class_body = False
+        self.imports = []  # type: List[Node]
+        self.future = []  # type: List[str]
 
     def generic_visit(self, node):
-        raise RuntimeError('AST node not implemented: ' + str(type(node)))
+        raise unsupported(node, type(node).__name__)
 
     def visit_NoneType(self, n):
         return None
@@ -98,56 +189,140 @@ class ASTConverter(typed_ast.NodeTransformer):
     def visit_list(self, l):
         return [self.visit(e) for e in l]
 
+    def fail(self, msg: str, line: int) -> None:
+        self.errors.report(line, msg)
+
+    # Positions
+
+    def line(self, n) -> int:
+        """Return the line on which a node starts.
+
+        typed_ast records the last line of a string literal that spans
+        several lines (and of an expression starting with one), with the
+        column -1; find the line that has the opening quotes. The closing
+        quotes are the first triple quotes on the last line (anything after
+        them, such as a comment, may contain quotes).
+        """
+        if n.col_offset >= 0:
+            return n.lineno
+        text = self.lines[n.lineno - 1]
+        triple = [(text.find(q), q) for q in (b'"""', b"'''") if q in text]
+        if triple:
+            quotes = min(triple)[1]
+        else:
+            # A string literal continued with backslashes
+            end = max(text.rfind(b'"'), text.rfind(b"'"))
+            if end < 0:
+                return n.lineno
+            quotes = text[end:end + 1]
+        for line in range(n.lineno - 1, 0, -1):
+            if quotes in self.lines[line - 1]:
+                return line
+        return n.lineno
+
+    def block_line(self, first) -> int:
+        """Return the line of the colon that starts a block.
+
+        The argument is the first statement of the block. The colon is on
+        the same line, or on the last line before it that isn't blank or a
+        comment.
+        """
+        line = self.line(first)
+        text = self.lines[line - 1]
+        column = self.statement_column(first)
+        if column >= 0 and text[:column].strip():
+            return line
+        line -= 1
+        while line > 1 and self.lines[line - 1].strip()[:1] in (b'', b'#'):
+            line -= 1
+        return line
+
+    def statement_column(self, n) -> int:
+        """Return the column at which a statement starts (-1 if not known)."""
+        return n.col_offset
+
+    def operator_line(self, operand) -> int:
+        """Return the line of the binary operator before an operand.
+
+        mypy.parse gives a binary operation the line of its operator. The
+        operator is on the line of the operand, or on the last line before
+        it that has something else than opening parentheses and comments.
+        """
+        line = self.line(operand)
+        text = self.lines[line - 1]
+        if operand.col_offset >= 0:
+            before = text[:operand.col_offset]
+        else:
+            # A string literal that spans lines
+            before = text[:len(text) - len(text.lstrip())]
+        while line > 1:
+            code = before.strip()
+            if code and not code.startswith(b'#') and code.strip(b'(\\ \t'):
+                break
+            line -= 1
+            before = self.lines[line - 1]
+        return line
+
+    def def_line(self, n) -> int:
+        """Return the line of the 'def' of a function definition.
+
+        typed_ast records the line of the first decorator of a decorated function.
+        """
+        line = n.decorator_list[-1].lineno if n.decorator_list else n.lineno
+        while line < len(self.lines) and not def_re.match(self.lines[line - 1]):
+            line += 1
+        return line
+
+    def starts_with(self, n, text: bytes) -> bool:
+        """Does the source text at the position of a node start with text?"""
+        return self.lines[n.lineno - 1].startswith(text, n.col_offset)
+
     op_map = {
-        typed_ast.Add: '+',
-        typed_ast.Sub: '-',
-        typed_ast.Mult: '*',
-        typed_ast.MatMult: '@',
-        typed_ast.Div: '/',
-        typed_ast.Mod: '%',
-        typed_ast.Pow: '**',
-        typed_ast.LShift: '<<',
-        typed_ast.RShift: '>>',
-        typed_ast.BitOr: '|',
-        typed_ast.BitXor: '^',
-        typed_ast.BitAnd: '&',
-        typed_ast.FloorDiv: '//'
+        'Add': '+',
+        'Sub': '-',
+        'Mult': '*',
+        'Div': '/',
+        'Mod': '%',
+        'Pow': '**',
+        'LShift': '<<',
+        'RShift': '>>',
+        'BitOr': '|',
+        'BitXor': '^',
+        'BitAnd': '&',
+        'FloorDiv': '//'
     }
 
     def from_operator(self, op):
-        op_name = ASTConverter.op_map.get(type(op))
+        op_name = ASTConverter.op_map.get(type(op).__name__)
         if op_name is None:
             raise RuntimeError('Unknown operator ' + str(type(op)))
-        elif op_name == '@':
-            raise RuntimeError('mypy does not support the MatMult operator')
-        else:
-            return op_name
+        return op_name
 
     comp_op_map = {
-        typed_ast.Gt: '>',
-        typed_ast.Lt: '<',
-        typed_ast.Eq: '==',
-        typed_ast.GtE: '>=',
-        typed_ast.LtE: '<=',
-        typed_ast.NotEq: '!=',
-        typed_ast.Is: 'is',
-        typed_ast.IsNot: 'is not',
-        typed_ast.In: 'in',
-        typed_ast.NotIn: 'not in'
+        'Gt': '>',
+        'Lt': '<',
+        'Eq': '==',
+        'GtE': '>=',
+        'LtE': '<=',
+        'NotEq': '!=',
+        'Is': 'is',
+        'IsNot': 'is not',
+        'In': 'in',
+        'NotIn': 'not in'
     }
 
     def from_comp_operator(self, op):
-        op_name = ASTConverter.comp_op_map.get(type(op))
+        op_name = ASTConverter.comp_op_map.get(type(op).__name__)
         if op_name is None:
             raise RuntimeError('Unknown comparison operator ' + str(type(op)))
         else:
             return op_name
 
-    def as_block(self, stmts, lineno):
+    def as_block(self, stmts):
         b = None
         if stmts:
-            b = Block(self.visit(stmts))
-            b.set_line(lineno)
+            b = Block(self.fix_function_overloads(self.visit(stmts)))
+            b.set_line(self.block_line(stmts[0]))
         return b
 
     def fix_function_overloads(self, stmts):
@@ -178,110 +353,190 @@ class ASTConverter(typed_ast.NodeTransformer):
             ret.append(OverloadedFuncDef(current_overload))
         return ret
 
+    def translate_module_id(self, id: str) -> str:
+        """Return the actual, internal module id for a source text id (see Parser)."""
+        if id == self.custom_typing_module:
+            return 'typing'
+        elif id == '__builtin__' and self.pyversion[0] == 2:
+            return 'builtins'
+        return id
+
+    def convert_type(self, n, line: int) -> Type:
+        """Convert a type annotation into a type."""
+        if n is None:
+            return None
+        try:
+            return TypeConverter(line).visit(n)
+        except TypeParseError:
+            self.fail('Invalid type annotation', line)
+            return AnyType()
+
     def visit_Module(self, mod):
         body = self.fix_function_overloads(self.visit(mod.body))
-
+        ignored_lines = {ti.lineno for ti in mod.type_ignores}
+        # Skip imports that have been ignored, except for 'from x import *'
+        # (see Parser.parse_file).
+        imports = [node for node in self.imports
+                   if node.line not in ignored_lines or isinstance(node, ImportAll)]
         return MypyFile(body,
-                        self.imports,
+                        imports,
                         False,
-                        {ti.lineno for ti in mod.type_ignores},
-                        weak_opts=set())
+                        ignored_lines,
+                        weak_opts=self.weak_opts())
+
+    def weak_opts(self) -> Set[str]:
+        """Do weak typing if a comment at the start of the file says so (see Parser)."""
+        for text in self.lines:
+            m = weak_re.search(text)
+            if m:
+                opts = set(x for x in m.group(2).decode().split(',') if x)
+                if not opts:
+                    opts.add('local')
+                return opts
+            if text.strip()[:1] not in (b'', b'#'):
+                break
+        return set()
 
     # --- stmt ---
     # FunctionDef(identifier name, arguments args,
     #             stmt* body, expr* decorator_list, expr? returns, string? type_comment)
     # arguments = (arg* args, arg? vararg, arg* kwonlyargs, expr* kw_defaults,
     #              arg? kwarg, expr* defaults)
-    @with_line
     def visit_FunctionDef(self, n):
-        args = self.transform_args(n.args, n.lineno)
+        line = self.def_line(n)
+        no_type_checks = any(self.is_no_type_check_decorator(d) for d in n.decorator_list)
+        args, extra_stmts = self.transform_args(n.args, line, no_type_checks)
 
         arg_kinds = [arg.kind for arg in args]
         arg_names = [arg.variable.name() for arg in args]
+        return_type = None
+        if not no_type_checks:
+            return_type = self.convert_type(getattr(n, 'returns', None), line)
+        typ = None
+        if return_type is not None or any(arg.type_annotation for arg in args):
+            typ = CallableType([arg.type_annotation or AnyType(implicit=True) for arg in args],
+                               arg_kinds,
+                               arg_names,
+                               return_type or AnyType(implicit=True),
+                               None,
+                               line=line)
+        is_method = self.is_class_body
         if n.type_comment is not None:
-            func_type_ast = typed_ast.parse(n.type_comment, '<func_type>', 'func_type')
-            arg_types = [a if a is not None else AnyType() for
-                         a in TypeConverter(line=n.lineno).visit(func_type_ast.argtypes)]
-            return_type = TypeConverter(line=n.lineno).visit(func_type_ast.returns)
-
-            # add implicit self type
-            if self.in_class and len(arg_types) < len(args):
-                arg_types.insert(0, AnyType())
-        else:
-            arg_types = [a.type_annotation for a in args]
-            return_type = TypeConverter(line=n.lineno).visit(n.returns)
-
-        func_type = None
-        if any(arg_types) or return_type:
-            func_type = CallableType([a if a is not None else AnyType() for a in arg_types],
-                                     arg_kinds,
-                                     arg_names,
-                                     return_type if return_type is not None else AnyType(),
-                                     None)
-
-        func_def = FuncDef(n.name,
-                       args,
-                       self.as_block(n.body, n.lineno),
-                       func_type)
-        if func_type is not None:
-            func_type.definition = func_def
+            # The comment is on the line of the colon.
+            sig = parse_type_comment(n.type_comment, self.block_line(n.body[0]), self.errors,
+                                     signature=True)
+            if sig is not None:
+                if typ:
+                    self.fail('Function has duplicate type signatures', line)
+                typ = self.comment_signature(sig, is_method, arg_kinds, arg_names, line)
+
+        self.is_class_body = False
+        try:
+            body = self.as_block(n.body)
+        finally:
+            self.is_class_body = is_method
+        # Insert the assignments that decompose Python 2 tuple arguments.
+        body.body[:0] = extra_stmts
+
+        func_def = FuncDef(n.name, args, body, typ)
+        func_def.set_line(line)
+        if typ is not None:
+            typ.definition = func_def
 
         if n.decorator_list:
+            decorators = self.visit(n.decorator_list)
             var = Var(func_def.name())
+            # Types of decorated functions must always be inferred.
             var.is_ready = False
-            var.set_line(n.decorator_list[0].lineno)
+            var.set_line(decorators[0].line)
 
             func_def.is_decorated = True
-            func_def.set_line(n.lineno + len(n.decorator_list))
-            func_def.body.set_line(func_def.get_line())
-            return Decorator(func_def, self.visit(n.decorator_list), var)
+            decorator = Decorator(func_def, decorators, var)
+            decorator.set_line(n.lineno)
+            return decorator
         else:
             return func_def
 
-    def transform_args(self, args, line):
+    def comment_signature(self, sig: CallableType, is_method: bool, arg_kinds: List[int],
+                          arg_names: List[str], line: int) -> CallableType:
+        """Return the type of a function from a '# type:' signature (see Parser)."""
+        if sig.is_ellipsis_args:
+            # When we encounter an ellipsis, fill in the arg_types with
+            # a bunch of AnyTypes, emulating Callable[..., T]
+            arg_types = [AnyType()] * len(arg_kinds)  # type: List[Type]
+        elif is_method and len(sig.arg_kinds) < len(arg_kinds):
+            self.check_argument_kinds(arg_kinds, [ARG_POS] + sig.arg_kinds, line)
+            # Add implicit 'self' argument to signature.
+            arg_types = [AnyType()] + sig.arg_types
+        else:
+            self.check_argument_kinds(arg_kinds, sig.arg_kinds, line)
+            arg_types = sig.arg_types
+        return CallableType(arg_types, arg_kinds, arg_names, sig.ret_type, None, line=line)
+
+    def check_argument_kinds(self, funckinds: List[int], sigkinds: List[int],
+                             line: int) -> None:
+        """Check that the arguments of a function and its signature correspond."""
+        if len(funckinds) != len(sigkinds):
+            if len(funckinds) > len(sigkinds):
+                self.fail("Type signature has too few arguments", line)
+            else:
+                self.fail("Type signature has too many arguments", line)
+            return
+        for kind, token in [(ARG_STAR, '*'),
+                            (ARG_STAR2, '**')]:
+            if ((funckinds.count(kind) != sigkinds.count(kind)) or
+                    (kind in funckinds and sigkinds.index(kind) != funckinds.index(kind))):
+                self.fail(
+                    "Inconsistent use of '{}' in function "
+                    "signature".format(token), line)
+
+    def is_no_type_check_decorator(self, n) -> bool:
+        if type(n).__name__ == 'Name':
+            return n.id == 'no_type_check'
+        elif type(n).__name__ == 'Attribute' and type(n.value).__name__ == 'Name':
+            return n.value.id == 'typing' and n.attr == 'no_type_check'
+        return False
+
+    def transform_args(self, args, line, no_type_checks=False):
+        """Return the arguments and the statements that decompose tuple arguments.
+
+        Only Python 2 has tuple arguments (see ASTConverter27).
+        """
         def make_argument(arg, default, kind):
-            arg_type = TypeConverter(line=line).visit(arg.annotation)
+            arg_type = None
+            if not no_type_checks:
+                arg_type = self.convert_type(arg.annotation, line)
             return Argument(Var(arg.arg), arg_type, self.visit(default), kind)
 
         new_args = []
-        num_no_defaults = len(args.args) - len(args.defaults)
-        # positional arguments without defaults
-        for a in args.args[:num_no_defaults]:
-            new_args.append(make_argument(a, None, ARG_POS))
-
-        # positional arguments with defaults
-        for a, d in zip(args.args[num_no_defaults:], args.defaults):
-            new_args.append(make_argument(a, d, ARG_OPT))
+        defaults = [None] * (len(args.args) - len(args.defaults)) + args.defaults
+        for a, d in zip(args.args, defaults):
+            new_args.append(make_argument(a, d, ARG_POS if d is None else ARG_OPT))
 
         # *arg
         if args.vararg is not None:
             new_args.append(make_argument(args.vararg, None, ARG_STAR))
 
-        num_no_kw_defaults = len(args.kwonlyargs) - len(args.kw_defaults)
-        # keyword-only arguments without defaults
-        for a in args.kwonlyargs[:num_no_kw_defaults]:
-            new_args.append(make_argument(a, None, ARG_NAMED))
-
-        # keyword-only arguments with defaults
-        for a, d in zip(args.kwonlyargs[num_no_kw_defaults:], args.kw_defaults):
+        # keyword-only arguments (kw_defaults has None for those without a default)
+        for a, d in zip(args.kwonlyargs, args.kw_defaults):
             new_args.append(make_argument(a, d, ARG_NAMED))
 
         # **kwarg
         if args.kwarg is not None:
             new_args.append(make_argument(args.kwarg, None, ARG_STAR2))
 
-        return new_args
+        return new_args, []
 
-    # TODO: AsyncFunctionDef(identifier name, arguments args,
-    #                  stmt* body, expr* decorator_list, expr? returns, string? type_comment)
+    def visit_AsyncFunctionDef(self, n):
+        raise unsupported(n, 'async def')
 
     def stringify_name(self, n):
-        if isinstance(n, typed_ast.Name):
+        if type(n).__name__ == 'Name':
             return n.id
-        elif isinstance(n, typed_ast.Attribute):
+        elif type(n).__name__ == 'Attribute':
             return "{}.{}".format(self.stringify_name(n.value), n.attr)
         else:
-            assert False, "can't stringify " + str(type(n))
+            raise unsupported(n, 'This metaclass expression')
 
     # ClassDef(identifier name,
     #  expr* bases,
@@ -290,19 +545,23 @@ class ASTConverter(typed_ast.NodeTransformer):
     #  expr* decorator_list)
     @with_line
     def visit_ClassDef(self, n):
-        self.in_class = True
-        metaclass_arg = find(lambda x: x.arg == 'metaclass', n.keywords)
+        metaclass_arg = find(lambda x: x.arg == 'metaclass', getattr(n, 'keywords', []))
         metaclass = None
         if metaclass_arg:
             metaclass = self.stringify_name(metaclass_arg.value)
 
+        old_is_class_body = self.is_class_body
+        self.is_class_body = True
+        try:
+            body = self.as_block(n.body)
+        finally:
+            self.is_class_body = old_is_class_body
         cdef = ClassDef(n.name,
-                        Block(self.fix_function_overloads(self.visit(n.body))),
+                        body,
                         None,
                         self.visit(n.bases),
                         metaclass=metaclass)
         cdef.decorators = self.visit(n.decorator_list)
-        self.in_class = False
         return cdef
 
     # Return(expr? value)
@@ -315,7 +574,7 @@ class ASTConverter(typed_ast.NodeTransformer):
     def visit_Delete(self, n):
         if len(n.targets) > 1:
             tup = TupleExpr(self.visit(n.targets))
-            tup.set_line(n.lineno)
+            tup.set_line(self.line(n))
             return DelStmt(tup)
         else:
             return DelStmt(self.visit(n.targets[0]))
@@ -325,7 +584,7 @@ class ASTConverter(typed_ast.NodeTransformer):
     def visit_Assign(self, n):
         typ = None
         if n.type_comment:
-            typ = parse_type_comment(n.type_comment, n.lineno)
+            typ = parse_type_comment(n.type_comment, n.lineno, self.errors)
 
         return AssignmentStmt(self.visit(n.targets),
                               self.visit(n.value),
@@ -343,32 +602,42 @@ class ASTConverter(typed_ast.NodeTransformer):
     def visit_For(self, n):
         return ForStmt(self.visit(n.target),
                        self.visit(n.iter),
-                       self.as_block(n.body, n.lineno),
-                       self.as_block(n.orelse, n.lineno))
+                       self.as_block(n.body),
+                       self.as_block(n.orelse))
+
+    def visit_AsyncFor(self, n):
+        raise unsupported(n, 'async for')
 
-    # TODO: AsyncFor(expr target, expr iter, stmt* body, stmt* orelse)
     # While(expr test, stmt* body, stmt* orelse)
     @with_line
     def visit_While(self, n):
         return WhileStmt(self.visit(n.test),
-                         self.as_block(n.body, n.lineno),
-                         self.as_block(n.orelse, n.lineno))
+                         self.as_block(n.body),
+                         self.as_block(n.orelse))
 
     # If(expr test, stmt* body, stmt* orelse)
     @with_line
     def visit_If(self, n):
-        return IfStmt([self.visit(n.test)],
-                      [self.as_block(n.body, n.lineno)],
-                      self.as_block(n.orelse, n.lineno))
+        exprs = [self.visit(n.test)]
+        bodies = [self.as_block(n.body)]
+        # An elif clause is an if statement in the else clause that starts
+        # on the line of the 'elif'.
+        while (len(n.orelse) == 1 and type(n.orelse[0]).__name__ == 'If' and
+               self.lines[n.orelse[0].lineno - 1].lstrip().startswith(b'elif')):
+            n = n.orelse[0]
+            exprs.append(self.visit(n.test))
+            bodies.append(self.as_block(n.body))
+        return IfStmt(exprs, bodies, self.as_block(n.orelse))
 
     # With(withitem* items, stmt* body, string? type_comment)
     @with_line
     def visit_With(self, n):
         return WithStmt([self.visit(i.context_expr) for i in n.items],
                         [self.visit(i.optional_vars) for i in n.items],
-                        self.as_block(n.body, n.lineno))
+                        self.as_block(n.body))
 
-    # TODO: AsyncWith(withitem* items, stmt* body)
+    def visit_AsyncWith(self, n):
+        raise unsupported(n, 'async with')
 
     # Raise(expr? exc, expr? cause)
     @with_line
@@ -378,39 +647,72 @@ class ASTConverter(typed_ast.NodeTransformer):
     # Try(stmt* body, excepthandler* handlers, stmt* orelse, stmt* finalbody)
     @with_line
     def visit_Try(self, n):
-        vs = [NameExpr(h.name) if h.name is not None else None for h in n.handlers]
-        types = [self.visit(h.type) for h in n.handlers]
-        handlers = [self.as_block(h.body, h.lineno) for h in n.handlers]
+        return self.try_stmt(n.body, n.handlers, n.orelse, n.finalbody)
+
+    def try_stmt(self, body, handlers, orelse, finalbody):
+        vs = [self.handler_name(h) for h in handlers]
+        types = [self.visit(h.type) for h in handlers]
+        handler_blocks = [self.as_block(h.body) for h in handlers]
 
-        return TryStmt(self.as_block(n.body, n.lineno),
+        return TryStmt(self.as_block(body),
                        vs,
                        types,
-                       handlers,
-                       self.as_block(n.orelse, n.lineno),
-                       self.as_block(n.finalbody, n.lineno))
+                       handler_blocks,
+                       self.as_block(orelse),
+                       self.as_block(finalbody))
+
+    def handler_name(self, h):
+        if h.name is None:
+            return None
+        name = NameExpr(h.name)
+        name.set_line(h.lineno)
+        return name
 
     # Assert(expr test, expr? msg)
     @with_line
     def visit_Assert(self, n):
-        return AssertStmt(self.visit(n.test))
+        if n.msg is None:
+            return AssertStmt(self.visit(n.test))
+        # mypy.parse parses 'assert x, msg' as asserting the tuple (x, msg),
+        # so that the message is type checked as well.
+        expr = TupleExpr(self.visit([n.test, n.msg]))
+        expr.set_line(self.line(n.test))
+        return AssertStmt(expr)
 
     # Import(alias* names)
     @with_line
     def visit_Import(self, n):
-        i = Import([(a.name, a.asname) for a in n.names])
+        ids = []
+        for a in n.names:
+            translated = self.translate_module_id(a.name)
+            as_id = a.asname
+            if as_id is None and translated != a.name:
+                as_id = a.name
+            ids.append((translated, as_id))
+        i = Import(ids)
         self.imports.append(i)
         return i
 
     # ImportFrom(identifier? module, alias* names, int? level)
     @with_line
     def visit_ImportFrom(self, n):
+        name = self.translate_module_id(n.module or '')
         if len(n.names) == 1 and n.names[0].name == '*':
-            i = ImportAll(n.module, n.level)
+            i = ImportAll(name, n.level)
         else:
-            i = ImportFrom(n.module if n.module is not None else '',
-                           n.level,
-                           [(a.name, a.asname) for a in n.names])
+            i = None
+            for index, a in enumerate(n.names):
+                if '%s.%s' % (name, a.name) == self.custom_typing_module:
+                    if len(n.names) > 1:
+                        self.fail('You cannot import any other modules when you '
+                                  'import a custom typing module', n.lineno)
+                    i = Import([('typing', a.asname)])
+                    break
+            if i is None:
+                i = ImportFrom(name, n.level, [(a.name, a.asname) for a in n.names])
         self.imports.append(i)
+        if name == '__future__':
+            self.future.extend(a.name for a in n.names)
         return i
 
     # Global(identifier* names)
@@ -446,50 +748,35 @@ class ASTConverter(typed_ast.NodeTransformer):
 
     # --- expr ---
     # BoolOp(boolop op, expr* values)
-    @with_line
     def visit_BoolOp(self, n):
-        # mypy translates (1 and 2 and 3) as (1 and (2 and 3))
+        # mypy translates (1 and 2 and 3) as ((1 and 2) and 3)
         assert len(n.values) >= 2
         op = None
-        if isinstance(n.op, typed_ast.And):
+        if type(n.op).__name__ == 'And':
             op = 'and'
-        elif isinstance(n.op, typed_ast.Or):
+        elif type(n.op).__name__ == 'Or':
             op = 'or'
         else:
             raise RuntimeError('unknown BoolOp ' + str(type(n)))
 
-        # potentially inefficient!
-        def group(vals):
-            if len(vals) == 2:
-                return OpExpr(op, vals[0], vals[1])
-            else:
-                return OpExpr(op, vals[0], group(vals[1:]))
-
-        return group(self.visit(n.values))
+        expr = self.visit(n.values[0])
+        for value in n.values[1:]:
+            expr = OpExpr(op, expr, self.visit(value))
+            expr.set_line(self.operator_line(value))
+        return expr
 
     # BinOp(expr left, operator op, expr right)
-    @with_line
     def visit_BinOp(self, n):
+        if type(n.op).__name__ == 'MatMult':
+            raise unsupported(n, 'The @ operator')
         op = self.from_operator(n.op)
-
-        if op is None:
-            raise RuntimeError('cannot translate BinOp ' + str(type(n.op)))
-
-        return OpExpr(op, self.visit(n.left), self.visit(n.right))
+        expr = OpExpr(op, self.visit(n.left), self.visit(n.right))
+        return expr.set_line(self.operator_line(n.right))
 
     # UnaryOp(unaryop op, expr operand)
     @with_line
     def visit_UnaryOp(self, n):
-        op = None
-        if isinstance(n.op, typed_ast.Invert):
-            op = '~'
-        elif isinstance(n.op, typed_ast.Not):
-            op = 'not'
-        elif isinstance(n.op, typed_ast.UAdd):
-            op = '+'
-        elif isinstance(n.op, typed_ast.USub):
-            op = '-'
-
+        op = {'Invert': '~', 'Not': 'not', 'UAdd': '+', 'USub': '-'}.get(type(n.op).__name__)
         if op is None:
             raise RuntimeError('cannot translate UnaryOp ' + str(type(n.op)))
 
@@ -498,11 +785,13 @@ class ASTConverter(typed_ast.NodeTransformer):
     # Lambda(arguments args, expr body)
     @with_line
     def visit_Lambda(self, n):
-        body = typed_ast.Return(n.body)
-        body.lineno = n.lineno
-
-        return FuncExpr(self.transform_args(n.args, n.lineno),
-                        self.as_block([body], n.lineno))
+        line = self.line(n)
+        args, extra_stmts = self.transform_args(n.args, line)
+        body = ReturnStmt(self.visit(n.body))
+        body.set_line(line)
+        block = Block(extra_stmts + [body])
+        block.set_line(line)
+        return FuncExpr(args, block)
 
     # IfExp(expr test, expr body, expr orelse)
     @with_line
@@ -514,6 +803,8 @@ class ASTConverter(typed_ast.NodeTransformer):
     # Dict(expr* keys, expr* values)
     @with_line
     def visit_Dict(self, n):
+        if None in n.keys:
+            raise unsupported(n, 'Dictionary unpacking')
         return DictExpr(list(zip(self.visit(n.keys), self.visit(n.values))))
 
     # Set(expr* elts)
@@ -532,29 +823,32 @@ class ASTConverter(typed_ast.NodeTransformer):
         return SetComprehension(self.visit_GeneratorExp(n))
 
     # DictComp(expr key, expr value, comprehension* generators)
-    @with_line
     def visit_DictComp(self, n):
         targets = [self.visit(c.target) for c in n.generators]
         iters = [self.visit(c.iter) for c in n.generators]
         ifs_list = [self.visit(c.ifs) for c in n.generators]
-        return DictionaryComprehension(self.visit(n.key),
+        expr = DictionaryComprehension(self.visit(n.key),
                                        self.visit(n.value),
                                        targets,
                                        iters,
                                        ifs_list)
+        # mypy.parse uses the line of the colon.
+        return expr.set_line(self.operator_line(n.value))
 
     # GeneratorExp(expr elt, comprehension* generators)
-    @with_line
     def visit_GeneratorExp(self, n):
         targets = [self.visit(c.target) for c in n.generators]
         iters = [self.visit(c.iter) for c in n.generators]
         ifs_list = [self.visit(c.ifs) for c in n.generators]
-        return GeneratorExpr(self.visit(n.elt),
+        expr = GeneratorExpr(self.visit(n.elt),
                              targets,
                              iters,
                              ifs_list)
+        # mypy.parse uses the line of the first 'for'.
+        return expr.set_line(self.operator_line(n.generators[0].target))
 
-    # TODO: Await(expr value)
+    def visit_Await(self, n):
+        raise unsupported(n, 'await')
 
     # Yield(expr? value)
     @with_line
@@ -567,30 +861,44 @@ class ASTConverter(typed_ast.NodeTransformer):
         return YieldFromExpr(self.visit(n.value))
 
     # Compare(expr left, cmpop* ops, expr* comparators)
-    @with_line
     def visit_Compare(self, n):
         operators = [self.from_comp_operator(o) for o in n.ops]
         operands = self.visit([n.left] + n.comparators)
-        return ComparisonExpr(operators, operands)
+        expr = ComparisonExpr(operators, operands)
+        return expr.set_line(self.operator_line(n.comparators[0]))
 
     # Call(expr func, expr* args, keyword* keywords)
     # keyword = (identifier? arg, expr value)
-    @with_line
     def visit_Call(self, n):
-        def is_stararg(a):
-            return isinstance(a, typed_ast.Starred)
-
-        def is_star2arg(k):
-            return k.arg is None
-
-        arg_types = self.visit([a.value if is_stararg(a) else a for a in n.args] +
-                               [k.value for k in n.keywords])
-        arg_kinds = ([ARG_STAR if is_stararg(a) else ARG_POS for a in n.args] +
-                     [ARG_STAR2 if is_star2arg(k) else ARG_NAMED for k in n.keywords])
-        return CallExpr(self.visit(n.func),
-                        arg_types,
-                        arg_kinds,
-                        [None for _ in n.args] + [k.arg for k in n.keywords])
+        args = []
+        for a in n.args:
+            if type(a).__name__ == 'Starred':
+                args.append((a, a.value, ARG_STAR, None))
+            else:
+                args.append((a, a, ARG_POS, None))
+        for k in n.keywords:
+            args.append((k.value, k.value, ARG_STAR2 if k.arg is None else ARG_NAMED, k.arg))
+        return self.call_expr(n.func, args)
+
+    def call_expr(self, func, args):
+        """Build a call expression.
+
+        The arguments are tuples (node that starts the argument, argument,
+        kind, name). They are put in the order of the source, like
+        mypy.parse does, since typed_ast groups them by kind.
+        """
+        if all(start.col_offset >= 0 for start, _, _, _ in args):
+            args.sort(key=lambda arg: (arg[0].lineno, arg[0].col_offset))
+        expr = CallExpr(self.visit(func),
+                        [self.visit(arg) for _, arg, _, _ in args],
+                        [kind for _, _, kind, _ in args],
+                        [name for _, _, _, name in args])
+        # mypy.parse uses the line of the '(', which is before the first argument.
+        if args:
+            expr.set_line(self.operator_line(args[0][0]))
+        else:
+            expr.set_line(self.line(func))
+        return expr
 
     # Num(object n) -- a number as a PyObject.
     @with_line
@@ -604,18 +912,31 @@ class ASTConverter(typed_ast.NodeTransformer):
 
         raise RuntimeError('num not implemented for ' + str(type(num.n)))
 
-    # Str(string s) -- need to specify raw, unicode, etc?
+    # Str(string s, string kind)
     @with_line
     def visit_Str(self, n):
-        return StrExpr(n.s)
+        if self.pyversion[0] >= 3:
+            # Python 3.3 supports u'...' as an alias of '...'.
+            return StrExpr(n.s)
+        elif 'u' in n.kind or 'unicode_literals' in self.future:
+            # A Python 2 stub
+            return UnicodeExpr(n.s)
+        else:
+            return StrExpr(n.s)
 
     # Bytes(bytes s)
     @with_line
     def visit_Bytes(self, n):
-        # TODO: this is kind of hacky
-        return BytesExpr(str(n.s)[2:-1])
+        if self.pyversion[0] >= 3:
+            return BytesExpr(n.s.decode('latin1'))
+        else:
+            return StrExpr(n.s.decode('latin1'))
+
+    def visit_JoinedStr(self, n):
+        raise unsupported(n, 'Format string')
 
     # NameConstant(singleton value)
+    @with_line
     def visit_NameConstant(self, n):
         return NameExpr(str(n.value))
 
@@ -627,8 +948,8 @@ class ASTConverter(typed_ast.NodeTransformer):
     # Attribute(expr value, identifier attr, expr_context ctx)
     @with_line
     def visit_Attribute(self, n):
-        if (isinstance(n.value, typed_ast.Call) and
-                isinstance(n.value.func, typed_ast.Name) and
+        if (type(n.value).__name__ == 'Call' and
+                type(n.value.func).__name__ == 'Name' and
                 n.value.func.id == 'super'):
             return SuperExpr(n.attr)
 
@@ -637,7 +958,13 @@ class ASTConverter(typed_ast.NodeTransformer):
     # Subscript(expr value, slice slice, expr_context ctx)
     @with_line
     def visit_Subscript(self, n):
-        return IndexExpr(self.visit(n.value), self.visit(n.slice))
+        index = self.visit(n.slice)
+        # Slices don't have a position.
+        items = index.items if type(n.slice).__name__ == 'ExtSlice' else []
+        for item in items + [index]:
+            if item.line < 0:
+                item.set_line(self.line(n))
+        return IndexExpr(self.visit(n.value), index)
 
     # Starred(expr value, expr_context ctx)
     @with_line
@@ -669,19 +996,226 @@ class ASTConverter(typed_ast.NodeTransformer):
 
     # ExtSlice(slice* dims)
     def visit_ExtSlice(self, n):
-        return TupleExpr(self.visit(n.dims))
+        items = self.visit(n.dims)
+        return TupleExpr(items).set_line(items[0].line)
 
     # Index(expr value)
     def visit_Index(self, n):
         return self.visit(n.value)
 
 
-class TypeConverter(typed_ast.NodeTransformer):
+class ASTConverter27(ASTConverter):
+    """Convert a typed_ast.ast27 (Python 2.7) syntax tree into a mypy parse tree.
+
+    Attributes:
+      docstring: The string literal of the docstring of the module (if any)
+    """
+
+    def __init__(self, source: bytes, errors: Errors, pyversion: Tuple[int, int],
+                 custom_typing_module: str = None) -> None:
+        super().__init__(source, errors, pyversion, custom_typing_module)
+        self.docstring = None
+
+    def visit_Module(self, mod):
+        if (mod.body and type(mod.body[0]).__name__ == 'Expr' and
+                type(mod.body[0].value).__name__ == 'Str'):
+            self.docstring = mod.body[0].value
+        return super().visit_Module(mod)
+
+    # arguments = (expr* args, identifier? vararg, identifier? kwarg,
+    #              expr* defaults, string* type_comments)
+    def transform_args(self, args, line, no_type_checks=False):
+        new_args = []
+        extra_stmts = []
+        names = []  # type: List[str]
+        defaults = [None] * (len(args.args) - len(args.defaults)) + args.defaults
+        for index, (a, d) in enumerate(zip(args.args, defaults)):
+            if type(a).__name__ == 'Tuple':
+                # A tuple argument such as (x, y) in def f((x, y)) is
+                # replaced with an argument with a generated name, which is
+                # decomposed in the body: x, y = __tuple_arg_1
+                arg_name = '__tuple_arg_{}'.format(index + 1)
+                paren_arg = self.visit(a)
+                rvalue = NameExpr(arg_name)
+                rvalue.set_line(a.lineno)
+                decompose = AssignmentStmt([paren_arg], rvalue)
+                decompose.set_line(a.lineno)
+                extra_stmts.append(decompose)
+                names.extend(self.find_tuple_arg_argument_names(paren_arg))
+            else:
+                arg_name = a.id
+                names.append(arg_name)
+            new_args.append(Argument(Var(arg_name), None, self.visit(d),
+                                     ARG_POS if d is None else ARG_OPT))
+
+        if args.vararg is not None:
+            new_args.append(Argument(Var(args.vararg), None, None, ARG_STAR))
+        if args.kwarg is not None:
+            new_args.append(Argument(Var(args.kwarg), None, None, ARG_STAR2))
+
+        if extra_stmts:
+            # Other duplicate argument names are reported by the semantic analyzer.
+            found = set()  # type: Set[str]
+            for name in names:
+                if name in found:
+                    self.fail('Duplicate argument name "{}"'.format(name), line)
+                found.add(name)
+        return new_args, extra_stmts
+
+    def find_tuple_arg_argument_names(self, node: Node) -> List[str]:
+        result = []  # type: List[str]
+        if isinstance(node, TupleExpr):
+            for item in node.items:
+                result.extend(self.find_tuple_arg_argument_names(item))
+        elif isinstance(node, NameExpr):
+            result.append(node.name)
+        return result
+
+    def statement_column(self, n) -> int:
+        if type(n).__name__ == 'With':
+            # typed_ast records the column of the context expression of a
+            # with statement; find the 'with' before it.
+            return self.lines[n.lineno - 1].rfind(b'with', 0, n.col_offset)
+        return n.col_offset
+
+    # With(expr context_expr, expr? optional_vars, stmt* body, string? type_comment)
+    @with_line
+    def visit_With(self, n):
+        exprs = [self.visit(n.context_expr)]
+        targets = [self.visit(n.optional_vars)]
+        # 'with a, b:' is a with statement for b nested in a with statement for a.
+        while (len(n.body) == 1 and type(n.body[0]).__name__ == 'With' and
+               (n.body[0].lineno == n.context_expr.lineno or
+                not re.match(br'\s*with\b', self.lines[n.body[0].lineno - 1]))):
+            n = n.body[0]
+            exprs.append(self.visit(n.context_expr))
+            targets.append(self.visit(n.optional_vars))
+        return WithStmt(exprs, targets, self.as_block(n.body))
+
+    # Raise(expr? type, expr? inst, expr? tback)
+    @with_line
+    def visit_Raise(self, n):
+        expr = self.visit(n.type)
+        if n.inst is not None:
+            # mypy.parse parses 'raise E, V' as raising the tuple (E, V).
+            expr = TupleExpr([expr] + self.visit([n.inst, n.tback][:2 if n.tback else 1]))
+            expr.set_line(self.line(n.type))
+        return RaiseStmt(expr, None)
+
+    # TryExcept(stmt* body, excepthandler* handlers, stmt* orelse)
+    @with_line
+    def visit_TryExcept(self, n):
+        return self.try_stmt(n.body, n.handlers, n.orelse, [])
+
+    # TryFinally(stmt* body, stmt* finalbody)
+    @with_line
+    def visit_TryFinally(self, n):
+        if (len(n.body) == 1 and type(n.body[0]).__name__ == 'TryExcept' and
+                n.body[0].lineno == n.lineno and n.body[0].col_offset == n.col_offset):
+            # try ... except ... finally
+            return self.try_stmt(n.body[0].body, n.body[0].handlers, n.body[0].orelse,
+                                 n.finalbody)
+        return self.try_stmt(n.body, [], [], n.finalbody)
+
+    def handler_name(self, h):
+        # The name is an expression, as in 'except E, e'.
+        return self.visit(h.name)
+
+    # Print(expr? dest, expr* values, bool nl)
+    @with_line
+    def visit_Print(self, n):
+        return PrintStmt(self.visit(n.values), newline=n.nl, target=self.visit(n.dest))
+
+    # Exec(expr body, expr? globals, expr? locals)
+    @with_line
+    def visit_Exec(self, n):
+        body, globals, locals = self.visit([n.body, n.globals, n.locals])
+        if n.globals is not None and self.follows_comma(n.globals):
+            # typed_ast parses exec(code, globals) like 'exec code in globals';
+            # mypy.parse executes the tuple.
+            body = TupleExpr([body, globals] + ([locals] if locals else []))
+            body.set_line(self.line(n))
+            globals = locals = None
+        return ExecStmt(body, globals, locals)
+
+    def follows_comma(self, n) -> bool:
+        """Is the last character before a node (other than whitespace) a comma?"""
+        line = self.line(n)
+        text = self.lines[line - 1][:max(n.col_offset, 0)]
+        while not text.strip() and line > 1:
+            line -= 1
+            text = self.lines[line - 1].rstrip(b'\\ \t')
+        return text.rstrip().endswith(b',')
+
+    # Repr(expr value)
+    @with_line
+    def visit_Repr(self, n):
+        return BackquoteExpr(self.visit(n.value))
+
+    # Call(expr func, expr* args, keyword* keywords, expr? starargs, expr? kwargs)
+    def visit_Call(self, n):
+        args = [(a, a, ARG_POS, None) for a in n.args]
+        args.extend((k.value, k.value, ARG_NAMED, k.arg) for k in n.keywords)
+        if n.starargs is not None:
+            args.append((n.starargs, n.starargs, ARG_STAR, None))
+        if n.kwargs is not None:
+            args.append((n.kwargs, n.kwargs, ARG_STAR2, None))
+        return self.call_expr(n.func, args)
+
+    # Num(object n)
+    def visit_Num(self, n):
+        if not self.starts_with(n, b'-'):
+            return super().visit_Num(n)
+        # typed_ast folds the negation of a number literal into the number
+        # (-1 is Num(-1)); mypy.parse keeps the unary operation.
+        value = complex(0, -n.n.imag) if isinstance(n.n, complex) else -n.n
+        operand = ast27.Num(value, lineno=n.lineno, col_offset=n.col_offset)
+        return UnaryExpr('-', super().visit_Num(operand)).set_line(self.line(n))
+
+    # Str(string s, string kind)
+    @with_line
+    def visit_Str(self, n):
+        if isinstance(n.s, bytes):
+            try:
+                return StrExpr(n.s.decode('utf-8'))
+            except UnicodeDecodeError:
+                return StrExpr(n.s.decode('latin1'))
+        elif (n is self.docstring and 'u' not in n.kind and
+              'unicode_literals' not in self.future):
+            # mypy.parse only applies 'from __future__ import unicode_literals'
+            # to the literals after it.
+            return StrExpr(n.s)
+        else:
+            # A unicode literal or a str literal with unicode_literals
+            return UnicodeExpr(n.s)
+
+    # Slice(expr? lower, expr? upper, expr? step)
+    def visit_Slice(self, n):
+        step = n.step
+        if (step is not None and type(step).__name__ == 'Name' and step.id == 'None' and
+                not self.starts_with(step, b'None')):
+            # An empty step as in x[a::] (Python 2 represents it as None).
+            step = None
+        return SliceExpr(self.visit(n.lower),
+                         self.visit(n.upper),
+                         self.visit(step))
+
+    # Ellipsis in a subscript
+    def visit_Ellipsis(self, n):
+        return EllipsisExpr()
+
+
+class TypeConverter(ast3.NodeTransformer):
+    """Convert a type annotation into a type, like mypy.parsetype does.
+
+    Raise TypeParseError if the annotation is not a valid type.
+    """
+
     def __init__(self, line=-1):
         self.line = line
 
     def generic_visit(self, node):
-        raise RuntimeError('Type node not implemented: ' + str(type(node)))
+        raise TypeParseError(None, -1)
 
     def visit_NoneType(self, n):
         return None
@@ -693,22 +1227,20 @@ class TypeConverter(typed_ast.NodeTransformer):
         return UnboundType(n.id, line=self.line)
 
     def visit_NameConstant(self, n):
-        return UnboundType(str(n.value))
+        return UnboundType(str(n.value), line=self.line)
 
     # Str(string s)
     def visit_Str(self, n):
-        return parse_type_comment(n.s.strip(), line=self.line)
+        return parse_str_as_type(n.s, self.line)
 
     # Subscript(expr value, slice slice, expr_context ctx)
     def visit_Subscript(self, n):
-        assert isinstance(n.slice, typed_ast.Index)
-
         value = self.visit(n.value)
+        if (type(n.slice).__name__ != 'Index' or not isinstance(value, UnboundType) or
+                value.args):
+            raise TypeParseError(None, -1)
 
-        assert isinstance(value, UnboundType)
-        assert not value.args
-
-        if isinstance(n.slice.value, typed_ast.Tuple):
+        if type(n.slice.value).__name__ == 'Tuple':
             params = self.visit(n.slice.value.elts)
         else:
             params = [self.visit(n.slice.value)]
@@ -721,9 +1253,8 @@ class TypeConverter(typed_ast.NodeTransformer):
     # Attribute(expr value, identifier attr, expr_context ctx)
     def visit_Attribute(self, n):
         before_dot = self.visit(n.value)
-
-        assert isinstance(before_dot, UnboundType)
-        assert not before_dot.args
+        if not isinstance(before_dot, UnboundType) or before_dot.args:
+            raise TypeParseError(None, -1)
 
         return UnboundType("{}.{}".format(before_dot.name, n.attr), line=self.line)
 
@@ -734,3 +1265,7 @@ class TypeConverter(typed_ast.NodeTransformer):
     # List(expr* elts, expr_context ctx)
     def visit_List(self, n):
         return TypeList(self.visit(n.elts), line=self.line)
+
+    # Starred(expr value, expr_context ctx)
+    def visit_Starred(self, n):
+        return StarType(self.visit(n.value), line=self.line)
@@ -0,0 +1,111 @@
+"""Fast scanner for the modules imported by a source file.
+
+The scanner finds import statements with a regular expression instead of
+tokenizing and parsing the whole file, so it is much faster than the parser.
+It is used to find the modules of a program before they are parsed, so that
+they can be parsed in worker processes (--jobs) while the driver is still
+working on the modules that import them.
+
+The result is only a prediction: the scanner doesn't know which imports are
+unreachable (for example, Python 2 only imports), it misses imports that
+don't start a line (such as 'if x: import y') and it may find statements in
+unusual places (such as a line starting with 'from' in a parenthesized
+expression). The imports found by parsing the file are always used for
+building the program.
+"""
+
+import re
+
+from typing import List, Set
+
+
+# String literals and comments are skipped, since they may contain text that
+# looks like an import statement. An import statement starts a line.
+_SCAN_RE = re.compile(r'''
+      \'\'\' (?: [^\\] | \\[\s\S] )*? \'\'\'
+    | """ (?: [^\\] | \\[\s\S] )*? """
+    | ' (?: [^\\'\n] | \\[\s\S] )* '
+    | " (?: [^\\"\n] | \\[\s\S] )* "
+    | \# [^\n]*
+    | ^ [ \t]* (?P<keyword> import | from ) (?= [ \t\\(.] )
+''', re.VERBOSE | re.MULTILINE)
+
+_FROM_RE = re.compile(r'from \s* (?P<dots> \.* ) \s* (?P<module> [\w.]* ) \s+ import \b'
+                      r'(?P<names> .* )', re.VERBOSE | re.DOTALL)
+
+
+def scan_imports(text: str, id: str, is_package: bool = False) -> List[str]:
+    """Return the ids of the modules that a module seems to import.
+
+    If a name is imported from a module (from m import n), m.n is included,
+    since it may be a submodule. Relative imports are resolved against id,
+    the id of the scanned module (is_package is True if the module is the
+    __init__ file of a package).
+    """
+    result = []  # type: List[str]
+    seen = set()  # type: Set[str]
+    pos = 0
+    while True:
+        match = _SCAN_RE.search(text, pos)
+        if match is None:
+            break
+        if match.group('keyword') is None:
+            pos = match.end()
+            continue
+        start, pos = match.start('keyword'), statement_end(text, match.start('keyword'))
+        lines = [line.split('#', 1)[0] for line in text[start:pos].split('\n')]
+        for statement in ' '.join(lines).replace('\\', ' ').split(';'):
+            for imported in statement_imports(statement.strip(), id, is_package):
+                if imported and imported not in seen:
+                    seen.add(imported)
+                    result.append(imported)
+    return result
+
+
+def statement_end(text: str, start: int) -> int:
+    """Return the end of the logical line that starts at a position."""
+    pos = start
+    depth = 0
+    while True:
+        end = text.find('\n', pos)
+        if end < 0:
+            end = len(text)
+        line = text[pos:end]
+        comment = line.find('#')
+        if comment >= 0:
+            line = line[:comment]
+        depth += line.count('(') - line.count(')')
+        if end == len(text) or (depth <= 0 and not line.rstrip().endswith('\\')):
+            return end
+        pos = end + 1
+
+
+def statement_imports(statement: str, id: str, is_package: bool) -> List[str]:
+    """Return the modules imported by an import statement on a single line."""
+    if statement.startswith('import'):
+        return [name_of(item) for item in statement[len('import'):].split(',')]
+    match = _FROM_RE.match(statement)
+    if match is None:
+        return []
+    module = match.group('module')
+    relative = len(match.group('dots'))
+    if relative:
+        if is_package:
+            relative -= 1
+        parts = id.split('.')
+        if relative > len(parts):
+            return []
+        package = '.'.join(parts[:len(parts) - relative])
+        module = package + '.' + module if module else package
+    result = [module]
+    for item in match.group('names').replace('(', ' ').replace(')', ' ').split(','):
+        name = name_of(item)
+        if name and name != '*':
+            result.append(module + '.' + name)
+    return result
+
+
+def name_of(item: str) -> str:
+    """Return the imported name of an item such as 'a.b as c'."""
+    words = item.split()
+    return words[0] if words else ''
@@ -3,14 +3,27 @@
 Translate a string that represents a file or a compilation unit to a list of
 tokens.
 
+There are two lexer engines that produce the same tokens. Lexer dispatches
+on each character to a method that lexes a token. ScannerLexer (the default)
+matches the common tokens with a single precompiled pattern and only calls
+the methods of Lexer for the rest.
+
+lex_stream() stores the tokens compactly in a TokenStream instead of a list
+of token objects.
+
 This module can be run as a script (lex.py FILE).
 """
 
 import re
+from array import array
+from itertools import accumulate, chain
+from operator import add, attrgetter, sub
 
 from mypy.util import short_type, find_python_encoding
 from mypy import defaults
-from typing import List, Callable, Dict, Any, Match, Pattern, Set, Union, Tuple
+from typing import (
+    List, Callable, Dict, Any, Match, Pattern, Set, Union, Tuple, Sequence, Type
+)
 
 
 class Token:
@@ -158,19 +171,144 @@ INVALID_BACKSLASH = 4
 INVALID_DEDENT = 5
 
 
+# The token classes, indexed by the kind codes of TokenStream
+token_classes = [Break, Indent, Dedent, Eof, Keyword, Name, IntLit, StrLit, BytesLit,
+                 UnicodeLit, FloatLit, ComplexLit, Punct, Colon, EllipsisToken, Op, Bom,
+                 LexError]  # type: List[Type[Token]]
+
+# Map from token class to kind code
+token_kinds = {cls: kind for kind, cls in enumerate(token_classes)}  # type: Dict[type, int]
+
+LEX_ERROR_KIND = token_kinds[LexError]
+
+
+class TokenStream(Sequence[Token]):
+    """Compact sequence of the tokens of a program text.
+
+    Instead of a token object, each token is stored as a kind code, a line
+    number and the offsets of its string in the text; the whitespace and
+    comments before a token (pre) are the text between the previous token and
+    the token. Token objects are created only when they are indexed (the last
+    one is cached); the kind, string and line of a token can be read without
+    creating one.
+
+    The tokens that aren't slices of the text at the expected location (such
+    as lexer errors) are stored as objects.
+
+    Attributes:
+      text:      The program text
+      kinds:     Kind code of each token (see token_classes)
+      starts:    Offset of the string of each token in text
+      ends:      End offset of the string of each token in text
+      lines:     Line number of each token
+      overrides: Map from index to the tokens that are stored as objects
+    """
+
+    def __init__(self, text: str, tokens: List[Token] = None) -> None:
+        self.text = text
+        self.kinds = array('B')
+        self.starts = array('i')
+        self.ends = array('i')
+        self.lines = array('i')
+        self.overrides = {}  # type: Dict[int, Token]
+        self.cached_index = None  # type: int
+        self.cached = None  # type: Token
+        if tokens:
+            self.extend(tokens)
+
+    def extend(self, tokens: List[Token]) -> None:
+        """Append token objects that follow the current tokens in the text."""
+        # Avoid per-token Python code, since this is done for every token.
+        text = self.text
+        first = len(self.kinds)
+        pos = self.ends[-1] if first else 0
+        self.kinds.extend(map(token_kinds.__getitem__, map(type, tokens)))
+        pres = list(map(attrgetter('pre'), tokens))
+        strings = list(map(attrgetter('string'), tokens))
+        ends = accumulate(chain([pos], map(add, map(len, pres), map(len, strings))))
+        next(ends)
+        self.ends.extend(ends)
+        self.starts.extend(map(sub, self.ends[first:], map(len, strings)))
+        self.lines.extend(map(attrgetter('line'), tokens))
+        if ''.join(map(add, pres, strings)) != text[pos:self.ends[-1]]:
+            for index, tok in enumerate(tokens, first):
+                if (not text.startswith(tok.pre, pos) or
+                        not text.startswith(tok.string, self.starts[index])):
+                    self.overrides[index] = tok
+                pos = self.ends[index]
+        kinds = self.kinds[first:]
+        if LEX_ERROR_KIND in kinds:
+            for index, kind in enumerate(kinds):
+                if kind == LEX_ERROR_KIND:
+                    self.overrides[first + index] = tokens[index]
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, index: Any) -> Any:
+        if index == self.cached_index:
+            return self.cached
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self.kinds)
+            if index < 0:
+                raise IndexError('token index out of range')
+        tok = self.overrides.get(index)
+        if tok is None:
+            start = self.starts[index]
+            tok = token_classes[self.kinds[index]](
+                self.text[start:self.ends[index]],
+                self.text[self.ends[index - 1] if index else 0:start])
+            tok.line = self.lines[index]
+        self.cached_index = index
+        self.cached = tok
+        return tok
+
+    def kind(self, index: int) -> type:
+        """Return the class of a token."""
+        return token_classes[self.kinds[index]]
+
+    def string(self, index: int) -> str:
+        if index in self.overrides:
+            return self.overrides[index].string
+        return self.text[self.starts[index]:self.ends[index]]
+
+    def line(self, index: int) -> int:
+        return self.lines[index]
+
+
 def lex(string: Union[str, bytes], first_line: int = 1,
         pyversion: Tuple[int, int] = defaults.PYTHON3_VERSION,
-        is_stub_file: bool = False) -> Tuple[List[Token], Set[int]]:
+        is_stub_file: bool = False,
+        scanner: bool = True) -> Tuple[List[Token], Set[int]]:
     """Analyze string, and return an array of token objects and the lines to ignore.
 
     The last token is always Eof. The intention is to ignore any
-    semantic and type check errors on the ignored lines.
+    semantic and type check errors on the ignored lines. If scanner is
+    False, use the character dispatching engine (Lexer) instead of
+    ScannerLexer.
     """
-    l = Lexer(pyversion, is_stub_file=is_stub_file)
+    if scanner:
+        l = ScannerLexer(pyversion, is_stub_file=is_stub_file)  # type: Lexer
+    else:
+        l = Lexer(pyversion, is_stub_file=is_stub_file)
     l.lex(string, first_line)
     return l.tok, l.ignored_lines
 
 
+def lex_stream(string: Union[str, bytes], first_line: int = 1,
+               pyversion: Tuple[int, int] = defaults.PYTHON3_VERSION,
+               is_stub_file: bool = False) -> Tuple[TokenStream, Set[int]]:
+    """Like lex, but return the tokens as a TokenStream."""
+    l = ScannerLexer(pyversion, is_stub_file=is_stub_file)
+    l.stream = TokenStream('')
+    l.lex(string, first_line)
+    l.stream.text = l.s
+    l.stream.extend(l.tok)
+    return l.stream, l.ignored_lines
+
+
 # Reserved words (not including operators)
 keywords_common = set([
     'as', 'assert', 'break', 'class', 'continue', 'def', 'del', 'elif',
@@ -282,9 +420,19 @@ class Lexer:
     # Generated tokens
     tok = None  # type: List[Token]
 
-    # Table from byte character value to lexer method. E.g. entry at ord('0')
-    # contains the method lex_number().
-    map = None  # type: Dict[str, Callable[[], None]]
+    # If not None, ScannerLexer moves the tokens (other than the last one,
+    # which may still change) from tok to the stream every now and then, so
+    # that the token objects of a large file don't need to be kept in memory.
+    stream = None  # type: TokenStream
+    flush_tokens = 1024  # Number of tokens in tok that triggers the move
+
+    # Table from character to lexer method (an unbound method that takes the
+    # lexer as the argument). E.g. the entry at '0' contains lex_number().
+    map = None  # type: Dict[str, Callable[[Lexer], None]]
+
+    # The tables of each lexer class, by major Python version (the tables
+    # are the same for all the files)
+    dispatch_maps = {}  # type: Dict[Tuple[type, int], Dict[str, Callable[[Lexer], None]]]
 
     # Indent levels of currently open blocks, in spaces.
     indents = None  # type: List[int]
@@ -300,32 +448,16 @@ class Lexer:
 
     def __init__(self, pyversion: Tuple[int, int] = defaults.PYTHON3_VERSION,
                  is_stub_file: bool = False) -> None:
-        self.map = {}
         self.tok = []
         self.indents = [0]
         self.open_brackets = []
         self.pyversion = pyversion
         self.is_stub_file = is_stub_file
         self.ignored_lines = set()
-        # Fill in the map from valid character codes to relevant lexer methods.
-        extra_misc = '' if pyversion[0] >= 3 else '`'
-        for seq, method in [('ABCDEFGHIJKLMNOPQRSTUVWXYZ', self.lex_name),
-                            ('abcdefghijklmnopqrstuvwxyz_', self.lex_name),
-                            ('0123456789', self.lex_number),
-                            ('.', self.lex_number_or_dot),
-                            (' ' + '\t' + '\x0c', self.lex_space),
-                            ('"', self.lex_str_double),
-                            ("'", self.lex_str_single),
-                            ('\r' + '\n', self.lex_break),
-                            (';', self.lex_semicolon),
-                            (':', self.lex_colon),
-                            ('#', self.lex_comment),
-                            ('\\', self.lex_backslash),
-                            ('([{', self.lex_open_bracket),
-                            (')]}', self.lex_close_bracket),
-                            ('-+*/<>%&|^~=!,@' + extra_misc, self.lex_misc)]:
-            for c in seq:
-                self.map[c] = method
+        key = (type(self), pyversion[0])
+        if key not in Lexer.dispatch_maps:
+            Lexer.dispatch_maps[key] = self.dispatch_map()
+        self.map = Lexer.dispatch_maps[key]
         if pyversion[0] == 2:
             self.keywords = keywords_common | keywords2
             # Decimal/hex/octal/binary literal or integer complex literal
@@ -335,6 +467,30 @@ class Lexer:
             self.keywords = keywords_common | keywords3
             self.number_exp1 = re.compile('0[xXoObB][0-9a-fA-F]+|[0-9]+')
 
+    def dispatch_map(self) -> Dict[str, Callable[['Lexer'], None]]:
+        """Return the map from valid characters to the relevant lexer methods."""
+        cls = type(self)
+        map = {}  # type: Dict[str, Callable[[Lexer], None]]
+        extra_misc = '' if self.pyversion[0] >= 3 else '`'
+        for seq, method in [('ABCDEFGHIJKLMNOPQRSTUVWXYZ', cls.lex_name),
+                            ('abcdefghijklmnopqrstuvwxyz_', cls.lex_name),
+                            ('0123456789', cls.lex_number),
+                            ('.', cls.lex_number_or_dot),
+                            (' ' + '\t' + '\x0c', cls.lex_space),
+                            ('"', cls.lex_str_double),
+                            ("'", cls.lex_str_single),
+                            ('\r' + '\n', cls.lex_break),
+                            (';', cls.lex_semicolon),
+                            (':', cls.lex_colon),
+                            ('#', cls.lex_comment),
+                            ('\\', cls.lex_backslash),
+                            ('([{', cls.lex_open_bracket),
+                            (')]}', cls.lex_close_bracket),
+                            ('-+*/<>%&|^~=!,@' + extra_misc, cls.lex_misc)]:
+            for c in seq:
+                map[c] = method
+        return map
+
     def lex(self, text: Union[str, bytes], first_line: int) -> None:
         """Lexically analyze a string, storing the tokens at the tok list."""
         self.i = 0
@@ -364,18 +520,7 @@ class Lexer:
         # an error.
         self.lex_indent()
 
-        # Use some local variables as a simple optimization.
-        map = self.map
-        default = self.unknown_character
-
-        # Lex the file. Repeatedly call the lexer method for the current char.
-        while self.i < len(text):
-            # Get the character code of the next character to lex.
-            c = text[self.i]
-            # Dispatch to the relevant lexer method. This will consume some
-            # characters in the text, add a token to self.tok and increment
-            # self.i.
-            map.get(c, default)()
+        self.lex_tokens()
 
         # Append a break if there is no statement/block terminator at the end
         # of input.
@@ -393,6 +538,22 @@ class Lexer:
 
         self.add_token(Eof(''))
 
+    def lex_tokens(self) -> None:
+        """Lex the tokens from the current location to the end of the text."""
+        # Use some local variables as a simple optimization.
+        text = self.s
+        map = self.map
+        default = type(self).unknown_character
+
+        # Lex the file. Repeatedly call the lexer method for the current char.
+        while self.i < len(text):
+            # Get the character code of the next character to lex.
+            c = text[self.i]
+            # Dispatch to the relevant lexer method. This will consume some
+            # characters in the text, add a token to self.tok and increment
+            # self.i.
+            map.get(c, default)(self)
+
     def report_unicode_decode_error(self, exc: UnicodeDecodeError, text: bytes) -> None:
         lines = text.splitlines()
         for line in lines:
@@ -756,7 +917,7 @@ class Lexer:
     def lex_colon(self) -> None:
         self.add_token(Colon(':'))
 
-    open_bracket_exp = re.compile('[[({]')
+    open_bracket_exp = re.compile('[\\[({]')
 
     def lex_open_bracket(self) -> None:
         s = self.match(self.open_bracket_exp)
@@ -842,7 +1003,7 @@ class Lexer:
                 and not isinstance(tok, Dedent)):
             raise ValueError('Empty token')
         tok.pre = self.pre_whitespace
-        if self.type_ignore_exp.match(tok.pre):
+        if '#' in tok.pre and self.type_ignore_exp.match(tok.pre):
             delta = 0
             if '\n' in tok.pre or '\r' in tok.pre:
                 delta += 1
@@ -876,6 +1037,155 @@ class Lexer:
             return isinstance(t, Break) or isinstance(t, Dedent)
 
 
+
+# Pattern of the tokens that ScannerLexer lexes without calling the methods of
+# Lexer, together with the whitespace and comment before the token (the group
+# pre). The alternatives are tried in order, so longer operators come first.
+# Names followed by a quote may be string prefixes, and ints followed by a
+# character that could continue a number may be other numeric literals; they
+# are lexed by the methods of Lexer, like triple-quoted, multi-line and
+# unterminated string literals, backslashes, '<>', '...' and invalid
+# characters. If no token matches, the last group is pre. Only the common
+# cases of line breaks are handled by ScannerLexer.
+scanner_exp = re.compile(r"""
+    (?P<pre> [ \t\x0c]* (?: \#[^\n\r]* )? )
+    (?: (?P<name> [a-zA-Z_][a-zA-Z0-9_]* ) (?! [a-zA-Z0-9_'"] )
+      | (?P<open> [(\[{] )
+      | (?P<close> [)\]}] )
+      | (?P<punct3> \*\*= | //= | <<= | >>= )
+      | (?P<op2> == | != | <= | >= | \*\* | // | << | >> )
+      | (?P<punct2> -> | [-+*/%&|^]= )
+      | (?P<op1> [-+*/>%&|^~] | <(?!>) | \.(?![0-9.]) )
+      | (?P<punct1> [=,@] )
+      | (?P<colon> : )
+      | (?P<semicolon> ; )
+      | (?P<str> '(?!'') (?: [^'\\\r\n] | \\[^\r\n] )* '
+               | "(?!"") (?: [^"\\\r\n] | \\[^\r\n] )* " )
+      | (?P<int> (?: [1-9][0-9]* | 0 ) (?! [0-9a-zA-Z_.] ) )
+      | (?P<newline> \r\n | \r | \n )
+    )?
+""", re.VERBOSE)
+
+# Token class of each group of scanner_exp (other than pre, name, open, close
+# and newline)
+scanner_token_types = {
+    'punct1': Punct,
+    'punct2': Punct,
+    'punct3': Punct,
+    'op1': Op,
+    'op2': Op,
+    'colon': Colon,
+    'semicolon': Break,
+    'str': StrLit,
+    'int': IntLit,
+}  # type: Dict[str, Any]
+
+
+class ScannerLexer(Lexer):
+    """Lexical analyzer that matches the common tokens with a single pattern.
+
+    The tokens are the same as those of Lexer, whose methods are used for the
+    tokens that scanner_exp doesn't match.
+    """
+
+    indent_space_exp = re.compile(r'[ \t]*')
+
+    def lex_tokens(self) -> None:
+        # Use some local variables as a simple optimization. The current
+        # location, line and whitespace are stored in self only when calling
+        # a method of Lexer.
+        text = self.s
+        n = len(text)
+        match = scanner_exp.match
+        map = self.map
+        default = type(self).unknown_character
+        keywords = self.keywords
+        types = scanner_token_types
+        open_brackets = self.open_brackets
+        open_bracket = self.open_bracket
+        indents = self.indents
+        indent_match = self.indent_space_exp.match
+        type_ignore_match = self.type_ignore_exp.match
+        tokens = self.tok
+        i = self.i
+        line = self.line
+        pre = self.pre_whitespace
+
+        while i < n:
+            m = match(text, i)
+            kind = m.lastgroup
+            if kind == 'pre':
+                # No token matched; use the method of Lexer.
+                pre += m.group(kind)
+                i = m.end()
+                if i < n:
+                    self.i, self.line, self.pre_whitespace = i, line, pre
+                    map.get(text[i], default)(self)
+                    i, line, pre = self.i, self.line, self.pre_whitespace
+                continue
+            space, s = m.group('pre', kind)
+            if space:
+                pre += space
+            if kind == 'newline':
+                # Like lex_break.
+                last = tokens[-1] if tokens else None
+                if isinstance(last, Break):
+                    self.i, self.line, self.pre_whitespace = i + len(space), line, pre
+                    self.lex_break()
+                    i, line, pre = self.i, self.line, self.pre_whitespace
+                    continue
+                if open_brackets or last is None or isinstance(last, Dedent):
+                    pre += s
+                    i = m.end()
+                    line += 1
+                    continue
+                tok = Break(s)
+            elif kind == 'name':
+                if s in keywords:
+                    tok = Keyword(s)  # type: Token
+                elif s in alpha_operators:
+                    tok = Op(s)
+                else:
+                    tok = Name(s)
+            elif kind == 'open':
+                open_brackets.append(s)
+                tok = Punct(s)
+            elif kind == 'close':
+                if open_brackets and open_bracket[s] == open_brackets[-1]:
+                    open_brackets.pop()
+                tok = Punct(s)
+            else:
+                tok = types[kind](s)
+            # Like add_token.
+            tok.pre = pre
+            if '#' in pre and type_ignore_match(pre):
+                self.ignored_lines.add(line - 1 if '\n' in pre or '\r' in pre else line)
+            tok.line = line
+            tokens.append(tok)
+            i = m.end()
+            pre = ''
+            if kind == 'newline':
+                if self.stream is not None and len(tokens) > self.flush_tokens:
+                    self.stream.text = text
+                    self.stream.extend(tokens[:-1])
+                    del tokens[:-1]
+                # Like lex_indent, if the next line isn't blank and has the
+                # same indent.
+                line += 1
+                indent = indent_match(text, i).group()
+                j = i + len(indent)
+                if (j < n and text[j] not in self.comment_or_newline and
+                        self.calc_indent(indent) == indents[-1]):
+                    pre = indent
+                    i = j
+                else:
+                    self.i, self.line, self.pre_whitespace = i, line, pre
+                    self.lex_indent()
+                    i, line, pre = self.i, self.line, self.pre_whitespace
+
+        self.i, self.line, self.pre_whitespace = i, line, pre
+
+
 if __name__ == '__main__':
     # Lexically analyze a file and dump the tokens to stdout.
     import sys
@@ -10,6 +10,7 @@ from typing import Optional, Dict, List, Tuple
 from mypy import build
 from mypy import defaults
 from mypy import git
+from mypy import shard
 from mypy.build import BuildSource, PYTHON_EXTENSIONS
 from mypy.errors import CompileError, set_drop_into_pdb
 
@@ -29,6 +30,15 @@ class Options:
         self.python_path = False
         self.dirty_stubs = False
         self.pdb = False
+        self.cache_dir = defaults.CACHE_DIR
+        self.jobs = 1
+        self.timing_report = None  # type: str
+        self.profile_dir = None  # type: str
+        self.profile_slowest = None  # type: int
+        self.slowest_defs = None  # type: int
+        self.watch = False
+        self.shard = None  # type: Tuple[int, int]
+        self.shard_output = None  # type: str
 
 
 def main(script_path: str) -> None:
@@ -47,7 +57,9 @@ def main(script_path: str) -> None:
     if not options.dirty_stubs:
         git.verify_git_integrity_or_abort(build.default_data_dir(bin_dir))
     try:
-        if options.target == build.TYPE_CHECK:
+        if options.watch:
+            watch_only(sources, bin_dir, options)
+        elif options.target == build.TYPE_CHECK:
             type_check_only(sources, bin_dir, options)
         else:
             raise RuntimeError('unsupported target %d' % options.target)
@@ -92,15 +104,49 @@ def type_check_only(sources: List[BuildSource],
                 custom_typing_module=options.custom_typing_module,
                 report_dirs=options.report_dirs,
                 flags=options.build_flags,
-                python_path=options.python_path)
+                python_path=options.python_path,
+                cache_dir=options.cache_dir,
+                jobs=options.jobs,
+                timing_report=options.timing_report,
+                profile_dir=options.profile_dir,
+                profile_slowest=options.profile_slowest,
+                slowest_defs=options.slowest_defs,
+                shard_spec=options.shard,
+                shard_output=options.shard_output)
+
+
+def watch_only(sources: List[BuildSource],
+        bin_dir: str, options: Options) -> None:
+    # Type-check the program again after each change until interrupted.
+    from mypy.watch import watch  # mypy.watch imports this module
+    try:
+        watch(sources, options, bin_dir)
+    except KeyboardInterrupt:
+        pass
 
 
 FOOTER = """environment variables:
 MYPYPATH     additional module search path"""
 
 
-def process_options() -> Tuple[List[BuildSource], Options]:
-    """Process command line arguments.
+def per_build_options(options: Options) -> List[str]:
+    """Return the given options that only apply to single (non-resident) builds.
+
+    Resident builds (--watch and the daemon) reuse the modules of the previous
+    build, so reports, timings and profiles would only cover part of the program.
+    """
+    result = ['--{}-report'.format(report_type) for report_type in sorted(options.report_dirs)]
+    if options.timing_report is not None:
+        result.append('--timing-report')
+    if options.profile_dir is not None:
+        result.append('--profile')
+    if options.slowest_defs is not None:
+        result.append('--slowest-defs')
+    return result
+
+
+def process_options(args: List[str] = None) -> Tuple[List[BuildSource], Options]:
+    """Process command line arguments (by default, sys.argv[1:]).
 
     Return (mypy program path (or None),
             module to run as script (or None),
@@ -110,6 +156,13 @@ def process_options() -> Tuple[List[BuildSource], Options]:
     parser = argparse.ArgumentParser(prog='mypy', epilog=FOOTER,
                                      formatter_class=argparse.RawDescriptionHelpFormatter)
 
+    def parse_shard(v):
+        try:
+            return shard.parse_shard(v)
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                "Invalid shard '{}' (expected format: 'K/N' with 1 <= K <= N)".format(v))
+
     def parse_version(v):
         m = re.match(r'\A(\d)\.(\d+)\Z', v)
         if m:
@@ -136,7 +189,25 @@ def process_options() -> Tuple[List[BuildSource], Options]:
     parser.add_argument('--check-untyped-defs', action='store_true',
                         help="type check the interior of functions without type annotations")
     parser.add_argument('--fast-parser', action='store_true',
-                        help="enable experimental fast parser")
+                        help="parse with the typed_ast based parser")
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help="cache module interfaces and reuse them in later runs")
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help="store the incremental cache in DIR (default: {})".format(
+                            defaults.CACHE_DIR))
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help="parse files in N processes (default: 1)")
+    parser.add_argument('--parallel-check', action='store_true',
+                        help="type check independent groups of modules in the --jobs processes")
+    parser.add_argument('--stream-errors', action='store_true',
+                        help="write the errors of each module as soon as it has been checked")
+    parser.add_argument('--low-memory', action='store_true',
+                        help="release function bodies and inferred types of checked modules")
+    parser.add_argument('--lazy-bodies', action='store_true',
+                        help="don't parse or check function bodies of modules that aren't "
+                        "build sources")
+    parser.add_argument('--watch', action='store_true',
+                        help="type check again whenever a file of the program changes")
     parser.add_argument('-f', '--dirty-stubs', action='store_true',
                         help="don't warn if typeshed is out of sync")
     parser.add_argument('--pdb', action='store_true', help="invoke pdb on fatal error")
@@ -145,6 +216,23 @@ def process_options() -> Tuple[List[BuildSource], Options]:
     parser.add_argument('--stats', action='store_true', help="dump stats")
     parser.add_argument('--inferstats', action='store_true', help="dump type inference stats")
     parser.add_argument('--custom-typing', metavar='MODULE', help="use a custom typing module")
+    parser.add_argument('--timing-report', metavar='FILE', dest='timing_report_file',
+                        help="write the time spent in each phase of each module to FILE "
+                             "(as JSON)")
+    parser.add_argument('--profile', metavar='DIR',
+                        help="profile each phase of the build and write the profiles "
+                             "to DIR/<phase>.pstats")
+    parser.add_argument('--profile-slowest', type=int, metavar='N',
+                        help="only write the profiles of the N modules that take the longest")
+    parser.add_argument('--slowest-defs', type=int, metavar='N',
+                        help="list the N functions and classes that take the longest "
+                             "to type check")
+    parser.add_argument('--shard', type=parse_shard, metavar='K/N',
+                        help="only type check shard K of N shards of the modules "
+                             "(merge the outputs with python -m mypy.shard)")
+    parser.add_argument('--shard-output', metavar='FILE',
+                        help="write the errors and report data of the shard to FILE "
+                             "(default: {})".format(defaults.SHARD_OUTPUT.format('K', 'N')))
 
     report_group = parser.add_argument_group(
         title='report generation',
@@ -164,7 +252,7 @@ def process_options() -> Tuple[List[BuildSource], Options]:
     code_group.add_argument('-p', '--package', help="type-check all files in a directory")
     code_group.add_argument('files', nargs='*', help="type-check given files or directories")
 
-    args = parser.parse_args()
+    args = parser.parse_args(args)
 
     # Check for invalid argument combinations.
     code_methods = sum(bool(c) for c in [args.modules, args.command, args.package, args.files])
@@ -177,17 +265,36 @@ def process_options() -> Tuple[List[BuildSource], Options]:
         parser.error('Python version 2 (or --py2) specified, '
                      'but --use-python-path will search in sys.path of Python 3')
 
-    if args.fast_parser and (args.py2 or
-                             args.python_version and args.python_version[0] == 2):
-        parser.error('The experimental fast parser is only compatible with Python 3, '
-                     'but Python 2 specified.')
-
     # Set options.
     options = Options()
     options.dirty_stubs = args.dirty_stubs
     options.python_path = args.use_python_path
     options.pdb = args.pdb
     options.custom_typing_module = args.custom_typing
+    if args.cache_dir is not None:
+        options.cache_dir = args.cache_dir
+    if args.jobs < 1:
+        parser.error('The number of jobs must be at least 1')
+    options.jobs = args.jobs
+    options.timing_report = args.timing_report_file
+    if args.profile_slowest is not None:
+        if not args.profile:
+            parser.error('--profile-slowest requires --profile')
+        if args.profile_slowest < 1:
+            parser.error('The number of profiled modules must be at least 1')
+    options.profile_dir = args.profile
+    options.profile_slowest = args.profile_slowest
+    if args.slowest_defs is not None and args.slowest_defs < 1:
+        parser.error('The number of listed definitions must be at least 1')
+    options.slowest_defs = args.slowest_defs
+    options.watch = args.watch
+    if args.shard_output and not args.shard:
+        parser.error('--shard-output requires --shard')
+    if args.shard:
+        if args.watch:
+            parser.error('May not use --shard with --watch')
+        options.shard = args.shard
+        options.shard_output = args.shard_output or defaults.SHARD_OUTPUT.format(*args.shard)
 
     # Set build flags.
     if args.python_version is not None:
@@ -214,6 +321,21 @@ def process_options() -> Tuple[List[BuildSource], Options]:
     if args.check_untyped_defs:
         options.build_flags.append(build.CHECK_UNTYPED_DEFS)
 
+    if args.incremental:
+        options.build_flags.append(build.INCREMENTAL)
+
+    if args.parallel_check:
+        options.build_flags.append(build.PARALLEL_CHECK)
+
+    if args.stream_errors:
+        options.build_flags.append(build.STREAM_ERRORS)
+
+    if args.low_memory:
+        options.build_flags.append(build.LOW_MEMORY)
+
+    if args.lazy_bodies:
+        options.build_flags.append(build.LAZY_BODIES)
+
     # experimental
     if args.fast_parser:
         options.build_flags.append(build.FAST_PARSER)
@@ -225,6 +347,10 @@ def process_options() -> Tuple[List[BuildSource], Options]:
             report_dir = val
             options.report_dirs[report_type] = report_dir
 
+    if args.watch:
+        for option in per_build_options(options):
+            parser.error('May not use {} with --watch'.format(option))
+
     # Set target.
     if args.modules:
         options.build_flags.append(build.MODULE)
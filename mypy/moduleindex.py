@@ -0,0 +1,174 @@
+"""Index of the directories in the module search path.
+
+Looking up a module checks for a number of candidate files (x.pyi, x.py,
+x/__init__.pyi, ...) in each directory of the search path, and every package
+containing the module must have an __init__ file. Instead of a stat call
+for each candidate, the directories are listed (once each) with os.scandir
+(or os.listdir and os.stat before Python 3.5) and the candidates are looked
+up in the listings.
+
+The index can be saved to a file together with the modification times of
+the directories. When the index is loaded, a listing is only used if the
+modification time of the directory is unchanged (adding, removing or
+renaming an entry changes the modification time of a directory). A
+directory may change again within the resolution of its modification time
+(or of the clock of a network file system), so listings of directories
+modified shortly before they were scanned are not saved.
+"""
+
+import json
+import os
+import stat
+import time
+
+from typing import Dict, List, Optional, Set, Tuple
+
+from mypy.util import replace_file
+
+
+# Version of the format of saved indexes.
+INDEX_FORMAT_VERSION = 1
+
+# Listings of directories modified less than this many seconds before they
+# were scanned are not saved. This covers the resolution of modification
+# times of common file systems (2 seconds on FAT) and small clock
+# differences between NFS clients and servers.
+MTIME_GRANULARITY = 2.0
+
+
+class DirListing:
+    """The entries of a directory.
+
+    Attributes:
+      mtime:   Modification time of the directory (see dir_mtime)
+      files:   Names of files in the directory
+      subdirs: Names of subdirectories of the directory
+      recent:  Was the directory modified shortly before it was scanned (the
+               listing is then not saved)?
+    """
+
+    def __init__(self, mtime: float, files: Set[str], subdirs: Set[str],
+                 recent: bool = False) -> None:
+        self.mtime = mtime
+        self.files = files
+        self.subdirs = subdirs
+        self.recent = recent
+
+
+def dir_mtime(st: os.stat_result) -> float:
+    """Return the modification time in a stat result.
+
+    This is in nanoseconds (an int) if available (Python 3.3 and later), and
+    in seconds (a float) otherwise.
+    """
+    return getattr(st, 'st_mtime_ns', st.st_mtime)
+
+
+class ModuleIndex:
+    """Index of directory listings, keyed by normalized directory path.
+
+    A directory that can't be listed (for example, because it doesn't exist)
+    has the listing None.
+    """
+
+    def __init__(self) -> None:
+        self.listings = {}  # type: Dict[str, Optional[DirListing]]
+        self.scans = 0
+
+    def clear(self) -> None:
+        self.listings.clear()
+
+    def listing(self, dir: str) -> Optional[DirListing]:
+        """Return the listing of a directory, or None if it can't be listed."""
+        dir = os.path.normpath(dir)
+        if dir not in self.listings:
+            self.listings[dir] = self.scan(dir)
+        return self.listings[dir]
+
+    def scan(self, dir: str) -> Optional[DirListing]:
+        self.scans += 1
+        files = set()  # type: Set[str]
+        subdirs = set()  # type: Set[str]
+        try:
+            scan_time = time.time()
+            st = os.stat(dir)
+            if hasattr(os, 'scandir'):
+                for entry in os.scandir(dir):
+                    try:
+                        if entry.is_file():
+                            files.add(entry.name)
+                        elif entry.is_dir():
+                            subdirs.add(entry.name)
+                    except OSError:
+                        # For example, a broken symbolic link.
+                        pass
+            else:
+                for name in os.listdir(dir):
+                    try:
+                        mode = os.stat(os.path.join(dir, name)).st_mode
+                    except OSError:
+                        continue
+                    if stat.S_ISREG(mode):
+                        files.add(name)
+                    elif stat.S_ISDIR(mode):
+                        subdirs.add(name)
+        except OSError:
+            return None
+        return DirListing(dir_mtime(st), files, subdirs,
+                          st.st_mtime > scan_time - MTIME_GRANULARITY)
+
+    def isdir(self, path: str) -> bool:
+        return self.listing(path) is not None
+
+    def isfile(self, path: str) -> bool:
+        dir, name = os.path.split(os.path.normpath(path))
+        listing = self.listing(dir)
+        return listing is not None and name in listing.files
+
+    def has_init_file(self, dir: str, extensions: List[str]) -> bool:
+        """Does a directory contain __init__ with one of the given extensions?"""
+        listing = self.listing(dir)
+        return listing is not None and any('__init__' + extension in listing.files
+                                           for extension in extensions)
+
+    def save(self, path: str) -> None:
+        """Save the listings of existing directories to a file.
+
+        Listings of recently modified directories are left out. Failures are
+        ignored, since the index can always be rebuilt.
+        """
+        dirs = {}  # type: Dict[str, Tuple[float, List[str], List[str]]]
+        for dir, listing in self.listings.items():
+            if listing is not None and not listing.recent:
+                dirs[dir] = (listing.mtime, sorted(listing.files), sorted(listing.subdirs))
+        try:
+            parent = os.path.dirname(path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            with open(path + '.tmp', 'w') as f:
+                json.dump({'format': INDEX_FORMAT_VERSION, 'dirs': dirs}, f)
+            replace_file(path + '.tmp', path)
+        except OSError:
+            pass
+
+    def load(self, path: str) -> None:
+        """Add the listings saved in a file that are still up to date.
+
+        The file is ignored if it can't be read.
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get('format') != INDEX_FORMAT_VERSION:
+            return
+        for dir, (mtime, files, subdirs) in data['dirs'].items():
+            if dir in self.listings:
+                continue
+            try:
+                if dir_mtime(os.stat(dir)) != mtime:
+                    continue
+            except OSError:
+                continue
+            self.listings[dir] = DirListing(mtime, set(files), set(subdirs))
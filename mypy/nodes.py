@@ -365,6 +365,8 @@ class FuncDef(FuncItem):
     is_abstract = False
     is_property = False
     original_def = None  # type: Union[FuncDef, Var]  # Original conditional definition
+    # Body skipped by the parser, if not parsed yet (see mypy.parse.LazyBody)
+    lazy_body = None  # type: Any
 
     def __init__(self,
                  name: str,              # Function name
@@ -12,7 +12,7 @@ from mypy import lex, docstring
 from mypy.lex import (
     Token, Eof, Bom, Break, Name, Colon, Dedent, IntLit, StrLit, BytesLit,
     UnicodeLit, FloatLit, Op, Indent, Keyword, Punct, LexError, ComplexLit,
-    EllipsisToken
+    EllipsisToken, TokenStream
 )
 import mypy.types
 from mypy.nodes import (
@@ -71,13 +71,17 @@ none = Token('')  # Empty token
 def parse(source: Union[str, bytes], fnam: str = None, errors: Errors = None,
           pyversion: Tuple[int, int] = defaults.PYTHON3_VERSION,
           custom_typing_module: str = None,
-          fast_parser: bool = False) -> MypyFile:
+          fast_parser: bool = False,
+          lazy_bodies: bool = False) -> MypyFile:
     """Parse a source file, without doing any semantic analysis.
 
     Return the parse tree. If errors is not provided, raise ParseError
     on failure. Otherwise, use the errors object to report parse errors.
 
     The pyversion (major, minor) argument determines the Python syntax variant.
+
+    If lazy_bodies is True, the bodies of functions are not parsed (see
+    LazyBody); this is ignored by the fast parser.
     """
     if fast_parser:
         import mypy.fastparse
@@ -92,7 +96,8 @@ def parse(source: Union[str, bytes], fnam: str = None, errors: Errors = None,
                     errors,
                     pyversion,
                     custom_typing_module,
-                    is_stub_file=is_stub_file)
+                    is_stub_file=is_stub_file,
+                    lazy_bodies=lazy_bodies)
     tree = parser.parse(source)
     tree.path = fnam
     tree.is_stub = is_stub_file
@@ -108,7 +113,8 @@ class Parser:
     The AST classes are defined in mypy.nodes and mypy.types.
     """
 
-    tok = None  # type: List[Token]
+    # Tokens of the file and the index of the current token
+    tok = None  # type: TokenStream
     ind = 0
     errors = None  # type: Errors
     # If True, raise an exception on any parse error. Otherwise, errors are reported via 'errors'.
@@ -122,13 +128,18 @@ class Parser:
     future_options = None  # type: List[str]
     # Lines to ignore (using # type: ignore).
     ignored_lines = None  # type: Set[int]
+    # Skip the indented bodies of functions, recording their extent in LazyBody objects?
+    lazy_bodies = False
 
     def __init__(self, fnam: str, errors: Errors, pyversion: Tuple[int, int],
-                 custom_typing_module: str = None, is_stub_file: bool = False) -> None:
+                 custom_typing_module: str = None, is_stub_file: bool = False,
+                 lazy_bodies: bool = False) -> None:
         self.raise_on_error = errors is None
+        self.fnam = fnam
         self.pyversion = pyversion
         self.custom_typing_module = custom_typing_module
         self.is_stub_file = is_stub_file
+        self.lazy_bodies = lazy_bodies
         if errors is not None:
             self.errors = errors
         else:
@@ -138,17 +149,34 @@ class Parser:
         else:
             self.errors.set_file('<input>')
 
-    def parse(self, s: Union[str, bytes]) -> MypyFile:
-        self.tok, self.ignored_lines = lex.lex(s, pyversion=self.pyversion,
-                                               is_stub_file=self.is_stub_file)
+    def parse(self, s: Union[str, bytes], first_line: int = 1,
+              future_options: List[str] = None) -> MypyFile:
+        """Parse a source file, or a part of one starting at first_line.
+
+        If the part doesn't start the file, future_options are the names
+        imported from __future__ before it.
+        """
+        self.tok, self.ignored_lines = lex.lex_stream(s, first_line, pyversion=self.pyversion,
+                                                      is_stub_file=self.is_stub_file)
         self.ind = 0
         self.imports = []
-        self.future_options = []
+        self.future_options = list(future_options or [])
         file = self.parse_file()
         if self.raise_on_error and self.errors.is_errors():
             self.errors.raise_error()
         return file
 
+    def parse_lazy_body(self, lazy: 'LazyBody') -> Block:
+        """Parse the statements of a function body skipped by an earlier parse."""
+        self.tok = lazy.tokens
+        self.ind = lazy.start
+        self.imports = []
+        self.future_options = lazy.future_options
+        body = Block(self.parse_indented_statements())
+        if self.raise_on_error and self.errors.is_errors():
+            self.errors.raise_error()
+        return body
+
     def weak_opts(self) -> Set[str]:
         """Do weak typing if any of the first ten tokens is a comment saying so.
 
@@ -188,23 +216,23 @@ class Parser:
 
     def parse_bom(self) -> bool:
         """Parse the optional byte order mark at the beginning of a file."""
-        if isinstance(self.current(), Bom):
+        if self.current_is(Bom):
             self.expect_type(Bom)
-            if isinstance(self.current(), Break):
+            if self.current_is(Break):
                 self.expect_break()
             return True
         else:
             return False
 
     def parse_import(self) -> Import:
-        self.expect('import')
+        self.consume('import')
         ids = []
         while True:
             id = self.parse_qualified_name()
             translated = self.translate_module_id(id)
             as_id = None
             if self.current_str() == 'as':
-                self.expect('as')
+                self.consume('as')
                 name_tok = self.expect_type(Name)
                 as_id = name_tok.string
             elif translated != id:
@@ -212,7 +240,7 @@ class Parser:
             ids.append((translated, as_id))
             if self.current_str() != ',':
                 break
-            self.expect(',')
+            self.consume(',')
         node = Import(ids)
         self.imports.append(node)
         return node
@@ -231,13 +259,13 @@ class Parser:
         return id
 
     def parse_import_from(self) -> Node:
-        self.expect('from')
+        self.consume('from')
 
         # Build the list of beginning relative tokens.
         relative = 0
         while self.current_str() in (".", "..."):
             relative += len(self.current_str())
-            self.skip()
+            self.advance()
 
         # Parse qualified name to actually import from.
         if self.current_str() == "import":
@@ -249,18 +277,18 @@ class Parser:
         name = self.translate_module_id(name)
 
         # Parse import list
-        self.expect('import')
+        self.consume('import')
         node = None  # type: ImportBase
         if self.current_str() == '*':
             if name == '__future__':
                 self.parse_error()
             # An import all from a module node:
-            self.skip()
+            self.advance()
             node = ImportAll(name, relative)
         else:
             is_paren = self.current_str() == '('
             if is_paren:
-                self.expect('(')
+                self.consume('(')
             targets = []  # type: List[Tuple[str, str]]
             while True:
                 id, as_id = self.parse_import_name()
@@ -268,18 +296,18 @@ class Parser:
                     if targets or self.current_str() == ',':
                         self.fail('You cannot import any other modules when you '
                                   'import a custom typing module',
-                                  self.current().line)
+                                  self.current_line())
                     node = Import([('typing', as_id)])
                     self.skip_until_break()
                     break
                 targets.append((id, as_id))
                 if self.current_str() != ',':
                     break
-                self.expect(',')
+                self.consume(',')
                 if is_paren and self.current_str() == ')':
                     break
             if is_paren:
-                self.expect(')')
+                self.consume(')')
             if node is None:
                 node = ImportFrom(name, relative, targets)
         self.imports.append(node)
@@ -291,7 +319,7 @@ class Parser:
         tok = self.expect_type(Name)
         name = tok.string
         if self.current_str() == 'as':
-            self.skip()
+            self.advance()
             as_name = self.expect_type(Name)
             return name, as_name.string
         else:
@@ -306,7 +334,7 @@ class Parser:
         tok = self.expect_type(Name)
         n = tok.string
         while self.current_str() == '.':
-            self.expect('.')
+            self.consume('.')
             tok = self.expect_type(Name)
             n += '.' + tok.string
         return n
@@ -331,7 +359,7 @@ class Parser:
         old_is_class_body = self.is_class_body
         self.is_class_body = True
 
-        self.expect('class')
+        self.consume('class')
         metaclass = None
 
         try:
@@ -343,7 +371,7 @@ class Parser:
                 self.errors.push_type(name)
 
                 if self.current_str() == '(':
-                    self.skip()
+                    self.advance()
                     while True:
                         if self.current_str() == ')':
                             break
@@ -354,7 +382,7 @@ class Parser:
                         if self.current_str() != ',':
                             break
                         commas.append(self.skip())
-                    self.expect(')')
+                    self.consume(')')
             except ParseError:
                 pass
 
@@ -370,15 +398,15 @@ class Parser:
         return self.parse_expression(precedence[','])
 
     def parse_metaclass(self) -> str:
-        self.expect('metaclass')
-        self.expect('=')
+        self.consume('metaclass')
+        self.consume('=')
         return self.parse_qualified_name()
 
     def parse_decorated_function_or_class(self) -> Node:
         decorators = []
         no_type_checks = False
         while self.current_str() == '@':
-            self.expect('@')
+            self.consume('@')
             d_exp = self.parse_expression()
             if self.is_no_type_check_decorator(d_exp):
                 no_type_checks = True
@@ -417,7 +445,11 @@ class Parser:
             arg_kinds = [arg.kind for arg in args]
             arg_names = [arg.variable.name() for arg in args]
 
-            body, comment_type = self.parse_block(allow_type=True)
+            lazy_body = None  # type: LazyBody
+            if self.lazy_bodies and self.is_skippable_block():
+                body, comment_type, lazy_body = self.skip_block()
+            else:
+                body, comment_type = self.parse_block(allow_type=True)
             # Potentially insert extra assignment statements to the beginning of the
             # body, used to decompose Python 2 tuple arguments.
             body.body[:0] = extra_stmts
@@ -469,6 +501,7 @@ class Parser:
 
             node = FuncDef(name, args, body, typ)
             node.set_line(def_tok)
+            node.lazy_body = lazy_body
             if typ is not None:
                 typ.definition = node
             return node
@@ -527,10 +560,10 @@ class Parser:
 
             args, typ, extra_stmts = self.parse_args(no_type_checks)
         except ParseError:
-            if not isinstance(self.current(), Break):
+            if not self.current_is(Break):
                 self.ind -= 1  # Kludge: go back to the Break token
             # Resynchronise parsing by going back over :, if present.
-            if isinstance(self.tok[self.ind - 1], Colon):
+            if self.tok.kind(self.ind - 1) is Colon:
                 self.ind -= 1
             return (name, [], None, True, [])
 
@@ -548,10 +581,10 @@ class Parser:
         # Parse the argument list (everything within '(' and ')').
         args, extra_stmts = self.parse_arg_list(no_type_checks=no_type_checks)
 
-        self.expect(')')
+        self.consume(')')
 
         if self.current_str() == '->':
-            self.skip()
+            self.advance()
             if no_type_checks:
                 self.parse_expression()
                 ret_type = None
@@ -613,8 +646,8 @@ class Parser:
 
         if self.current_str() != ')' and self.current_str() != ':':
             while self.current_str() != ')':
-                if self.current_str() == '*' and self.peek().string == ',':
-                    self.expect('*')
+                if self.current_str() == '*' and self.peek_str() == ',':
+                    self.consume('*')
                     require_named = True
                     bare_asterisk_before = len(args)
                 elif self.current_str() in ['*', '**']:
@@ -643,10 +676,10 @@ class Parser:
                     args.append(arg)
                     arg_names.append(arg.variable.name())
 
-                if self.current().string != ',':
+                if self.current_str() != ',':
                     break
 
-                self.expect(',')
+                self.consume(',')
 
         # Non-tuple argument dupes will be checked elsewhere. Avoid
         # generating duplicate errors.
@@ -660,7 +693,7 @@ class Parser:
         for name in names:
             if name in found:
                 self.fail('Duplicate argument name "{}"'.format(name),
-                          self.current().line)
+                          self.current_line())
             found.add(name)
 
     def parse_asterisk_arg(self,
@@ -692,7 +725,7 @@ class Parser:
 
         Return tuple (argument, decomposing assignment, list of names defined).
         """
-        line = self.current().line
+        line = self.current_line()
         # Generate a new argument name that is very unlikely to clash with anything.
         arg_name = '__tuple_arg_{}'.format(index + 1)
         if self.pyversion[0] >= 3:
@@ -710,7 +743,7 @@ class Parser:
         kind = nodes.ARG_POS
         initializer = None
         if self.current_str() == '=':
-            self.expect('=')
+            self.consume('=')
             initializer = self.parse_expression(precedence[','])
             kind = nodes.ARG_OPT
         var = Var(arg_name)
@@ -749,7 +782,7 @@ class Parser:
 
         initializer = None  # type: Node
         if self.current_str() == '=':
-            self.expect('=')
+            self.consume('=')
             initializer = self.parse_expression(precedence[','])
             if require_named:
                 kind = nodes.ARG_NAMED
@@ -765,12 +798,12 @@ class Parser:
 
     def parse_parameter_annotation(self) -> Node:
         if self.current_str() == ':':
-            self.skip()
+            self.advance()
             return self.parse_expression(precedence[','])
 
     def parse_arg_type(self, allow_signature: bool) -> Type:
         if self.current_str() == ':' and allow_signature:
-            self.skip()
+            self.advance()
             return self.parse_type()
         else:
             return None
@@ -806,7 +839,7 @@ class Parser:
 
     def parse_block(self, allow_type: bool = False) -> Tuple[Block, Type]:
         colon = self.expect(':')
-        if not isinstance(self.current(), Break):
+        if not self.current_is(Break):
             # Block immediately after ':'.
             nodes = []
             while True:
@@ -839,22 +872,90 @@ class Parser:
                             # We don't require docstrings to be actually correct.
                             # TODO: Report something here.
                             type = None
-            while (not isinstance(self.current(), Dedent) and
-                   not isinstance(self.current(), Eof)):
+            node = Block(self.parse_indented_statements())
+            node.set_line(colon)
+            return node, type
+
+    def parse_indented_statements(self) -> List[Node]:
+        """Parse the statements of an indented block, up to and including the Dedent."""
+        stmt_list = []  # type: List[Node]
+        while (not self.current_is(Dedent) and
+               not self.current_is(Eof)):
+            try:
+                stmt, is_simple = self.parse_statement()
+                if is_simple:
+                    self.expect_break()
+                if stmt is not None:
+                    if not self.try_combine_overloads(stmt, stmt_list):
+                        stmt_list.append(stmt)
+            except ParseError:
+                pass
+        if self.current_is(Dedent):
+            self.advance()
+        return stmt_list
+
+    def is_skippable_block(self) -> bool:
+        """Can the block at the current token be skipped (see skip_block)?
+
+        Only indented blocks without lexical errors are skipped, so that
+        skipping doesn't hide errors reported by the lexer.
+        """
+        if (self.current_str() != ':' or not issubclass(self.tok.kind(self.ind + 1), Break) or
+                not issubclass(self.tok.kind(self.ind + 2), Indent)):
+            return False
+        end = self.block_end(self.ind + 2)
+        return not any(issubclass(self.tok.kind(i), LexError)
+                       for i in range(self.ind + 2, end))
+
+    def block_end(self, indent: int) -> int:
+        """Return the index of the token after the indented block that starts at indent."""
+        depth = 0
+        kinds = self.tok.kinds
+        indent_kind = lex.token_kinds[Indent]
+        dedent_kind = lex.token_kinds[Dedent]
+        eof_kind = lex.token_kinds[Eof]
+        for i in range(indent, len(kinds)):
+            kind = kinds[i]
+            if kind == indent_kind:
+                depth += 1
+            elif kind == dedent_kind:
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+            elif kind == eof_kind:
+                return i
+        return len(kinds)
+
+    def skip_block(self) -> Tuple[Block, Type, 'LazyBody']:
+        """Skip an indented function body without building its parse tree.
+
+        Return an empty block, the type comment of the function and the
+        extent of the body. The import statements in the body are parsed,
+        since they are dependencies of the module.
+        """
+        colon = self.expect(':')
+        brk = self.expect_break()
+        type = self.parse_type_comment(brk, signature=True)
+        start = self.ind
+        end = self.block_end(start)
+        statement_start = (Break, Indent, Dedent)
+        for i in range(start + 1, end):
+            if (issubclass(self.tok.kind(i), Keyword) and
+                    self.tok.string(i) in ('import', 'from') and
+                    issubclass(self.tok.kind(i - 1), statement_start)):
+                self.ind = i
                 try:
-                    stmt, is_simple = self.parse_statement()
-                    if is_simple:
-                        self.expect_break()
-                    if stmt is not None:
-                        if not self.try_combine_overloads(stmt, stmt_list):
-                            stmt_list.append(stmt)
+                    if self.current_str() == 'import':
+                        stmt = self.parse_import()  # type: Node
+                    else:
+                        stmt = self.parse_import_from()
+                    stmt.set_line(self.tok.line(i))
                 except ParseError:
                     pass
-            if isinstance(self.current(), Dedent):
-                self.skip()
-            node = Block(stmt_list)
-            node.set_line(colon)
-            return node, type
+        self.ind = end
+        node = Block([])
+        node.set_line(colon)
+        return node, type, LazyBody(self, start + 1, end)
 
     def try_combine_overloads(self, s: Node, stmt: List[Node]) -> bool:
         if isinstance(s, Decorator) and stmt:
@@ -872,7 +973,7 @@ class Parser:
 
     def parse_statement(self) -> Tuple[Node, bool]:
         stmt = None  # type: Node
-        t = self.current()
+        line = self.current_line()
         ts = self.current_str()
         is_simple = True  # Is this a non-block statement?
         if ts == 'if':
@@ -929,7 +1030,7 @@ class Parser:
         else:
             stmt = self.parse_expression_or_assignment()
         if stmt is not None:
-            stmt.set_line(t)
+            stmt.set_line(line)
         return stmt, is_simple
 
     def parse_expression_or_assignment(self) -> Node:
@@ -939,7 +1040,7 @@ class Parser:
         elif self.current_str() in op_assign:
             # Operator assignment statement.
             op = self.current_str()[:-1]
-            self.skip()
+            self.advance()
             rvalue = self.parse_expression()
             return OperatorAssignmentStmt(op, expr, rvalue)
         else:
@@ -952,11 +1053,11 @@ class Parser:
         Assume that lvalue has been parsed already, and the current token is '='.
         Also parse an optional '# type:' comment.
         """
-        self.expect('=')
+        self.consume('=')
         lvalues = [lvalue]
         expr = self.parse_expression(star_expr_allowed=True)
         while self.current_str() == '=':
-            self.skip()
+            self.advance()
             lvalues.append(expr)
             expr = self.parse_expression(star_expr_allowed=True)
         cur = self.current()
@@ -967,7 +1068,7 @@ class Parser:
         return AssignmentStmt(lvalues, expr, type)
 
     def parse_return_stmt(self) -> ReturnStmt:
-        self.expect('return')
+        self.consume('return')
         expr = None
         current = self.current()
         if current.string == 'yield':
@@ -978,30 +1079,30 @@ class Parser:
         return node
 
     def parse_raise_stmt(self) -> RaiseStmt:
-        self.expect('raise')
+        self.consume('raise')
         expr = None
         from_expr = None
-        if not isinstance(self.current(), Break):
+        if not self.current_is(Break):
             expr = self.parse_expression()
             if self.current_str() == 'from':
-                self.expect('from')
+                self.consume('from')
                 from_expr = self.parse_expression()
         node = RaiseStmt(expr, from_expr)
         return node
 
     def parse_assert_stmt(self) -> AssertStmt:
-        self.expect('assert')
+        self.consume('assert')
         expr = self.parse_expression()
         node = AssertStmt(expr)
         return node
 
     def parse_yield_or_yield_from_expr(self) -> Union[YieldFromExpr, YieldExpr]:
-        self.expect("yield")
+        self.consume("yield")
         expr = None
         node = YieldExpr(expr)  # type: Union[YieldFromExpr, YieldExpr]
-        if not isinstance(self.current(), Break):
+        if not self.current_is(Break):
             if self.current_str() == "from":
-                self.expect("from")
+                self.consume("from")
                 expr = self.parse_expression()  # when yield from is assigned to a variable
                 node = YieldFromExpr(expr)
             else:
@@ -1013,39 +1114,39 @@ class Parser:
         return node
 
     def parse_ellipsis(self) -> EllipsisExpr:
-        self.expect('...')
+        self.consume('...')
         node = EllipsisExpr()
         return node
 
     def parse_del_stmt(self) -> DelStmt:
-        self.expect('del')
+        self.consume('del')
         expr = self.parse_expression()
         node = DelStmt(expr)
         return node
 
     def parse_break_stmt(self) -> BreakStmt:
-        self.expect('break')
+        self.consume('break')
         node = BreakStmt()
         return node
 
     def parse_continue_stmt(self) -> ContinueStmt:
-        self.expect('continue')
+        self.consume('continue')
         node = ContinueStmt()
         return node
 
     def parse_pass_stmt(self) -> PassStmt:
-        self.expect('pass')
+        self.consume('pass')
         node = PassStmt()
         return node
 
     def parse_global_decl(self) -> GlobalDecl:
-        self.expect('global')
+        self.consume('global')
         names = self.parse_identifier_list()
         node = GlobalDecl(names)
         return node
 
     def parse_nonlocal_decl(self) -> NonlocalDecl:
-        self.expect('nonlocal')
+        self.consume('nonlocal')
         names = self.parse_identifier_list()
         node = NonlocalDecl(names)
         return node
@@ -1057,38 +1158,38 @@ class Parser:
             names.append(n.string)
             if self.current_str() != ',':
                 break
-            self.skip()
+            self.advance()
         return names
 
     def parse_while_stmt(self) -> WhileStmt:
         is_error = False
-        self.expect('while')
+        self.consume('while')
         try:
             expr = self.parse_expression()
         except ParseError:
             is_error = True
         body, _ = self.parse_block()
         if self.current_str() == 'else':
-            self.expect('else')
+            self.consume('else')
             else_body, _ = self.parse_block()
         else:
             else_body = None
-        if is_error is not None:
+        if not is_error:
             node = WhileStmt(expr, body, else_body)
             return node
         else:
             return None
 
     def parse_for_stmt(self) -> ForStmt:
-        self.expect('for')
+        self.consume('for')
         index = self.parse_for_index_variables()
-        self.expect('in')
+        self.consume('in')
         expr = self.parse_expression()
 
         body, _ = self.parse_block()
 
         if self.current_str() == 'else':
-            self.expect('else')
+            self.consume('else')
             else_body, _ = self.parse_block()
         else:
             else_body = None
@@ -1107,7 +1208,7 @@ class Parser:
             index_items.append(v)
             if self.current_str() != ',':
                 break
-            self.skip()
+            self.advance()
             if self.current_str() == 'in':
                 force_tuple = True
                 break
@@ -1123,7 +1224,7 @@ class Parser:
     def parse_if_stmt(self) -> IfStmt:
         is_error = False
 
-        self.expect('if')
+        self.consume('if')
         expr = []
         try:
             expr.append(self.parse_expression())
@@ -1133,7 +1234,7 @@ class Parser:
         body = [self.parse_block()[0]]
 
         while self.current_str() == 'elif':
-            self.expect('elif')
+            self.consume('elif')
             try:
                 expr.append(self.parse_expression())
             except ParseError:
@@ -1141,7 +1242,7 @@ class Parser:
             body.append(self.parse_block()[0])
 
         if self.current_str() == 'else':
-            self.expect('else')
+            self.consume('else')
             else_body, _ = self.parse_block()
         else:
             else_body = None
@@ -1153,23 +1254,23 @@ class Parser:
             return None
 
     def parse_try_stmt(self) -> Node:
-        self.expect('try')
+        self.consume('try')
         body, _ = self.parse_block()
         is_error = False
         vars = []  # type: List[NameExpr]
         types = []  # type: List[Node]
         handlers = []  # type: List[Block]
         while self.current_str() == 'except':
-            self.expect('except')
-            if not isinstance(self.current(), Colon):
+            self.consume('except')
+            if not self.current_is(Colon):
                 try:
                     t = self.current()
                     types.append(self.parse_expression(precedence[',']).set_line(t))
                     if self.current_str() == 'as':
-                        self.expect('as')
+                        self.consume('as')
                         vars.append(self.parse_name_expr())
                     elif self.pyversion[0] == 2 and self.current_str() == ',':
-                        self.expect(',')
+                        self.consume(',')
                         vars.append(self.parse_name_expr())
                     else:
                         vars.append(None)
@@ -1181,12 +1282,12 @@ class Parser:
             handlers.append(self.parse_block()[0])
         if not is_error:
             if self.current_str() == 'else':
-                self.skip()
+                self.advance()
                 else_body, _ = self.parse_block()
             else:
                 else_body = None
             if self.current_str() == 'finally':
-                self.expect('finally')
+                self.consume('finally')
                 finally_body, _ = self.parse_block()
             else:
                 finally_body = None
@@ -1197,13 +1298,13 @@ class Parser:
             return None
 
     def parse_with_stmt(self) -> WithStmt:
-        self.expect('with')
+        self.consume('with')
         exprs = []
         targets = []
         while True:
             expr = self.parse_expression(precedence[','])
             if self.current_str() == 'as':
-                self.expect('as')
+                self.consume('as')
                 target = self.parse_expression(precedence[','])
             else:
                 target = None
@@ -1211,45 +1312,45 @@ class Parser:
             targets.append(target)
             if self.current_str() != ',':
                 break
-            self.expect(',')
+            self.consume(',')
         body, _ = self.parse_block()
         return WithStmt(exprs, targets, body)
 
     def parse_print_stmt(self) -> PrintStmt:
-        self.expect('print')
+        self.consume('print')
         args = []
         target = None
         if self.current_str() == '>>':
-            self.skip()
+            self.advance()
             target = self.parse_expression(precedence[','])
             if self.current_str() == ',':
-                self.skip()
-                if isinstance(self.current(), Break):
+                self.advance()
+                if self.current_is(Break):
                     self.parse_error()
             else:
-                if not isinstance(self.current(), Break):
+                if not self.current_is(Break):
                     self.parse_error()
         comma = False
-        while not isinstance(self.current(), Break):
+        while not self.current_is(Break):
             args.append(self.parse_expression(precedence[',']))
             if self.current_str() == ',':
                 comma = True
-                self.skip()
+                self.advance()
             else:
                 comma = False
                 break
         return PrintStmt(args, newline=not comma, target=target)
 
     def parse_exec_stmt(self) -> ExecStmt:
-        self.expect('exec')
+        self.consume('exec')
         expr = self.parse_expression(precedence['in'])
         variables1 = None
         variables2 = None
         if self.current_str() == 'in':
-            self.skip()
+            self.advance()
             variables1 = self.parse_expression(precedence[','])
             if self.current_str() == ',':
-                self.skip()
+                self.advance()
                 variables2 = self.parse_expression(precedence[','])
         return ExecStmt(expr, variables1, variables2)
 
@@ -1258,7 +1359,8 @@ class Parser:
     def parse_expression(self, prec: int = 0, star_expr_allowed: bool = False) -> Node:
         """Parse a subexpression within a specific precedence context."""
         expr = None  # type: Node
-        current = self.current()  # Remember token for setting the line number.
+        line = self.current_line()  # Remember the line number of the expression.
+        kind = self.current_kind()
 
         # Parse a "value" expression or unary operator expression and store
         # that in expr.
@@ -1280,26 +1382,26 @@ class Parser:
         elif s == '`' and self.pyversion[0] == 2:
             expr = self.parse_backquote_expr()
         else:
-            if isinstance(current, Name):
+            if kind is Name:
                 # Name expression.
                 expr = self.parse_name_expr()
-            elif isinstance(current, IntLit):
+            elif kind is IntLit:
                 expr = self.parse_int_expr()
-            elif isinstance(current, StrLit):
+            elif kind is StrLit:
                 expr = self.parse_str_expr()
-            elif isinstance(current, BytesLit):
+            elif kind is BytesLit:
                 expr = self.parse_bytes_literal()
-            elif isinstance(current, UnicodeLit):
+            elif kind is UnicodeLit:
                 expr = self.parse_unicode_literal()
-            elif isinstance(current, FloatLit):
+            elif kind is FloatLit:
                 expr = self.parse_float_expr()
-            elif isinstance(current, ComplexLit):
+            elif kind is ComplexLit:
                 expr = self.parse_complex_expr()
-            elif isinstance(current, Keyword) and s == "yield":
+            elif kind is Keyword and s == "yield":
                 # The expression yield from and yield to assign
                 expr = self.parse_yield_or_yield_from_expr()
-            elif isinstance(current, EllipsisToken) and (self.pyversion[0] >= 3
-                                                         or self.is_stub_file):
+            elif kind is EllipsisToken and (self.pyversion[0] >= 3
+                                            or self.is_stub_file):
                 expr = self.parse_ellipsis()
             else:
                 # Invalid expression.
@@ -1309,11 +1411,11 @@ class Parser:
         # simplifies recording the line number as not every node type needs to
         # deal with it separately.
         if expr.line < 0:
-            expr.set_line(current)
+            expr.set_line(line)
 
         # Parse operations that require a left argument (stored in expr).
         while True:
-            current = self.current()
+            line = self.current_line()
             s = self.current_str()
             if s == '(':
                 # Call expression.
@@ -1348,7 +1450,7 @@ class Parser:
                     break
             else:
                 # Binary operation or a special case.
-                if isinstance(current, Op):
+                if self.current_is(Op):
                     op = self.current_str()
                     op_prec = precedence[op]
                     if op == 'not':
@@ -1373,19 +1475,19 @@ class Parser:
             # simplifies recording the line number as not every node type
             # needs to deal with it separately.
             if expr.line < 0:
-                expr.set_line(current)
+                expr.set_line(line)
 
         return expr
 
     def parse_parentheses(self) -> Node:
-        self.skip()
+        self.advance()
         if self.current_str() == ')':
             # Empty tuple ().
             expr = self.parse_empty_tuple_expr()  # type: Node
         else:
             # Parenthesised expression.
             expr = self.parse_expression(0, star_expr_allowed=True)
-            self.expect(')')
+            self.consume(')')
         return expr
 
     def parse_star_expr(self) -> Node:
@@ -1397,22 +1499,22 @@ class Parser:
         return expr
 
     def parse_empty_tuple_expr(self) -> TupleExpr:
-        self.expect(')')
+        self.consume(')')
         node = TupleExpr([])
         return node
 
     def parse_list_expr(self) -> Node:
         """Parse list literal or list comprehension."""
         items = []
-        self.expect('[')
+        self.consume('[')
         while self.current_str() != ']' and not self.eol():
             items.append(self.parse_expression(precedence['<for>'], star_expr_allowed=True))
             if self.current_str() != ',':
                 break
-            self.expect(',')
+            self.consume(',')
         if self.current_str() == 'for' and len(items) == 1:
             items[0] = self.parse_generator_expr(items[0])
-        self.expect(']')
+        self.consume(']')
         if len(items) == 1 and isinstance(items[0], GeneratorExpr):
             return ListComprehension(cast(GeneratorExpr, items[0]))
         else:
@@ -1433,17 +1535,17 @@ class Parser:
         condlists = []  # type: List[List[Node]]
         while self.current_str() == 'for':
             conds = []
-            self.expect('for')
+            self.consume('for')
             index = self.parse_for_index_variables()
             indices.append(index)
-            self.expect('in')
+            self.consume('in')
             if self.pyversion[0] >= 3:
                 sequence = self.parse_expression(precedence['<if>'])
             else:
                 sequence = self.parse_expression_list()
             sequences.append(sequence)
             while self.current_str() == 'if':
-                self.skip()
+                self.advance()
                 conds.append(self.parse_expression(precedence['<if>']))
             condlists.append(conds)
 
@@ -1459,15 +1561,15 @@ class Parser:
             return self.parse_tuple_expr(expr, prec).set_line(t)
 
     def parse_conditional_expr(self, left_expr: Node) -> ConditionalExpr:
-        self.expect('if')
+        self.consume('if')
         cond = self.parse_expression(precedence['<if>'])
-        self.expect('else')
+        self.consume('else')
         else_expr = self.parse_expression(precedence['<if>'])
         return ConditionalExpr(cond, left_expr, else_expr)
 
     def parse_dict_or_set_expr(self) -> Node:
         items = []  # type: List[Tuple[Node, Node]]
-        self.expect('{')
+        self.consume('{')
         while self.current_str() != '}' and not self.eol():
             key = self.parse_expression(precedence['<for>'])
             if self.current_str() in [',', '}'] and items == []:
@@ -1483,25 +1585,25 @@ class Parser:
             items.append((key, value))
             if self.current_str() != ',':
                 break
-            self.expect(',')
-        self.expect('}')
+            self.consume(',')
+        self.consume('}')
         node = DictExpr(items)
         return node
 
     def parse_set_expr(self, first: Node) -> SetExpr:
         items = [first]
         while self.current_str() != '}' and not self.eol():
-            self.expect(',')
+            self.consume(',')
             if self.current_str() == '}':
                 break
             items.append(self.parse_expression(precedence[',']))
-        self.expect('}')
+        self.consume('}')
         expr = SetExpr(items)
         return expr
 
     def parse_set_comprehension(self, expr: Node):
         gen = self.parse_generator_expr(expr)
-        self.expect('}')
+        self.consume('}')
         set_comp = SetComprehension(gen)
         return set_comp
 
@@ -1510,16 +1612,16 @@ class Parser:
         indices, sequences, condlists = self.parse_comp_for()
         dic = DictionaryComprehension(key, value, indices, sequences, condlists)
         dic.set_line(colon)
-        self.expect('}')
+        self.consume('}')
         return dic
 
     def parse_tuple_expr(self, expr: Node,
                          prec: int = precedence[',']) -> TupleExpr:
         items = [expr]
         while True:
-            self.expect(',')
+            self.consume(',')
             if (self.current_str() in [')', ']', '=', ':'] or
-                    isinstance(self.current(), Break)):
+                    self.current_is(Break)):
                 break
             items.append(self.parse_expression(prec, star_expr_allowed=True))
             if self.current_str() != ',': break
@@ -1527,9 +1629,9 @@ class Parser:
         return node
 
     def parse_backquote_expr(self) -> BackquoteExpr:
-        self.expect('`')
+        self.consume('`')
         expr = self.parse_expression()
-        self.expect('`')
+        self.consume('`')
         return BackquoteExpr(expr)
 
     def parse_name_expr(self) -> NameExpr:
@@ -1555,7 +1657,7 @@ class Parser:
         token = self.expect_type(StrLit)
         value = cast(StrLit, token).parsed()
         is_unicode = False
-        while isinstance(self.current(), (StrLit, UnicodeLit)):
+        while self.current_is((StrLit, UnicodeLit)):
             token = self.skip()
             if isinstance(token, StrLit):
                 value += token.parsed()
@@ -1572,7 +1674,7 @@ class Parser:
         # XXX \uxxxx literals
         tok = [self.expect_type(BytesLit)]
         value = (cast(BytesLit, tok[0])).parsed()
-        while isinstance(self.current(), BytesLit):
+        while self.current_is(BytesLit):
             t = cast(BytesLit, self.skip())
             value += t.parsed()
         if self.pyversion[0] >= 3:
@@ -1585,7 +1687,7 @@ class Parser:
         # XXX \uxxxx literals
         token = self.expect_type(UnicodeLit)
         value = cast(UnicodeLit, token).parsed()
-        while isinstance(self.current(), (UnicodeLit, StrLit)):
+        while self.current_is((UnicodeLit, StrLit)):
             token = cast(Union[UnicodeLit, StrLit], self.skip())
             value += token.parsed()
         if self.pyversion[0] >= 3:
@@ -1606,9 +1708,9 @@ class Parser:
         return node
 
     def parse_call_expr(self, callee: Any) -> CallExpr:
-        self.expect('(')
+        self.consume('(')
         args, kinds, names = self.parse_arg_expr()
-        self.expect(')')
+        self.consume(')')
         node = CallExpr(callee, args, kinds, names)
         return node
 
@@ -1627,22 +1729,22 @@ class Parser:
         dict_arg = False
         named_args = False
         while self.current_str() != ')' and not self.eol() and not dict_arg:
-            if isinstance(self.current(), Name) and self.peek().string == '=':
+            if self.current_is(Name) and self.peek_str() == '=':
                 # Named argument
                 name = self.expect_type(Name)
-                self.expect('=')
+                self.consume('=')
                 kinds.append(nodes.ARG_NAMED)
                 names.append(name.string)
                 named_args = True
             elif (self.current_str() == '*' and not var_arg and not dict_arg):
                 # *args
                 var_arg = True
-                self.expect('*')
+                self.consume('*')
                 kinds.append(nodes.ARG_STAR)
                 names.append(None)
             elif self.current_str() == '**':
                 # **kwargs
-                self.expect('**')
+                self.consume('**')
                 dict_arg = True
                 kinds.append(nodes.ARG_STAR2)
                 names.append(None)
@@ -1655,11 +1757,11 @@ class Parser:
             args.append(self.parse_expression(precedence[',']))
             if self.current_str() != ',':
                 break
-            self.expect(',')
+            self.consume(',')
         return args, kinds, names
 
     def parse_member_expr(self, expr: Any) -> Node:
-        self.expect('.')
+        self.consume('.')
         name = self.expect_type(Name)
         if (isinstance(expr, CallExpr) and isinstance(expr.callee, NameExpr)
                 and cast(NameExpr, expr.callee).name == 'super'):
@@ -1670,19 +1772,19 @@ class Parser:
         return node
 
     def parse_index_expr(self, base: Any) -> IndexExpr:
-        self.expect('[')
+        self.consume('[')
         index = self.parse_slice_item()
         if self.current_str() == ',':
             # Extended slicing such as x[1:, :2].
             items = [index]
             while self.current_str() == ',':
-                self.skip()
-                if self.current_str() == ']' or isinstance(self.current(), Break):
+                self.advance()
+                if self.current_str() == ']' or self.current_is(Break):
                     break
                 items.append(self.parse_slice_item())
             index = TupleExpr(items)
             index.set_line(items[0].line)
-        self.expect(']')
+        self.consume(']')
         node = IndexExpr(base, index)
         return node
 
@@ -1708,7 +1810,7 @@ class Parser:
                 end_index = None
             stride = None
             if self.current_str() == ':':
-                self.expect(':')
+                self.consume(':')
                 if self.current_str() not in (']', ','):
                     stride = self.parse_expression(precedence[','])
             item = SliceExpr(index, end_index, stride).set_line(colon.line)
@@ -1734,12 +1836,12 @@ class Parser:
             if op_str == 'not':
                 if self.current_str() == 'in':
                     op_str = 'not in'
-                    self.skip()
+                    self.advance()
                 else:
                     self.parse_error()
             elif op_str == 'is' and self.current_str() == 'not':
                 op_str = 'is not'
-                self.skip()
+                self.advance()
 
             operators_str.append(op_str)
             operand = self.parse_expression(prec)
@@ -1790,12 +1892,18 @@ class Parser:
 
         return FuncExpr(args, body, typ)
 
-    # Helper methods
+    # Helper methods. The methods that return a token create a token object,
+    # so the others (such as advance and current_str) are used if only the
+    # position or the string of a token is needed.
 
     def skip(self) -> Token:
         self.ind += 1
         return self.tok[self.ind - 1]
 
+    def advance(self) -> None:
+        """Move to the next token (like skip, but don't return the token)."""
+        self.ind += 1
+
     def expect(self, string: str) -> Token:
         if self.current_str() == string:
             self.ind += 1
@@ -1803,21 +1911,27 @@ class Parser:
         else:
             self.parse_error()
 
+    def consume(self, string: str) -> None:
+        """Like expect, but don't return the token."""
+        if self.current_str() == string:
+            self.ind += 1
+        else:
+            self.parse_error()
+
     def expect_indent(self) -> Token:
-        if isinstance(self.current(), Indent):
+        if self.current_is(Indent):
             return self.expect_type(Indent)
         else:
-            self.fail('Expected an indented block', self.current().line)
+            self.fail('Expected an indented block', self.current_line())
             return none
 
     def fail(self, msg: str, line: int) -> None:
         self.errors.report(line, msg)
 
     def expect_type(self, typ: type) -> Token:
-        current = self.current()
-        if isinstance(current, typ):
+        if self.current_is(typ):
             self.ind += 1
-            return current
+            return self.tok[self.ind - 1]
         else:
             self.parse_error()
 
@@ -1831,11 +1945,25 @@ class Parser:
         return self.tok[self.ind]
 
     def current_str(self) -> str:
-        return self.current().string
+        return self.tok.string(self.ind)
+
+    def current_line(self) -> int:
+        return self.tok.line(self.ind)
+
+    def current_kind(self) -> type:
+        """Return the class of the current token."""
+        return self.tok.kind(self.ind)
+
+    def current_is(self, typ: Union[type, Tuple[type, ...]]) -> bool:
+        """Is the current token an instance of a token class (or classes)?"""
+        return issubclass(self.tok.kind(self.ind), typ)
 
     def peek(self) -> Token:
         return self.tok[self.ind + 1]
 
+    def peek_str(self) -> str:
+        return self.tok.string(self.ind + 1)
+
     def parse_error(self) -> None:
         self.parse_error_at(self.current())
         raise ParseError()
@@ -1858,23 +1986,23 @@ class Parser:
 
     def skip_until_break(self) -> None:
         n = 0
-        while (not isinstance(self.current(), Break)
-               and not isinstance(self.current(), Eof)):
-            self.skip()
+        while (not self.current_is(Break)
+               and not self.current_is(Eof)):
+            self.advance()
             n += 1
-        if isinstance(self.tok[self.ind - 1], Colon) and n > 1:
+        if self.tok.kind(self.ind - 1) is Colon and n > 1:
             self.ind -= 1
 
     def skip_until_next_line(self) -> None:
         self.skip_until_break()
-        if isinstance(self.current(), Break):
-            self.skip()
+        if self.current_is(Break):
+            self.advance()
 
     def eol(self) -> bool:
-        return isinstance(self.current(), Break) or self.eof()
+        return self.current_is(Break) or self.eof()
 
     def eof(self) -> bool:
-        return isinstance(self.current(), Eof)
+        return self.current_is(Eof)
 
     # Type annotation related functionality
 
@@ -1922,6 +2050,66 @@ class Parser:
             return None
 
 
+class LazyBody:
+    """The extent of a function body that was skipped by the parser.
+
+    The body can be parsed later with load_lazy_body. The parser options
+    are recorded, since the body must be parsed with the same options as the
+    rest of the module.
+
+    Attributes:
+      tokens:         Tokens of the module
+      start:          Index of the first token of the body (after the Indent)
+      end:            Index of the token after the body
+      fnam:           Path of the module
+      pyversion:      Python version of the parser
+      custom_typing_module:
+                      Custom typing module of the parser
+      is_stub_file:   Was the module a stub?
+      future_options: Names imported from __future__ by the module
+    """
+
+    def __init__(self, parser: Parser, start: int, end: int) -> None:
+        self.tokens = parser.tok
+        self.start = start
+        self.end = end
+        self.fnam = parser.fnam
+        self.pyversion = parser.pyversion
+        self.custom_typing_module = parser.custom_typing_module
+        self.is_stub_file = parser.is_stub_file
+        self.future_options = parser.future_options
+
+    def may_define_attributes(self, self_name: str) -> bool:
+        """Could the body define attributes of the argument self_name?
+
+        This is True if the body contains an attribute reference self_name.x
+        followed by a token that may end an assignment target.
+        """
+        tokens = self.tokens
+        for i in range(self.start, self.end - 3):
+            if (tokens.string(i) == self_name and issubclass(tokens.kind(i), Name) and
+                    tokens.string(i + 1) == '.' and
+                    tokens.string(i + 3) in ('=', ',', ')', ']', ':', 'in')):
+                return True
+        return False
+
+
+def load_lazy_body(defn: FuncDef, errors: Errors = None) -> None:
+    """Parse the body of a function that was skipped by the parser (see LazyBody).
+
+    Report parse errors using errors; raise CompileError if errors is None.
+    """
+    lazy = defn.lazy_body
+    parser = Parser(lazy.fnam, errors, lazy.pyversion, lazy.custom_typing_module,
+                    is_stub_file=lazy.is_stub_file, lazy_bodies=True)
+    body = parser.parse_lazy_body(lazy)
+    # The skipped body may contain statements that decompose tuple arguments.
+    body.body[:0] = defn.body.body
+    body.set_line(defn.body.line)
+    defn.body = body
+    defn.lazy_body = None
+
+
 class ParseError(Exception): pass
 
 
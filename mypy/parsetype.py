@@ -1,6 +1,6 @@
 """Type parser"""
 
-from typing import List, Tuple, Union, cast, Optional
+from typing import List, Tuple, Union, cast, Optional, Sequence
 
 from mypy.types import (
     Type, UnboundType, TupleType, TypeList, CallableType, StarType,
@@ -21,7 +21,7 @@ class TypeParseError(Exception):
         self.message = message
 
 
-def parse_type(tok: List[Token], index: int) -> Tuple[Type, int]:
+def parse_type(tok: Sequence[Token], index: int) -> Tuple[Type, int]:
     """Parse a type.
 
     Return (type, index after type).
@@ -31,7 +31,7 @@ def parse_type(tok: List[Token], index: int) -> Tuple[Type, int]:
     return p.parse_type(), p.index()
 
 
-def parse_types(tok: List[Token], index: int) -> Tuple[Type, int]:
+def parse_types(tok: Sequence[Token], index: int) -> Tuple[Type, int]:
     """Parse one or more types separated by commas (optional parentheses).
 
     Return (type, index after type).
@@ -42,7 +42,7 @@ def parse_types(tok: List[Token], index: int) -> Tuple[Type, int]:
 
 
 class TypeParser:
-    def __init__(self, tok: List[Token], ind: int) -> None:
+    def __init__(self, tok: Sequence[Token], ind: int) -> None:
         self.tok = tok
         self.ind = ind
 
@@ -213,7 +213,7 @@ def parse_str_as_signature(typestr: str, line: int) -> CallableType:
     return result
 
 
-def parse_signature(tokens: List[Token]) -> Tuple[CallableType, int]:
+def parse_signature(tokens: Sequence[Token]) -> Tuple[CallableType, int]:
     """Parse signature of form (argtype, ...) -> ...
 
     Return tuple (signature type, token index).
@@ -0,0 +1,123 @@
+"""Profiling the build phases with cProfile (--profile).
+
+The profile of each phase of the build (see mypy.timing for the phases) is
+collected separately and written to DIR/<phase>.pstats, so that the time
+spent in shared code (for example, mypy.subtypes) is attributed to the phase
+that called it. The files can be read with the pstats module:
+
+  python -m pstats DIR/check.pstats
+
+If slowest is given, each module is profiled separately and only the
+profiles of the slowest modules (by the total wall time of their profiled
+phases) are written; the selected modules and their times are listed in
+DIR/modules.txt.
+
+Only the driver process is profiled; with --jobs, the parse phase is the
+time spent waiting for the worker processes.
+"""
+
+import cProfile
+import os
+import pstats
+
+from typing import Dict, List, Tuple, Union
+
+from mypy.timing import PhaseTimer, NullTimer
+from mypy.util import wall_clock
+
+
+# Name of the file that lists the profiled modules (if slowest is given)
+MODULES_FILE = 'modules.txt'
+
+
+class PhaseProfiler:
+    """Profiles of the phases of a build.
+
+    Attributes:
+      slowest:  Number of modules whose profiles are written (or None for all)
+      profiles: Map from (module id, phase) to profile; the module id is None
+                unless slowest is given
+      times:    Map from module id to the wall time of its profiled phases
+      active:   Stack of the profiles of the phases in progress (if phases
+                nest, only the innermost one is enabled)
+    """
+
+    def __init__(self, slowest: int = None) -> None:
+        self.slowest = slowest
+        self.profiles = {}  # type: Dict[Tuple[str, str], cProfile.Profile]
+        self.times = {}  # type: Dict[str, float]
+        self.active = []  # type: List[cProfile.Profile]
+
+    def phase(self, id: str, phase: str,
+              inner: Union[PhaseTimer, NullTimer]) -> 'ProfiledPhase':
+        """Return a context manager that profiles a phase of a module.
+
+        The context manager inner (for example, a timer) is entered before
+        the profile is enabled.
+        """
+        key = (id if self.slowest is not None else None, phase)
+        if key not in self.profiles:
+            self.profiles[key] = cProfile.Profile()
+        return ProfiledPhase(self, id, self.profiles[key], inner)
+
+    def start(self, profile: cProfile.Profile) -> None:
+        if self.active:
+            self.active[-1].disable()
+        self.active.append(profile)
+        profile.enable()
+
+    def stop(self, profile: cProfile.Profile) -> None:
+        profile.disable()
+        self.active.pop()
+        if self.active:
+            self.active[-1].enable()
+
+    def selected_modules(self) -> List[str]:
+        """Return the ids of the modules whose profiles are written, slowest first."""
+        ids = sorted(self.times, key=lambda id: (-self.times[id], id))
+        if self.slowest is not None:
+            ids = ids[:self.slowest]
+        return ids
+
+    def write(self, dir: str) -> None:
+        """Write a .pstats file for each profiled phase to a directory."""
+        os.makedirs(dir, exist_ok=True)
+        selected = set(self.selected_modules())
+        phase_stats = {}  # type: Dict[str, pstats.Stats]
+        for (id, phase), profile in sorted(self.profiles.items(),
+                                           key=lambda item: (item[0][1], item[0][0] or '')):
+            if id is not None and id not in selected:
+                continue
+            if phase in phase_stats:
+                phase_stats[phase].add(profile)
+            else:
+                phase_stats[phase] = pstats.Stats(profile)
+        for phase, stats in phase_stats.items():
+            stats.dump_stats(os.path.join(dir, phase + '.pstats'))
+        if self.slowest is not None:
+            with open(os.path.join(dir, MODULES_FILE), 'w') as f:
+                for id in self.selected_modules():
+                    f.write('{:.6f} {}\n'.format(self.times[id], id))
+
+
+class ProfiledPhase:
+    """Context manager that profiles a phase of a module."""
+
+    def __init__(self, profiler: PhaseProfiler, id: str, profile: cProfile.Profile,
+                 inner: Union[PhaseTimer, NullTimer]) -> None:
+        self.profiler = profiler
+        self.id = id
+        self.profile = profile
+        self.inner = inner
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.inner.__enter__()
+        self.start = wall_clock()
+        self.profiler.start(self.profile)
+
+    def __exit__(self, *exc: object) -> None:
+        self.profiler.stop(self.profile)
+        elapsed = wall_clock() - self.start
+        self.profiler.times[self.id] = self.profiler.times.get(self.id, 0.0) + elapsed
+        self.inner.__exit__(*exc)
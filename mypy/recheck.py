@@ -0,0 +1,231 @@
+"""Function-level rechecking of changed modules in resident builds.
+
+When a module has changed since the previous build (see the RESIDENT build
+flag), it is parsed and semantically analyzed again. It can still avoid
+type checking the bodies of top-level functions and methods that haven't
+changed, if everything else they depend on is the same as in the previous
+build:
+
+ * all the modules the module depends on were reused from the previous
+   build, and
+ * the module has the same top-level statements and class bodies, except
+   that the bodies of functions and methods may have changed (their
+   signatures may not, and the classes must have the same members).
+
+The source text of the module is split into chunks at the top-level
+statements, and the chunks of classes are split further at the statements
+of the class body. Functions and methods whose chunk is unchanged are not
+type checked again; instead, the errors reported for them when type
+checking the previous version are reported again, moved to the new line
+numbers. The types of the nodes within such functions are not recorded.
+
+Methods that define attributes (by assigning to self.x) are always type
+checked again, since that infers the types of the attributes. If the body
+of such a method has changed, the whole module is type checked again.
+Nested classes are compared by their text only.
+"""
+
+import hashlib
+
+from typing import List, Optional, Tuple, cast
+
+from mypy.errors import ErrorInfo
+from mypy.nodes import (
+    MypyFile, Node, FuncDef, ClassDef, Decorator, MemberExpr, GlobalDecl, NonlocalDecl
+)
+from mypy.reparse import split_lines
+from mypy.traverser import TraverserVisitor
+
+
+class TopLevelDef:
+    """A chunk of the source text of a module starting with a top-level statement.
+
+    The chunk of a class definition is split further into the chunks of the
+    statements of the class body.
+
+    Attributes:
+      name:      Name of the function, if the statement is a function definition
+      line:      First line of the chunk
+      end_line:  Line after the last line of the chunk
+      text_hash: Hash of the text of the chunk (for a class with members, only of
+                 the lines before the first statement of the body)
+      signature: Description of the signature of the function, or of the names of
+                 the class (after semantic analysis)
+      members:   Chunks of the statements of the body of a class definition (None
+                 if the statement is not a class definition or its body can't be
+                 split)
+    """
+
+    def __init__(self, name: Optional[str], line: int, end_line: int, text_hash: str,
+                 members: List['TopLevelDef'] = None) -> None:
+        self.name = name
+        self.line = line
+        self.end_line = end_line
+        self.text_hash = text_hash
+        self.signature = None  # type: str
+        self.members = members
+
+
+def split_top_level_defs(tree: MypyFile, text: str) -> List[TopLevelDef]:
+    """Split the source text of a parsed module into chunks at the top-level statements.
+
+    Lines before the first statement belong to the first chunk. Return an
+    empty list if the lines of the statements are not in order.
+    """
+    lines = split_lines(text)
+    return split_defs(tree.defs, 1, len(lines) + 1, lines, True) or []
+
+
+def split_defs(defs: List[Node], first_line: int, end_line: int, lines: List[str],
+               split_classes: bool) -> Optional[List[TopLevelDef]]:
+    """Split the lines [first_line, end_line) into chunks at the given statements.
+
+    Return None if the lines of the statements are not in order.
+    """
+    starts = [first_line] + [d.line for d in defs[1:]]
+    if any(starts[i] > starts[i + 1] for i in range(len(starts) - 1)):
+        return None
+    result = []  # type: List[TopLevelDef]
+    for i, d in enumerate(defs):
+        end = starts[i + 1] if i + 1 < len(starts) else end_line
+        members = None  # type: List[TopLevelDef]
+        text_end = end
+        if split_classes and isinstance(d, ClassDef):
+            body = d.defs.body
+            if body and starts[i] <= d.line < body[0].line < end:
+                members = split_defs(body, body[0].line, end, lines, False)
+                if members is not None:
+                    text_end = body[0].line
+        chunk = ''.join(lines[starts[i] - 1:text_end - 1])
+        name = d.name() if isinstance(d, FuncDef) else None
+        result.append(TopLevelDef(name, starts[i], end,
+                                  hashlib.md5(chunk.encode('utf-8')).hexdigest(), members))
+    return result
+
+
+def set_signatures(defs: List[TopLevelDef], tree: MypyFile) -> None:
+    """Describe the signatures of the functions and classes of a semantically analyzed module."""
+    set_def_signatures(defs, tree.defs)
+
+
+def set_def_signatures(defs: List[TopLevelDef], nodes: List[Node]) -> None:
+    for d, node in zip(defs, nodes):
+        if isinstance(node, FuncDef):
+            d.signature = repr(([arg.variable.name() for arg in node.arguments],
+                                [arg.kind for arg in node.arguments],
+                                str(node.type)))
+        elif isinstance(node, ClassDef) and d.members is not None:
+            d.signature = repr(sorted((name, symbol.kind, str(symbol.type))
+                                      for name, symbol in node.info.names.items()))
+            set_def_signatures(d.members, node.defs.body)
+
+
+def reusable_functions(old: List[TopLevelDef], new: List[TopLevelDef],
+                       tree: MypyFile) -> Optional[List[Tuple[FuncDef, TopLevelDef,
+                                                              TopLevelDef]]]:
+    """Find the functions and methods of a module whose type checking results can be reused.
+
+    The module must have the same top-level statements and class members as
+    the previous version, apart from the bodies of functions and methods.
+    Return tuples (function, old chunk, new chunk) for the unchanged
+    functions, or None if the interface of the module may have changed.
+    """
+    result = []  # type: List[Tuple[FuncDef, TopLevelDef, TopLevelDef]]
+    if not new or not match_defs(old, new, tree.defs, result):
+        return None
+    return result
+
+
+def match_defs(old: List[TopLevelDef], new: List[TopLevelDef], nodes: List[Node],
+               result: List[Tuple[FuncDef, TopLevelDef, TopLevelDef]]) -> bool:
+    """Compare the chunks of two versions of a list of statements.
+
+    Add the unchanged functions to result. Return False if the statements
+    differ other than by the bodies of functions.
+    """
+    if len(old) != len(new):
+        return False
+    for old_def, new_def, node in zip(old, new, nodes):
+        if (old_def.name != new_def.name or old_def.signature != new_def.signature or
+                (old_def.members is None) != (new_def.members is None)):
+            return False
+        if old_def.name is None:
+            if old_def.text_hash != new_def.text_hash:
+                return False
+            if (old_def.members is not None and
+                    not match_defs(old_def.members, new_def.members,
+                                   cast(ClassDef, node).defs.body, result)):
+                return False
+        elif old_def.text_hash == new_def.text_hash:
+            if is_self_contained(cast(FuncDef, node)):
+                result.append((cast(FuncDef, node), old_def, new_def))
+        elif defines_attributes(cast(FuncDef, node)):
+            return False
+    return True
+
+
+def is_self_contained(defn: FuncDef) -> bool:
+    """Does type checking a function only affect the function itself?
+
+    Functions that redefine an earlier definition or assign names in
+    enclosing scopes can affect the types of other definitions, and so can
+    methods that define attributes.
+    """
+    if defn.original_def is not None:
+        return False
+    finder = ScopeDeclFinder()
+    defn.body.accept(finder)
+    return not finder.found
+
+
+def self_contained_functions(defs: List[Node]) -> List[FuncDef]:
+    """Return the self-contained functions and methods among statements and class bodies.
+
+    Decorated functions are included, but not overloaded ones.
+    """
+    result = []  # type: List[FuncDef]
+    for node in defs:
+        if isinstance(node, Decorator):
+            node = node.func
+        if isinstance(node, FuncDef):
+            if is_self_contained(node):
+                result.append(node)
+        elif isinstance(node, ClassDef):
+            result.extend(self_contained_functions(node.defs.body))
+    return result
+
+
+def defines_attributes(defn: FuncDef) -> bool:
+    finder = ScopeDeclFinder()
+    defn.body.accept(finder)
+    return finder.defines_attributes
+
+
+class ScopeDeclFinder(TraverserVisitor):
+    """Find global and nonlocal declarations and definitions of attributes."""
+
+    found = False
+    defines_attributes = False
+
+    def visit_global_decl(self, o: GlobalDecl) -> None:
+        self.found = True
+
+    def visit_nonlocal_decl(self, o: NonlocalDecl) -> None:
+        self.found = True
+
+    def visit_member_expr(self, o: MemberExpr) -> None:
+        if o.is_def:
+            self.found = self.defines_attributes = True
+        super().visit_member_expr(o)
+
+
+def moved_errors(infos: List[ErrorInfo], old: TopLevelDef, new: TopLevelDef,
+                 import_ctx: List[Tuple[str, int]]) -> List[ErrorInfo]:
+    """Return the errors reported within a chunk, moved to the lines of the new chunk."""
+    result = []  # type: List[ErrorInfo]
+    for info in infos:
+        if old.line <= info.line < old.end_line:
+            result.append(ErrorInfo(import_ctx, info.file, info.type, info.function_or_member,
+                                    info.line - old.line + new.line, info.severity,
+                                    info.message, info.blocker, info.only_once))
+    return result
@@ -0,0 +1,232 @@
+"""Incremental reparsing of a changed source file.
+
+When a file is edited, usually only a few of its top-level statements
+change. Instead of parsing the whole new text, reparse updates the parse
+tree of the previous version of the file: only the lines of the top-level
+statements that contain changes are lexed and parsed again, and the new
+nodes replace the old ones in the tree. If the changes are within the body
+of a class, only the changed statements of the body are parsed again. The
+nodes of the other statements are kept (their line numbers are moved if
+lines were added or removed before them), so unchanged FuncDef and ClassDef
+nodes keep their identity.
+
+The changed lines are found by comparing the old and new text line by line
+from the start and from the end. The new text is parsed from scratch if the
+changes can't be isolated, in particular if
+
+ * the first top-level statement changes (the lines before it may contain a
+   byte order mark, an encoding declaration or a '# mypy: weak' comment),
+ * the changed statements import from __future__,
+ * the changed lines don't parse as complete statements (for example, if
+   they contain an unclosed bracket or string, or an indented line that
+   continues a block of the previous statement), or
+ * a new function definition may be an overload variant of the adjacent
+   one.
+
+The previous tree must have been built by mypy.parse, and it must not have
+been semantically analyzed.
+"""
+
+from typing import Any, List, Optional, Set, Tuple, cast
+
+from mypy import defaults
+from mypy import parse
+from mypy.errors import Errors
+from mypy.nodes import (
+    MypyFile, Node, ClassDef, FuncDef, Decorator, OverloadedFuncDef, ImportFrom
+)
+from mypy.types import Type
+
+
+def reparse(tree: MypyFile, old_text: str, new_text: str, fnam: str = None,
+            errors: Errors = None,
+            pyversion: Tuple[int, int] = defaults.PYTHON3_VERSION,
+            custom_typing_module: str = None) -> MypyFile:
+    """Return the parse tree of new_text, given the tree of the old text of the file.
+
+    The tree is updated in place and returned, unless the new text has to be
+    parsed from scratch (see above). Errors are reported like in parse.parse.
+    """
+    if old_text == new_text:
+        return tree
+    old_lines = split_lines(old_text)
+    new_lines = split_lines(new_text)
+    delta = len(new_lines) - len(old_lines)
+    first_line, last_line = changed_lines(old_lines, new_lines)
+    defs = tree.defs
+    region = find_statements(defs, 1, len(old_lines) + 1, first_line, last_line)
+    if (region is None or region[0] == 0 or
+            any(is_future_import(d) for d in defs[region[0]:region[1]])):
+        return parse.parse(new_text, fnam, errors, pyversion=pyversion,
+                           custom_typing_module=custom_typing_module)
+    # If the changes are within the body of a class, only reparse the changed
+    # statements of the body. Enclosing statement lists are recorded with the
+    # index of the first statement after the changed ones.
+    enclosing = []  # type: List[Tuple[List[Node], int]]
+    indent = ''
+    while True:
+        first, last, start, end = region
+        if last - first != 1 or not isinstance(defs[first], ClassDef):
+            break
+        body = cast(ClassDef, defs[first]).defs.body
+        if not body or body[0].line <= defs[first].line or first_line < body[0].line:
+            break
+        region = find_statements(body, body[0].line, end, first_line, last_line)
+        if region is None:
+            return parse.parse(new_text, fnam, errors, pyversion=pyversion,
+                               custom_typing_module=custom_typing_module)
+        enclosing.append((defs, last))
+        defs = body
+        indent = indentation(old_lines[body[0].line - 1])
+    first, last, start, end = region
+    new_defs, part = parse_region(tree.defs, new_lines[start - 1:end - 1 + delta], start,
+                                  indent, fnam, pyversion, custom_typing_module)
+    if part is None or any(is_overload_pair(a, b) for a, b in zip(
+            defs[:first][-1:] + new_defs, new_defs + defs[last:last + 1])):
+        return parse.parse(new_text, fnam, errors, pyversion=pyversion,
+                           custom_typing_module=custom_typing_module)
+    imports_before = [imp for imp in tree.imports if imp.line < start]
+    imports_after = [imp for imp in tree.imports if imp.line >= end]
+    if delta:
+        for statements, index in enclosing + [(defs, last)]:
+            for node in statements[index:]:
+                shift_lines(node, delta, errors)
+    defs[first:last] = new_defs
+    tree.imports = imports_before + part.imports + imports_after
+    tree.ignored_lines = (set(line for line in tree.ignored_lines if line < start) |
+                          part.ignored_lines |
+                          set(line + delta for line in tree.ignored_lines if line >= end))
+    return tree
+
+
+def split_lines(text: str) -> List[str]:
+    """Split text into lines, keeping the line breaks.
+
+    Unlike str.splitlines, only '\\n' ends a line (as in the lexer).
+    """
+    lines = [line + '\n' for line in text.split('\n')]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        del lines[-1]
+    return lines
+
+
+def changed_lines(old_lines: List[str], new_lines: List[str]) -> Tuple[int, int]:
+    """Return the first and last old line that differ from the new lines.
+
+    If lines were only inserted, return the line before them if they are
+    indented (they probably continue the statement before them), and
+    otherwise the line after them.
+    """
+    prefix = 0
+    while (prefix < len(old_lines) and prefix < len(new_lines) and
+           old_lines[prefix] == new_lines[prefix]):
+        prefix += 1
+    suffix = 0
+    while (suffix < min(len(old_lines), len(new_lines)) - prefix and
+           old_lines[-1 - suffix] == new_lines[-1 - suffix]):
+        suffix += 1
+    if len(old_lines) - suffix > prefix:
+        return prefix + 1, len(old_lines) - suffix
+    code = [line for line in new_lines[prefix:len(new_lines) - suffix] if is_code(line)]
+    if prefix > 0 and (not code or indentation(code[0])):
+        return prefix, prefix
+    return prefix + 1, prefix + 1
+
+
+def find_statements(defs: List[Node], first_start: int, end_line: int, first_line: int,
+                    last_line: int) -> Optional[Tuple[int, int, int, int]]:
+    """Find the statements of a statement list that contain the lines [first_line, last_line].
+
+    Each statement spans the lines up to the next statement; the first one
+    starts at first_start and the last one ends at end_line. Return (first,
+    last, start, end): the statements are defs[first:last] and they span
+    the lines [start, end). Statements that start on the same line are never
+    separated. Return None if the statements are not in line order.
+    """
+    starts = [first_start] + [d.line for d in defs[1:]]
+    if any(starts[i] > starts[i + 1] for i in range(len(starts) - 1)):
+        return None
+    first = last = 0
+    for i, start in enumerate(starts):
+        if start <= first_line and (i == 0 or start > starts[i - 1]):
+            first = i
+        if start <= last_line:
+            last = i + 1
+    end = starts[last] if last < len(starts) else end_line
+    return first, last, starts[first], end
+
+
+def indentation(line: str) -> str:
+    return line[:len(line) - len(line.lstrip(' \t\f'))]
+
+
+def is_code(line: str) -> bool:
+    """Does a line contain something other than whitespace and a comment?"""
+    return bool(line.strip()) and not line.lstrip().startswith('#')
+
+
+def parse_region(module_defs: List[Node], lines: List[str], first_line: int, indent: str,
+                 fnam: str, pyversion: Tuple[int, int],
+                 custom_typing_module: str) -> Tuple[List[Node], Optional[MypyFile]]:
+    """Parse the changed lines of a file, starting at first_line.
+
+    If indent is not empty, the lines are statements of a class body with
+    that indentation. Return the statements and the parsed file, or None
+    as the file if the lines don't parse as complete statements.
+    """
+    text = ''.join(lines)
+    if indent:
+        code = [line for line in lines if is_code(line)]
+        if code and indentation(code[0]) != indent:
+            return [], None
+        # Parse the statements as the body of a class, on the lines before them.
+        text = 'class _:\n' + text
+        first_line -= 1
+    errors = Errors()
+    parser = parse.Parser(fnam, errors, pyversion, custom_typing_module,
+                          is_stub_file=bool(fnam) and fnam.endswith('.pyi'))
+    future_options = [name for d in module_defs if is_future_import(d)
+                      for name, _ in cast(ImportFrom, d).names]
+    part = parser.parse(text, first_line, future_options)
+    if errors.is_errors() or any(is_future_import(d) for d in part.defs):
+        return [], None
+    if not indent:
+        return part.defs, part
+    if len(part.defs) != 1 or not isinstance(part.defs[0], ClassDef):
+        return [], None
+    return cast(ClassDef, part.defs[0]).defs.body, part
+
+
+def is_future_import(node: Node) -> bool:
+    return isinstance(node, ImportFrom) and node.id == '__future__'
+
+
+def is_overload_pair(first: Node, second: Node) -> bool:
+    """Would the parser combine two adjacent statements into an overloaded function?"""
+    if not isinstance(second, Decorator):
+        return False
+    if isinstance(first, Decorator):
+        return first.func.name() == second.func.name()
+    return isinstance(first, OverloadedFuncDef) and first.name() == second.func.name()
+
+
+def shift_lines(node: Node, delta: int, errors: Errors = None) -> None:
+    """Add delta to the line numbers of the nodes and types in a parse tree.
+
+    Skipped function bodies (see parse.LazyBody) are parsed first, since they
+    refer to the tokens of the old text.
+    """
+    seen = set()  # type: Set[int]
+    stack = [node]  # type: List[Any]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif isinstance(obj, (Node, Type)) and id(obj) not in seen:
+            seen.add(id(obj))
+            if isinstance(obj, FuncDef) and obj.lazy_body is not None:
+                parse.load_lazy_body(obj, errors)
+            if obj.line > 0:
+                obj.line += delta
+            stack.extend(vars(obj).values())
@@ -5,7 +5,7 @@ import cgi
 import os
 import shutil
 
-from typing import Callable, Dict, List, Tuple, cast
+from typing import Any, Callable, Dict, List, Tuple, cast
 
 from mypy.nodes import MypyFile, Node, FuncDef
 from mypy import stats
@@ -57,6 +57,17 @@ class AbstractReporter(metaclass=ABCMeta):
     def on_finish(self) -> None:
         pass
 
+    def shard_data(self) -> Any:
+        """Return the data collected by on_file that on_finish uses (as JSON data).
+
+        This is used for merging the reports of several shards of a build.
+        """
+        return None
+
+    def add_shard_data(self, data: Any) -> None:
+        """Add data returned by shard_data (in another shard)."""
+        pass
+
 
 class FuncCounterVisitor(TraverserVisitor):
     def __init__(self) -> None:
@@ -99,6 +110,13 @@ class LineCountReporter(AbstractReporter):
                 f.write('{:7} {:7} {:6} {:6} {}\n'.format(
                     c[0], c[1], c[2], c[3], p))
 
+    def shard_data(self) -> Any:
+        return self.counts
+
+    def add_shard_data(self, data: Any) -> None:
+        for module, counts in data.items():
+            self.counts[module] = tuple(counts)
+
 reporter_classes['linecount'] = LineCountReporter
 
 
@@ -114,6 +132,12 @@ class OldHtmlReporter(AbstractReporter):
 
     def on_finish(self) -> None:
         stats.generate_html_index(self.output_dir)
+
+    def shard_data(self) -> Any:
+        return stats.html_files
+
+    def add_shard_data(self, data: Any) -> None:
+        stats.html_files.extend(tuple(item) for item in data)
 reporter_classes['old-html'] = OldHtmlReporter
 
 
@@ -210,6 +234,15 @@ class MemoryXmlReporter(AbstractReporter):
 
         self.last_xml = doc
 
+    def shard_data(self) -> Any:
+        return [(info.name, info.module, info.counts) for info in self.files]
+
+    def add_shard_data(self, data: Any) -> None:
+        for name, module, counts in data:
+            file_info = FileInfo(name, module)
+            file_info.counts = counts
+            self.files.append(file_info)
+
 reporter_classes['memory-xml'] = MemoryXmlReporter
 
 
@@ -74,6 +74,7 @@ from mypy.nodes import function_type, implicit_module_attrs
 from mypy.typeanal import TypeAnalyser, TypeAnalyserPass3, analyze_type_alias
 from mypy.exprtotype import expr_to_unanalyzed_type, TypeTranslationError
 from mypy.lex import lex
+from mypy.parse import load_lazy_body
 from mypy.parsetype import parse_type
 from mypy.sametypes import is_same_type
 from mypy import defaults
@@ -183,6 +184,9 @@ class SemanticAnalyzer(NodeVisitor):
     is_stub_file = False   # Are we analyzing a stub file?
     imports = None  # type: Set[str]  # Imported modules (during phase 2 analysis)
     errors = None  # type: Errors     # Keeps track of generated errors
+    # Fully qualified names of the symbols read from other modules (or None if
+    # they aren't recorded). The name of a module stands for all its symbols.
+    symbol_deps = None  # type: Set[str]
 
     def __init__(self, lib_path: List[str], errors: Errors,
                  pyversion: Tuple[int, int] = defaults.PYTHON3_VERSION) -> None:
@@ -459,6 +463,10 @@ class SemanticAnalyzer(NodeVisitor):
         # instance type.
         if is_method and not defn.is_static and not defn.is_class and defn.arguments:
             defn.arguments[0].variable.is_self = True
+            if (isinstance(defn, FuncDef) and defn.lazy_body is not None and
+                    defn.lazy_body.may_define_attributes(defn.arguments[0].variable.name())):
+                # Attributes defined in the body are part of the class.
+                load_lazy_body(defn, self.errors)
 
         # First analyze body of the function but ignore nested functions.
         self.postpone_nested_functions_stack.append(FUNCTION_FIRST_PHASE_POSTPONE_SECOND)
@@ -753,6 +761,10 @@ class SemanticAnalyzer(NodeVisitor):
                 defn.info.mro.append(self.object_type().type)
         # The property of falling back to Any is inherited.
         defn.info.fallback_to_any = any(baseinfo.fallback_to_any for baseinfo in defn.info.mro)
+        # The class inherits the members of all the classes in its MRO, not just
+        # of the direct bases. The hash of a class covers its members.
+        for baseinfo in defn.info.mro[1:]:
+            self.record_symbol_dep(baseinfo.fullname())
 
     def expr_to_analyzed_type(self, expr: Node) -> Type:
         if isinstance(expr, CallExpr):
@@ -867,6 +879,7 @@ class SemanticAnalyzer(NodeVisitor):
         if import_id in self.modules:
             module = self.modules[import_id]
             for id, as_id in imp.names:
+                self.record_symbol_dep(import_id + '.' + id)
                 node = module.names.get(id)
                 if node and node.kind != UNBOUND_IMPORTED:
                     node = self.normalize_type_alias(node, imp)
@@ -945,6 +958,7 @@ class SemanticAnalyzer(NodeVisitor):
     def visit_import_all(self, i: ImportAll) -> None:
         i_id = self.correct_relative_import(i)
         if i_id in self.modules:
+            self.record_symbol_dep(i_id)
             m = self.modules[i_id]
             for name, node in m.names.items():
                 node = self.normalize_type_alias(node, i)
@@ -1821,6 +1835,7 @@ class SemanticAnalyzer(NodeVisitor):
         if isinstance(base, RefExpr) and cast(RefExpr,
                                               base).kind == MODULE_REF:
             file = cast(MypyFile, cast(RefExpr, base).node)
+            self.record_symbol_dep(file.fullname() + '.' + expr.name)
             names = file.names
             n = names.get(expr.name, None)
             if n:
@@ -1972,7 +1987,7 @@ class SemanticAnalyzer(NodeVisitor):
         # 1a. Name declared using 'global x' takes precedence
         if name in self.global_decls[-1]:
             if name in self.globals:
-                return self.globals[name]
+                return self.global_symbol(self.globals[name])
             else:
                 self.name_not_defined(name, ctx)
                 return None
@@ -1993,7 +2008,7 @@ class SemanticAnalyzer(NodeVisitor):
                 return table[name]
         # 4. Current file global scope
         if name in self.globals:
-            return self.globals[name]
+            return self.global_symbol(self.globals[name])
         # 5. Builtins
         b = self.globals.get('__builtins__', None)
         if b:
@@ -2002,6 +2017,7 @@ class SemanticAnalyzer(NodeVisitor):
                 if name[0] == "_" and name[1] != "_":
                     self.name_not_defined(name, ctx)
                     return None
+                self.record_symbol_dep('builtins.' + name)
                 node = table[name]
                 return node
         # Give up.
@@ -2009,6 +2025,16 @@ class SemanticAnalyzer(NodeVisitor):
         self.check_for_obsolete_short_name(name, ctx)
         return None
 
+    def global_symbol(self, symbol: SymbolTableNode) -> SymbolTableNode:
+        """Record a global symbol as read if it was imported from another module."""
+        if symbol.kind != MODULE_REF:
+            self.record_symbol_dep(symbol.fullname)
+        return symbol
+
+    def record_symbol_dep(self, fullname: str) -> None:
+        if self.symbol_deps is not None and fullname:
+            self.symbol_deps.add(fullname)
+
     def check_for_obsolete_short_name(self, name: str, ctx: Context) -> None:
         matches = [obsolete_name
                    for obsolete_name in obsolete_name_mapping
@@ -2041,6 +2067,7 @@ class SemanticAnalyzer(NodeVisitor):
                             result = n.node.get(parts[i])
                         n = result
                     elif isinstance(n.node, MypyFile):
+                        self.record_symbol_dep(n.node.fullname() + '.' + parts[i])
                         n = n.node.names.get(parts[i], None)
                     # TODO: What if node is Var or FuncDef?
                     if not n:
@@ -2062,6 +2089,7 @@ class SemanticAnalyzer(NodeVisitor):
         module namespace is ignored.
         """
         assert '.' in name
+        self.record_symbol_dep(name)
         parts = name.split('.')
         n = self.modules[parts[0]]
         for i in range(1, len(parts) - 1):
@@ -2075,6 +2103,7 @@ class SemanticAnalyzer(NodeVisitor):
         module namespace is ignored.
         """
         assert '.' in name
+        self.record_symbol_dep(name)
         parts = name.split('.')
         n = self.modules[parts[0]]
         for i in range(1, len(parts) - 1):
@@ -0,0 +1,95 @@
+"""In-process API for type checking a program repeatedly.
+
+A Session keeps the modules analyzed by the most recent check in memory
+(like the resident daemon, see mypy.daemon), so a later check only processes
+the modules that have changed and the modules that depend on them. Editor
+integrations can give the contents of unsaved buffers as overlays, which are
+used instead of the contents of the files:
+
+  session = Session([BuildSource('main.py', None, None)])
+  session.check()
+  session.set_overlay('lib.py', buffer_text)
+  for error in session.check_file('lib.py'):
+      print(error.line, error.message)
+
+The errors are returned as ErrorInfo objects; their file paths are relative
+to the working directory if possible.
+"""
+
+import os
+
+from typing import Dict, Iterable, List
+
+from mypy import build
+from mypy.build import BuildSource
+from mypy.errors import CompileError, ErrorInfo
+from mypy.main import Options
+
+
+class Session:
+    """Type check a program, reusing the results of the previous check.
+
+    Attributes:
+      sources:  Sources to type check
+      options:  Options used for each check
+      overlays: Map from absolute file path to the source text used instead of
+                the contents of the file
+      manager:  Build manager of the most recent check that didn't fail with a
+                blocking error (or None)
+      errors:   Errors reported by the most recent check
+    """
+
+    def __init__(self, sources: List[BuildSource], options: Options = None,
+                 bin_dir: str = None) -> None:
+        self.sources = sources
+        self.options = options or Options()
+        self.bin_dir = bin_dir
+        self.overlays = {}  # type: Dict[str, str]
+        self.manager = None  # type: build.BuildManager
+        self.errors = []  # type: List[ErrorInfo]
+
+    def set_overlay(self, path: str, text: str) -> None:
+        """Use text as the contents of a file in later checks."""
+        self.overlays[os.path.abspath(path)] = text
+
+    def remove_overlay(self, path: str) -> None:
+        """Use the contents of a file again in later checks."""
+        self.overlays.pop(os.path.abspath(path), None)
+
+    def check(self, changed: Iterable[str] = ()) -> List[ErrorInfo]:
+        """Type check the program and return the errors.
+
+        The files in changed are processed again even if they seem unchanged.
+        Files whose contents (or overlays) differ from the previous check are
+        processed again in any case.
+        """
+        try:
+            result = build.build(sources=self.sources,
+                                 target=build.TYPE_CHECK,
+                                 bin_dir=self.bin_dir,
+                                 pyversion=self.options.pyversion,
+                                 custom_typing_module=self.options.custom_typing_module,
+                                 flags=self.options.build_flags + [build.RESIDENT],
+                                 python_path=self.options.python_path,
+                                 cache_dir=self.options.cache_dir,
+                                 previous=self.manager,
+                                 changed_paths=changed,
+                                 jobs=self.options.jobs,
+                                 overlays=self.overlays)
+        except CompileError as e:
+            # A blocking error; the previous build can still be reused next time.
+            self.errors = e.error_infos or []
+            return self.errors
+        self.manager = result.manager
+        self.errors = self.manager.errors.error_info
+        return self.errors
+
+    def check_file(self, path: str, text: str = None) -> List[ErrorInfo]:
+        """Type check the program and return the errors in a file.
+
+        If text is given, it is used as the contents of the file (as an overlay).
+        """
+        if text is not None:
+            self.set_overlay(path, text)
+        path = os.path.abspath(path)
+        return [error for error in self.check() if os.path.abspath(error.file) == path]
@@ -0,0 +1,209 @@
+"""Type checking a program in several shards and merging the results.
+
+With --shard K/N, all modules of the program are still parsed and
+semantically analyzed, but only the modules that belong to shard K (out of
+N) are type checked and passed to the reporters. Modules of other shards are
+only type checked if a module of the shard depends on them (since the types
+inferred for them may be needed), and their errors are discarded. Only their
+interfaces are needed, so the bodies of functions and methods that don't
+affect other definitions are skipped (see mypy.recheck). Which shard a
+module belongs to depends only on its id.
+
+Each shard writes its errors and report data to a JSON file:
+
+  {"format": 1,
+   "shard": [K, N],
+   "errors": [<error>, ...],
+   "checks": [[<module id>, <start>, <end>], ...],
+   "report_dirs": {<report type>: <directory>, ...},
+   "reports": {<report type>: <data>, ...}}
+
+The errors are in the order they were reported. Paths are relative to the
+working directory of the shard where possible. Each item of checks gives
+the range of the errors reported while type checking a module (which is
+empty for modules of other shards), in the order the modules were type
+checked. Since the order is the same in all shards, the errors of a single
+build are obtained by inserting the type checking errors of each shard into
+the other errors (which all shards report).
+
+Usage:
+
+  python -m mypy.shard OUTPUT_FILES...
+
+writes the messages a single build would have written, finishes the
+reports and exits with the status of a single build. The per-file outputs
+of the reporters are written by each shard, so the report directories of
+the shards should be combined for the reports to be complete.
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+from typing import Any, Dict, List, Tuple
+
+from mypy.errors import Errors, ErrorInfo, remove_path_prefix
+from mypy.report import Reports
+
+
+# Version of the format of shard output files.
+SHARD_FORMAT_VERSION = 1
+
+
+class ShardError(Exception):
+    """Raised if shard output files can't be read or merged."""
+
+
+def parse_shard(arg: str) -> Tuple[int, int]:
+    """Parse a shard given as K/N; raise ValueError if it isn't valid."""
+    index, _, count = arg.partition('/')
+    shard = int(index), int(count)
+    if not 1 <= shard[0] <= shard[1]:
+        raise ValueError('Invalid shard {}'.format(arg))
+    return shard
+
+
+def shard_of(id: str, num_shards: int) -> int:
+    """Return the shard (1 to num_shards) that a module belongs to.
+
+    The result doesn't depend on the Python process (unlike hash()).
+    """
+    digest = hashlib.md5(id.encode('utf-8')).hexdigest()
+    return int(digest, 16) % num_shards + 1
+
+
+def error_info_to_json(info: ErrorInfo, ignore_prefix: str) -> Dict[str, Any]:
+    return {'import_ctx': [[remove_path_prefix(path, ignore_prefix), line]
+                           for path, line in info.import_ctx],
+            'file': info.file,
+            'type': info.type,
+            'function_or_member': info.function_or_member,
+            'line': info.line,
+            'severity': info.severity,
+            'message': info.message,
+            'blocker': info.blocker,
+            'only_once': info.only_once}
+
+
+def error_info_from_json(data: Dict[str, Any]) -> ErrorInfo:
+    return ErrorInfo([(path, line) for path, line in data['import_ctx']],
+                     data['file'], data['type'], data['function_or_member'], data['line'],
+                     data['severity'], data['message'], data['blocker'], data['only_once'])
+
+
+def write_output(path: str, shard: Tuple[int, int], errors: Errors,
+                 checks: List[Tuple[str, int, int]], reports: Reports,
+                 report_dirs: Dict[str, str]) -> None:
+    """Write the errors and report data of a shard to a file."""
+    data = {
+        'format': SHARD_FORMAT_VERSION,
+        'shard': list(shard),
+        'errors': [error_info_to_json(info, errors.ignore_prefix)
+                   for info in errors.error_info],
+        'checks': [list(check) for check in checks],
+        'report_dirs': report_dirs,
+        'reports': dict((name, reporter.shard_data())
+                        for name, reporter in reports.named_reporters.items()),
+    }
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def read_output(path: str) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError) as err:
+        raise ShardError('Cannot read shard output {}: {}'.format(path, err))
+    if not isinstance(data, dict) or data.get('format') != SHARD_FORMAT_VERSION:
+        raise ShardError('{} is not a shard output file'.format(path))
+    return data
+
+
+def split_errors(data: Dict[str, Any]) -> Tuple[List[Dict[str, Any]],
+                                                List[Tuple[str, int, List[Dict[str, Any]]]]]:
+    """Separate the type checking errors of a shard from the other errors.
+
+    Return tuple (other errors, checks) where each check is a tuple (module id,
+    position in other errors, type checking errors).
+    """
+    errors = data['errors']
+    common = []  # type: List[Dict[str, Any]]
+    checks = []  # type: List[Tuple[str, int, List[Dict[str, Any]]]]
+    pos = 0
+    for id, start, end in data['checks']:
+        common.extend(errors[pos:start])
+        checks.append((id, len(common), errors[start:end]))
+        pos = end
+    common.extend(errors[pos:])
+    return common, checks
+
+
+def merge(paths: List[str], data_dir: str) -> List[str]:
+    """Merge the outputs of all shards of a build.
+
+    Return the messages of the build. Finish the reports.
+    """
+    outputs = [read_output(path) for path in paths]
+    if not outputs:
+        raise ShardError('No shard outputs given')
+    num_shards = outputs[0]['shard'][1]
+    shards = sorted(output['shard'][0] for output in outputs)
+    if (any(output['shard'][1] != num_shards for output in outputs) or
+            shards != list(range(1, num_shards + 1))):
+        raise ShardError('Expected the outputs of shards 1 to {} (got {})'.format(
+            num_shards, ', '.join('{}/{}'.format(*output['shard']) for output in outputs)))
+
+    common, checks = split_errors(outputs[0])
+    check_errors = {}  # type: Dict[str, List[Dict[str, Any]]]
+    for output in outputs:
+        other_common, other_checks = split_errors(output)
+        if (other_common != common or
+                [check[:2] for check in other_checks] != [check[:2] for check in checks]):
+            raise ShardError('The shard outputs are not from the same build')
+        for id, _, infos in other_checks:
+            if infos:
+                check_errors[id] = infos
+
+    errors = Errors()
+    errors.set_ignore_prefix(os.getcwd())
+    pos = 0
+    for id, check_pos, _ in checks:
+        errors.copy_error_infos([error_info_from_json(info) for info in common[pos:check_pos]])
+        errors.copy_error_infos([error_info_from_json(info)
+                                 for info in check_errors.get(id, [])])
+        pos = check_pos
+    errors.copy_error_infos([error_info_from_json(info) for info in common[pos:]])
+
+    reports = Reports(data_dir, outputs[0]['report_dirs'])
+    for output in outputs:
+        for name, data in output['reports'].items():
+            reports.add_report(name, '<memory>').add_shard_data(data)
+    reports.finish()
+    return errors.messages()
+
+
+def main(script_path: str = None) -> None:
+    # These modules import this module.
+    from mypy.build import default_data_dir
+    from mypy.main import find_bin_directory
+    if len(sys.argv) < 2 or sys.argv[1].startswith('-'):
+        sys.stderr.write('usage: python -m mypy.shard OUTPUT_FILES...\n')
+        sys.exit(2)
+    bin_dir = find_bin_directory(script_path) if script_path else None
+    try:
+        messages = merge(sys.argv[1:], default_data_dir(bin_dir))
+    except ShardError as err:
+        sys.stderr.write('{}\n'.format(err))
+        sys.exit(2)
+    for message in messages:
+        print(message)
+    sys.exit(1 if messages else 0)
+
+
+if __name__ == '__main__':
+    main()
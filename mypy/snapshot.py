@@ -0,0 +1,138 @@
+"""Precompiled snapshot of the analyzed library stubs.
+
+Every build parses, semantically analyzes and type checks builtins, typing
+and the other library stubs that the program imports, even though the stubs
+only change when typeshed is updated. A snapshot stores the analyzed
+interfaces of the stubs in a single file, in the format of the incremental
+cache (see mypy.cache). It is written by analyzing the stubs once:
+
+  python -m mypy.snapshot [--python-version x.y] [-o FILE] [MODULE ...]
+
+By default, all stubs in the typeshed directories are included, and the
+snapshot is written to the data directory, where build() looks for it. A
+module is loaded from the snapshot if its stub file hasn't changed and the
+interfaces of its dependencies are the same as when the snapshot was
+written; other modules are processed normally.
+"""
+
+import argparse
+import os
+import re
+import sys
+
+from typing import List, Set, Tuple, cast
+
+from mypy import build
+from mypy import cache
+from mypy import defaults
+from mypy.build import BuildSource, ParsedFile
+from mypy.errors import CompileError
+from mypy.nodes import MypyFile
+
+
+def stub_modules(dirs: List[str]) -> List[str]:
+    """Return the ids of the modules in stub directories (in sorted order)."""
+    ids = set()  # type: Set[str]
+    for dir in dirs:
+        for root, subdirs, files in os.walk(dir):
+            package = os.path.relpath(root, dir).split(os.sep)
+            if package == ['.']:
+                package = []
+            elif not all(component.isidentifier() for component in package):
+                continue
+            for file in files:
+                name, ext = os.path.splitext(file)
+                if ext not in build.PYTHON_EXTENSIONS or not name.isidentifier():
+                    continue
+                id = '.'.join(package if name == '__init__' else package + [name])
+                # The Python 2 builtins stub is analyzed as module builtins.
+                if id and id != '__builtin__':
+                    ids.add(id)
+    return sorted(ids)
+
+
+def write_snapshot(path: str, stub_dirs: List[str], modules: List[str] = None,
+                   pyversion: Tuple[int, int] = defaults.PYTHON3_VERSION,
+                   flags: List[str] = None, bin_dir: str = None) -> List[str]:
+    """Analyze library stubs and write a snapshot of them.
+
+    Analyze the given modules, or all modules in stub_dirs, together with the
+    modules they import. Modules with errors are left out of the snapshot.
+    Return the error messages. Raise CompileError on a blocking error.
+    """
+    if modules is None:
+        modules = stub_modules(stub_dirs)
+    sources = []  # type: List[BuildSource]
+    for id in modules:
+        file = build.find_module(id, stub_dirs)
+        if file is not None:
+            sources.append(BuildSource(file, id, None))
+    # Keep the state of the modules instead of failing on errors. Don't use
+    # an earlier snapshot, so that all modules are analyzed.
+    result = build.build(sources=sources,
+                         target=build.TYPE_CHECK,
+                         bin_dir=bin_dir,
+                         pyversion=pyversion,
+                         flags=(flags or []) + [build.RESIDENT],
+                         snapshot_path='')
+    manager = result.manager
+    entries = []  # type: List[Tuple[cache.CacheMeta, MypyFile]]
+    for state in manager.states:
+        if (state.path != '<string>' and state.id in manager.source_hashes and
+                not manager.errors.is_errors_for_file(state.path)):
+            entries.append((manager.cache_meta(state), cast(ParsedFile, state).tree))
+    for id in cache.write_snapshot(path, pyversion, entries, manager.semantic_analyzer.modules):
+        manager.log('Could not include {} in the snapshot'.format(id))
+    return manager.errors.messages()
+
+
+def typeshed_dirs(data_dir: str, pyversion: Tuple[int, int]) -> List[str]:
+    """Return the typeshed directories of the default library path."""
+    typeshed = os.path.join(data_dir, 'typeshed')
+    return [dir for dir in build.default_lib_path(data_dir, pyversion, False)
+            if os.path.abspath(dir).startswith(os.path.abspath(typeshed) + os.sep)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='mypy.snapshot',
+                                     description='Write a snapshot of the analyzed '
+                                                 'library stubs.')
+
+    def parse_version(v: str) -> Tuple[int, int]:
+        m = re.match(r'\A(\d)\.(\d+)\Z', v)
+        if not m:
+            raise argparse.ArgumentTypeError(
+                "Invalid python version '{}' (expected format: 'x.y')".format(v))
+        return int(m.group(1)), int(m.group(2))
+
+    parser.add_argument('--python-version', type=parse_version, metavar='x.y',
+                        default=defaults.PYTHON3_VERSION, help='use Python x.y')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='write the snapshot to FILE (default: the snapshot '
+                             'directory of the data directory)')
+    parser.add_argument('-v', '--verbose', action='count', help='more verbose messages')
+    parser.add_argument('modules', nargs='*',
+                        help='stub modules to include (default: all typeshed modules)')
+    args = parser.parse_args()
+
+    pyversion = args.python_version
+    data_dir = build.default_data_dir(None)
+    path = args.output or build.default_snapshot_path(data_dir, pyversion)
+    flags = (args.verbose or 0) * [build.VERBOSE]
+    try:
+        messages = write_snapshot(path, typeshed_dirs(data_dir, pyversion),
+                                  args.modules or None, pyversion, flags)
+    except CompileError as err:
+        for message in err.messages:
+            sys.stderr.write(message + '\n')
+        sys.exit(1)
+    except cache.CacheError as err:
+        sys.stderr.write('Could not write {}: {}\n'.format(path, err))
+        sys.exit(1)
+    for message in messages:
+        print(message)
+    print('Wrote {}'.format(path))
+
+
+if __name__ == '__main__':
+    main()
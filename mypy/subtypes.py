@@ -16,6 +16,9 @@ from mypy.maptype import map_instance_to_supertype
 
 TypeParameterChecker = Callable[[Type, Type, int], bool]
 
+# Number of is_subtype calls (for the timing report)
+subtype_checks = 0
+
 
 def check_type_parameter(lefta: Type, righta: Type, variance: int) -> bool:
     if variance == COVARIANT:
@@ -39,6 +42,8 @@ def is_subtype(left: Type, right: Type,
     between the type arguments (e.g., A and B), taking the variance of the
     type var into account.
     """
+    global subtype_checks
+    subtype_checks += 1
     if (isinstance(right, AnyType) or isinstance(right, UnboundType)
             or isinstance(right, ErasedType)):
         return True
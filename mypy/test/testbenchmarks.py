@@ -0,0 +1,63 @@
+"""Test cases for the benchmark programs and runner (benchmarks package)."""
+
+import os
+
+from contextlib import redirect_stderr
+from io import StringIO
+
+from benchmarks import compare, lexer, runner
+from benchmarks.generators import BENCHMARKS, Program
+from mypy import build
+from mypy.myunit import Suite, assert_equal, assert_true
+
+
+class BenchmarkSuite(Suite):
+    def test_programs_type_check(self) -> None:
+        benchmarks = [benchmark for benchmark in BENCHMARKS if not benchmark.full_stubs]
+        results = runner.run(benchmarks, scale=0.02, flags=[build.TEST_BUILTINS])
+        assert_equal(results['format'], runner.RESULTS_FORMAT_VERSION)
+        assert_equal(sorted(results['benchmarks']),
+                     sorted(benchmark.name for benchmark in benchmarks))
+        for name, result in results['benchmarks'].items():
+            assert_equal(result['errors'], 0, name)
+            assert_true(result['peak_rss_kb'] > 0)
+            assert_true('check' in result['phases'])
+        chain = results['benchmarks']['import_chain']
+        # The modules of the chain, the main module and builtins
+        assert_equal(chain['modules'], chain['size'] + 2)
+
+    def test_failing_run(self) -> None:
+        if not hasattr(os, 'fork'):
+            return
+        # The module can't be written, since its directory doesn't exist.
+        program = Program({'__main__': 'import x\n', 'missing/x': ''})
+        stderr = StringIO()
+        message = None
+        with redirect_stderr(stderr):
+            try:
+                runner.run_once(program, [build.TEST_BUILTINS])
+            except RuntimeError as e:
+                message = str(e)
+        assert_equal(message, 'Benchmark process failed with exit status 1')
+
+    def test_compare(self) -> None:
+        old = {'a': {'size': 10, 'errors': 0, 'wall': 1.0, 'peak_rss_kb': 1000},
+               'b': {'size': 10, 'errors': 0, 'wall': 1.0, 'peak_rss_kb': 1000}}
+        new = {'a': {'size': 10, 'errors': 0, 'wall': 1.05, 'peak_rss_kb': 1000},
+               'b': {'size': 10, 'errors': 0, 'wall': 1.5, 'peak_rss_kb': 900}}
+        old['c'] = {'size': 10, 'errors': 0, 'wall': 1.0, 'peak_rss_kb': 1000}
+        new['c'] = {'size': 20, 'errors': 1, 'wall': 2.0, 'peak_rss_kb': 1000}
+        table, regressions = compare.compare(old, new, 0.1)
+        assert_equal(table[2:], ['a peak_rss_kb            1000.000     1000.000    1.00',
+                                 'b wall                      1.000        1.500    1.50',
+                                 'b peak_rss_kb            1000.000      900.000    0.90',
+                                 'c                    (sizes differ: 10 and 20)'])
+        assert_equal(regressions, ['b: wall grew by 50%'])
+
+    def test_lexer_engines_agree(self) -> None:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(lexer.__file__)))
+        sources = lexer.find_sources([os.path.join(root, 'lib-python')])
+        assert_true(sources)
+        assert_equal(lexer.different_files(sources), [])
+        results = lexer.measure(sources[:2], runs=1)
+        assert_equal(results['scanner']['tokens'], results['dispatch']['tokens'])
@@ -0,0 +1,665 @@
+"""Test cases for the build manager (mypy.build)."""
+
+import json
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+
+from contextlib import redirect_stdout
+from io import StringIO
+from typing import Dict, List, Tuple
+
+from mypy import build
+from mypy import cache
+from mypy import profiling
+from mypy import shard
+from mypy import snapshot
+from mypy import timing
+from mypy.build import BuildSource
+from mypy.errors import CompileError
+from mypy.main import process_options
+from mypy.myunit import Suite, AssertionFailure, assert_equal, assert_true
+
+
+class SchedulerSuite(Suite):
+    def set_up(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tear_down(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def build_chain(self, n: int) -> build.BuildManager:
+        """Build a program with n modules where each module imports the previous ones."""
+        for i in range(n):
+            imports = ''.join('import m{}\n'.format(j) for j in (i - 1, i // 2) if j >= 0)
+            with open(os.path.join(self.temp_dir, 'm{}.py'.format(i)), 'w') as f:
+                f.write(imports + 'def f() -> int: pass\n')
+        program = ''.join('import m{}\n'.format(i) for i in range(n))
+        result = build.build(sources=[BuildSource('main', '__main__', program)],
+                             target=build.TYPE_CHECK,
+                             flags=[build.TEST_BUILTINS],
+                             alt_lib_path=self.temp_dir)
+        return result.manager
+
+    def test_scheduling_overhead_is_linear(self) -> None:
+        small = self.build_chain(20).scheduler_stats
+        large = self.build_chain(80).scheduler_stats
+        # Each module (including main and builtins) goes through four state transitions.
+        assert_equal(small['processed'], 4 * 22)
+        assert_equal(large['processed'], 4 * 82)
+        assert_equal(large['components'], 82)
+        assert_equal(large['graph_updates'], 0)
+        assert_true(large['dependency_checks'] < 5 * small['dependency_checks'])
+
+    def test_import_cycles_are_processed_together(self) -> None:
+        with open(os.path.join(self.temp_dir, 'a.py'), 'w') as f:
+            f.write('import b\nclass A: pass\ndef f() -> b.B: pass\n')
+        with open(os.path.join(self.temp_dir, 'b.py'), 'w') as f:
+            f.write('import a\nclass B(a.A): pass\n')
+        result = build.build(sources=[BuildSource('main', '__main__', 'import a\n')],
+                             target=build.TYPE_CHECK,
+                             flags=[build.TEST_BUILTINS],
+                             alt_lib_path=self.temp_dir)
+        # builtins, the cycle a <-> b and the main module
+        assert_equal(result.manager.scheduler_stats['components'], 3)
+
+
+class StronglyConnectedComponentsSuite(Suite):
+    def test_components_in_topological_order(self) -> None:
+        edges = {'a': ['b'], 'b': ['c', 'd'], 'c': ['b'], 'd': ['x'], 'e': ['e']}
+        components = build.strongly_connected_components(['a', 'b', 'c', 'd', 'e'], edges)
+        assert_equal([sorted(c) for c in components], [['d'], ['b', 'c'], ['a'], ['e']])
+
+    def test_long_chain(self) -> None:
+        n = 5000
+        edges = dict((str(i), [str(i + 1)] if i + 1 < n else ['0']) for i in range(n))
+        components = build.strongly_connected_components([str(i) for i in range(n)], edges)
+        assert_equal(len(components), 1)
+        assert_equal(len(components[0]), n)
+
+
+class ParallelParsingSuite(Suite):
+    def set_up(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tear_down(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, files: Dict[str, str]) -> None:
+        for name, text in files.items():
+            with open(os.path.join(self.temp_dir, name), 'w') as f:
+                f.write(text)
+
+    def build(self, program: str, jobs: int) -> List[str]:
+        try:
+            result = build.build(sources=[BuildSource('main', '__main__', program)],
+                                 target=build.TYPE_CHECK,
+                                 flags=[build.TEST_BUILTINS, build.RESIDENT],
+                                 alt_lib_path=self.temp_dir,
+                                 jobs=jobs)
+        except CompileError as e:
+            return e.messages
+        assert_equal(result.manager.parse_futures, {})
+        return result.manager.errors.messages()
+
+    def test_same_errors_as_serial_build(self) -> None:
+        self.write({'a.py': 'import b\nimport c\nx = b.f()  # type: str\n',
+                    'b.py': 'import c\ndef f() -> int: return c.g()\n',
+                    'c.py': 'import d\ndef g() -> str: pass\n'})
+        program = 'import a\nimport c\na.x + 1\n'
+        messages = self.build(program, jobs=1)
+        assert_true(len(messages) > 3)
+        assert_equal(self.build(program, jobs=3), messages)
+
+    def test_parse_error_in_worker(self) -> None:
+        self.write({'a.py': 'import b\n', 'b.py': 'def f(:\n'})
+        messages = self.build('import a\n', jobs=2)
+        assert_equal(messages, self.build('import a\n', jobs=1))
+        assert_true(any('Parse error' in message for message in messages))
+
+    def test_modules_found_by_import_scanner(self) -> None:
+        self.write({'a.py': 'import b\nMYPY = 0\nif MYPY:\n    pass\nelse:\n    import d\n',
+                    'b.py': 'from c import f\nx = f()  # type: str\n',
+                    'c.py': 'def f() -> int: pass\n',
+                    'd.py': 'x = 1  # type: str\n'})
+        result = build.build(sources=[BuildSource('main', '__main__', 'import a\n')],
+                             target=build.TYPE_CHECK,
+                             flags=[build.TEST_BUILTINS, build.RESIDENT],
+                             alt_lib_path=self.temp_dir,
+                             jobs=2)
+        stats = result.manager.scheduler_stats
+        # The unreachable import of d is predicted but not used.
+        assert_equal(stats['prescanned'], 5)
+        assert_equal(stats['prescan_hits'], 4)
+        assert_true('d' not in result.manager.module_files)
+        assert_equal(result.manager.errors.messages(), self.build('import a\n', jobs=1))
+
+
+class ParallelCheckSuite(Suite):
+    def set_up(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tear_down(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def build(self, modules: Dict[str, str], flags: List[str]) -> build.BuildManager:
+        sources = []  # type: List[BuildSource]
+        for id, text in sorted(modules.items()):
+            path = os.path.join(self.temp_dir, id + '.py')
+            with open(path, 'w') as f:
+                f.write(text)
+            if id.startswith('root'):
+                sources.append(BuildSource(path, id, None))
+        result = build.build(sources=sources,
+                             target=build.TYPE_CHECK,
+                             flags=[build.TEST_BUILTINS] + flags,
+                             alt_lib_path=self.temp_dir,
+                             jobs=3)
+        return result.manager
+
+    def messages(self, modules: Dict[str, str], flags: List[str]) -> List[str]:
+        try:
+            self.build(modules, flags)
+        except CompileError as e:
+            return e.messages
+        return []
+
+    def program(self, errors: bool) -> Dict[str, str]:
+        modules = {'shared': 'def f() -> int: pass\n'}
+        for i in range(5):
+            modules['root{}'.format(i)] = 'import shared\nimport private{}\n'.format(i)
+            modules['private{}'.format(i)] = 'import shared\ndef g() -> None: pass\n'
+            if errors:
+                modules['root{}'.format(i)] += ('x = shared.f()  # type: str\n'
+                                               'private{}.g(1)\n').format(i)
+                modules['private{}'.format(i)] += 'y = shared.f() + ""\n'
+        return modules
+
+    def test_groups(self) -> None:
+        manager = self.build(self.program(errors=False), [build.PARALLEL_CHECK])
+        assert_true('shared' not in manager.check_groups)
+        assert_equal(manager.check_groups['private1'], manager.check_groups['root1'])
+        assert_true(manager.check_groups['root1'] != manager.check_groups['root2'])
+        assert_equal(manager.deferred_checks, [])
+        for state in manager.states:
+            assert_equal(state.state(), build.TYPE_CHECKED_STATE)
+
+    def test_same_errors_as_serial_build(self) -> None:
+        program = self.program(errors=True)
+        messages = self.messages(program, [build.PARALLEL_CHECK])
+        assert_equal(len(messages), 20)
+        assert_equal(messages, self.messages(program, []))
+
+    def test_single_group_is_checked_by_driver(self) -> None:
+        manager = self.build({'root': 'import a\n', 'a': 'x = 1\n'}, [build.PARALLEL_CHECK])
+        assert_equal(manager.check_groups, {})
+
+
+class SnapshotSuite(Suite):
+    def set_up(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.snapshot_path = os.path.join(self.temp_dir, 'snapshot', 'stubs.pickle')
+        self.stub_dir = os.path.join(self.temp_dir, 'stubs')
+        os.mkdir(self.stub_dir)
+        self.write_stub('def f(x: int) -> str: pass\n')
+
+    def tear_down(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def write_stub(self, text: str) -> None:
+        with open(os.path.join(self.stub_dir, 'stub.pyi'), 'w') as f:
+            f.write(text)
+
+    def write_snapshot(self) -> None:
+        lib_stub = os.path.join(os.path.dirname(build.__file__), 'test', 'data', 'lib-stub')
+        messages = snapshot.write_snapshot(self.snapshot_path, [lib_stub, self.stub_dir],
+                                           flags=[build.TEST_BUILTINS])
+        assert_equal(messages, [])
+
+    def build(self, program: str) -> build.BuildManager:
+        result = build.build(sources=[BuildSource('main', '__main__', program)],
+                             target=build.TYPE_CHECK,
+                             flags=[build.TEST_BUILTINS, build.RESIDENT],
+                             alt_lib_path=self.stub_dir,
+                             snapshot_path=self.snapshot_path)
+        return result.manager
+
+    def test_stub_modules(self) -> None:
+        assert_equal(snapshot.stub_modules([self.stub_dir]), ['stub'])
+
+    def test_modules_loaded_from_snapshot(self) -> None:
+        self.write_snapshot()
+        manager = self.build('import stub\nx = stub.f(1)  # type: int\n')
+        assert_equal(sorted(manager.fresh_modules), ['builtins', 'stub'])
+        assert_equal(sorted(manager.stale_modules), ['__main__'])
+        assert_equal(manager.errors.messages(),
+                     ['main:2: error: Incompatible types in assignment '
+                      '(expression has type "str", variable has type "int")'])
+
+    def test_changed_stub_is_analyzed(self) -> None:
+        self.write_snapshot()
+        self.write_stub('def f(x: int) -> int: pass\n')
+        manager = self.build('import stub\nx = stub.f(1)  # type: int\n')
+        assert_equal(sorted(manager.fresh_modules), ['builtins'])
+        assert_equal(manager.errors.messages(), [])
+
+    def test_no_snapshot(self) -> None:
+        manager = self.build('import stub\n')
+        assert_equal(manager.snapshot, None)
+        assert_equal(sorted(manager.fresh_modules), [])
+
+
+class TimingReportSuite(Suite):
+    def set_up(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tear_down(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def test_phases_of_each_module(self) -> None:
+        with open(os.path.join(self.temp_dir, 'a.py'), 'w') as f:
+            f.write('def f(x: int) -> str: pass\n')
+        report_path = os.path.join(self.temp_dir, 'timing.json')
+        build.build(sources=[BuildSource('main', '__main__', 'import a\na.f("x")\n')],
+                    target=build.TYPE_CHECK,
+                    flags=[build.TEST_BUILTINS, build.RESIDENT],
+                    alt_lib_path=self.temp_dir,
+                    timing_report=report_path)
+        with open(report_path) as f:
+            data = json.load(f)
+        assert_equal(sorted(data['modules']), ['__main__', 'a', 'builtins'])
+        main = data['modules']['__main__']
+        assert_equal(sorted(main), sorted(timing.PHASES[:-1]))
+        for phase in main.values():
+            assert_equal(sorted(phase), sorted(timing.COUNTERS))
+        assert_equal(main['check']['errors'], 1)
+        assert_true(main['check']['nodes_visited'] > 0)
+        assert_true(main['check']['subtype_checks'] > 0)
+        assert_equal(data['totals']['check']['errors'], 1)
+        # The function, its body and the pass statement
+        assert_equal(data['modules']['a']['check']['nodes_visited'], 3)
+
+    def test_command_line_option(self) -> None:
+        path = os.path.join(self.temp_dir, 'a.py')
+        with open(path, 'w') as f:
+            f.write('x = 1\n')
+        report_path = os.path.join(self.temp_dir, 'timing.json')
+        sources, options = process_options(['--timing-report', report_path, path])
+        assert_equal(options.timing_report, report_path)
+        assert_equal(options.report_dirs, {})
+        build.build(sources=sources,
+                    target=build.TYPE_CHECK,
+                    flags=options.build_flags + [build.TEST_BUILTINS],
+                    alt_lib_path=self.temp_dir,
+                    report_dirs=options.report_dirs,
+                    timing_report=options.timing_report)
+        with open(report_path) as f:
+            assert_true('a' in json.load(f)['modules'])
+
+    def test_allocated_blocks_not_available(self) -> None:
+        # sys.getallocatedblocks is not available before Python 3.4.
+        report_path = os.path.join(self.temp_dir, 'timing.json')
+        getallocatedblocks = sys.getallocatedblocks
+        del sys.getallocatedblocks
+        try:
+            build.build(sources=[BuildSource('main', '__main__', 'x = 1\n')],
+                        target=build.TYPE_CHECK,
+                        flags=[build.TEST_BUILTINS],
+                        timing_report=report_path)
+        finally:
+            sys.getallocatedblocks = getallocatedblocks
+        with open(report_path) as f:
+            data = json.load(f)
+        assert_equal(data['modules']['__main__']['check']['allocated_blocks'], None)
+        assert_equal(data['totals']['check']['allocated_blocks'], None)
+        assert_true(data['totals']['check']['wall'] > 0)
+
+
+class ProfileSuite(Suite):
+    def set_up(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.profile_dir = os.path.join(self.temp_dir, 'profile')
+        with open(os.path.join(self.temp_dir, 'a.py'), 'w') as f:
+            f.write('def f(x: int) -> str: pass\n')
+
+    def tear_down(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def build(self, slowest: int = None) -> None:
+        build.build(sources=[BuildSource('main', '__main__', 'import a\na.f(1)\n')],
+                    target=build.TYPE_CHECK,
+                    flags=[build.TEST_BUILTINS],
+                    alt_lib_path=self.temp_dir,
+                    timing_report=os.path.join(self.temp_dir, 'timing.json'),
+                    profile_dir=self.profile_dir,
+                    profile_slowest=slowest)
+
+    def functions(self, phase: str) -> List[str]:
+        stats = pstats.Stats(os.path.join(self.profile_dir, phase + '.pstats'))
+        return [function for _, _, function in stats.stats]
+
+    def test_profile_of_each_phase(self) -> None:
+        self.build()
+        assert_equal(sorted(os.listdir(self.profile_dir)),
+                     sorted(phase + '.pstats' for phase in timing.PHASES[:-1]))
+        assert_true('visit_func_def' in self.functions('check'))
+        assert_true('parse_file' in self.functions('parse'))
+        assert_true('visit_func_def' not in self.functions('parse'))
+
+    def test_slowest_modules(self) -> None:
+        self.build(slowest=1)
+        with open(os.path.join(self.profile_dir, profiling.MODULES_FILE)) as f:
+            lines = f.read().splitlines()
+        # Builtins take the longest to analyze.
+        assert_equal(len(lines), 1)
+        assert_equal(lines[0].split()[1], 'builtins')
+
+
+class DefTimingSuite(Suite):
+    def test_definitions(self) -> None:
+        program = ('class C:\n'
+                   '    def f(self, x: int) -> int:\n'
+                   '        def g() -> int:\n'
+                   '            return abs(x)\n'
+                   '        return abs(g())\n'
+                   'def abs(x: int) -> int:\n'
+                   '    return x\n'
+                   'C().f(1)\n')
+        stdout = StringIO()
+        with redirect_stdout(stdout):
+            result = build.build(sources=[BuildSource('main', '__main__', program)],
+                                 target=build.TYPE_CHECK,
+                                 flags=[build.TEST_BUILTINS],
+                                 slowest_defs=3)
+        timings = result.manager.def_timings
+        defs = dict((name, values) for name, values in timings.defs.items()
+                    if name.startswith('__main__.'))
+        assert_equal(sorted(defs), ['__main__.C', '__main__.C.f', '__main__.C.f.g',
+                                    '__main__.abs'])
+        # The calls in nested definitions are not counted in the enclosing ones.
+        assert_equal(defs['__main__.C.f'][1], 2)
+        assert_equal(defs['__main__.C.f.g'][1], 1)
+        assert_equal(defs['__main__.C'][1], 0)
+        assert_true(sum(values[0] for values in timings.defs.values()) <= timings.total)
+        lines = stdout.getvalue().splitlines()
+        assert_true(lines[0].startswith('Slowest definitions'))
+        assert_equal(len(lines), 2 + 3)
+        assert_equal(lines[2].split()[-1], timings.slowest(1)[0])
+
+
+class StreamErrorsSuite(Suite):
+    def set_up(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        for id, text in [('a', 'import b\ndef f() -> None:\n    1 + ""\n'),
+                         ('b', 'x = 1 + ""\ny = 2 + ""\n'),
+                         ('c', 'x = 1\n')]:
+            with open(os.path.join(self.temp_dir, id + '.py'), 'w') as f:
+                f.write(text)
+
+    def tear_down(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def build(self, flags: List[str]) -> List[str]:
+        try:
+            build.build(sources=[BuildSource('main', '__main__', 'import a\nimport c\n')],
+                        target=build.TYPE_CHECK,
+                        flags=[build.TEST_BUILTINS] + flags,
+                        alt_lib_path=self.temp_dir)
+        except CompileError as e:
+            return e.messages
+        return []
+
+    def test_messages_written_per_module(self) -> None:
+        messages = self.build([])
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            remaining = self.build([build.STREAM_ERRORS])
+            output = sys.stdout.getvalue().splitlines()
+        finally:
+            sys.stdout = stdout
+        assert_equal(len(messages), 7)
+        assert_equal(output, messages)
+        assert_equal(remaining, [])
+
+
+class LowMemorySuite(Suite):
+    def set_up(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        for id, text in [('a', 'class A:\n'
+                               '    def __init__(self) -> None:\n'
+                               '        self.x = 1\n'
+                               '    def f(self) -> int:\n'
+                               '        return self.x\n'
+                               'def g(a: A) -> int:\n'
+                               '    return a.f()\n'),
+                         ('b', 'import a\n'
+                               'def h() -> None:\n'
+                               '    x = a.g(a.A()) + a.A().x\n'
+                               '    x + ""\n'
+                               '    a.g(x)\n')]:
+            with open(os.path.join(self.temp_dir, id + '.py'), 'w') as f:
+                f.write(text)
+
+    def tear_down(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def build(self, program: str, flags: List[str]) -> build.BuildResult:
+        return build.build(sources=[BuildSource('main', '__main__', program)],
+                           target=build.TYPE_CHECK,
+                           flags=[build.TEST_BUILTINS] + flags,
+                           alt_lib_path=self.temp_dir)
+
+    def messages(self, program: str, flags: List[str]) -> List[str]:
+        try:
+            self.build(program, flags)
+        except CompileError as e:
+            return e.messages
+        return []
+
+    def test_function_bodies_released(self) -> None:
+        result = self.build('import a\na.g(a.A())\n', [build.LOW_MEMORY])
+        tree = result.files['a']
+        func = tree.names['g'].node
+        assert_equal(func.body.body, [])
+        assert_equal(str(func.type), 'def (a: a.A) -> builtins.int')
+        method = tree.names['A'].node.names['f'].node
+        assert_equal(method.body.body, [])
+        assert_equal(str(tree.names['A'].node.names['x'].node.type), 'builtins.int')
+        assert_true(not any(node.get_line() > 1 for node in result.types))
+
+    def test_same_messages(self) -> None:
+        program = 'import b\n'
+        messages = self.messages(program, [])
+        assert_equal(len(messages), 3)
+        assert_equal(self.messages(program, [build.LOW_MEMORY]), messages)
+
+
+class LazyBodiesSuite(Suite):
+    def set_up(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        for id, text in [('a', 'class A:\n'
+                               '    def __init__(self) -> None:\n'
+                               '        self.x = 1\n'
+                               '    def f(self) -> int:\n'
+                               '        return self.x + ""\n'
+                               'def g(a: A) -> int:\n'
+                               '    import c\n'
+                               '    return c.y\n'),
+                         ('c', 'y = 1\n')]:
+            with open(os.path.join(self.temp_dir, id + '.py'), 'w') as f:
+                f.write(text)
+
+    def tear_down(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def build(self, flags: List[str]) -> build.BuildResult:
+        return build.build(sources=[BuildSource('main', '__main__',
+                                                'import a\n'
+                                                'def f() -> None:\n'
+                                                '    a.g(a.A())\n'
+                                                '    a.A().x\n')],
+                           target=build.TYPE_CHECK,
+                           flags=[build.TEST_BUILTINS] + flags,
+                           alt_lib_path=self.temp_dir)
+
+    def test_bodies_of_non_sources_skipped(self) -> None:
+        result = self.build([build.LAZY_BODIES])
+        tree = result.files['a']
+        func = tree.names['g'].node
+        assert_equal(func.body.body, [])
+        assert_true(func.lazy_body is not None)
+        assert_equal(str(func.type), 'def (a: a.A) -> builtins.int')
+        assert_true(tree.names['A'].node.names['f'].node.lazy_body is not None)
+        assert_true(result.files['__main__'].names['f'].node.lazy_body is None)
+
+    def test_methods_defining_attributes_are_parsed(self) -> None:
+        result = self.build([build.LAZY_BODIES])
+        info = result.files['a'].names['A'].node
+        assert_true(info.names['__init__'].node.lazy_body is None)
+        assert_equal(str(info.names['x'].node.type), 'builtins.int')
+
+    def test_imports_in_skipped_bodies(self) -> None:
+        assert_true('c' in self.build([build.LAZY_BODIES]).files)
+
+    def test_errors_in_skipped_bodies_not_reported(self) -> None:
+        try:
+            self.build([])
+        except CompileError as e:
+            assert_true(any('a.py:5: error' in message for message in e.messages))
+        else:
+            raise AssertionFailure('No errors reported')
+        self.build([build.LAZY_BODIES])
+
+
+class ShardSuite(Suite):
+    def set_up(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        modules = {'shared': 'x = 1\ndef f() -> int: pass\n',
+                   'a': 'import b\nimport missing\nclass A: pass\ny = b.B().g() + ""\n',
+                   'b': 'import a\nimport shared\n'
+                        'class B(a.A):\n    def g(self) -> int: return shared.x\n'}
+        for i in range(6):
+            modules['m{}'.format(i)] = ('import shared\nimport a\nimport missing\n'
+                                        'def h() -> str:\n    return shared.x\n'
+                                        'z = shared.f() + a.y\n')
+        for id, text in modules.items():
+            with open(os.path.join(self.temp_dir, id + '.py'), 'w') as f:
+                f.write(text)
+        self.program = ''.join('import m{}\n'.format(i) for i in range(6))
+
+    def tear_down(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def messages(self, shard_spec: Tuple[int, int] = None, shard_output: str = None) -> List[str]:
+        try:
+            build.build(sources=[BuildSource('main', '__main__', self.program)],
+                        target=build.TYPE_CHECK,
+                        flags=[build.TEST_BUILTINS],
+                        alt_lib_path=self.temp_dir,
+                        shard_spec=shard_spec,
+                        shard_output=shard_output)
+        except CompileError as e:
+            return e.messages
+        return []
+
+    def run_shards(self, num_shards: int) -> List[str]:
+        paths = []  # type: List[str]
+        for i in range(1, num_shards + 1):
+            paths.append(os.path.join(self.temp_dir, 'out', '{}.json'.format(i)))
+            self.messages((i, num_shards), paths[-1])
+        return paths
+
+    def test_merged_messages_are_same_as_single_build(self) -> None:
+        expected = self.messages()
+        assert_equal(len(expected), 32)
+        for num_shards in 1, 2, 3, 5:
+            paths = self.run_shards(num_shards)
+            assert_equal(shard.merge(paths, self.temp_dir), expected)
+
+    def test_modules_are_split_between_shards(self) -> None:
+        ids = ['m{}'.format(i) for i in range(6)]
+        owners = set(shard.shard_of(id, 3) for id in ids)
+        assert_equal(owners, {1, 2, 3})
+        assert_equal(shard.shard_of('m0', 3), shard.shard_of('m0', 3))
+
+    def test_outputs_of_all_shards_are_required(self) -> None:
+        paths = self.run_shards(3)
+        try:
+            shard.merge(paths[:2], self.temp_dir)
+        except shard.ShardError:
+            pass
+        else:
+            assert_true(False, 'ShardError not raised')
+
+    def test_only_interfaces_of_other_shards_are_checked(self) -> None:
+        main_shard = shard.shard_of('__main__', 2)
+        other = [id for id in ('c{}'.format(i) for i in range(20))
+                 if shard.shard_of(id, 2) != main_shard][0]
+        with open(os.path.join(self.temp_dir, other + '.py'), 'w') as f:
+            f.write('class C:\n'
+                    '    def __init__(self) -> None:\n'
+                    '        self.x = 1\n'
+                    '    def f(self) -> None:\n'
+                    '        y = 1\n'
+                    'def g() -> None:\n'
+                    '    y = 1\n')
+        program = 'import {0}\nx = {0}.C().x  # type: int\n'.format(other)
+        for shard_spec, checked in (None, True), ((main_shard, 2), False):
+            result = build.build(sources=[BuildSource('main', '__main__', program)],
+                                 target=build.TYPE_CHECK,
+                                 flags=[build.TEST_BUILTINS],
+                                 alt_lib_path=self.temp_dir,
+                                 shard_spec=shard_spec)
+            # The type of the attribute is inferred in either case, but the
+            # bodies of f and g are only checked if the module is in the shard.
+            tree = result.manager.semantic_analyzer.modules[other]
+            method = tree.defs[0].defs.body[1]
+            assigned = [method.body.body[0].rvalue, tree.defs[1].body.body[0].rvalue]
+            type_map = result.manager.type_checker.type_map
+            assert_equal([node in type_map for node in assigned], [checked, checked])
+
+
+class SymbolDepsSuite(Suite):
+    def set_up(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tear_down(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def test_classes_depend_on_their_whole_mro(self) -> None:
+        files = {'a.py': 'from b import X\nclass Z(X): pass\n',
+                 'b.py': 'from c import Y\nclass X(Y): pass\n',
+                 'c.py': 'class Y:\n    def f(self) -> int: pass\n'}
+        for name, text in files.items():
+            with open(os.path.join(self.temp_dir, name), 'w') as f:
+                f.write(text)
+        result = build.build(sources=[BuildSource('main', '__main__', 'import a\n')],
+                             target=build.TYPE_CHECK,
+                             flags=[build.TEST_BUILTINS, build.INCREMENTAL],
+                             alt_lib_path=self.temp_dir,
+                             cache_dir=os.path.join(self.temp_dir, 'cache'))
+        deps = result.manager.symbol_deps['a']
+        assert_true({'b.X', 'c.Y', 'builtins.object'} <= deps, str(deps))
+        meta = result.manager.cache_meta(result.manager.lookup_state('a'))
+        assert_true('c.Y' in meta.dep_symbol_hashes)
+
+
+class InterfaceHashSuite(Suite):
+    def test_hash_is_stable(self) -> None:
+        # Temporary objects created while hashing must not be confused with
+        # objects hashed earlier that happen to have had the same id.
+        program = ''.join('def f{0}(x: int) -> int: pass\n'
+                          'class C{0}:\n    def f(self) -> None: pass\n'.format(i)
+                          for i in range(60))
+        result = build.build(sources=[BuildSource('main', '__main__', program)],
+                             target=build.TYPE_CHECK, flags=[build.TEST_BUILTINS])
+        tree = result.files['__main__']
+        hashes = set(cache.interface_hash(tree, ['builtins'], result.files)
+                     for _ in range(20))
+        assert_equal(len(hashes), 1)
+        symbol_hashes = [cache.symbol_hashes(tree, ['builtins'], result.files)
+                         for _ in range(20)]
+        assert_true(all(h == symbol_hashes[0] for h in symbol_hashes))
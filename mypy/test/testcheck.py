@@ -2,11 +2,13 @@
 
 import os.path
 import re
+import shutil
 import sys
+import tempfile
 
-from typing import Tuple, List
+from typing import Tuple, List, Set
 
-from mypy import build
+from mypy import build, defaults
 import mypy.myunit  # for mutable globals (ick!)
 from mypy.build import BuildSource
 from mypy.myunit import Suite
@@ -54,6 +56,7 @@ files = [
     'check-type-promotion.test',
     'check-semanal-error.test',
     'check-flags.test',
+    'check-incremental.test',
 ]
 
 
@@ -66,21 +69,45 @@ class TypeCheckSuite(Suite):
         return c
 
     def run_test(self, testcase):
+        incremental = 'incremental' in testcase.name.lower() or 'incremental' in testcase.file
+        if incremental:
+            # Incremental tests are run once with a cold cache, then the .next files
+            # replace the corresponding files and the test is run again with the cache.
+            cache_dir = tempfile.mkdtemp()
+            try:
+                self.run_test_once(testcase, cache_dir, check_output=False)
+                for path, _ in testcase.files:
+                    if path.endswith('.next'):
+                        shutil.copy(path, path[:-len('.next')])
+                self.run_test_once(testcase, cache_dir)
+            finally:
+                shutil.rmtree(cache_dir)
+        else:
+            self.run_test_once(testcase)
+
+    def run_test_once(self, testcase, cache_dir=None, check_output=True):
         a = []
         pyversion = testcase_pyversion(testcase.file, testcase.name)
         program_text = '\n'.join(testcase.input)
         module_name, program_name, program_text = self.parse_options(program_text)
         flags = self.parse_flags(program_text)
+        if cache_dir:
+            flags.append(build.INCREMENTAL)
         source = BuildSource(program_name, module_name, program_text)
+        result = None
         try:
-            build.build(target=build.TYPE_CHECK,
-                        sources=[source],
-                        pyversion=pyversion,
-                        flags=flags + [build.TEST_BUILTINS],
-                        alt_lib_path=test_temp_dir)
+            result = build.build(target=build.TYPE_CHECK,
+                                 sources=[source],
+                                 pyversion=pyversion,
+                                 flags=flags + [build.TEST_BUILTINS],
+                                 alt_lib_path=test_temp_dir,
+                                 cache_dir=cache_dir or defaults.CACHE_DIR)
         except CompileError as e:
             a = normalize_error_messages(e.messages)
 
+        if not check_output:
+            return
+
         if testcase.output != a and mypy.myunit.UPDATE_TESTCASES:
             update_testcase_output(testcase, a, mypy.myunit.APPEND_TESTCASES)
 
@@ -89,6 +116,16 @@ class TypeCheckSuite(Suite):
             'Invalid type checker output ({}, line {})'.format(
                 testcase.file, testcase.line))
 
+        if result and testcase.expected_stale_modules is not None:
+            self.check_stale_modules(testcase, result.manager.stale_modules)
+
+    def check_stale_modules(self, testcase, stale_modules: Set[str]) -> None:
+        # The main module is given as program text, so it is always processed.
+        actual = sorted(stale_modules - {'__main__'})
+        assert_string_arrays_equal(
+            sorted(testcase.expected_stale_modules), actual,
+            'Invalid stale modules ({}, line {})'.format(testcase.file, testcase.line))
+
     def parse_options(self, program_text: str) -> Tuple[str, str, str]:
         """Return type check options for a test case.
 
@@ -0,0 +1,206 @@
+"""Test cases for the resident type checking daemon (mypy.daemon)."""
+
+import os
+import shutil
+import tempfile
+import threading
+
+from typing import Dict
+
+from mypy import build
+from mypy.build import BuildSource
+from mypy.daemon import Server, request
+from mypy.main import Options
+from mypy.myunit import Suite, assert_equal, assert_true
+
+
+class DaemonSuite(Suite):
+    def set_up(self) -> None:
+        self.old_cwd = os.getcwd()
+        self.old_mypy_path = os.environ.get('MYPYPATH')
+        self.temp_dir = tempfile.mkdtemp()
+        os.chdir(self.temp_dir)
+        # Test builtins are used, so the program directory is not in the search path.
+        os.environ['MYPYPATH'] = self.temp_dir
+
+    def tear_down(self) -> None:
+        os.chdir(self.old_cwd)
+        if self.old_mypy_path is None:
+            del os.environ['MYPYPATH']
+        else:
+            os.environ['MYPYPATH'] = self.old_mypy_path
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, files: Dict[str, str]) -> None:
+        for path, text in files.items():
+            with open(path, 'w') as f:
+                f.write(text)
+
+    def server(self) -> Server:
+        options = Options()
+        options.build_flags = [build.TEST_BUILTINS]
+        return Server([BuildSource('main.py', None, None)], options,
+                      os.path.join(self.temp_dir, 'daemon.sock'))
+
+    def test_reuse_unchanged_modules(self) -> None:
+        self.write({'main.py': 'import a\nimport b\nx = a.f()  # type: str\n',
+                    'a.py': 'import b\ndef f() -> int: return b.g()\n',
+                    'b.py': 'def g() -> int: pass\n',
+                    'c.py': 'import b\n'})
+        server = self.server()
+        status, messages = server.check()
+        assert_equal(status, 1)
+        assert_equal(messages, ['main.py:3: error: Incompatible types in assignment '
+                                '(expression has type "int", variable has type "str")'])
+        assert_true('a' in server.manager.stale_modules)
+
+        # Nothing has changed; everything is reused.
+        status, messages = server.check()
+        assert_equal(status, 1)
+        assert_equal(len(messages), 1)
+        assert_equal(sorted(server.manager.stale_modules), [])
+        assert_true('a' in server.manager.reused_modules)
+
+        # Change b; a and the main module depend on b and must be processed again.
+        self.write({'b.py': 'def g() -> str: pass\n'})
+        status, messages = server.check([os.path.abspath('b.py')])
+        assert_equal(status, 1)
+        assert_equal(messages, ['main.py:1: note: In module imported here:',
+                                'a.py: note: In function "f":',
+                                'a.py:2: error: Incompatible return value type: '
+                                'expected builtins.int, got builtins.str',
+                                'main.py: note: At top level:',
+                                'main.py:3: error: Incompatible types in assignment '
+                                '(expression has type "int", variable has type "str")'])
+        assert_equal(sorted(server.manager.stale_modules), ['__main__', 'a', 'b'])
+        assert_true('builtins' in server.manager.reused_modules)
+
+    def test_errors_of_reused_modules_are_reported(self) -> None:
+        self.write({'main.py': 'import a\n',
+                    'a.py': 'x = 1  # type: str\n'})
+        server = self.server()
+        first = server.check()
+        assert_equal(first[0], 1)
+        assert_equal(server.check(), first)
+        assert_true('a' in server.manager.reused_modules)
+
+    def test_unchanged_functions_are_not_checked_again(self) -> None:
+        self.write({'main.py': 'import a\n',
+                    'a.py': 'def f() -> int:\n'
+                            '    return ""\n'
+                            'def g() -> None:\n'
+                            '    x = 1  # type: str\n'})
+        server = self.server()
+        server.check()
+        # Change the body of f; g moves down a line.
+        self.write({'a.py': 'def f() -> int:\n'
+                            '    y = 1\n'
+                            '    return ""\n'
+                            'def g() -> None:\n'
+                            '    x = 1  # type: str\n'})
+        status, messages = server.check([os.path.abspath('a.py')])
+        assert_equal(sorted(server.manager.reused_functions), ['a.g'])
+        assert_equal(messages, ['main.py:1: note: In module imported here:',
+                                'a.py: note: In function "f":',
+                                'a.py:3: error: Incompatible return value type: '
+                                'expected builtins.int, got builtins.str',
+                                'a.py: note: In function "g":',
+                                'a.py:5: error: Incompatible types in assignment '
+                                '(expression has type "int", variable has type "str")'])
+        # A changed signature may affect the other functions.
+        self.write({'a.py': 'def f() -> str:\n'
+                            '    return ""\n'
+                            'def g() -> None:\n'
+                            '    x = 1  # type: str\n'})
+        status, messages = server.check([os.path.abspath('a.py')])
+        assert_equal(sorted(server.manager.reused_functions), [])
+        assert_equal(len(messages), 3)
+
+    def test_unchanged_methods_are_not_checked_again(self) -> None:
+        self.write({'main.py': 'import a\n',
+                    'a.py': 'class A:\n'
+                            '    def __init__(self) -> None:\n'
+                            '        self.x = 1\n'
+                            '    def f(self) -> int:\n'
+                            '        return ""\n'
+                            '    def g(self) -> str:\n'
+                            '        return self.x\n'})
+        server = self.server()
+        server.check()
+        # Change the body of f; g moves down a line.
+        self.write({'a.py': 'class A:\n'
+                            '    def __init__(self) -> None:\n'
+                            '        self.x = 1\n'
+                            '    def f(self) -> int:\n'
+                            '        y = 1\n'
+                            '        return ""\n'
+                            '    def g(self) -> str:\n'
+                            '        return self.x\n'})
+        status, messages = server.check([os.path.abspath('a.py')])
+        # __init__ defines an attribute, so it is checked again.
+        assert_equal(sorted(server.manager.reused_functions), ['a.A.g'])
+        assert_equal(messages, ['main.py:1: note: In module imported here:',
+                                'a.py: note: In member "f" of class "A":',
+                                'a.py:6: error: Incompatible return value type: '
+                                'expected builtins.int, got builtins.str',
+                                'a.py: note: In member "g" of class "A":',
+                                'a.py:8: error: Incompatible return value type: '
+                                'expected builtins.str, got builtins.int'])
+        # A new attribute changes the interface of the class.
+        self.write({'a.py': 'class A:\n'
+                            '    def __init__(self) -> None:\n'
+                            '        self.x = 1\n'
+                            '    def f(self) -> int:\n'
+                            '        self.y = 1\n'
+                            '        return ""\n'
+                            '    def g(self) -> str:\n'
+                            '        return self.x\n'})
+        status, messages = server.check([os.path.abspath('a.py')])
+        assert_equal(sorted(server.manager.reused_functions), [])
+        assert_equal(len(messages), 5)
+
+    def test_lines_are_split_at_newlines_only(self) -> None:
+        # The form feed must not end a line, or the chunk of g would contain
+        # the body of f.
+        self.write({'main.py': 'import a\n',
+                    'a.py': 'x = 1\x0c\n'
+                            'def f() -> int:\n'
+                            '    return 1\n'
+                            'def g() -> int:\n'
+                            '    return 2\n'})
+        server = self.server()
+        assert_equal(server.check(), (0, []))
+        self.write({'a.py': 'x = 1\x0c\n'
+                            'def f() -> int:\n'
+                            '    return ""\n'
+                            'def g() -> int:\n'
+                            '    return 2\n'})
+        status, messages = server.check([os.path.abspath('a.py')])
+        assert_equal(sorted(server.manager.reused_functions), ['a.g'])
+        assert_equal(messages, ['main.py:1: note: In module imported here:',
+                                'a.py: note: In function "f":',
+                                'a.py:3: error: Incompatible return value type: '
+                                'expected builtins.int, got builtins.str'])
+
+    def test_socket_protocol(self) -> None:
+        self.write({'main.py': 'import a\na.f(1)\n',
+                    'a.py': 'def f() -> None: pass\n'})
+        server = self.server()
+        thread = threading.Thread(target=server.serve)
+        thread.start()
+        try:
+            for i in range(100):
+                if os.path.exists(server.socket_path):
+                    break
+                thread.join(0.1)
+            response = request(server.socket_path, 'check', changed=[])
+            assert_equal(response['status'], 1)
+            assert_equal(response['messages'],
+                         ['main.py:2: error: Too many arguments for "f"'])
+            self.write({'a.py': 'def f(x: int) -> None: pass\n'})
+            response = request(server.socket_path, 'check',
+                               changed=[os.path.abspath('a.py')])
+            assert_equal(response, {'status': 0, 'messages': []})
+        finally:
+            request(server.socket_path, 'stop')
+            thread.join()
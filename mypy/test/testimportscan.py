@@ -0,0 +1,58 @@
+"""Test cases for the import scanner (mypy.importscan)."""
+
+import glob
+import os
+
+from typing import Set
+
+from mypy import parse
+from mypy.importscan import scan_imports
+from mypy.myunit import Suite, assert_equal, assert_true
+from mypy.nodes import Import, ImportFrom, ImportAll
+
+
+class ImportScanSuite(Suite):
+    def test_import_statements(self) -> None:
+        text = ('import a.b as c, d  # import e\n'
+                'from f import (g,  # h\n'
+                '               i as j)\n'
+                'from k import *\n'
+                'if x:\n'
+                '    from \\\n'
+                '      l import m; import n\n')
+        assert_equal(scan_imports(text, 'p'),
+                     ['a.b', 'd', 'f', 'f.g', 'f.i', 'k', 'l', 'l.m', 'n'])
+
+    def test_strings_and_comments_are_skipped(self) -> None:
+        text = ('"""Docstring\n'
+                'import a\n'
+                '"""\n'
+                "s = 'import b'\n"
+                '# import c\n'
+                "t = '''\\'''\n"
+                'import d\n'
+                "'''\n"
+                'importer = 1\n'
+                'import e\n')
+        assert_equal(scan_imports(text, 'p'), ['e'])
+
+    def test_relative_imports(self) -> None:
+        text = 'from . import a\nfrom ..b import c\n'
+        assert_equal(scan_imports(text, 'p.q.r'), ['p.q', 'p.q.a', 'p.b', 'p.b.c'])
+        assert_equal(scan_imports(text, 'p.q', is_package=True),
+                     ['p.q', 'p.q.a', 'p.b', 'p.b.c'])
+        assert_equal(scan_imports('from ... import a\n', 'p'), [])
+
+    def test_finds_all_imports_found_by_parser(self) -> None:
+        for path in glob.glob(os.path.join(os.path.dirname(parse.__file__), '*.py')):
+            with open(path) as f:
+                text = f.read()
+            tree = parse.parse(text, path, None)
+            imported = set()  # type: Set[str]
+            for imp in tree.imports:
+                if isinstance(imp, Import):
+                    imported.update(id for id, _ in imp.ids)
+                elif isinstance(imp, (ImportFrom, ImportAll)) and not imp.relative:
+                    imported.add(imp.id)
+            missing = imported - set(scan_imports(text, 'mypy.x'))
+            assert_true(not missing, '{}: {}'.format(path, missing))
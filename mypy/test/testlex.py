@@ -2,8 +2,8 @@
 
 import typing
 
-from mypy.myunit import Suite, assert_equal
-from mypy.lex import lex
+from mypy.myunit import Suite, assert_equal, assert_true
+from mypy.lex import lex, lex_stream, Lexer, Name, Break, Eof, LexError
 
 
 class LexerSuite(Suite):
@@ -437,21 +437,27 @@ class LexerSuite(Suite):
         if lexed.endswith(' ...'):
             lexed = lexed[:-3] + 'Break() Eof()'
 
-        l = lex(src)[0]
-        r = []
-        for t in l:
-            r.append(str(t))
-        act = ' '.join(r)
-        if act != lexed:
-            print('Actual:  ', act)
-            print('Expected:', lexed)
-        assert_equal(act, lexed)
+        # Both lexer engines and the token stream must produce the same tokens.
+        for scanner in True, False, None:
+            if scanner is None:
+                l = list(lex_stream(src)[0])
+            else:
+                l = lex(src, scanner=scanner)[0]
+            r = []
+            for t in l:
+                r.append(str(t))
+            act = ' '.join(r)
+            if act != lexed:
+                print('Actual:  ', act)
+                print('Expected:', lexed)
+            assert_equal(act, lexed)
 
     def assert_line(self, s, a):
         s = s.replace('\\n', '\n')
         s = s.replace('\\r', '\r')
 
         tt = lex(s)[0]
+        assert_equal([t.line for t in lex(s, scanner=False)[0]], [t.line for t in tt])
         r = []
         for t in tt:
             r.append(t.line)
@@ -460,3 +466,36 @@ class LexerSuite(Suite):
             a.append(a[-1])
             a.append(a[-1])
         assert_equal(r, a)
+
+
+class TokenStreamSuite(Suite):
+    def test_tokens_are_slices_of_text(self):
+        stream, ignored_lines = lex_stream('if x:  # type: ignore\n    y = 1\n')
+        assert_equal(ignored_lines, {1})
+        assert_equal(stream.overrides, {})
+        assert_equal(len(stream), 11)
+        assert_equal(stream.kind(1), Name)
+        assert_equal(stream.string(1), 'x')
+        assert_equal(stream.line(5), 2)
+        tok = stream[5]
+        assert_equal((type(tok), tok.string, tok.pre, tok.line), (Name, 'y', '', 2))
+        assert_true(stream[5] is tok)
+        assert_equal(stream[3].pre, '  # type: ignore')
+        assert_equal([t.string for t in stream[-3:]], ['\n', '', ''])
+        assert_equal(type(stream[-1]), Eof)
+
+    def test_tokens_that_are_not_slices(self):
+        stream = lex_stream(b'"\xbb"')[0]
+        assert_equal([type(t) for t in stream], [LexError, Break, Eof])
+        assert_equal(sorted(stream.overrides), [0])
+        # The numeric literal error token is spaces.
+        stream = lex_stream('x = 0xax; y')[0]
+        assert_equal(stream.kind(2), LexError)
+        assert_equal(stream.string(2), '    ')
+        assert_equal((stream.string(4), stream[4].pre), ('y', ' '))
+
+    def test_large_file(self):
+        # The lexer moves the tokens to the stream in parts.
+        text = 'x = (1,\n     2)  # c\n' * Lexer.flush_tokens
+        assert_equal([str(t) for t in lex_stream(text)[0]],
+                     [str(t) for t in lex(text)[0]])
@@ -0,0 +1,113 @@
+"""Test cases for the index of module search path directories (mypy.moduleindex)."""
+
+import os
+import shutil
+import tempfile
+import time
+
+from mypy import build
+from mypy.moduleindex import ModuleIndex
+from mypy.myunit import Suite, assert_equal, assert_true, assert_false
+
+
+class ModuleIndexSuite(Suite):
+    def set_up(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        for path in ['a.py', 'b.pyi', os.path.join('p', '__init__.py'),
+                     os.path.join('p', 'q.py'), os.path.join('n', 'r.py')]:
+            path = os.path.join(self.temp_dir, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write('')
+
+    def tear_down(self) -> None:
+        shutil.rmtree(self.temp_dir)
+        build.find_module_clear_caches()
+
+    def test_lookups(self) -> None:
+        index = ModuleIndex()
+        assert_true(index.isfile(os.path.join(self.temp_dir, 'a.py')))
+        assert_false(index.isfile(os.path.join(self.temp_dir, 'a.pyi')))
+        assert_false(index.isfile(os.path.join(self.temp_dir, 'p')))
+        assert_true(index.isdir(os.path.join(self.temp_dir, 'p')))
+        assert_false(index.isdir(os.path.join(self.temp_dir, 'x')))
+        assert_true(index.has_init_file(os.path.join(self.temp_dir, 'p'), ['.pyi', '.py']))
+        assert_false(index.has_init_file(os.path.join(self.temp_dir, 'n'), ['.pyi', '.py']))
+        # The root directory, p and n were listed once each; x couldn't be listed.
+        assert_equal(index.scans, 4)
+
+    def test_find_module(self) -> None:
+        build.find_module_clear_caches()
+        lib_path = [self.temp_dir]
+        assert_equal(build.find_module('a', lib_path), os.path.join(self.temp_dir, 'a.py'))
+        assert_equal(build.find_module('b', lib_path), os.path.join(self.temp_dir, 'b.pyi'))
+        assert_equal(build.find_module('p.q', lib_path),
+                     os.path.join(self.temp_dir, 'p', 'q.py'))
+        # n has no __init__ file.
+        assert_equal(build.find_module('n.r', lib_path), None)
+        sources = build.find_modules_recursive('p', lib_path)
+        assert_equal([source.module for source in sources], ['p', 'p.q'])
+
+    def set_old_mtimes(self) -> None:
+        # Listings of recently modified directories are not saved.
+        old = time.time() - 60
+        for dir in [self.temp_dir, os.path.join(self.temp_dir, 'p')]:
+            os.utime(dir, (old, old))
+
+    def test_save_and_load(self) -> None:
+        self.set_old_mtimes()
+        index = ModuleIndex()
+        index.listing(self.temp_dir)
+        index.listing(os.path.join(self.temp_dir, 'p'))
+        index_file = os.path.join(self.temp_dir, 'index.json')
+        index.save(index_file)
+
+        loaded = ModuleIndex()
+        loaded.load(index_file)
+        assert_true(loaded.isfile(os.path.join(self.temp_dir, 'p', 'q.py')))
+        assert_equal(loaded.scans, 0)
+
+        # A changed directory is scanned again.
+        with open(os.path.join(self.temp_dir, 'p', 'new.py'), 'w') as f:
+            f.write('')
+        os.utime(os.path.join(self.temp_dir, 'p'), (0, 0))
+        loaded = ModuleIndex()
+        loaded.load(index_file)
+        assert_true(loaded.isfile(os.path.join(self.temp_dir, 'p', 'new.py')))
+        assert_equal(loaded.scans, 1)
+
+    def test_recently_modified_directory_not_saved(self) -> None:
+        self.set_old_mtimes()
+        with open(os.path.join(self.temp_dir, 'p', 'new.py'), 'w') as f:
+            f.write('')
+        index = ModuleIndex()
+        index.listing(self.temp_dir)
+        index.listing(os.path.join(self.temp_dir, 'p'))
+        # n is not listed, so the index file doesn't change the listed directories.
+        index_file = os.path.join(self.temp_dir, 'n', 'index.json')
+        index.save(index_file)
+
+        loaded = ModuleIndex()
+        loaded.load(index_file)
+        assert_equal(sorted(loaded.listings), [self.temp_dir])
+
+    def test_listing_without_scandir(self) -> None:
+        scandir = getattr(os, 'scandir', None)
+        if scandir is not None:
+            del os.scandir
+        try:
+            index = ModuleIndex()
+            listing = index.listing(self.temp_dir)
+        finally:
+            if scandir is not None:
+                os.scandir = scandir
+        assert_equal(listing.files, {'a.py', 'b.pyi'})
+        assert_equal(listing.subdirs, {'p', 'n'})
+
+    def test_load_invalid_file(self) -> None:
+        index_file = os.path.join(self.temp_dir, 'index.json')
+        with open(index_file, 'w') as f:
+            f.write('{')
+        index = ModuleIndex()
+        index.load(index_file)
+        assert_equal(index.listings, {})
@@ -2,16 +2,24 @@
 
 Test case descriptions are in files test/data/parse[-errors].test."""
 
+import glob
+import io
 import os.path
+import re
+import tokenize
 
-import typing
+from typing import List, Set, Tuple
 
 from mypy import defaults
-from mypy.myunit import Suite, AssertionFailure
+from mypy.myunit import (
+    Suite, TestCase, AssertionFailure, SkipTestCaseException, assert_true
+)
 from mypy.test.helpers import assert_string_arrays_equal
 from mypy.test.data import parse_test_cases
 from mypy.test import config
-from mypy.parse import parse
+from mypy.parse import parse, load_lazy_body
+from mypy.nodes import FuncDef
+from mypy.traverser import TraverserVisitor
 from mypy.errors import CompileError
 
 
@@ -49,6 +57,34 @@ def test_parser(testcase):
                                    testcase.file, testcase.line))
 
 
+class LazyBodySuite(Suite):
+    def test_loaded_bodies_are_same_as_parsed_bodies(self) -> None:
+        mypy_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for path in sorted(glob.glob(os.path.join(mypy_dir, '*.py'))):
+            with open(path, 'rb') as f:
+                source = f.read()
+            tree = parse(source, path, lazy_bodies=True)
+            loader = LazyBodyLoader()
+            tree.accept(loader)
+            assert_string_arrays_equal(str(parse(source, path)).split('\n'),
+                                       str(tree).split('\n'),
+                                       'Different parse trees ({})'.format(path))
+            if 'def ' in str(source):
+                assert_true(loader.loaded > 0)
+
+
+class LazyBodyLoader(TraverserVisitor):
+    """Parse all skipped function bodies of a tree."""
+
+    loaded = 0
+
+    def visit_func_def(self, defn: FuncDef) -> None:
+        if defn.lazy_body is not None:
+            load_lazy_body(defn)
+            self.loaded += 1
+        super().visit_func_def(defn)
+
+
 # The file name shown in test case output. This is displayed in error
 # messages, and must match the file name in the test case descriptions.
 INPUT_FILE_NAME = 'file'
@@ -74,3 +110,123 @@ def test_parse_error(testcase):
             testcase.output, e.messages,
             'Invalid compiler output ({}, line {})'.format(testcase.file,
                                                            testcase.line))
+
+
+class FastParserDifferentialSuite(Suite):
+    """Compare the trees built by mypy.parse and mypy.fastparse.
+
+    The inputs are the parser test cases, the source files of mypy and
+    lib-python and the Python 2 files of lib-typing and pinfer. Test cases
+    that typed_ast rejects (mypy.parse accepts some invalid syntax) are
+    skipped, as are the differences documented in mypy.fastparse (see
+    normalize_dump).
+    """
+
+    def cases(self):
+        c = []  # type: List[TestCase]
+        for f in ParserSuite.parse_files:
+            c += parse_test_cases(os.path.join(config.test_data_prefix, f),
+                                  test_fast_parser_test_case, optional_out=True)
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        paths = sorted(glob.glob(os.path.join(root, 'mypy', '*.py')) +
+                       glob.glob(os.path.join(root, 'lib-python', '3.2', '*.py')))
+        python2_paths = sorted(glob.glob(os.path.join(root, 'lib-typing', '2.7', '*.py')) +
+                               [os.path.join(root, 'pinfer', 'unparse.py')])
+        for path in paths + python2_paths:
+            name = 'testFastParser_' + os.path.relpath(path, root)
+            pyversion = (defaults.PYTHON2_VERSION if path in python2_paths
+                         else defaults.PYTHON3_VERSION)
+            c.append(TestCase(name, self, lambda path=path, pyversion=pyversion:
+                              test_fast_parser_file(path, pyversion)))
+        return c
+
+
+# Test cases whose trees differ for documented reasons
+FAST_PARSER_SKIPPED_CASES = {
+    # The tuple argument (y) can't be told apart from the argument y.
+    'testParenthesizedArgumentInPython2',
+}
+
+
+def test_fast_parser_test_case(testcase):
+    if testcase.name in FAST_PARSER_SKIPPED_CASES:
+        raise SkipTestCaseException()
+    if testcase.file.endswith('python2.test'):
+        pyversion = defaults.PYTHON2_VERSION
+    else:
+        pyversion = defaults.PYTHON3_VERSION
+    assert_same_trees(bytes('\n'.join(testcase.input), 'ascii'), 'main', pyversion,
+                      '{}, line {}'.format(testcase.file, testcase.line))
+
+
+def test_fast_parser_file(path: str, pyversion: Tuple[int, int]) -> None:
+    with open(path, 'rb') as f:
+        source = f.read()
+    assert_same_trees(source, path, pyversion, path)
+
+
+def assert_same_trees(source: bytes, fnam: str, pyversion: Tuple[int, int],
+                      location: str) -> None:
+    try:
+        import mypy.fastparse  # noqa
+    except SystemExit:
+        # typed_ast is not installed.
+        raise SkipTestCaseException()
+    try:
+        fast = str(parse(source, fnam=fnam, pyversion=pyversion, fast_parser=True))
+    except CompileError:
+        # Not valid Python
+        raise SkipTestCaseException()
+    try:
+        expected = str(parse(source, fnam=fnam, pyversion=pyversion))
+    except CompileError as e:
+        raise AssertionFailure('mypy.parse failed: {}'.format(e.messages))
+    multi_line = multi_line_statements(source)
+    assert_string_arrays_equal(normalize_dump(expected, multi_line),
+                               normalize_dump(fast, multi_line),
+                               'Different parse trees ({})'.format(location))
+
+
+def normalize_dump(dump: str, multi_line: Set[int]) -> List[str]:
+    """Remove the documented differences of the parsers from a tree dump.
+
+    These are the lines of expressions in statements that span multiple
+    lines (multi_line has the first lines of these statements) and the
+    values of string literals with escape sequences. The lines of other
+    expressions must be the same.
+    """
+    result = []  # type: List[str]
+    statement = None  # type: int
+    for line in dump.split('\n'):
+        m = re.match(r'\s*\w+(?:Stmt|Def|Decorator):(\d+)\(', line)
+        if m:
+            statement = int(m.group(1))
+        elif statement in multi_line:
+            line = re.sub(r'(Expr|Comprehension):\d+', r'\1', line)
+        line = re.sub(r'^(\s*(?:Str|Bytes|Unicode)Expr\().*\\.*$', r'\1...)', line)
+        result.append(line)
+    return result
+
+
+def multi_line_statements(source: bytes) -> Set[int]:
+    """Return the first lines of the statements that span multiple lines.
+
+    Statements here are the logical lines of the tokenizer, so the header of
+    a compound statement is a statement of its own. If the source can't be
+    tokenized, return an empty set.
+    """
+    result = set()  # type: Set[int]
+    start = None  # type: int
+    skipped = (tokenize.ENCODING, tokenize.NL, tokenize.COMMENT, tokenize.INDENT,
+               tokenize.DEDENT)
+    try:
+        for token in tokenize.tokenize(io.BytesIO(source).readline):
+            if token.type in (tokenize.NEWLINE, tokenize.ENDMARKER):
+                if start is not None and token.start[0] > start:
+                    result.add(start)
+                start = None
+            elif token.type not in skipped and start is None:
+                start = token.start[0]
+    except (tokenize.TokenError, SyntaxError):
+        pass
+    return result
@@ -0,0 +1,109 @@
+"""Test cases for incremental reparsing (mypy.reparse)."""
+
+import os
+
+from mypy import defaults
+from mypy.errors import CompileError
+from mypy.myunit import Suite, assert_equal, assert_true
+from mypy.nodes import MypyFile
+from mypy.parse import parse
+from mypy.reparse import reparse
+from mypy.test.helpers import assert_string_arrays_equal
+
+
+TEXT = ('"""Docstring"""\n'
+        'import a\n'
+        '\n'
+        'def f() -> None:\n'
+        '    import b\n'
+        '    x = 1\n'
+        '\n'
+        'class C:\n'
+        '    def g(self) -> None:\n'
+        '        from c import *  # type: ignore\n'
+        '        pass\n'
+        'y = 1; z = 2\n')
+
+
+class ReparseSuite(Suite):
+    def reparse(self, old: str, new: str, pyversion=defaults.PYTHON3_VERSION) -> MypyFile:
+        """Reparse a change and check that the tree is the same as when parsing from scratch."""
+        tree = reparse(parse(old, 'main', pyversion=pyversion), old, new, 'main',
+                       pyversion=pyversion)
+        assert_string_arrays_equal(str(parse(new, 'main', pyversion=pyversion)).split('\n'),
+                                   str(tree).split('\n'), 'Different parse trees')
+        return tree
+
+    def test_unchanged_definitions_keep_identity(self) -> None:
+        tree = parse(TEXT, 'main')
+        f, c = tree.defs[2], tree.defs[3]
+        new = TEXT.replace('    x = 1\n', '    x = 2\n    x = 3\n')
+        assert_true(reparse(tree, TEXT, new, 'main') is tree)
+        assert_equal(str(tree), str(parse(new, 'main')))
+        assert_true(tree.defs[2] is not f)
+        assert_true(tree.defs[3] is c)
+        assert_equal(c.line, 9)
+        assert_equal(c.defs.body[0].line, 10)
+        assert_equal(tree.ignored_lines, {11})
+        assert_equal([imp.line for imp in tree.imports], [2, 5, 11])
+
+    def test_class_body_statements_are_reparsed(self) -> None:
+        tree = parse(TEXT, 'main')
+        c = tree.defs[3]
+        g = c.defs.body[0]
+        new = TEXT.replace('        pass\n', '        pass\n\n    def h(self) -> None: pass\n')
+        assert_true(reparse(tree, TEXT, new, 'main') is tree)
+        assert_equal(str(tree), str(parse(new, 'main')))
+        assert_true(tree.defs[3] is c)
+        assert_true(c.defs.body[0] is not g)
+        assert_equal(len(c.defs.body), 2)
+        assert_equal(tree.defs[4].line, 14)
+
+    def test_changes(self) -> None:
+        lines = TEXT.split('\n')
+        for i in range(len(lines)):
+            for new_lines in (lines[:i] + lines[i + 1:],
+                              lines[:i] + [lines[i]] + lines[i:],
+                              lines[:i] + ['import d'] + lines[i:],
+                              lines[:i] + ['    w = 3'] + lines[i:],
+                              lines[:i] + ['s = """'] + lines[i:]):
+                try:
+                    self.reparse(TEXT, '\n'.join(new_lines))
+                except CompileError:
+                    self.assert_parse_error('\n'.join(new_lines))
+
+    def assert_parse_error(self, text: str) -> None:
+        try:
+            parse(text, 'main')
+        except CompileError:
+            return
+        assert_true(False, 'Only reparse reported errors')
+
+    def test_overloads_are_combined(self) -> None:
+        old = ('from typing import overload\n'
+               '@overload\n'
+               'def f(x: int) -> int: pass\n'
+               'def g(x: str) -> str: pass\n')
+        tree = self.reparse(old, old.replace('def g', '@overload\ndef f'))
+        assert_equal(len(tree.defs), 2)
+
+    def test_future_imports(self) -> None:
+        old = ('from __future__ import print_function\n'
+               'def f():\n'
+               '    print(1, 2)\n')
+        self.reparse(old, old.replace('1, 2', '1, 2, 3'), defaults.PYTHON2_VERSION)
+        self.reparse(old, 'x = 1\n' + old.replace('print_function', 'division'),
+                     defaults.PYTHON2_VERSION)
+
+    def test_source_files(self) -> None:
+        path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'reparse.py')
+        with open(path) as f:
+            text = f.read()
+        lines = text.split('\n')
+        for i in range(0, len(lines), 7):
+            for new_lines in (lines[:i] + lines[i + 1:],
+                              lines[:i] + ['x = 1'] + lines[i:]):
+                try:
+                    self.reparse(text, '\n'.join(new_lines))
+                except CompileError:
+                    self.assert_parse_error('\n'.join(new_lines))
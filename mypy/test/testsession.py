@@ -0,0 +1,75 @@
+"""Test cases for the in-process type checking API (mypy.session)."""
+
+import os
+import shutil
+import tempfile
+
+from typing import Dict, List
+
+from mypy import build
+from mypy.build import BuildSource
+from mypy.errors import ErrorInfo
+from mypy.main import Options
+from mypy.myunit import Suite, assert_equal, assert_true
+from mypy.session import Session
+
+
+class SessionSuite(Suite):
+    def set_up(self) -> None:
+        self.old_cwd = os.getcwd()
+        self.old_mypy_path = os.environ.get('MYPYPATH')
+        self.temp_dir = tempfile.mkdtemp()
+        os.chdir(self.temp_dir)
+        # Test builtins are used, so the program directory is not in the search path.
+        os.environ['MYPYPATH'] = self.temp_dir
+        self.write({'main.py': 'import a\na.f(1)\n',
+                    'a.py': 'import b\ndef f() -> None: pass\n',
+                    'b.py': 'x = 1\n'})
+        options = Options()
+        options.build_flags = [build.TEST_BUILTINS]
+        self.session = Session([BuildSource('main.py', None, None)], options)
+
+    def tear_down(self) -> None:
+        os.chdir(self.old_cwd)
+        if self.old_mypy_path is None:
+            del os.environ['MYPYPATH']
+        else:
+            os.environ['MYPYPATH'] = self.old_mypy_path
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, files: Dict[str, str]) -> None:
+        for path, text in files.items():
+            with open(path, 'w') as f:
+                f.write(text)
+
+    def summary(self, errors: List[ErrorInfo]) -> List[str]:
+        return ['{}:{}: {}'.format(error.file, error.line, error.message) for error in errors]
+
+    def test_overlay_replaces_file(self) -> None:
+        assert_equal(self.summary(self.session.check()),
+                     ['main.py:2: Too many arguments for "f"'])
+        self.session.set_overlay('a.py', 'import b\ndef f(x: int) -> None: pass\n')
+        assert_equal(self.session.check(), [])
+        # Only the changed module and the modules depending on it are processed again.
+        assert_equal(sorted(self.session.manager.stale_modules), ['__main__', 'a'])
+        assert_true('b' in self.session.manager.reused_modules)
+        self.session.remove_overlay('a.py')
+        assert_equal(len(self.session.check()), 1)
+
+    def test_errors_of_buffer(self) -> None:
+        self.session.check()
+        errors = self.session.check_file('b.py', 'x = 1\ny = x + ""\n')
+        assert_equal(self.summary(errors), ['b.py:2: Unsupported left operand type for + '
+                                            '("int")'])
+        # The file itself is unchanged.
+        with open('b.py') as f:
+            assert_equal(f.read(), 'x = 1\n')
+
+    def test_blocking_error(self) -> None:
+        self.session.check()
+        manager = self.session.manager
+        errors = self.session.check_file('a.py', 'def f(:\n')
+        assert_true(errors != [])
+        assert_true(self.session.manager is manager)
+        self.session.remove_overlay('a.py')
+        assert_equal(len(self.session.check()), 1)
@@ -0,0 +1,115 @@
+"""Test cases for re-checking a program when its files change (mypy.watch)."""
+
+import io
+import os
+import shutil
+import tempfile
+
+from contextlib import redirect_stderr
+from typing import Dict, List
+
+from mypy import build
+from mypy.build import BuildSource
+from mypy.main import Options, process_options
+from mypy.myunit import Suite, assert_equal, assert_true
+from mypy.watch import FileWatcher, InotifyWatcher, PollingWatcher, file_watcher, watch
+
+
+class ScriptedWatcher(FileWatcher):
+    """Make changes to files instead of waiting for them."""
+
+    def __init__(self, changes: List[Dict[str, str]]) -> None:
+        super().__init__()
+        self.changes = changes
+        self.watched = []  # type: List[List[str]]
+
+    def watch(self, paths: List[str]) -> None:
+        super().watch(paths)
+        self.watched.append(sorted(self.paths))
+
+    def wait(self, timeout: float = None) -> List[str]:
+        changed = []  # type: List[str]
+        for path, text in self.changes.pop(0).items():
+            with open(path, 'w') as f:
+                f.write(text)
+            changed.append(os.path.abspath(path))
+        return changed
+
+
+class WatchSuite(Suite):
+    def set_up(self) -> None:
+        self.old_cwd = os.getcwd()
+        self.old_mypy_path = os.environ.get('MYPYPATH')
+        self.temp_dir = tempfile.mkdtemp()
+        os.chdir(self.temp_dir)
+        os.environ['MYPYPATH'] = self.temp_dir
+
+    def tear_down(self) -> None:
+        os.chdir(self.old_cwd)
+        if self.old_mypy_path is None:
+            del os.environ['MYPYPATH']
+        else:
+            os.environ['MYPYPATH'] = self.old_mypy_path
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, path: str, text: str) -> None:
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def test_check_after_each_change(self) -> None:
+        self.write('main.py', 'import a\na.f(1)\n')
+        self.write('a.py', 'def f() -> None: pass\n')
+        options = Options()
+        options.build_flags = [build.TEST_BUILTINS]
+        watcher = ScriptedWatcher([{'a.py': 'def f(x: int) -> None: pass\n'}])
+        stdout = io.StringIO()
+        watch([BuildSource('main.py', None, None)], options, watcher=watcher,
+              stdout=stdout, max_checks=2)
+        assert_equal(stdout.getvalue().splitlines(),
+                     ['main.py:2: error: Too many arguments for "f"',
+                      '-- Found errors; waiting for changes --',
+                      '-- No errors; waiting for changes --'])
+        assert_true(os.path.abspath('a.py') in watcher.watched[0])
+        assert_true(self.temp_dir in watcher.watched[0])
+
+    def test_per_build_options_are_rejected(self) -> None:
+        for flags in (['--html-report', 'r'], ['--timing-report', 't.json'],
+                      ['--profile', 'p'], ['--slowest-defs', '3']):
+            stderr = io.StringIO()
+            with redirect_stderr(stderr):
+                try:
+                    process_options(['--watch'] + flags + ['main.py'])
+                except SystemExit:
+                    pass
+                else:
+                    assert_true(False, 'SystemExit not raised')
+            assert_true('May not use {} with --watch'.format(flags[0]) in stderr.getvalue(),
+                        stderr.getvalue())
+        sources, options = process_options(['--watch', 'main.py'])
+        assert_true(options.watch)
+
+    def check_watcher(self, watcher: FileWatcher) -> None:
+        self.write('a.py', '')
+        os.mkdir('d')
+        try:
+            watcher.watch([os.path.abspath('a.py'), os.path.abspath('d')])
+            assert_equal(watcher.wait(0), [])
+            # Replace a.py by renaming another file over it, as some editors do.
+            self.write('a.py.tmp', 'x = 1\n')
+            os.replace('a.py.tmp', 'a.py')
+            assert_true(os.path.abspath('a.py') in watcher.wait(5))
+            self.write(os.path.join('d', 'b.py'), '')
+            assert_true(watcher.wait(5) != [])
+            assert_equal(watcher.wait(0), [])
+        finally:
+            watcher.close()
+
+    def test_polling_watcher(self) -> None:
+        self.check_watcher(PollingWatcher(interval=0.01))
+
+    def test_inotify_watcher(self) -> None:
+        watcher = file_watcher()
+        if isinstance(watcher, InotifyWatcher):
+            self.check_watcher(watcher)
+        else:
+            watcher.close()
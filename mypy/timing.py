@@ -0,0 +1,133 @@
+"""Per-module timing of the build phases (--timing-report).
+
+The report records, for each module and each phase of the build, the wall
+time and CPU time spent and the net number of memory blocks allocated
+(sys.getallocatedblocks), together with the number of nodes type checked,
+the number of is_subtype calls and the number of errors reported during the
+phase. The number of allocated blocks is null before Python 3.4. The phases
+are:
+
+  read           finding and reading the source file
+  parse          parsing (waiting for the worker process with --jobs)
+  first_pass     first pass of semantic analysis (top-level definitions)
+  semanal        second pass of semantic analysis
+  semanal_pass3  third pass of semantic analysis
+  check          type checking
+  report         generating reports
+
+The report is written as JSON:
+
+  {"modules": {"<module id>": {"<phase>": {"wall": ..., "cpu": ..., ...}, ...}, ...},
+   "totals": {"<phase>": {...}, ...}}
+
+Modules loaded from a cache or snapshot only have a read phase.
+"""
+
+import json
+import sys
+
+from typing import Dict, List, Optional
+
+from mypy import subtypes
+from mypy.checker import TypeChecker
+from mypy.errors import Errors
+from mypy.util import wall_clock, cpu_clock
+
+
+PHASES = ['read', 'parse', 'first_pass', 'semanal', 'semanal_pass3', 'check', 'report']
+
+# The measurements recorded for each phase
+COUNTERS = ['wall', 'cpu', 'allocated_blocks', 'nodes_visited', 'subtype_checks', 'errors']
+
+
+class TimingReport:
+    """Measurements of the phases of a build, by module id."""
+
+    def __init__(self, errors: Errors, checker: TypeChecker) -> None:
+        self.errors = errors
+        self.checker = checker
+        self.phases = {}  # type: Dict[str, Dict[str, List[Optional[float]]]]
+
+    def sample(self) -> List[Optional[float]]:
+        """Return the current values of the counters (see COUNTERS)."""
+        return [wall_clock(), cpu_clock(), allocated_blocks(),
+                self.checker.nodes_visited, subtypes.subtype_checks,
+                self.errors.num_messages()]
+
+    def phase(self, id: str, phase: str) -> 'PhaseTimer':
+        """Return a context manager that measures a phase of a module."""
+        return PhaseTimer(self, id, phase)
+
+    def record(self, id: str, phase: str, start: List[Optional[float]]) -> None:
+        """Add the change of the counters since start to a phase of a module."""
+        end = self.sample()
+        values = self.phases.setdefault(id, {}).setdefault(phase, [0] * len(COUNTERS))
+        for i in range(len(COUNTERS)):
+            values[i] = add_counter(values[i], add_counter(end[i], start[i], -1))
+
+    def totals(self) -> Dict[str, List[Optional[float]]]:
+        totals = {}  # type: Dict[str, List[Optional[float]]]
+        for phases in self.phases.values():
+            for phase, values in phases.items():
+                total = totals.setdefault(phase, [0] * len(COUNTERS))
+                for i in range(len(COUNTERS)):
+                    total[i] = add_counter(total[i], values[i])
+        return totals
+
+    def data(self) -> Dict[str, object]:
+        """Return the report as JSON-compatible data."""
+        def phase_data(phases: Dict[str, List[Optional[float]]]
+                       ) -> Dict[str, Dict[str, Optional[float]]]:
+            return dict((phase, dict(zip(COUNTERS, phases[phase])))
+                        for phase in PHASES if phase in phases)
+
+        return {'modules': dict((id, phase_data(self.phases[id])) for id in self.phases),
+                'totals': phase_data(self.totals())}
+
+    def write(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.data(), f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+def allocated_blocks() -> Optional[int]:
+    """Return the number of allocated memory blocks (None before Python 3.4)."""
+    if hasattr(sys, 'getallocatedblocks'):
+        return sys.getallocatedblocks()
+    return None
+
+
+def add_counter(x: Optional[float], y: Optional[float], sign: int = 1) -> Optional[float]:
+    """Return x + sign * y, or None if the counter is not available."""
+    if x is None or y is None:
+        return None
+    return x + sign * y
+
+
+class PhaseTimer:
+    """Context manager that records a phase of a module in a timing report."""
+
+    def __init__(self, report: TimingReport, id: str, phase: str) -> None:
+        self.report = report
+        self.id = id
+        self.phase = phase
+        self.start = None  # type: List[Optional[float]]
+
+    def __enter__(self) -> None:
+        self.start = self.report.sample()
+
+    def __exit__(self, *exc: object) -> None:
+        self.report.record(self.id, self.phase, self.start)
+
+
+class NullTimer:
+    """Context manager used when no timing report is generated."""
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc: object) -> None:
+        pass
+
+
+NULL_TIMER = NullTimer()
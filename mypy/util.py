@@ -1,8 +1,10 @@
 """Utility functions with no non-trivial dependencies."""
 
+import os
 import re
 import subprocess
-from typing import TypeVar, List, Any, Tuple, Optional
+import time
+from typing import TypeVar, List, Any, Tuple, Optional, Callable
 
 
 T = TypeVar('T')
@@ -11,6 +13,11 @@ ENCODING_RE = re.compile(br'([ \t\v]*#.*(\r\n?|\n))??[ \t\v]*#.*coding[:=][ \t]*
 
 default_python2_interpreter = ['python2', 'python', '/usr/bin/python']
 
+# Clocks for measuring wall and CPU time. time.perf_counter and
+# time.process_time are not available before Python 3.3.
+wall_clock = getattr(time, 'perf_counter', None) or time.time  # type: Callable[[], float]
+cpu_clock = getattr(time, 'process_time', None) or time.clock  # type: Callable[[], float]
+
 
 def short_type(obj: object) -> str:
     """Return the last component of the type name of an object.
@@ -100,3 +107,22 @@ def try_find_python2_interpreter() -> Optional[str]:
         except OSError:
             pass
     return None
+
+
+def replace_file(src: str, dst: str) -> None:
+    """Atomically rename src to dst, replacing dst if it exists.
+
+    This is os.replace, which is not available before Python 3.3. On older
+    versions os.rename replaces dst on POSIX systems, but not on Windows,
+    where MoveFileEx is used instead.
+    """
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    elif os.name != 'nt':
+        os.rename(src, dst)
+    else:
+        import ctypes
+        MOVEFILE_REPLACE_EXISTING = 1
+        if not ctypes.windll.kernel32.MoveFileExW(src, dst,  # type: ignore
+                                                  MOVEFILE_REPLACE_EXISTING):
+            raise ctypes.WinError()  # type: ignore
@@ -0,0 +1,258 @@
+"""Type check a program again whenever one of its files changes.
+
+The state of the most recent build is kept in memory (as in the resident
+daemon, see mypy.daemon), so only the changed modules and the modules that
+depend on them are processed again. All the files of the build, as found
+through the module search path, are watched, and so are the directories of
+the module search path, since a new file may resolve a missing import.
+
+On Linux, inotify is used for watching the directories that contain the
+files. Elsewhere, or if inotify is not available, the modification times of
+the files and directories are polled.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from typing import Dict, IO, Iterable, List, Optional, Set
+
+from mypy.build import BuildSource, PYTHON_EXTENSIONS
+from mypy.daemon import Server
+from mypy.main import Options
+
+
+# Events of watched directories (from <sys/inotify.h>).
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_ONLYDIR)
+
+# Layout of struct inotify_event, which is followed by the name of the file.
+EVENT_HEADER = struct.Struct('iIII')
+
+# Editors often write a file in several steps; wait for this long (in seconds)
+# after a change for further changes before checking.
+SETTLE_DELAY = 0.1
+
+# Interval (in seconds) for polling modification times.
+POLL_INTERVAL = 0.5
+
+
+class FileWatcher:
+    """Report changes to a set of files and directories.
+
+    Attributes:
+      paths: Absolute paths of the watched files and directories
+    """
+
+    def __init__(self) -> None:
+        self.paths = set()  # type: Set[str]
+
+    def watch(self, paths: Iterable[str]) -> None:
+        """Replace the set of watched paths.
+
+        Changes made before the call may be reported by the next call of wait.
+        """
+        self.paths = set(os.path.abspath(path) for path in paths)
+
+    def wait(self, timeout: float = None) -> List[str]:
+        """Wait until some paths change and return the changed paths, sorted.
+
+        Return an empty list if nothing changed within timeout seconds.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class PollingWatcher(FileWatcher):
+    """Detect changes by polling the modification times of the watched paths."""
+
+    def __init__(self, interval: float = POLL_INTERVAL) -> None:
+        super().__init__()
+        self.interval = interval
+        self.mtimes = {}  # type: Dict[str, Optional[float]]
+
+    def watch(self, paths: Iterable[str]) -> None:
+        super().watch(paths)
+        # Keep the times of paths that were watched already, so that a change
+        # made during the previous check is reported.
+        self.mtimes = dict((path, self.mtimes[path] if path in self.mtimes else mtime(path))
+                           for path in self.paths)
+
+    def wait(self, timeout: float = None) -> List[str]:
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            changed = self.poll()
+            if changed:
+                time.sleep(SETTLE_DELAY)
+                return sorted(set(changed + self.poll()))
+            if deadline is not None and time.time() >= deadline:
+                return []
+            time.sleep(self.interval)
+
+    def poll(self) -> List[str]:
+        changed = []  # type: List[str]
+        for path, old in self.mtimes.items():
+            new = mtime(path)
+            if new != old:
+                self.mtimes[path] = new
+                changed.append(path)
+        return changed
+
+
+class InotifyWatcher(FileWatcher):
+    """Detect changes with inotify watches of the directories containing the paths.
+
+    Watching the directories (rather than the files) catches files that are
+    replaced by renaming a new file over them, as many editors do.
+
+    Directories in the watched paths are watched themselves, so that new
+    files in them are reported.
+
+    Raise OSError if inotify is not available.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        name = ctypes.util.find_library('c')
+        if not name:
+            raise OSError('C library not found')
+        self.libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError('inotify is not supported')
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}  # type: Dict[str, int]
+        self.watch_dirs = {}  # type: Dict[int, str]
+
+    def watch(self, paths: Iterable[str]) -> None:
+        super().watch(paths)
+        dirs = set(path if os.path.isdir(path) else os.path.dirname(path)
+                   for path in self.paths)
+        for dir in dirs - set(self.dirs):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir), WATCH_MASK)
+            if wd >= 0:
+                self.dirs[dir] = wd
+                self.watch_dirs[wd] = dir
+            # Otherwise the directory doesn't exist; if it is created later, its
+            # parent directory (if watched) reports the change.
+        for dir in set(self.dirs) - dirs:
+            wd = self.dirs.pop(dir)
+            del self.watch_dirs[wd]
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def wait(self, timeout: float = None) -> List[str]:
+        deadline = None if timeout is None else time.time() + timeout
+        changed = set()  # type: Set[str]
+        while not changed:
+            remaining = None if deadline is None else max(0.0, deadline - time.time())
+            if not self.read_events(changed, remaining) and remaining is not None:
+                return []
+        while self.read_events(changed, SETTLE_DELAY):
+            pass
+        return sorted(changed)
+
+    def read_events(self, changed: Set[str], timeout: Optional[float]) -> bool:
+        """Add the paths changed by the next events to changed.
+
+        Return False if there were no events within timeout seconds.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return False
+        data = os.read(self.fd, 65536)
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, pos)
+            pos += EVENT_HEADER.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b'\0'))
+            pos += length
+            if wd not in self.watch_dirs:
+                continue
+            dir = self.watch_dirs[wd]
+            path = os.path.join(dir, name) if name else dir
+            # A new module or package may resolve a missing import.
+            if (path in self.paths or name.endswith(tuple(PYTHON_EXTENSIONS)) or
+                    mask & IN_ISDIR):
+                changed.add(path)
+        return True
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def mtime(path: str) -> Optional[float]:
+    """Return the modification time of a file, or None if it doesn't exist.
+
+    This is in nanoseconds if available (Python 3.3 and later).
+    """
+    try:
+        st = os.stat(path)
+        return getattr(st, 'st_mtime_ns', st.st_mtime)
+    except OSError:
+        return None
+
+
+def file_watcher() -> FileWatcher:
+    """Return an inotify watcher if supported and a polling watcher otherwise."""
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError):
+        return PollingWatcher()
+
+
+def watched_paths(server: Server) -> Set[str]:
+    """Return the files of the most recent build and the module search path."""
+    paths = set(source.path for source in server.sources if source.path)
+    manager = server.manager
+    if manager is not None:
+        paths.update(path for path in manager.module_files.values()
+                     if path and path != '<string>')
+        paths.update(manager.lib_path)
+    return set(os.path.abspath(path) for path in paths)
+
+
+def watch(sources: List[BuildSource], options: Options, bin_dir: str = None,
+          watcher: FileWatcher = None, stdout: IO[str] = None,
+          max_checks: int = None) -> None:
+    """Type check a program and check it again after each change until interrupted.
+
+    The messages of each check are written to stdout, followed by a summary
+    line. Stop after max_checks checks, if given.
+    """
+    stdout = stdout or sys.stdout
+    watcher = watcher or file_watcher()
+    server = Server(sources, options, bin_dir=bin_dir)
+    changed = []  # type: List[str]
+    checks = 0
+    try:
+        while max_checks is None or checks < max_checks:
+            status, messages = server.check(changed)
+            checks += 1
+            for message in messages:
+                stdout.write(message + '\n')
+            watcher.watch(watched_paths(server))
+            stdout.write('-- {}; waiting for changes --\n'.format(
+                'Found errors' if status else 'No errors'))
+            stdout.flush()
+            if max_checks is not None and checks >= max_checks:
+                break
+            changed = watcher.wait()
+    finally:
+        watcher.close()
@@ -158,6 +158,7 @@ def add_basic(driver: Driver) -> None:
 
 def add_selftypecheck(driver: Driver) -> None:
     driver.add_mypy_package('package mypy', 'mypy')
+    driver.add_mypy_package('package benchmarks', 'benchmarks')
 
 
 def find_files(base: str, prefix: str = '', suffix: str = '') -> List[str]:
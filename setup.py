@@ -86,7 +86,7 @@ setup(name='mypy-lang',
       package_dir=package_dir,
       py_modules=['typing'] if sys.version_info < (3, 5, 0) else [],
       packages=['mypy'],
-      scripts=['scripts/mypy', 'scripts/stubgen'],
+      scripts=['scripts/mypy', 'scripts/mypy-daemon', 'scripts/stubgen'],
       data_files=data_files,
       classifiers=classifiers,
       )